@@ -0,0 +1,167 @@
+"""
+逐帧的内存分配统计
+
+游戏循环每帧都会新建对象：_get_game_state 为每辆坦克和每颗子弹新建字典，
+optimize_sync_data 再复制一遍，客户端应用状态时也会建字典，to_bytes 生成JSON字符串。
+AllocationProfiler 用 tracemalloc 统计这些分配，每 N 帧输出一次报告：
+- 每帧净增的内存（两次快照之间存活下来的分配，按代码行归类，列出最多的几处）
+- 每帧的瞬时峰值（帧内比帧开始时多占用的最大内存，帧结束前已经释放的临时对象也计入）
+- 每帧各代垃圾回收的次数
+
+稳定状态下净增应接近0；瞬时峰值和0代回收次数反映每帧产生的垃圾量。
+tracemalloc 会让程序明显变慢，只用于分析，不要和帧耗时统计的数据放在一起比较。
+
+启用：main.py --alloc-profile N（每 N 帧输出一次）
+"""
+
+import gc
+import os
+import tracemalloc
+from typing import List, Optional
+
+# 默认每隔多少帧输出一次报告
+ALLOC_REPORT_FRAMES = 300
+# 报告中列出的代码位置数
+ALLOC_TOP_SITES = 10
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 当前启用的统计（None表示未启用），由 start_alloc_profiler 设置
+tracker: Optional["AllocationProfiler"] = None
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(_BASE_DIR):
+        return os.path.relpath(filename, _BASE_DIR)
+    return filename
+
+
+class AllocationProfiler:
+    """每 N 帧比较两次 tracemalloc 快照，统计每帧的分配"""
+
+    def __init__(self, every: int = ALLOC_REPORT_FRAMES, top: int = ALLOC_TOP_SITES, depth: int = 1):
+        self.every = max(int(every), 1)
+        self.top = top
+        self.depth = depth
+        self.running = False
+        self.reports: List[dict] = []
+        self._started_tracing = False
+        self._snapshot = None
+        self._frames = 0
+        self._peak_total = 0
+        self._frame_base = 0
+        self._gc_before = None
+
+    def start(self):
+        """开始统计（tracemalloc 未开启时开启）"""
+        if self.running:
+            return
+        self.running = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.depth)
+            self._started_tracing = True
+        self._begin_window()
+        print(f"🧮 内存分配统计已启用：每 {self.every} 帧输出一次")
+
+    def stop(self):
+        """停止统计，由本对象开启的 tracemalloc 同时关闭"""
+        if not self.running:
+            return
+        self.running = False
+        self._snapshot = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _begin_window(self):
+        self._snapshot = self._take_snapshot()
+        self._frames = 0
+        self._peak_total = 0
+        self._gc_before = [generation["collections"] for generation in gc.get_stats()]
+        tracemalloc.reset_peak()
+        self._frame_base = tracemalloc.get_traced_memory()[0]
+
+    def _take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def end_frame(self) -> Optional[dict]:
+        """结束一帧，满 N 帧时生成报告并返回"""
+        if not self.running:
+            return None
+        current, peak = tracemalloc.get_traced_memory()
+        self._peak_total += max(peak - self._frame_base, 0)
+        self._frames += 1
+
+        report = None
+        if self._frames >= self.every:
+            report = self._report()
+            self._begin_window()
+        else:
+            tracemalloc.reset_peak()
+            self._frame_base = current
+        return report
+
+    def _report(self) -> dict:
+        snapshot = self._take_snapshot()
+        key_type = "traceback" if self.depth > 1 else "lineno"
+        stats = snapshot.compare_to(self._snapshot, key_type)
+        frames = self._frames
+        gc_after = [generation["collections"] for generation in gc.get_stats()]
+
+        sites = []
+        for stat in sorted(stats, key=lambda item: item.size_diff, reverse=True)[:self.top]:
+            if stat.size_diff <= 0:
+                break
+            frame = stat.traceback[0]
+            site = {
+                "site": f"{_short_path(frame.filename)}:{frame.lineno}",
+                "bytes_per_frame": round(stat.size_diff / frames, 1),
+                "blocks_per_frame": round(stat.count_diff / frames, 2),
+            }
+            if self.depth > 1:
+                site["stack"] = [f"{_short_path(outer.filename)}:{outer.lineno}" for outer in stat.traceback[1:]]
+            sites.append(site)
+
+        report = {
+            "frames": frames,
+            "net_bytes_per_frame": round(sum(stat.size_diff for stat in stats) / frames, 1),
+            "peak_bytes_per_frame": round(self._peak_total / frames, 1),
+            "gc_per_frame": [round((after - before) / frames, 3)
+                             for before, after in zip(self._gc_before, gc_after)],
+            "sites": sites,
+        }
+        self.reports.append(report)
+        self._print_report(report)
+        return report
+
+    @staticmethod
+    def _print_report(report: dict):
+        print(f"🧮 内存分配（最近 {report['frames']} 帧）：净增 {report['net_bytes_per_frame']:.0f} B/帧，"
+              f"瞬时峰值 {report['peak_bytes_per_frame']:.0f} B/帧，"
+              f"回收 {'/'.join(f'{value:g}' for value in report['gc_per_frame'])} 次/帧")
+        for site in report["sites"]:
+            print(f"   {site['bytes_per_frame']:>10.1f} B/帧 {site['blocks_per_frame']:>8.2f} 块/帧  {site['site']}")
+
+
+def start_alloc_profiler(every: int = ALLOC_REPORT_FRAMES, top: int = ALLOC_TOP_SITES,
+                         depth: int = 1) -> AllocationProfiler:
+    """启用全局的分配统计（已启用时先停止旧的）"""
+    global tracker
+    stop_alloc_profiler()
+    tracker = AllocationProfiler(every, top, depth)
+    tracker.start()
+    return tracker
+
+
+def stop_alloc_profiler():
+    """停止全局的分配统计"""
+    global tracker
+    if tracker:
+        tracker.stop()
+        tracker = None
@@ -0,0 +1,10 @@
+"""
+性能基准测试
+
+不打开可见窗口运行的基准测试脚本，结果输出为JSON，便于在不同提交之间对比。
+
+运行方式（在 tank 目录下）：
+    python -m benchmarks.loopback_latency --output results.json
+    python -m benchmarks.hot_paths --baseline
+    python -m benchmarks.bullet_storm --output storm.json
+"""
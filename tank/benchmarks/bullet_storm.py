@@ -0,0 +1,297 @@
+"""
+子弹风暴压力测试
+
+脚本化的对局：两辆坦克持续旋转，按射击冷却正常开火，同时通过 Tank.shoot 发射扇形齐射，
+把场上的子弹数量逐级提高到几百颗（子弹照常反弹3次后消失，齐射不断补充）。
+每一级运行固定的tick数，统计：
+- 整帧时间（齐射 + GameView.on_update + 主机生成并编码 GAME_STATE，有窗口时还包括绘制）
+- 物理时间（frame_profiler 的 space_step/sprite_sync/bullet_cull/post_step_remove 之和）
+- GAME_STATE 消息的大小和生成/编码耗时
+- 分配：每秒的0代垃圾回收次数，以及每tick新增的已分配内存块（sys.getallocatedblocks）
+并给出每张地图平均帧时间超过 1/60 秒（低于60FPS）时的子弹数量。
+
+默认不打开窗口（HeadlessWindow），--window 时在真实窗口中绘制（关闭垂直同步）。
+游戏代码的调试输出被丢弃（格式化的开销仍计入帧时间）。
+
+用法（在 tank 目录下）：
+    python -m benchmarks.bullet_storm
+    python -m benchmarks.bullet_storm --maps 1,3 --max-bullets 800 --step 100 --ticks 180
+    python -m benchmarks.bullet_storm --window --output storm.json
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import math
+import os
+import platform
+import sys
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FRAME = 1 / 60
+FPS_TARGET = 60
+MAX_BULLETS = 600
+LEVEL_STEP = 50
+TICKS_PER_LEVEL = 120
+WARMUP_TICKS = 30        # 每一级开始时子弹数量还在上升，这些tick不计入统计
+VOLLEY_SIZE = 8          # 每辆坦克每tick最多齐射的子弹数
+VOLLEY_SPREAD = 12.0     # 齐射中相邻子弹的角度差(度)
+PHYSICS_PHASES = ("space_step", "sprite_sync", "bullet_cull", "post_step_remove")
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return round(value * 1000, 3) if value is not None else None
+
+
+def _p95(values: List[float]) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+
+class BulletStorm:
+    """一张地图上的子弹风暴对局"""
+
+    def __init__(self, map_layout, window=None, volley_size: int = VOLLEY_SIZE,
+                 volley_spread: float = VOLLEY_SPREAD):
+        from game_views import GameView
+        from multiplayer.dedicated_server import HeadlessWindow
+        from multiplayer.network_views import HostGameView
+        from multiplayer.transport import LoopbackNetwork
+        from fps_config import get_fps_config, NetworkSyncOptimizer
+
+        self.window = window
+        self.game_view = GameView(mode="pvp", window=window or HeadlessWindow())
+        self.game_view.allow_replay_recording = False
+        self.game_view.set_map_layout(map_layout)
+        if window is not None:
+            window.show_view(self.game_view)   # on_show_view 中调用 setup
+        else:
+            self.game_view.setup()
+        for index, tank in enumerate(self.game_view.player_list):
+            tank.player_id = ("host", "client")[index]
+            # 两辆坦克反向旋转
+            tank.turn_direction = 1 if index == 0 else -1
+
+        # 主机端的状态生成和编码（不需要连接客户端）
+        self.host_view = HostGameView(network=LoopbackNetwork(), window=HeadlessWindow())
+        self.host_view.game_view = self.game_view
+        self.sync_optimizer = NetworkSyncOptimizer(get_fps_config())
+
+        self.volley_size = volley_size
+        self.volley_spread = volley_spread
+        self.shots = 0
+
+    def _add_bullet(self, bullet):
+        # 与 GameView.on_key_press 中发射子弹的处理相同
+        self.game_view.bullet_list.append(bullet)
+        if bullet.pymunk_body and bullet.pymunk_shape:
+            self.game_view.space.add(bullet.pymunk_body, bullet.pymunk_shape)
+        self.shots += 1
+
+    def _volley(self, tank, count: int):
+        """通过 Tank.shoot 发射扇形齐射（临时跳过冷却，发射后恢复朝向和冷却）"""
+        now = self.game_view.total_time
+        base_angle = tank.angle
+        for index in range(count):
+            tank.last_shot_time = -math.inf
+            tank.angle = base_angle + (index - (count - 1) / 2) * self.volley_spread
+            bullet = tank.shoot(now)
+            if bullet:
+                self._add_bullet(bullet)
+        tank.angle = base_angle
+        tank.last_shot_time = now
+
+    def fire(self, target_bullets: int):
+        """两辆坦克旋转并按冷却开火，子弹不足 target_bullets 时补充齐射"""
+        from game_views import PLAYER_TURN_SPEED
+
+        view = self.game_view
+        turn_rate = math.radians(PLAYER_TURN_SPEED * 60)
+        for tank in view.player_list:
+            tank.pymunk_body.angular_velocity = turn_rate * tank.turn_direction
+            # 保持坦克存活，避免回合结束打断测量
+            tank.health = 10 ** 6
+            bullet = tank.shoot(view.total_time)
+            if bullet:
+                self._add_bullet(bullet)
+        for tank in view.player_list:
+            missing = target_bullets - len(view.bullet_list)
+            if missing <= 0:
+                break
+            self._volley(tank, min(self.volley_size, missing))
+
+    def encode_state(self) -> int:
+        """生成并编码主机发送的 GAME_STATE，返回字节数"""
+        from multiplayer.messages import MessageFactory
+
+        state = self.sync_optimizer.optimize_sync_data(self.host_view._get_game_state())
+        message = MessageFactory.create_game_state(
+            tanks=state.get("tanks", []),
+            scores=state.get("scores", {}),
+            bullet_events=state.get("bullet_events"),
+            game_time=state.get("game_time")
+        )
+        return len(message.to_bytes())
+
+    def tick(self, target_bullets: int) -> Dict[str, float]:
+        """运行一帧，返回各部分的耗时"""
+        from frame_profiler import profiler
+
+        started = time.perf_counter()
+        self.fire(target_bullets)
+        self.game_view.on_update(FRAME)
+        state_started = time.perf_counter()
+        state_bytes = self.encode_state()
+        state_time = time.perf_counter() - state_started
+        if self.window is not None:
+            self.window.dispatch_events()
+            self.game_view.on_draw()   # on_draw 结束时调用 profiler.end_frame
+            self.window.flip()
+        else:
+            profiler.end_frame()
+        frame_time = time.perf_counter() - started
+
+        phases = profiler.last_frame
+        return {
+            "frame": frame_time,
+            "physics": sum(phases.get(phase, 0.0) for phase in PHYSICS_PHASES),
+            "state": state_time,
+            "state_bytes": state_bytes,
+            "bullets": len(self.game_view.bullet_list),
+        }
+
+    def run_level(self, target_bullets: int, ticks: int = TICKS_PER_LEVEL,
+                  warmup: int = WARMUP_TICKS) -> Dict:
+        """以 target_bullets 为目标运行一级，汇总统计"""
+        for _ in range(warmup):
+            self.tick(target_bullets)
+
+        samples = {"frame": [], "physics": [], "state": [], "state_bytes": [], "bullets": []}
+        gc_before = [stats["collections"] for stats in gc.get_stats()]
+        blocks_before = sys.getallocatedblocks()
+        shots_before = self.shots
+        started = time.perf_counter()
+        for _ in range(ticks):
+            for key, value in self.tick(target_bullets).items():
+                samples[key].append(value)
+        elapsed = time.perf_counter() - started
+        gc_after = [stats["collections"] for stats in gc.get_stats()]
+
+        mean_frame = _mean(samples["frame"])
+        return {
+            "target_bullets": target_bullets,
+            "bullets": round(_mean(samples["bullets"]), 1),
+            "max_bullets": max(samples["bullets"]),
+            "shots_per_tick": round((self.shots - shots_before) / ticks, 2),
+            "frame_ms": {"mean": _ms(mean_frame), "p95": _ms(_p95(samples["frame"]))},
+            "fps": round(1 / mean_frame, 1) if mean_frame else None,
+            "physics_ms": {"mean": _ms(_mean(samples["physics"])), "p95": _ms(_p95(samples["physics"]))},
+            "state_ms": {"mean": _ms(_mean(samples["state"])), "p95": _ms(_p95(samples["state"]))},
+            "game_state_bytes": {"mean": round(_mean(samples["state_bytes"]), 1),
+                                 "max": max(samples["state_bytes"])},
+            "gc_per_second": [round((after - before) / elapsed, 2) for before, after in zip(gc_before, gc_after)],
+            "allocated_blocks_per_tick": round((sys.getallocatedblocks() - blocks_before) / ticks, 1),
+        }
+
+
+def find_fps_limit(levels: List[Dict], fps: float = FPS_TARGET) -> Optional[float]:
+    """平均帧时间第一次超过 1/fps 的那一级的平均子弹数（一直满足时返回None）"""
+    for level in levels:
+        if level["fps"] is not None and level["fps"] < fps:
+            return level["bullets"]
+    return None
+
+
+def run_map(map_layout, levels: List[int], ticks: int = TICKS_PER_LEVEL, window=None,
+            volley_size: int = VOLLEY_SIZE, warmup: int = WARMUP_TICKS) -> Dict:
+    """在一张地图上逐级运行，返回每一级的统计和低于60FPS时的子弹数"""
+    from frame_profiler import profiler
+
+    profiler.acquire("storm")
+    try:
+        storm = BulletStorm(map_layout, window=window, volley_size=volley_size)
+        results = []
+        for target in levels:
+            print(f"⏱️ 目标 {target} 颗子弹...", file=sys.stderr)
+            results.append(storm.run_level(target, ticks, warmup))
+    finally:
+        profiler.release("storm")
+    return {
+        "walls": len(map_layout),
+        "levels": results,
+        "below_60fps_at_bullets": find_fps_limit(results),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="子弹风暴压力测试")
+    parser.add_argument("--maps", default=None, help="逗号分隔的地图编号（从1开始，默认全部）")
+    parser.add_argument("--max-bullets", type=int, default=MAX_BULLETS, help="最高一级的目标子弹数")
+    parser.add_argument("--step", type=int, default=LEVEL_STEP, help="每一级增加的子弹数")
+    parser.add_argument("--ticks", type=int, default=TICKS_PER_LEVEL, help="每一级统计的tick数")
+    parser.add_argument("--volley", type=int, default=VOLLEY_SIZE, help="每辆坦克每tick最多齐射的子弹数")
+    parser.add_argument("--window", action="store_true", help="在真实窗口中运行并绘制")
+    parser.add_argument("--output", default=None, help="JSON结果输出文件（默认输出到标准输出）")
+    args = parser.parse_args(argv)
+
+    import arcade
+    import tank_sprites
+    from maps import ALL_MAP_LAYOUTS
+    # loopback_latency 导入时默认开启无窗口模式，要在导入arcade之后再导入
+    from benchmarks.loopback_latency import _git_commit
+
+    map_numbers = ([int(item) for item in args.maps.split(",") if item.strip()]
+                   if args.maps else list(range(1, len(ALL_MAP_LAYOUTS) + 1)))
+    levels = list(range(0, args.max_bullets + 1, max(args.step, 1)))
+
+    window = arcade.Window(1280, 720, "bullet storm", vsync=False) if args.window else None
+    sound_enabled = tank_sprites.SOUND_ENABLED
+    tank_sprites.SOUND_ENABLED = False
+    maps = {}
+    try:
+        for number in map_numbers:
+            print(f"🌪️ 地图 {number}", file=sys.stderr)
+            # 游戏代码的调试输出（命中、回合等）丢弃，标准输出只保留JSON结果
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                maps[f"map{number}"] = run_map(list(ALL_MAP_LAYOUTS[number - 1]), levels,
+                                               args.ticks, window, args.volley)
+            print(f"   低于60FPS的子弹数: {maps[f'map{number}']['below_60fps_at_bullets']}", file=sys.stderr)
+    finally:
+        tank_sprites.SOUND_ENABLED = sound_enabled
+        if window is not None:
+            window.close()
+
+    report = {
+        "benchmark": "bullet_storm",
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "window": args.window,
+        "ticks_per_level": args.ticks,
+        "volley_size": args.volley,
+        "maps": maps,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"✅ 结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
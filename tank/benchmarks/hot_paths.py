@@ -0,0 +1,413 @@
+"""
+热点路径微基准测试
+
+逐个测量游戏循环和网络同步中的热点函数（无窗口，使用 HeadlessWindow，不创建OpenGL上下文）：
+    physics_step/<地图>/<子弹数>     space.step（maps.ALL_MAP_LAYOUTS 中的每张地图，0~500颗子弹）
+    state_encode/<状态>              NetworkMessage.to_bytes（常规快照和带全部子弹的关键帧）
+    state_decode/<状态>              NetworkMessage.from_bytes
+    get_game_state/<子弹数>          HostGameView._get_game_state
+    apply_server_state/<子弹数>      ClientGameView._apply_server_state
+    game_view_setup/<地图>           GameView.setup
+    map_checksum/<地图>              MapSyncManager.calculate_map_checksum
+
+每个用例先预热，再逐次计时，结果为每次调用的 p50/平均/最小值（微秒）。
+每次调用之后紧接着计时一次固定的校准工作量，记录其 p50（calib_us）：机器的速度会随时间变化
+（CPU频率、其他负载），单看 p50 时同一份代码前后两次运行可以相差1.5倍以上，
+而同一时间窗口内的校准工作量会同样变慢。
+整套用例运行 ROUNDS 轮，每个用例保留 p50/calib_us 最小的一轮。
+传入 --baseline 时与保存的结果对比：先把基线的 p50 按两次的 calib_us 换算到当前速度，
+比换算后的基线慢 threshold 以上（且差值超过 NOISE_FLOOR_US）的用例记为退化，退出码为1。
+基线与机器有关，换机器后先用 --save-baseline 重新记录。
+
+用法（在 tank 目录下）：
+    python -m benchmarks.hot_paths --baseline benchmarks/baselines/hot_paths.json
+    python -m benchmarks.hot_paths --filter physics_step --repeat 500
+    python -m benchmarks.hot_paths --save-baseline benchmarks/baselines/hot_paths.json
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.loopback_latency import _git_commit
+
+BULLET_COUNTS = (0, 100, 250, 500)
+REPEAT = 200
+WARMUP = 10
+# 整套用例运行的轮数，每个用例取换算后 p50 最小的一轮（减少机器上其他负载的干扰）
+ROUNDS = 3
+# 换算后的 p50 比基线慢超过该比例记为退化（未改动的代码在同一台机器上反复运行，偏差在该范围内）
+REGRESSION_THRESHOLD = 0.5
+# 差值小于该值(微秒)时视为计时噪声，不记为退化
+NOISE_FLOOR_US = 2.0
+FRAME = 1 / 60
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "hot_paths.json")
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """每次调用耗时的 p50/平均/最小值（微秒，保留2位小数）"""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "p50_us": round(ordered[len(ordered) // 2] * 1e6, 2),
+        "mean_us": round(sum(ordered) / len(ordered) * 1e6, 2),
+        "min_us": round(ordered[0] * 1e6, 2),
+    }
+
+
+def _calibration_work():
+    """固定的纯Python工作量：构建、编码、解码一个类似状态快照的字典"""
+    state = {"tanks": [{"player_id": index, "x": index * 1.5, "y": index * 2.5, "angle": index % 360}
+                       for index in range(8)]}
+    return len(json.loads(json.dumps(state))["tanks"])
+
+
+def time_calls(func: Callable[[], object], repeat: int = REPEAT, before: Callable[[], None] = None,
+               warmup: int = WARMUP) -> Dict[str, float]:
+    """逐次调用 func 并计时，before 在每次调用前执行（不计时）
+
+    每次调用后计时一次校准工作量，结果中的 calib_us 是校准工作量的 p50。
+    与 timeit 一样，计时期间关闭垃圾回收，避免回收停顿随机落在某些调用中。
+    """
+    samples = []
+    calibration = []
+    gc_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        for index in range(warmup + repeat):
+            if before is not None:
+                before()
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            started = time.perf_counter()
+            _calibration_work()
+            calibrated = time.perf_counter() - started
+            if index >= warmup:
+                samples.append(elapsed)
+                calibration.append(calibrated)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    stats = summarize(samples)
+    stats["calib_us"] = summarize(calibration)["p50_us"]
+    return stats
+
+
+def _new_game_view(map_layout):
+    from game_views import GameView
+    from multiplayer.dedicated_server import HeadlessWindow
+
+    game_view = GameView(mode="pvp", window=HeadlessWindow())
+    game_view.set_map_layout(map_layout)
+    return game_view
+
+
+class BulletFiller:
+    """在游戏视图中维持固定数量的子弹（位置和方向随机，种子固定）"""
+
+    def __init__(self, game_view, count: int, seed: int = 1):
+        self.game_view = game_view
+        self.count = count
+        self.rng = random.Random(seed)
+
+    def top_up(self):
+        # 颜色取自 tank_sprites 使用的 arcade 模块，与子弹类保持一致
+        from tank_sprites import Bullet, arcade
+        from game_views import SCREEN_WIDTH, GAME_AREA_BOTTOM_Y, GAME_AREA_TOP_Y
+
+        view = self.game_view
+        while len(view.bullet_list) < self.count:
+            owner = view.player_list[self.rng.randrange(len(view.player_list))]
+            bullet = Bullet(
+                radius=4,
+                owner=owner,
+                tank_center_x=self.rng.uniform(60, SCREEN_WIDTH - 60),
+                tank_center_y=self.rng.uniform(GAME_AREA_BOTTOM_Y + 60, GAME_AREA_TOP_Y - 60),
+                actual_emission_angle_degrees=self.rng.uniform(0, 360),
+                speed_magnitude=16,
+                color=arcade.color.YELLOW_ORANGE
+            )
+            bullet.owner_id = getattr(owner, 'player_id', 'unknown')
+            bullet.spawn_time = view.total_time
+            view.bullet_list.append(bullet)
+            view.space.add(bullet.pymunk_body, bullet.pymunk_shape)
+
+        # 保持坦克存活，避免回合结束
+        for tank in view.player_list:
+            tank.health = 10 ** 6
+
+
+def _game_view_with_bullets(map_layout, bullet_count: int):
+    game_view = _new_game_view(map_layout)
+    game_view.setup()
+    filler = BulletFiller(game_view, bullet_count)
+    filler.top_up()
+    return game_view, filler
+
+
+def _host_view(game_view):
+    from multiplayer.network_views import HostGameView
+    from multiplayer.transport import LoopbackNetwork
+    from multiplayer.dedicated_server import HeadlessWindow
+
+    host_view = HostGameView(network=LoopbackNetwork(), window=HeadlessWindow())
+    host_view.game_view = game_view
+    for index, tank in enumerate(game_view.player_list):
+        tank.player_id = ("host", "client")[index]
+    return host_view
+
+
+def _encoded_state(host_view, keyframe: bool = False):
+    """主机实际发送的 GAME_STATE 消息（经过 optimize_sync_data）"""
+    from fps_config import get_fps_config, NetworkSyncOptimizer
+    from multiplayer.messages import MessageFactory
+
+    state = NetworkSyncOptimizer(get_fps_config()).optimize_sync_data(
+        host_view._get_game_state(keyframe=keyframe))
+    return MessageFactory.create_game_state(
+        tanks=state.get("tanks", []),
+        scores=state.get("scores", {}),
+        bullet_events=state.get("bullet_events"),
+        game_time=state.get("game_time")
+    )
+
+
+def bench_physics_step(layouts, bullet_counts, repeat) -> Dict[str, Dict]:
+    results = {}
+    for map_index, layout in enumerate(layouts):
+        for count in bullet_counts:
+            game_view, filler = _game_view_with_bullets(layout, count)
+            # 碰撞回调可能移除子弹，每次步进前补足数量（不计时）
+            results[f"physics_step/map{map_index + 1}/{count}"] = time_calls(
+                lambda: game_view.space.step(FRAME), repeat, before=filler.top_up)
+    return results
+
+
+def bench_messages(layout, bullet_counts, repeat) -> Dict[str, Dict]:
+    from multiplayer.messages import NetworkMessage
+
+    results = {}
+    for count in bullet_counts:
+        game_view, _filler = _game_view_with_bullets(layout, count)
+        host_view = _host_view(game_view)
+        host_view._get_game_state()
+        cases = [("snapshot", _encoded_state(host_view))] if count == bullet_counts[0] else []
+        if count:
+            cases.append((f"keyframe{count}", _encoded_state(host_view, keyframe=True)))
+        for name, message in cases:
+            data = message.to_bytes()
+            encode = time_calls(message.to_bytes, repeat)
+            decode = time_calls(lambda: NetworkMessage.from_bytes(data), repeat)
+            encode["bytes"] = decode["bytes"] = len(data)
+            results[f"state_encode/{name}"] = encode
+            results[f"state_decode/{name}"] = decode
+    return results
+
+
+def bench_get_game_state(layout, bullet_counts, repeat) -> Dict[str, Dict]:
+    results = {}
+    for count in bullet_counts:
+        game_view, _filler = _game_view_with_bullets(layout, count)
+        host_view = _host_view(game_view)
+        # 第一次调用为所有子弹生成事件，之后是稳定状态（只有轮流抽样的校验数据）
+        host_view._get_game_state()
+        results[f"get_game_state/{count}"] = time_calls(host_view._get_game_state, repeat)
+    return results
+
+
+def bench_apply_server_state(layout, bullet_counts, repeat) -> Dict[str, Dict]:
+    from multiplayer.network_views import ClientGameView
+    from multiplayer.bullet_sync import BulletEventApplier
+    from multiplayer.transport import LoopbackNetwork
+    from multiplayer.dedicated_server import HeadlessWindow
+
+    results = {}
+    for count in bullet_counts:
+        host_game_view, _filler = _game_view_with_bullets(layout, count)
+        host_view = _host_view(host_game_view)
+        keyframe = host_view._get_game_state(keyframe=True)
+        host_view._get_game_state()
+        snapshot = host_view._get_game_state()
+
+        client_view = ClientGameView(network=LoopbackNetwork(), window=HeadlessWindow())
+        client_view.game_view = _new_game_view(layout)
+        client_view.game_view.setup()
+        client_view.bullet_applier = BulletEventApplier(client_view.game_view,
+                                                        client_view._get_bullet_color_for_owner)
+        # 先按关键帧重建全部子弹，之后每次应用一个新的常规快照
+        client_view._on_game_state_update(keyframe)
+        client_view._apply_server_state()
+
+        def next_state():
+            client_view._on_game_state_update(dict(snapshot))
+
+        results[f"apply_server_state/{count}"] = time_calls(
+            client_view._apply_server_state, repeat, before=next_state)
+    return results
+
+
+def bench_setup(layouts, repeat) -> Dict[str, Dict]:
+    results = {}
+    for map_index, layout in enumerate(layouts):
+        # setup 向物理空间添加墙壁，每次都用新的视图（创建视图不计时）
+        views = []
+        results[f"game_view_setup/map{map_index + 1}"] = time_calls(
+            lambda: views[-1].setup(), max(repeat // 10, 5),
+            before=lambda: views.append(_new_game_view(layout)), warmup=2)
+        views.clear()
+    return results
+
+
+def bench_map_checksum(layouts, repeat) -> Dict[str, Dict]:
+    from multiplayer.map_sync import MapSyncManager
+
+    return {
+        f"map_checksum/map{map_index + 1}": time_calls(
+            lambda: MapSyncManager.calculate_map_checksum(layout), repeat)
+        for map_index, layout in enumerate(layouts)
+    }
+
+
+def run_benchmarks(repeat: int = REPEAT, bullet_counts=BULLET_COUNTS,
+                   name_filter: Optional[str] = None) -> Dict[str, Dict]:
+    """运行所有用例（name_filter 为用例名前缀时只运行匹配的组）"""
+    import tank_sprites
+    from maps import ALL_MAP_LAYOUTS
+
+    layouts = [list(layout) for layout in ALL_MAP_LAYOUTS]
+    groups = [
+        ("physics_step", lambda: bench_physics_step(layouts, bullet_counts, repeat)),
+        ("state_", lambda: bench_messages(layouts[0], bullet_counts, repeat)),
+        ("get_game_state", lambda: bench_get_game_state(layouts[0], bullet_counts, repeat)),
+        ("apply_server_state", lambda: bench_apply_server_state(layouts[0], bullet_counts, repeat)),
+        ("game_view_setup", lambda: bench_setup(layouts, repeat)),
+        ("map_checksum", lambda: bench_map_checksum(layouts, repeat)),
+    ]
+
+    sound_enabled = tank_sprites.SOUND_ENABLED
+    tank_sprites.SOUND_ENABLED = False
+    results = {}
+    try:
+        for prefix, bench in groups:
+            if name_filter and not (prefix.startswith(name_filter) or name_filter.startswith(prefix)):
+                continue
+            print(f"⏱️ 测量 {prefix}...", file=sys.stderr)
+            # 每组之前测一次校准工作量，记录在该组的每个用例中
+            results.update(bench())
+    finally:
+        tank_sprites.SOUND_ENABLED = sound_enabled
+    if name_filter:
+        results = {name: stats for name, stats in results.items() if name.startswith(name_filter)}
+    return results
+
+
+def normalized_us(stats: Dict) -> float:
+    """按同组校准工作量换算后的 p50（没有校准数据时为原始 p50）"""
+    return stats["p50_us"] / stats["calib_us"] if stats.get("calib_us") else stats["p50_us"]
+
+
+def best_of(runs: List[Dict[str, Dict]]) -> Dict[str, Dict]:
+    """多轮结果中每个用例取换算后 p50 最小的一轮"""
+    best = {}
+    for results in runs:
+        for name, stats in results.items():
+            if name not in best or normalized_us(stats) < normalized_us(best[name]):
+                best[name] = stats
+    return best
+
+
+def compare_results(results: Dict[str, Dict], baseline: Dict[str, Dict],
+                    threshold: float = REGRESSION_THRESHOLD) -> List[Dict]:
+    """与基线对比每个用例的 p50，返回退化的用例（基线中没有的用例跳过）
+
+    双方都有校准数据时，先把基线的 p50 按两次校准的比值换算到当前机器的速度。
+    """
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("p50_us"):
+            continue
+        current, previous = stats["p50_us"], base["p50_us"]
+        if stats.get("calib_us") and base.get("calib_us"):
+            previous = previous * stats["calib_us"] / base["calib_us"]
+        if current > previous * (1 + threshold) and current - previous > NOISE_FLOOR_US:
+            regressions.append({
+                "name": name,
+                "baseline_us": round(previous, 2),
+                "current_us": current,
+                "ratio": round(current / previous, 2),
+            })
+    return regressions
+
+
+def load_baseline(path: str) -> Dict[str, Dict]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="热点路径微基准测试")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="每个用例的计时次数")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="整套用例运行的轮数")
+    parser.add_argument("--bullets", default=",".join(map(str, BULLET_COUNTS)), help="逗号分隔的子弹数量列表")
+    parser.add_argument("--filter", default=None, help="只运行名称以此开头的用例，例如 physics_step")
+    parser.add_argument("--baseline", nargs="?", const=DEFAULT_BASELINE, default=None,
+                        help="与基线文件对比（不指定文件时使用 benchmarks/baselines/hot_paths.json）")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="退化阈值（0.3 表示慢30%%）")
+    parser.add_argument("--save-baseline", default=None, help="把本次结果保存为基线文件")
+    parser.add_argument("--output", default=None, help="JSON结果输出文件（默认输出到标准输出）")
+    args = parser.parse_args(argv)
+
+    bullet_counts = tuple(int(item) for item in args.bullets.split(",") if item.strip())
+    # 游戏代码的调试输出转到标准错误，标准输出只保留JSON结果
+    with contextlib.redirect_stdout(sys.stderr):
+        results = best_of([run_benchmarks(args.repeat, bullet_counts, args.filter)
+                           for _ in range(max(args.rounds, 1))])
+
+    report = {
+        "benchmark": "hot_paths",
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "rounds": args.rounds,
+        "results": results,
+    }
+
+    if args.baseline:
+        regressions = compare_results(results, load_baseline(args.baseline), args.threshold)
+        report["baseline"] = args.baseline
+        report["regressions"] = regressions
+        for item in regressions:
+            print(f"❌ {item['name']}: {item['baseline_us']:.2f}us -> {item['current_us']:.2f}us "
+                  f"(x{item['ratio']})", file=sys.stderr)
+        if not regressions:
+            print(f"✅ 没有超过 {args.threshold:.0%} 的退化", file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    for path in (args.save_baseline, args.output):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            print(f"✅ 结果已写入 {path}", file=sys.stderr)
+    if not args.output:
+        print(text)
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,389 @@
+"""
+端到端回环延迟基准测试
+
+在一个进程内通过回环网络运行主机视图和客户端视图（无可见窗口），测量：
+- 主机tick到客户端应用的延迟（_get_game_state -> optimize_sync_data -> to_bytes -> 发送
+  -> 客户端网络线程 -> from_bytes -> 回调 -> 下一帧 _apply_server_state）
+- 输入到生效的延迟（客户端按键 -> 主机应用输入 -> 状态回到客户端并被应用）
+- 每个tick的主机更新耗时和进程CPU时间
+
+每个子弹数量单独运行一轮，结果按 p50/p95/p99 汇总后输出为JSON。
+
+用法（在 tank 目录下）：
+    python -m benchmarks.loopback_latency
+    python -m benchmarks.loopback_latency --bullets 0,100,300 --seconds 5 --output latency.json
+    python -m benchmarks.loopback_latency --transport udp --impairment wifi
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+# 必须在导入arcade之前设置，使用无窗口的OpenGL上下文
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arcade
+
+from multiplayer.messages import MessageType, NetworkMessage
+
+FRAME_RATE = 60
+INPUT_INTERVAL = 0.5     # 两次输入采样之间的间隔(秒)
+EFFECT_TIMEOUT = 1.0     # 输入在该时间内没有生效则记为丢失
+HOST_PORT = 12346
+
+
+def percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    """计算 p50/p95/p99/平均/最大值（毫秒，保留3位小数）"""
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+
+    ordered = sorted(samples)
+
+    def pick(q):
+        index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _create_network(transport: str, impairment: Optional[str]):
+    from multiplayer.transport import LoopbackNetwork, UdpNetwork
+    network = LoopbackNetwork() if transport == "loopback" else UdpNetwork()
+    if impairment:
+        from multiplayer.impairment import ImpairedNetwork, NetworkImpairment
+        network = ImpairedNetwork(network, NetworkImpairment.from_spec(impairment))
+    return network
+
+
+class LatencyProbe:
+    """给主机和客户端视图挂上计时钩子"""
+
+    def __init__(self, host_view, client_view):
+        self.host_view = host_view
+        self.client_view = client_view
+
+        self.tick_started: Dict[float, float] = {}   # game_time -> 主机开始生成状态的时刻
+        self.tick_sent: Dict[float, float] = {}      # game_time -> 发送完成的时刻
+        self.received: Dict[float, float] = {}       # game_time -> 客户端回调收到的时刻
+        self.tick_to_apply: List[float] = []
+        self.send_stage: List[float] = []
+        self.network_stage: List[float] = []
+        self.apply_wait_stage: List[float] = []
+        self.state_sizes: List[int] = []
+        self._last_applied = None
+
+        self._hook_host()
+        self._hook_client()
+
+    def _hook_host(self):
+        view = self.host_view
+        original_get_state = view._get_game_state
+        original_send = view.game_host.send_game_state
+
+        def timed_get_state():
+            game_time = getattr(view.game_view, 'total_time', 0)
+            self.tick_started[game_time] = time.perf_counter()
+            return original_get_state()
+
+        # 主机默认合并发送：状态先排队，flush_sends 时才真正发出
+        unsent = []
+        original_flush = view.game_host.flush_sends
+
+        def timed_send(game_state):
+            original_send(game_state)
+            game_time = game_state.get("game_time")
+            if game_time in self.tick_started:
+                unsent.append(game_time)
+
+        def timed_flush():
+            sent = original_flush()
+            now = time.perf_counter()
+            for game_time in unsent:
+                self.tick_sent[game_time] = now
+            unsent.clear()
+            return sent
+
+        view._get_game_state = timed_get_state
+        view.game_host.send_game_state = timed_send
+        view.game_host.flush_sends = timed_flush
+
+        # 记录发送的GAME_STATE大小
+        original_queue_bytes = view.game_host._queue_bytes
+
+        def measured_queue_bytes(addr, data):
+            if NetworkMessage.is_type(data, MessageType.GAME_STATE):
+                self.state_sizes.append(len(data))
+            original_queue_bytes(addr, data)
+
+        view.game_host._queue_bytes = measured_queue_bytes
+
+    def _hook_client(self):
+        view = self.client_view
+        original_on_state = view._on_game_state_update
+        original_apply = view._apply_server_state
+
+        def timed_on_state(state):
+            game_time = state.get("game_time")
+            if game_time is not None and game_time not in self.received:
+                self.received[game_time] = time.perf_counter()
+            original_on_state(state)
+
+        def timed_apply():
+            state = view.game_state
+            original_apply()
+            if not state or state is self._last_applied:
+                return
+            self._last_applied = state
+            now = time.perf_counter()
+            game_time = state.get("game_time")
+            started = self.tick_started.pop(game_time, None)
+            sent = self.tick_sent.pop(game_time, None)
+            received = self.received.pop(game_time, None)
+            if started is None:
+                return
+            self.tick_to_apply.append(now - started)
+            if sent is not None and received is not None:
+                self.send_stage.append(sent - started)
+                self.network_stage.append(received - sent)
+                self.apply_wait_stage.append(now - received)
+
+        # 回调在 connect_to_room 中绑定，需在连接之前替换
+        view._on_game_state_update = timed_on_state
+        view._apply_server_state = timed_apply
+
+
+class BulletFeeder:
+    """在主机端维持固定数量的子弹"""
+
+    def __init__(self, game_view, count: int, seed: int = 1):
+        self.game_view = game_view
+        self.count = count
+        self.rng = random.Random(seed)
+
+    def top_up(self):
+        # 颜色取自 tank_sprites 使用的 arcade 模块，与子弹类保持一致
+        from tank_sprites import Bullet, arcade
+        from game_views import SCREEN_WIDTH, GAME_AREA_BOTTOM_Y, GAME_AREA_TOP_Y
+
+        view = self.game_view
+        while len(view.bullet_list) < self.count:
+            owner = view.player_list[self.rng.randrange(len(view.player_list))]
+            bullet = Bullet(
+                radius=4,
+                owner=owner,
+                tank_center_x=self.rng.uniform(60, SCREEN_WIDTH - 60),
+                tank_center_y=self.rng.uniform(GAME_AREA_BOTTOM_Y + 60, GAME_AREA_TOP_Y - 60),
+                actual_emission_angle_degrees=self.rng.uniform(0, 360),
+                speed_magnitude=16,
+                color=arcade.color.YELLOW_ORANGE
+            )
+            bullet.owner_id = getattr(owner, 'player_id', 'unknown')
+            bullet.spawn_time = view.total_time
+            view.bullet_list.append(bullet)
+            view.space.add(bullet.pymunk_body, bullet.pymunk_shape)
+
+        # 保持坦克存活，避免回合结束打断测量
+        for tank in view.player_list:
+            tank.health = 10 ** 6
+
+
+class InputProbe:
+    """周期性地在客户端按下/释放旋转键，测量输入到生效的延迟"""
+
+    KEYS = ("A", "D")
+
+    def __init__(self, client_view):
+        self.client_view = client_view
+        self.samples: List[float] = []
+        self.lost = 0
+        self._pending = None   # (按下时刻, 按下时的角度, 按键)
+        self._next_press = time.perf_counter() + INPUT_INTERVAL
+        self._key_index = 0
+
+    def _client_tank(self):
+        game_view = self.client_view.game_view
+        if game_view is None or game_view.player_list is None or len(game_view.player_list) < 2:
+            return None
+        return game_view.player_list[1]
+
+    def update(self):
+        tank = self._client_tank()
+        if tank is None:
+            return
+        now = time.perf_counter()
+        client = self.client_view.game_client
+
+        if self._pending is not None:
+            pressed_at, start_angle, key = self._pending
+            if abs(tank.angle - start_angle) > 0.05:
+                self.samples.append(now - pressed_at)
+            elif now - pressed_at > EFFECT_TIMEOUT:
+                self.lost += 1
+            else:
+                return
+            client.send_key_release(key)
+            self._pending = None
+            self._next_press = now + INPUT_INTERVAL
+            return
+
+        if now >= self._next_press:
+            key = self.KEYS[self._key_index % len(self.KEYS)]
+            self._key_index += 1
+            self._pending = (now, tank.angle, key)
+            client.send_key_press(key)
+
+
+def run_scenario(bullet_count: int, seconds: float, transport: str = "loopback",
+                 impairment: Optional[str] = None, window=None) -> Dict:
+    """运行一轮测量并返回汇总结果（window 为None时使用当前窗口）"""
+    from multiplayer.network_views import HostGameView, ClientGameView
+
+    network = _create_network(transport, impairment)
+    host_view = HostGameView(network=network, window=window)
+    client_view = ClientGameView(network=network, window=window)
+    probe = LatencyProbe(host_view, client_view)
+
+    host_view.on_show_view()
+    try:
+        if not client_view.connect_to_room("127.0.0.1", HOST_PORT, "benchmark"):
+            raise RuntimeError("客户端连接主机失败")
+
+        deadline = time.perf_counter() + 2.0
+        while len(host_view.connected_players) < 2 and time.perf_counter() < deadline:
+            time.sleep(0.001)
+        host_view._start_game()
+
+        # 等待客户端完成游戏初始化（主机默认合并发送，MAP_SYNC 和 GAME_START 在主机 on_update 中才发出）
+        deadline = time.perf_counter() + 2.0
+        while client_view.game_view is None and time.perf_counter() < deadline:
+            time.sleep(0.005)
+            host_view.on_update(1 / FRAME_RATE)
+            client_view.on_update(1 / FRAME_RATE)
+        if client_view.game_view is None:
+            raise RuntimeError("客户端未能初始化游戏视图")
+
+        feeder = BulletFeeder(host_view.game_view, bullet_count)
+        input_probe = InputProbe(client_view)
+        frame = 1.0 / FRAME_RATE
+        host_tick_times = []
+        ticks = 0
+
+        cpu_start = time.process_time()
+        next_frame = time.perf_counter()
+        end_time = next_frame + seconds
+        while time.perf_counter() < end_time:
+            feeder.top_up()
+
+            tick_start = time.perf_counter()
+            host_view.on_update(frame)
+            host_tick_times.append(time.perf_counter() - tick_start)
+
+            client_view.on_update(frame)
+            input_probe.update()
+            ticks += 1
+
+            next_frame += frame
+            delay = next_frame - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_frame = time.perf_counter()
+        cpu_used = time.process_time() - cpu_start
+
+        sizes = probe.state_sizes
+        return {
+            "bullets": bullet_count,
+            "ticks": ticks,
+            "states_applied": len(probe.tick_to_apply),
+            "tick_to_apply_ms": percentiles(probe.tick_to_apply),
+            "stages_ms": {
+                "build_and_send": percentiles(probe.send_stage),
+                "network": percentiles(probe.network_stage),
+                "wait_for_apply": percentiles(probe.apply_wait_stage),
+            },
+            "input_to_effect_ms": percentiles(input_probe.samples),
+            "inputs_lost": input_probe.lost,
+            "host_tick_ms": percentiles(host_tick_times),
+            "process_cpu_ms_per_tick": round(cpu_used / max(ticks, 1) * 1000, 3),
+            "game_state_bytes": {
+                "mean": round(sum(sizes) / len(sizes), 1) if sizes else None,
+                "max": max(sizes) if sizes else None,
+            },
+        }
+    finally:
+        client_view.game_client.disconnect()
+        host_view.game_host.stop_hosting()
+
+
+def _git_commit() -> Optional[str]:
+    """当前提交的短哈希，工作区有未提交的修改时带 -dirty 后缀"""
+    try:
+        return subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="主机->客户端端到端延迟基准测试")
+    parser.add_argument("--bullets", default="0,50,200", help="逗号分隔的子弹数量列表")
+    parser.add_argument("--seconds", type=float, default=5.0, help="每个子弹数量的测量时长")
+    parser.add_argument("--transport", choices=("loopback", "udp"), default="loopback")
+    parser.add_argument("--impairment", default=None, help="网络损伤配置，例如 wifi 或 latency_ms=50")
+    parser.add_argument("--output", default=None, help="JSON结果输出文件（默认输出到标准输出）")
+    args = parser.parse_args(argv)
+
+    window = arcade.Window(1280, 720, "benchmark", visible=False)
+    try:
+        results = []
+        # 游戏代码的调试输出转到标准错误，标准输出只保留JSON结果
+        with contextlib.redirect_stdout(sys.stderr):
+            for count in [int(item) for item in args.bullets.split(",") if item.strip()]:
+                print(f"⏱️ 测量 {count} 颗子弹...")
+                results.append(run_scenario(count, args.seconds, args.transport, args.impairment))
+    finally:
+        window.close()
+
+    report = {
+        "benchmark": "loopback_latency",
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "transport": args.transport,
+        "impairment": args.impairment,
+        "frame_rate": FRAME_RATE,
+        "results": results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"✅ 结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
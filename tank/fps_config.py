@@ -6,6 +6,7 @@ FPS配置管理模块
 
 import arcade
 import time
+from collections import deque
 from typing import Optional, Dict, Any
 
 
@@ -59,7 +60,7 @@ class FPSConfig:
         self.actual_fps = 0.0
         self.frame_count = 0
         self.last_fps_update = time.time()
-        self.fps_history = []
+        self.fps_history = deque(maxlen=60)  # 最近60秒，超出后自动丢弃最旧的记录
         
         print(f"🎯 FPS配置已设置: {config['description']}")
         print(f"   目标FPS: {self.target_fps}")
@@ -88,11 +89,6 @@ class FPSConfig:
         if current_time - self.last_fps_update >= 1.0:
             self.actual_fps = self.frame_count / (current_time - self.last_fps_update)
             self.fps_history.append(self.actual_fps)
-            
-            # 保持历史记录在合理范围内
-            if len(self.fps_history) > 60:
-                self.fps_history.pop(0)
-                
             self.frame_count = 0
             self.last_fps_update = current_time
     
@@ -102,7 +98,7 @@ class FPSConfig:
         
         # 计算FPS稳定性
         if len(self.fps_history) >= 5:
-            recent_fps = self.fps_history[-5:]
+            recent_fps = list(self.fps_history)[-5:]
             avg_recent = sum(recent_fps) / len(recent_fps)
             variance = sum((fps - avg_recent) ** 2 for fps in recent_fps) / len(recent_fps)
             stability = "稳定" if variance < 25 else "不稳定"
@@ -164,9 +160,13 @@ class NetworkSyncOptimizer:
         # 只同步必要的数据
         optimized_state = {
             "tanks": [],
-            "bullets": [],
             "round_info": game_state.get("round_info", {})
         }
+
+        # 子弹事件在生成时已压缩，比分和游戏时间原样保留
+        for key in ("bullet_events", "scores", "game_time"):
+            if key in game_state:
+                optimized_state[key] = game_state[key]
         
         # 优化坦克数据
         for tank in game_state.get("tanks", []):
@@ -180,7 +180,9 @@ class NetworkSyncOptimizer:
             }
             optimized_state["tanks"].append(optimized_tank)
         
-        # 优化子弹数据
+        # 优化子弹数据（仅在状态中包含完整子弹列表时）
+        if "bullets" in game_state:
+            optimized_state["bullets"] = []
         for bullet in game_state.get("bullets", []):
             optimized_bullet = {
                 "id": bullet.get("id"),
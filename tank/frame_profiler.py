@@ -0,0 +1,203 @@
+"""
+分阶段的帧耗时统计
+
+FPSConfig 只统计整帧的FPS，看不出一帧的时间花在哪里。FrameProfiler 记录每帧中各阶段的耗时：
+    space_step        Pymunk 物理步进
+    sprite_sync       坦克和子弹精灵与物理体同步
+    bullet_cull       检查飞出场地的子弹并移除
+    post_step_remove  碰撞回调标记的子弹在步进后移除
+    state_extract     主机生成并压缩游戏状态（_get_game_state + optimize_sync_data）
+    network_encode    主机编码游戏状态消息并发送（to_bytes + flush_sends）
+    state_apply       客户端应用主机的游戏状态
+    draw_sprites      绘制墙壁、坦克和子弹
+    draw_ui           绘制文字、血条和回合提示
+    frame             两次 end_frame 之间的整帧时间（含等待垂直同步）
+
+同一帧内同一阶段多次计时会累加，end_frame 时写入每个阶段固定长度的环形缓冲区，
+只保留最近 PROFILE_WINDOW 帧，不会随运行时间增长。默认关闭：关闭时 start/lap 只做一次属性判断。
+F3 浮层和卡顿检测（hitch_detector.py）各自申请开启计时，两者都释放后才关闭。
+
+用法：
+    started = profiler.start()
+    self.space.step(delta_time)
+    started = profiler.lap("space_step", started)   # 返回当前时间，作为下一阶段的起点
+    ...
+    profiler.end_frame()                             # GameView.on_draw 结束时调用
+
+游戏中按 F3 显示/隐藏各阶段的 p50/p99 浮层（超过帧预算 1/target_fps 的阶段标红）。
+"""
+
+import time
+from array import array
+from typing import Dict, List, Optional
+
+# 每个阶段保留的帧数（60FPS下4秒）
+PROFILE_WINDOW = 240
+
+# 浮层中的显示顺序
+PHASES = (
+    "space_step",
+    "sprite_sync",
+    "bullet_cull",
+    "post_step_remove",
+    "state_extract",
+    "network_encode",
+    "state_apply",
+    "draw_sprites",
+    "draw_ui",
+    "frame",
+)
+
+
+class RingBuffer:
+    """固定长度的浮点数环形缓冲区，写满后覆盖最旧的值"""
+
+    __slots__ = ("_values", "_size", "_index", "count")
+
+    def __init__(self, size: int = PROFILE_WINDOW):
+        self._values = array("d", bytes(8 * size))
+        self._size = size
+        self._index = 0
+        self.count = 0  # 已写入的值（不超过 size）
+
+    def append(self, value: float):
+        self._values[self._index] = value
+        self._index = (self._index + 1) % self._size
+        if self.count < self._size:
+            self.count += 1
+
+    def values(self) -> List[float]:
+        """按写入顺序返回当前保存的值"""
+        if self.count < self._size:
+            return list(self._values[:self.count])
+        return list(self._values[self._index:]) + list(self._values[:self._index])
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q 在 0~1 之间，没有数据时返回None"""
+        if not self.count:
+            return None
+        ordered = sorted(self._values[:self.count])
+        return ordered[min(self.count - 1, max(0, int(round(q * (self.count - 1)))))]
+
+    def clear(self):
+        self._index = 0
+        self.count = 0
+
+
+class FrameProfiler:
+    """逐帧累加各阶段耗时，写入环形缓冲区"""
+
+    def __init__(self, window: int = PROFILE_WINDOW):
+        self.enabled = False
+        self.window = window
+        self._buffers: Dict[str, RingBuffer] = {}
+        self._current: Dict[str, float] = {}
+        self.last_frame: Dict[str, float] = {}  # 上一帧各阶段的耗时（秒）
+        self._last_frame_end = None
+        self._users = set()
+        self.frame_count = 0
+
+    @property
+    def overlay_visible(self) -> bool:
+        return "overlay" in self._users
+
+    def acquire(self, user: str):
+        """申请开启计时（user 区分浮层、卡顿检测等使用者），从关闭变为开启时清空之前的数据"""
+        if not self._users:
+            self.reset()
+        self._users.add(user)
+        self.enabled = True
+
+    def release(self, user: str):
+        """释放计时，没有使用者时关闭"""
+        self._users.discard(user)
+        self.enabled = bool(self._users)
+
+    def set_enabled(self, enabled: bool):
+        """直接开关计时（脚本和测试使用）"""
+        if enabled:
+            self.acquire("manual")
+        else:
+            self.release("manual")
+
+    def toggle_overlay(self) -> bool:
+        """开关浮层，返回是否显示"""
+        if self.overlay_visible:
+            self.release("overlay")
+        else:
+            self.acquire("overlay")
+        return self.overlay_visible
+
+    def reset(self):
+        self._buffers.clear()
+        self._current.clear()
+        self.last_frame.clear()
+        self._last_frame_end = None
+        self.frame_count = 0
+
+    def reset_frame(self):
+        """丢弃未结束的一帧（切换视图时调用），下一次 end_frame 不计算整帧时间"""
+        self._current.clear()
+        self._last_frame_end = None
+
+    def start(self) -> float:
+        """当前时间，作为第一个阶段的起点（关闭时返回0）"""
+        return time.perf_counter() if self.enabled else 0.0
+
+    def lap(self, phase: str, started: float) -> float:
+        """把 started 到现在的时间计入 phase，返回当前时间"""
+        if not self.enabled:
+            return 0.0
+        now = time.perf_counter()
+        self._current[phase] = self._current.get(phase, 0.0) + (now - started)
+        return now
+
+    def end_frame(self):
+        """结束一帧：写入本帧各阶段的耗时和整帧时间"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self._last_frame_end is not None:
+            self._current["frame"] = now - self._last_frame_end
+        self._last_frame_end = now
+
+        for phase, elapsed in self._current.items():
+            buffer = self._buffers.get(phase)
+            if buffer is None:
+                buffer = self._buffers[phase] = RingBuffer(self.window)
+            buffer.append(elapsed)
+        # 交换两个字典，不为每帧新建字典
+        self.last_frame, self._current = self._current, self.last_frame
+        self._current.clear()
+        self.frame_count += 1
+
+    def get_stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """每个阶段的 p50/p99/最大值（毫秒），只包含出现过的阶段，按 PHASES 排序"""
+        order = {phase: index for index, phase in enumerate(PHASES)}
+        stats = {}
+        for phase in sorted(self._buffers, key=lambda name: (order.get(name, len(order)), name)):
+            buffer = self._buffers[phase]
+            stats[phase] = {
+                "count": buffer.count,
+                "p50": buffer.percentile(0.50) * 1000,
+                "p99": buffer.percentile(0.99) * 1000,
+                "max": max(buffer.values()) * 1000,
+            }
+        return stats
+
+    def format_lines(self, budget_ms: float) -> List[tuple]:
+        """浮层的文字行：(文字, 是否超过帧预算)"""
+        lines = []
+        for phase, stats in self.get_stats().items():
+            lines.append((f"{phase:<17}{stats['p50']:7.2f}{stats['p99']:8.2f}",
+                          stats["p99"] > budget_ms))
+        return lines
+
+
+# 全局实例，游戏循环各处直接使用
+profiler = FrameProfiler()
+
+
+def get_profiler() -> FrameProfiler:
+    """获取全局的帧耗时统计"""
+    return profiler
@@ -0,0 +1,105 @@
+"""
+分级日志
+
+每次射击、每颗子弹、每次受伤都 print 一行带 f-string 的调试信息，既要格式化字符串，
+又要同步写控制台（Windows 终端尤其慢），全部落在主线程或网络线程上。
+这里把这些输出按子系统放到 logging 的 tank.<子系统> 记录器下：
+- 各子系统分别设置级别，默认只输出 WARNING 及以上
+- 调用处使用 log.debug("... %d", value) 的延迟格式化：级别未开启时只做一次级别判断，
+  不拼接字符串，也不访问参数
+- 开启后在调用线程里把消息格式化成字符串（参数可能是之后还会修改的列表、坐标等），
+  再放入队列，由后台线程写入文件（或控制台），调用线程不等待 I/O
+
+子系统：game（游戏视图、回合）、tank（坦克）、net（联机同步、射击）
+
+启用：main.py --log-levels debug 或 --log-levels game=info,net=debug，
+      --debug-log FILE 写入文件（默认输出到控制台）
+"""
+
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Dict, Optional
+
+# 所有子系统记录器的父记录器（tank.server、tank.hitch 自行设置级别且不向上传递，不受影响）
+ROOT_LOGGER = "tank"
+SUBSYSTEMS = ("game", "tank", "net")
+DEFAULT_LEVEL = logging.WARNING
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+_root = logging.getLogger(ROOT_LOGGER)
+if _root.level == logging.NOTSET:
+    _root.setLevel(DEFAULT_LEVEL)
+
+_handler: Optional[logging.Handler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    """获取子系统的记录器"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{subsystem}")
+
+
+def _parse_level(name: str) -> int:
+    level = logging.getLevelName(name.strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"未知的日志级别: {name}")
+    return level
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """解析级别设置，如 "debug"（所有子系统）或 "info,net=debug"（按子系统）"""
+    levels = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        if "=" in item:
+            subsystem, level = item.split("=", 1)
+            subsystem = subsystem.strip()
+            if subsystem not in SUBSYSTEMS:
+                raise ValueError(f"未知的日志子系统: {subsystem}（可选: {', '.join(SUBSYSTEMS)}）")
+            levels[subsystem] = _parse_level(level)
+        else:
+            for subsystem in SUBSYSTEMS:
+                levels.setdefault(subsystem, _parse_level(item))
+    return levels
+
+
+def configure_logging(levels: Optional[Dict[str, int]] = None, log_file: Optional[str] = None):
+    """设置各子系统的级别，并启动后台写入线程（已启动时先停止旧的）"""
+    global _handler, _listener
+    shutdown_logging()
+
+    for subsystem, level in (levels or {}).items():
+        get_logger(subsystem).setLevel(level)
+
+    if log_file:
+        target = logging.FileHandler(log_file, encoding="utf-8")
+    else:
+        target = logging.StreamHandler(sys.stderr)
+    target.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    # QueueHandler.prepare 在入队前格式化消息并丢弃 args，后台线程不再访问调用处的对象
+    _handler = logging.handlers.QueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, target)
+    _listener.start()
+    _root.addHandler(_handler)
+    _root.propagate = False
+
+
+def shutdown_logging():
+    """写完队列中剩余的记录，停止后台线程，恢复默认设置"""
+    global _handler, _listener
+    if _listener is None:
+        return
+    _root.removeHandler(_handler)
+    _root.propagate = True
+    _listener.stop()
+    for target in _listener.handlers:
+        target.close()
+    for subsystem in SUBSYSTEMS:
+        get_logger(subsystem).setLevel(logging.NOTSET)
+    _handler = None
+    _listener = None
@@ -2,9 +2,20 @@ import arcade
 import math
 import pymunk
 import os # 添加os模块导入
+import time
 from tank_sprites import (Tank, PLAYER_IMAGE_PATH_GREEN, PLAYER_IMAGE_PATH_DESERT,PLAYER_IMAGE_PATH_BLUE, PLAYER_IMAGE_PATH_GREY, PLAYER_MOVEMENT_SPEED, PLAYER_TURN_SPEED, COLLISION_TYPE_BULLET, COLLISION_TYPE_WALL, COLLISION_TYPE_TANK)
 from maps import get_random_map_layout # <--- 修改导入路径
+import match_state
+import replay
 from fps_config import get_fps_config
+from frame_profiler import profiler
+import hitch_detector
+import alloc_profiler
+import gc_control
+import game_log
+from multiplayer.tracing import tracer
+
+log = game_log.get_logger("game")
 
 # 获取 game_views.py 文件所在的目录
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -33,6 +44,14 @@ NEW_PLAYER_SCALE = 0.08 # 调整坦克大小
 WALL_THICKNESS = 10    # 墙壁改薄
 WALL_ELASTICITY = 0.7 # 墙壁弹性
 
+# 回放录制：本地按键对应的按键名称（玩家2只在PVP模式下使用方向键）
+PLAYER1_REPLAY_KEYS = {arcade.key.W: "W", arcade.key.S: "S", arcade.key.A: "A",
+                       arcade.key.D: "D", arcade.key.SPACE: "SPACE"}
+PLAYER2_REPLAY_KEYS = {arcade.key.UP: "W", arcade.key.DOWN: "S", arcade.key.LEFT: "A",
+                       arcade.key.RIGHT: "D", arcade.key.ENTER: "SPACE", arcade.key.RSHIFT: "SPACE"}
+# 帧耗时浮层的文字刷新间隔（秒）
+PROFILER_REFRESH_INTERVAL = 0.5
+
 class MainMenu(arcade.View):
     """ 主菜单视图 """
     def on_show_view(self):
@@ -109,8 +128,11 @@ class ModeSelectView(arcade.View):
 
 class GameView(arcade.View):
     """ 游戏主视图 """
-    def __init__(self, mode="pvc", player1_tank_image=PLAYER_IMAGE_PATH_GREEN, player2_tank_image=PLAYER_IMAGE_PATH_DESERT):
-        super().__init__()
+    def __init__(self, mode="pvc", player1_tank_image=PLAYER_IMAGE_PATH_GREEN, player2_tank_image=PLAYER_IMAGE_PATH_DESERT,
+                 window=None):
+        # window: 专用服务器传入无界面的窗口替身，不创建真实窗口
+        super().__init__(window)
+        self.headless = getattr(self.window, "headless", False)
         self.mode = mode
         self.player1_tank_image = player1_tank_image  # 玩家1选择的坦克图片
         self.player2_tank_image = player2_tank_image  # 玩家2选择的坦克图片
@@ -126,6 +148,7 @@ class GameView(arcade.View):
         self.round_over_delay = 2.0 # 回合结束后等待2秒开始下一回合或结束游戏
         self.max_score = 2 # 获胜需要的胜场数
         self.round_result_text = "" # 用于显示回合结束提示
+        self.game_over = False # 整局结束（无界面模式下不切换到GameOverView）
 
         # 网络游戏相关
         self.fixed_map_layout = None  # 用于网络游戏的固定地图布局
@@ -146,6 +169,15 @@ class GameView(arcade.View):
         # 游戏总运行时间，用于射击冷却
         self.total_time = 0.0
 
+        # 对局回放录制（见 replay.py），本局实际使用的地图布局写入回放文件头
+        self.current_map_layout = None
+        self.replay_recorder = None
+        self.allow_replay_recording = True  # 回放播放和回滚同步的对局不录制
+
+        # 帧耗时浮层（F3，见 frame_profiler.py）的文字对象
+        self._profiler_texts = []
+        self._profiler_refreshed = 0.0
+
         self._setup_collision_handlers()
 
     def set_network_callback(self, callback):
@@ -215,48 +247,66 @@ class GameView(arcade.View):
             # 更严谨的检查：
             if not (bullet_sprite.pymunk_shape.collision_type == COLLISION_TYPE_BULLET and \
                     tank_sprite.pymunk_shape.collision_type == COLLISION_TYPE_TANK):
-                print("ERROR: Collision handler shape order assumption wrong and recovery failed.")
+                log.error("Collision handler shape order assumption wrong and recovery failed.")
                 return False # 忽略此碰撞
 
         if bullet_sprite.owner is not tank_sprite and tank_sprite.is_alive():
-            if not self.round_over: # 只有在回合进行中才处理伤害
-                tank_sprite.take_damage(1)
-                # 子弹击中坦克后消失
-                if bullet_shape.body not in self.pymunk_bodies_to_remove_post_step:
-                    self.pymunk_bodies_to_remove_post_step.append(bullet_shape.body)
-                if bullet_sprite not in self.arcade_sprites_to_remove_post_step:
-                    self.arcade_sprites_to_remove_post_step.append(bullet_sprite)
-
-                if not tank_sprite.is_alive():
-                    # print(f"Tank ({tank_sprite.center_x:.0f},{tank_sprite.center_y:.0f}) destroyed by Pymunk bullet!")
-                    if not self.round_over: # 再次检查，因为伤害可能导致回合结束
-                        self.round_over = True
-                        self.round_over_timer = self.round_over_delay
-                        if tank_sprite is self.player_tank:
-                            if self.mode in ["pvp", "network_host", "network_client"]:
-                                self.player2_score += 1
-                                if self.mode == "pvp":
-                                    self.round_result_text = "玩家2 本回合胜利!"
-                                elif self.mode == "network_host":
-                                    self.round_result_text = "客户端 本回合胜利!"
-                                else:  # network_client
-                                    self.round_result_text = "主机 本回合胜利!"
-                        elif self.mode in ["pvp", "network_host", "network_client"] and tank_sprite is self.player2_tank:
-                            self.player1_score += 1
+            self.apply_bullet_hit(bullet_sprite, tank_sprite)
+            return False # 子弹击中坦克后应该消失，不发生物理反弹
+        return False # 如果是自己的子弹或坦克已死亡，忽略碰撞的物理效果
+
+    def apply_bullet_hit(self, bullet_sprite, tank_sprite):
+        """处理子弹命中坦克：扣血、移除子弹、判定回合胜负
+
+        由碰撞处理器调用，也供主机端延迟补偿的回退命中检测调用
+        """
+        # 同一颗子弹只结算一次
+        if bullet_sprite in self.arcade_sprites_to_remove_post_step:
+            return
+        bullet_body = bullet_sprite.pymunk_body
+
+        if self.mode == "network_client":
+            # 客户端只做本地预测：子弹命中后消失，伤害和比分以主机为准
+            if bullet_body not in self.pymunk_bodies_to_remove_post_step:
+                self.pymunk_bodies_to_remove_post_step.append(bullet_body)
+            self.arcade_sprites_to_remove_post_step.append(bullet_sprite)
+            return
+        if not self.round_over: # 只有在回合进行中才处理伤害
+            tank_sprite.take_damage(1)
+            # 子弹击中坦克后消失
+            if bullet_body not in self.pymunk_bodies_to_remove_post_step:
+                self.pymunk_bodies_to_remove_post_step.append(bullet_body)
+            self.arcade_sprites_to_remove_post_step.append(bullet_sprite)
+
+            if not tank_sprite.is_alive():
+                # print(f"Tank ({tank_sprite.center_x:.0f},{tank_sprite.center_y:.0f}) destroyed by Pymunk bullet!")
+                if not self.round_over: # 再次检查，因为伤害可能导致回合结束
+                    self.round_over = True
+                    self.round_over_timer = self.round_over_delay
+                    if tank_sprite is self.player_tank:
+                        if self.mode in ["pvp", "network_host", "network_client"]:
+                            self.player2_score += 1
                             if self.mode == "pvp":
-                                self.round_result_text = "玩家1 本回合胜利!"
+                                self.round_result_text = "玩家2 本回合胜利!"
                             elif self.mode == "network_host":
-                                self.round_result_text = "主机 本回合胜利!"
-                            else:  # network_client
                                 self.round_result_text = "客户端 本回合胜利!"
-            return False # 子弹击中坦克后应该消失，不发生物理反弹
-        return False # 如果是自己的子弹或坦克已死亡，忽略碰撞的物理效果
+                            else:  # network_client
+                                self.round_result_text = "主机 本回合胜利!"
+                    elif self.mode in ["pvp", "network_host", "network_client"] and tank_sprite is self.player2_tank:
+                        self.player1_score += 1
+                        if self.mode == "pvp":
+                            self.round_result_text = "玩家1 本回合胜利!"
+                        elif self.mode == "network_host":
+                            self.round_result_text = "主机 本回合胜利!"
+                        else:  # network_client
+                            self.round_result_text = "客户端 本回合胜利!"
 
     def start_new_round(self):
         """开始一个新回合或重置当前回合的坦克状态"""
-        print("Starting new round / Resetting tanks...")
+        log.info("Starting new round / Resetting tanks...")
         self.round_result_text = "" # 清除上一回合的提示
         self.round_over = False
+        gc_control.start_round()
         self.round_over_timer = 0.0
         if self.bullet_list: # 确保bullet_list已初始化
             self.bullet_list.clear() # 清空所有子弹
@@ -411,6 +461,7 @@ class GameView(arcade.View):
             selected_map_layout = self.fixed_map_layout
         else:
             selected_map_layout = get_random_map_layout()
+        self.current_map_layout = selected_map_layout
 
         for cx, cy, w, h in selected_map_layout:
             # 创建 Arcade Sprite
@@ -442,9 +493,58 @@ class GameView(arcade.View):
         #                                   0, BOTTOM_UI_PANEL_HEIGHT,
         #                                   arcade.color.LIGHT_STEEL_BLUE)
 
-        arcade.set_background_color(arcade.color.LIGHT_GRAY)
+        if not self.headless:
+            arcade.set_background_color(arcade.color.LIGHT_GRAY)
         self.start_new_round() # 初始化第一回合
 
+        if replay.replay_directory and self.allow_replay_recording and not self.headless \
+                and self.mode in replay.RECORDABLE_MODES:
+            self.start_replay_recording(replay.new_replay_path(self.mode))
+
+        # 本局的长期对象已经创建完，冻结后不再参与分代回收
+        gc_control.after_setup()
+        self._reset_frame_timing()
+
+    def _reset_frame_timing(self):
+        """重新开始帧计时：菜单、大厅和等待界面停留的时间不计入本局的第一帧"""
+        profiler.reset_frame()
+        if hitch_detector.detector:
+            hitch_detector.detector.reset_frame()
+
+    def start_replay_recording(self, path):
+        """开始把本局录制到回放文件（setup之后调用）"""
+        self.stop_replay_recording()
+        self.replay_recorder = replay.ReplayRecorder(path, self)
+        print(f"📼 开始录制回放: {path}")
+
+    def stop_replay_recording(self):
+        """结束录制，写完剩余数据"""
+        if self.replay_recorder:
+            self.replay_recorder.close()
+            self.replay_recorder = None
+
+    def record_input(self, slot, key, pressed):
+        """录制一个按键事件（slot：0为player_tank，1为player2_tank；key：W/S/A/D/SPACE）"""
+        if self.replay_recorder:
+            self.replay_recorder.record_input(slot, key, pressed)
+
+    def _record_key(self, key, pressed):
+        """把本地按键转换为槽位和按键名称后录制"""
+        if not self.replay_recorder:
+            return
+        if key in PLAYER1_REPLAY_KEYS:
+            self.record_input(0, PLAYER1_REPLAY_KEYS[key], pressed)
+        elif self.mode == "pvp" and key in PLAYER2_REPLAY_KEYS:
+            self.record_input(1, PLAYER2_REPLAY_KEYS[key], pressed)
+
+    def save_state(self) -> bytes:
+        """保存对局状态（坦克和子弹刚体、比分、回合计时、射击冷却），见 match_state.py"""
+        return match_state.save_state(self)
+
+    def load_state(self, data: bytes):
+        """原地恢复 save_state 保存的状态，不重建墙壁和坦克"""
+        match_state.load_state(self, data)
+
     def set_map_layout(self, map_layout):
         """设置固定地图布局（用于网络游戏同步）"""
         self.fixed_map_layout = map_layout
@@ -462,11 +562,19 @@ class GameView(arcade.View):
     def on_show_view(self):
         self.setup()
 
+    def on_hide_view(self):
+        self.stop_replay_recording()
+        gc_control.end_round()
+        self._reset_frame_timing()
+
     def on_draw(self):
+        tracer.begin("draw", "render")
         self.clear()
+        started = profiler.start()
         self.wall_list.draw()
         self.player_list.draw()
         self.bullet_list.draw()
+        started = profiler.lap("draw_sprites", started)
 
         # 绘制坦克的碰撞体积描线 (用于调试)
         # if self.player_list:
@@ -543,6 +651,46 @@ class GameView(arcade.View):
                              SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2,
                              arcade.color.WHITE_SMOKE, font_size=30,
                              anchor_x="center", anchor_y="center", bold=True)
+        profiler.lap("draw_ui", started)
+
+        if profiler.overlay_visible:
+            self._draw_profiler_overlay()
+        tracer.end("draw", "render")
+        profiler.end_frame()
+        if hitch_detector.detector:
+            hitch_detector.detector.end_frame(self)
+        if alloc_profiler.tracker:
+            alloc_profiler.tracker.end_frame()
+
+    def toggle_profiler(self):
+        """F3：开关分阶段的帧耗时统计和浮层"""
+        visible = profiler.toggle_overlay()
+        print(f"📊 帧耗时统计已{'开启' if visible else '关闭'}")
+
+    def _draw_profiler_overlay(self):
+        """在游戏区域右上角显示各阶段的 p50/p99（每隔 PROFILER_REFRESH_INTERVAL 秒刷新文字，复用Text对象）"""
+        line_height = 16
+        left = SCREEN_WIDTH - 310
+        top = GAME_AREA_TOP_Y - 10
+        now = time.perf_counter()
+        if not self._profiler_texts or now - self._profiler_refreshed >= PROFILER_REFRESH_INTERVAL:
+            self._profiler_refreshed = now
+            budget_ms = get_fps_config().frame_interval * 1000
+            lines = [(f"{'阶段':<15}{'p50':>7}{'p99':>8} ms  预算 {budget_ms:.1f}", False)]
+            lines += profiler.format_lines(budget_ms)
+            while len(self._profiler_texts) < len(lines):
+                self._profiler_texts.append(arcade.Text(
+                    "", left, top - line_height * (len(self._profiler_texts) + 1), arcade.color.WHITE,
+                    font_size=10, font_name=("Consolas", "Courier New", "monospace")))
+            del self._profiler_texts[len(lines):]
+            for text, (line, over_budget) in zip(self._profiler_texts, lines):
+                text.text = line
+                text.color = arcade.color.RED if over_budget else arcade.color.WHITE
+
+        bottom = top - line_height * len(self._profiler_texts) - 8
+        arcade.draw_lrbt_rectangle_filled(left - 10, SCREEN_WIDTH - 10, bottom, top + 4, (0, 0, 0, 170))
+        for text in self._profiler_texts:
+            text.draw()
 
 
     def draw_health_bar(self, x, y, current_health, max_health, bar_width=100, bar_height=15, heart_size=12):
@@ -579,15 +727,24 @@ class GameView(arcade.View):
     def on_update(self, delta_time):
         """ 游戏逻辑更新 """
 
+        if self.game_over:
+            return
+
+        if self.replay_recorder:
+            self.replay_recorder.record_tick(self, delta_time)
+
         # 累积游戏总时间
         self.total_time += delta_time
 
         if self.round_over:
+            # 回合间隙执行推迟的2代回收
+            gc_control.end_round()
             self.round_over_timer -= delta_time
             if self.round_over_timer <= 0:
-                print(f"DEBUG: Round over timer ended. P1 Score: {self.player1_score}, P2 Score: {self.player2_score}, Max Score: {self.max_score}")
+                log.debug("Round over timer ended. P1 Score: %d, P2 Score: %d, Max Score: %d",
+                          self.player1_score, self.player2_score, self.max_score)
                 if self.player1_score >= self.max_score:
-                    print("DEBUG: Player 1 wins the game! Showing GameOverView.")
+                    log.debug("Player 1 wins the game! Showing GameOverView.")
                     # 根据模式显示不同的胜利信息
                     if self.mode == "pvp":
                         winner_text = "玩家1 最终胜利!"
@@ -600,15 +757,9 @@ class GameView(arcade.View):
                     if self.mode == "network_host" and hasattr(self, 'network_callback'):
                         self._send_game_end_message("player1", winner_text)
 
-                    game_over_view = GameOverView(
-                        winner_text,
-                        self.mode,
-                        self.player1_tank_image,
-                        self.player2_tank_image
-                    )
-                    self.window.show_view(game_over_view)
+                    self._show_game_over(winner_text)
                 elif self.mode in ["pvp", "network_host", "network_client"] and self.player2_score >= self.max_score:
-                    print("DEBUG: Player 2 wins the game! Showing GameOverView.")
+                    log.debug("Player 2 wins the game! Showing GameOverView.")
                     # 根据模式显示不同的胜利信息
                     if self.mode == "pvp":
                         winner_text = "玩家2 最终胜利!"
@@ -621,25 +772,41 @@ class GameView(arcade.View):
                     if self.mode == "network_host" and hasattr(self, 'network_callback'):
                         self._send_game_end_message("player2", winner_text)
 
-                    game_over_view = GameOverView(
-                        winner_text,
-                        self.mode,
-                        self.player1_tank_image,
-                        self.player2_tank_image
-                    )
-                    self.window.show_view(game_over_view)
+                    self._show_game_over(winner_text)
                 else:
-                    print("DEBUG: No winner yet, starting new round.")
+                    log.debug("No winner yet, starting new round.")
                     self.start_new_round()
             return
 
+        self.step_physics(delta_time)
+
+    def _show_game_over(self, winner_text):
+        """整局结束：有窗口时切换到GameOverView，无界面模式下只记录结果"""
+        self.game_over = True
+        self.round_result_text = winner_text
+        gc_control.end_round()
+        if self.headless:
+            return
+        game_over_view = GameOverView(
+            winner_text,
+            self.mode,
+            self.player1_tank_image,
+            self.player2_tank_image
+        )
+        self.window.show_view(game_over_view)
+
+    def step_physics(self, delta_time):
+        """推进一次物理模拟：步进Pymunk空间、同步精灵、清理子弹"""
         # 更新物理空间
         # 启用小步长更新，提高物理模拟精度，减少穿模
         # 使用统一的FPS配置限制最大步长，防止在帧率过低时物理模拟不稳定
         fps_config = get_fps_config()
         max_delta = fps_config.get_physics_delta_limit()
         delta_time = min(delta_time, max_delta) # 使用配置的物理更新频率
+        tracer.begin("step_physics", "game")
+        started = profiler.start()
         self.space.step(delta_time) # 进行一次物理更新
+        started = profiler.lap("space_step", started)
 
 
         # Arcade SpriteList的 .update() 仍然需要调用，以便执行Sprite自己的update（如果有的话）
@@ -653,15 +820,18 @@ class GameView(arcade.View):
                 if tank_sprite and hasattr(tank_sprite, 'sync_with_pymunk_body'):
                     tank_sprite.sync_with_pymunk_body()
 
-        # 同步并处理子弹 (Pymunk版)
-        bullets_to_remove_arcade = [] # 存储待移除的Arcade Sprite
-        bodies_to_remove_pymunk = []  # 存储待移除的Pymunk Body
-
+        # 同步子弹 (Pymunk版)
         if self.bullet_list:
             for bullet_sprite in self.bullet_list:
                 if bullet_sprite and hasattr(bullet_sprite, 'sync_with_pymunk_body'):
                     bullet_sprite.sync_with_pymunk_body()
+        started = profiler.lap("sprite_sync", started)
 
+        bullets_to_remove_arcade = [] # 存储待移除的Arcade Sprite
+        bodies_to_remove_pymunk = []  # 存储待移除的Pymunk Body
+
+        if self.bullet_list:
+            for bullet_sprite in self.bullet_list:
                 # 检查飞出屏幕的子弹 (基于Pymunk body的位置)
                 if bullet_sprite.pymunk_body:
                     pos = bullet_sprite.pymunk_body.position
@@ -678,6 +848,15 @@ class GameView(arcade.View):
             # hit_walls = arcade.check_for_collision_with_list(bullet, self.wall_list) ...
             # hit_tanks = arcade.check_for_collision_with_list(bullet, self.player_list) ...
 
+        # 移除飞出屏幕的子弹
+        for bullet_sprite in bullets_to_remove_arcade:
+            if bullet_sprite in self.bullet_list:
+                self.bullet_list.remove(bullet_sprite)
+        for body_to_remove in bodies_to_remove_pymunk:
+            if body_to_remove in self.space.bodies:
+                self.space.remove(body_to_remove, *body_to_remove.shapes)
+        started = profiler.lap("bullet_cull", started)
+
         # 执行移除操作 (在space.step()之后进行)
         for sprite_to_remove in self.arcade_sprites_to_remove_post_step:
             if sprite_to_remove in self.bullet_list: # 假设只移除子弹
@@ -694,6 +873,8 @@ class GameView(arcade.View):
 
         self.arcade_sprites_to_remove_post_step.clear()
         self.pymunk_bodies_to_remove_post_step.clear()
+        profiler.lap("post_step_remove", started)
+        tracer.end("step_physics", "game")
 
 
         # 子弹与坦克的碰撞伤害逻辑 (现在由Pymunk碰撞处理器处理)
@@ -707,10 +888,14 @@ class GameView(arcade.View):
 
     def on_key_press(self, key, modifiers):
         """ 处理按键按下事件 """
+        self._record_key(key, True)
         if key == arcade.key.ESCAPE:
             # TODO: 可以实现暂停菜单
             main_menu_view = MainMenu() # 暂时直接返回主菜单
             self.window.show_view(main_menu_view)
+        elif key == arcade.key.F3:
+            self.toggle_profiler()
+            return
 
         # 玩家1 (WASD) 控制 - Pymunk版
         if self.player_tank and self.player_tank.pymunk_body: # 确保坦克及其Pymunk body存在
@@ -747,16 +932,18 @@ class GameView(arcade.View):
                         self.bullet_list.append(bullet)
                         if bullet.pymunk_body and bullet.pymunk_shape:
                             self.space.add(bullet.pymunk_body, bullet.pymunk_shape)
-                        # 网络模式下打印调试信息
+                        # 网络模式下输出调试信息
                         if self.mode in ["network_host", "network_client"]:
-                            print(f"🔫 主机端发射子弹: 位置({bullet.center_x:.1f}, {bullet.center_y:.1f}), 角度{bullet.angle:.1f}, 子弹总数: {len(self.bullet_list)}")
+                            log.debug("🔫 主机端发射子弹: 位置(%.1f, %.1f), 角度%.1f, 子弹总数: %d",
+                                      bullet.center_x, bullet.center_y, bullet.angle, len(self.bullet_list))
                     else:
                         # 射击失败的调试信息
                         if self.mode in ["network_host", "network_client"]:
-                            print(f"🚫 主机端射击失败: 冷却时间未到 (当前时间: {self.total_time:.2f}, 上次射击: {self.player_tank.last_shot_time:.2f})")
+                            log.debug("🚫 主机端射击失败: 冷却时间未到 (当前时间: %.2f, 上次射击: %.2f)",
+                                      self.total_time, self.player_tank.last_shot_time)
                 else:
                     if self.mode in ["network_host", "network_client"]:
-                        print("🚫 主机端射击失败: 坦克或物理体不存在")
+                        log.warning("🚫 主机端射击失败: 坦克或物理体不存在")
 
         # 玩家2 (上下左右箭头) 控制 - Pymunk版
         if self.mode == "pvp" and self.player2_tank and self.player2_tank.pymunk_body:
@@ -789,6 +976,7 @@ class GameView(arcade.View):
 
     def on_key_release(self, key, modifiers):
         """ 处理按键释放事件 - Pymunk版 """
+        self._record_key(key, False)
         # 玩家1
         if self.player_tank and self.player_tank.pymunk_body:
             if key == arcade.key.W or key == arcade.key.S:
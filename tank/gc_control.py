@@ -0,0 +1,69 @@
+"""
+垃圾回收控制
+
+对局中的大部分对象（墙壁、纹理、精灵列表、物理空间）在 GameView.setup 之后一直存活，
+但分代回收每次2代回收都要重新扫描它们，造成几毫秒的停顿。开启后：
+- setup 结束时回收一次并 gc.freeze()：之后创建的对象才参与回收
+- 回合进行中把2代回收的阈值调得足够大（0代、1代照常），等到回合结束的间隙
+  （或离开游戏视图时）恢复阈值并执行一次完整回收，停顿落在玩家看不到的地方
+
+默认关闭，main.py --gc-tuning 开启。
+"""
+
+import gc
+
+# 回合进行中2代回收的阈值（1代回收这么多次之后才做2代回收，回合内实际不会触发）
+DEFERRED_GEN2_THRESHOLD = 1000000
+
+enabled = False
+_saved_threshold = None  # 推迟2代回收之前的阈值，None表示没有推迟
+
+
+def enable():
+    """开启垃圾回收控制"""
+    global enabled
+    enabled = True
+    print("♻️ 垃圾回收控制已开启：setup后冻结长期对象，回合内推迟2代回收")
+
+
+def disable():
+    """关闭并恢复默认行为"""
+    global enabled
+    end_round(collect=False)
+    gc.unfreeze()
+    enabled = False
+
+
+def after_setup():
+    """GameView.setup 结束时调用：回收上一局留下的对象，冻结本局的长期对象"""
+    if not enabled:
+        return
+    # 先解冻，上一局冻结的对象如果已经成为垃圾可以在这次回收中释放
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+
+def start_round():
+    """回合开始：推迟2代回收"""
+    global _saved_threshold
+    if not enabled or _saved_threshold is not None:
+        return
+    _saved_threshold = gc.get_threshold()
+    gc.set_threshold(_saved_threshold[0], _saved_threshold[1], DEFERRED_GEN2_THRESHOLD)
+
+
+def end_round(collect: bool = True):
+    """回合结束（或离开游戏视图）：恢复2代回收的阈值，collect 为True时执行一次完整回收"""
+    global _saved_threshold
+    if _saved_threshold is None:
+        return
+    gc.set_threshold(*_saved_threshold)
+    _saved_threshold = None
+    if collect:
+        gc.collect()
+
+
+def is_deferring() -> bool:
+    """当前是否推迟了2代回收"""
+    return _saved_threshold is not None
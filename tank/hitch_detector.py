@@ -0,0 +1,213 @@
+"""
+卡顿检测
+
+每帧结束时（GameView.on_draw 的末尾）比较整帧时间和阈值 HITCH_FACTOR / FPSConfig.target_fps，
+超过阈值时把这一帧的现场写入滚动日志（每条一行JSON）：
+- 各阶段耗时（frame_profiler 上一帧的数据，卡顿检测开启期间计时一直开启）
+- 这一帧内发生的垃圾回收：各代的次数和总耗时（gc.callbacks）
+- 实体数量：坦克、子弹、Pymunk 物理体
+- 主线程和网络线程的调用栈
+
+调用栈由看门狗线程采样：它在每帧开始后等待到阈值时刻，如果这一帧还没有结束，
+就趁主线程仍卡在慢代码里时采集所有线程的调用栈（每帧最多一次）。
+平时每帧只有几次计时、一次 Event.set 和看门狗的一次唤醒，可以一直开启。
+
+启用：main.py --hitch-log FILE
+"""
+
+import gc
+import json
+import logging
+import logging.handlers
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
+
+from fps_config import get_fps_config
+from frame_profiler import profiler
+
+# 整帧时间超过 目标帧间隔 * HITCH_FACTOR 时记为卡顿
+HITCH_FACTOR = 2.0
+# 每个线程的调用栈保留的层数
+STACK_DEPTH = 12
+# 滚动日志：单个文件大小和保留的旧文件数
+HITCH_LOG_MAX_BYTES = 1024 * 1024
+HITCH_LOG_BACKUPS = 3
+
+# 当前启用的检测器（None表示未启用），由 start_hitch_detector 设置
+detector: Optional["HitchDetector"] = None
+
+
+class HitchDetector:
+    """比较每帧时间和阈值，卡顿时记录现场"""
+
+    def __init__(self, log_path: str, threshold: float = None,
+                 max_bytes: int = HITCH_LOG_MAX_BYTES, backups: int = HITCH_LOG_BACKUPS):
+        self.threshold = threshold or HITCH_FACTOR / get_fps_config().target_fps
+        self.log_path = log_path
+        self.logger = logging.getLogger("tank.hitch")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
+        self._handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self.logger.addHandler(self._handler)
+
+        self.hitch_count = 0
+        self.frame_count = 0
+        self.running = False
+
+        # 当前帧：序号、开始时间、调用 end_frame 的线程
+        self._frame_seq = 0
+        self._frame_start = None
+        self._frame_thread = None
+        self._frame_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._watchdog = None
+        self._stacks = (None, None)  # (帧序号, 调用栈)
+
+        # 本帧的垃圾回收：每代次数和耗时
+        self._gc_collections = [0, 0, 0]
+        self._gc_time = 0.0
+        self._gc_started = 0.0
+
+    def start(self):
+        """开始检测：注册GC回调、开启分阶段计时、启动看门狗线程"""
+        if self.running:
+            return
+        self.running = True
+        gc.callbacks.append(self._on_gc)
+        profiler.acquire("hitch")
+        self._stop_event.clear()
+        self._watchdog = threading.Thread(target=self._watch_loop, name="hitch-watchdog", daemon=True)
+        self._watchdog.start()
+        print(f"🩺 卡顿检测已启用：超过 {self.threshold * 1000:.1f}ms 的帧记录到 {self.log_path}")
+
+    def stop(self):
+        """停止检测并关闭日志文件"""
+        if not self.running:
+            return
+        self.running = False
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        profiler.release("hitch")
+        self._stop_event.set()
+        self._frame_event.set()
+        if self._watchdog:
+            self._watchdog.join(timeout=1.0)
+        self.logger.removeHandler(self._handler)
+        self._handler.close()
+
+    def end_frame(self, game_view=None) -> Optional[dict]:
+        """结束一帧（在 profiler.end_frame 之后调用），卡顿时写入日志并返回记录"""
+        now = time.perf_counter()
+        record = None
+        if self._frame_start is not None and now - self._frame_start > self.threshold:
+            record = self._capture(now - self._frame_start, game_view)
+
+        self._frame_seq += 1
+        self._frame_start = now
+        self._frame_thread = threading.get_ident()
+        self._gc_collections[0] = self._gc_collections[1] = self._gc_collections[2] = 0
+        self._gc_time = 0.0
+        self.frame_count += 1
+        self._frame_event.set()
+        return record
+
+    def reset_frame(self):
+        """丢弃当前帧的起点（切换视图时调用）：菜单、大厅里停留的时间不算作一帧，看门狗也不在其间采样"""
+        self._frame_seq += 1
+        self._frame_start = None
+        self._frame_event.set()
+
+    def _capture(self, frame_time: float, game_view) -> dict:
+        seq, stacks = self._stacks
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "frame": self.frame_count,
+            "frame_ms": round(frame_time * 1000, 3),
+            "threshold_ms": round(self.threshold * 1000, 3),
+            "phases_ms": {phase: round(elapsed * 1000, 3) for phase, elapsed in profiler.last_frame.items()
+                          if phase != "frame"},
+            "gc": {
+                "collections": list(self._gc_collections),
+                "ms": round(self._gc_time * 1000, 3),
+                "counts": list(gc.get_count()),
+            },
+            "entities": _entity_counts(game_view),
+            # 看门狗没来得及在这一帧内采样时为空
+            "stacks": stacks if seq == self._frame_seq else {},
+        }
+        self.hitch_count += 1
+        self.logger.info(json.dumps(record, ensure_ascii=False))
+        print(f"⚠️ 卡顿 {record['frame_ms']:.1f}ms，已记录到 {self.log_path}")
+        return record
+
+    def _on_gc(self, phase: str, info: dict):
+        if phase == "start":
+            self._gc_started = time.perf_counter()
+        else:
+            self._gc_collections[info["generation"]] += 1
+            self._gc_time += time.perf_counter() - self._gc_started
+
+    def _watch_loop(self):
+        """等到当前帧超过阈值时采样调用栈，每帧最多一次"""
+        while not self._stop_event.is_set():
+            self._frame_event.wait()
+            self._frame_event.clear()
+            seq, started = self._frame_seq, self._frame_start
+            if started is None:
+                continue
+            remaining = started + self.threshold - time.perf_counter()
+            # 这一帧在阈值之前结束时 Event 被设置，直接开始等待下一帧
+            if remaining > 0 and self._frame_event.wait(remaining):
+                continue
+            if seq == self._frame_seq and not self._stop_event.is_set():
+                self._stacks = (seq, self._sample_stacks())
+
+    def _sample_stacks(self) -> Dict[str, List[str]]:
+        """采集除看门狗以外所有线程的调用栈，游戏循环线程标记为 main"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        watchdog = threading.get_ident()
+        stacks = {}
+        for ident, frame in sys._current_frames().items():
+            if ident == watchdog:
+                continue
+            name = "main" if ident == self._frame_thread else names.get(ident, str(ident))
+            lines = traceback.format_stack(frame, limit=STACK_DEPTH)
+            stacks[name] = [line.rstrip() for line in lines]
+        return stacks
+
+
+def _entity_counts(game_view) -> dict:
+    if game_view is None:
+        return {}
+    space = getattr(game_view, "space", None)
+    return {
+        "mode": getattr(game_view, "mode", None),
+        "tanks": len(game_view.player_list) if getattr(game_view, "player_list", None) is not None else 0,
+        "bullets": len(game_view.bullet_list) if getattr(game_view, "bullet_list", None) is not None else 0,
+        "bodies": len(space.bodies) if space is not None else 0,
+    }
+
+
+def start_hitch_detector(log_path: str, threshold: float = None) -> HitchDetector:
+    """启用全局的卡顿检测（已启用时先停止旧的）"""
+    global detector
+    stop_hitch_detector()
+    detector = HitchDetector(log_path, threshold)
+    detector.start()
+    return detector
+
+
+def stop_hitch_detector():
+    """停止全局的卡顿检测"""
+    global detector
+    if detector:
+        detector.stop()
+        detector = None
@@ -1,6 +1,9 @@
+import argparse
+import signal
 import arcade
 from game_views import MainMenu # 从 game_views.py 导入 MainMenu 视图
 from fps_config import set_fps_config, apply_fps_to_window
+from game_log import parse_levels, configure_logging, shutdown_logging
 # 其他导入可以根据需要添加，例如常量等
 
 # --- 常量 ---
@@ -11,8 +14,89 @@ SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 720
 SCREEN_TITLE = "坦克动荡"
 
-def main():
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description=SCREEN_TITLE)
+    parser.add_argument("--server", action="store_true",
+                        help="以专用服务器模式运行（不打开窗口，两名玩家都作为客户端连接）")
+    parser.add_argument("--room-name", default="专用服务器", help="服务器广播的房间名称")
+    parser.add_argument("--port", type=int, default=12346, help="服务器游戏端口（发现端口为该端口-1）")
+    parser.add_argument("--tick-rate", type=int, default=60, help="服务器模拟频率（Hz）")
+    parser.add_argument("--log-file", default="server.log", help="服务器日志文件，传空字符串输出到控制台")
+    parser.add_argument("--rooms", type=int, default=1,
+                        help="同时运行的房间数，大于1时每个房间使用 --port 起的连续端口")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="多房间模式的工作进程数（默认按CPU核数）")
+    parser.add_argument("--multicast", action="store_true",
+                        help="房间广播使用组播组代替局域网广播")
+    parser.add_argument("--record-dir", default=None,
+                        help="把本地对局和主机的对局录制为回放文件，保存到该目录")
+    parser.add_argument("--replay", default=None, help="播放回放文件")
+    parser.add_argument("--replay-speed", type=int, default=1, choices=[1, 2, 4, 8, 16],
+                        help="回放的初始播放速度")
+    parser.add_argument("--hitch-log", default=None,
+                        help="启用卡顿检测，把超过两倍目标帧间隔的帧的现场写入该日志文件（滚动）")
+    parser.add_argument("--trace", default=None,
+                        help="记录各线程的时间线，退出时写入该文件（Chrome trace 格式）")
+    parser.add_argument("--alloc-profile", type=int, default=None, metavar="N",
+                        help="用 tracemalloc 统计内存分配，每 N 帧输出每帧的分配量和主要代码位置")
+    parser.add_argument("--gc-tuning", action="store_true",
+                        help="setup后冻结长期对象，回合进行中推迟2代垃圾回收")
+    parser.add_argument("--log-levels", type=parse_levels, default=None, metavar="SPEC",
+                        help="调试日志级别，如 debug 或 game=info,net=debug（子系统: game/tank/net，默认只输出警告）")
+    parser.add_argument("--debug-log", default=None,
+                        help="调试日志写入该文件（默认输出到控制台），由后台线程写入")
+    return parser.parse_args(argv)
+
+def run_server(args):
+    """ 以专用服务器模式运行 """
+    import tank_sprites
+    from multiplayer.dedicated_server import DedicatedServer, setup_server_logging
+    from multiplayer.room_discovery import DEFAULT_MULTICAST_GROUP
+
+    if args.rooms > 1:
+        run_room_server(args)
+        return
+
+    tank_sprites.SOUND_ENABLED = False  # 服务器不播放音效
+    if args.gc_tuning:
+        import gc_control
+        gc_control.enable()
+    logger = setup_server_logging(args.log_file or None)
+    if args.log_file:
+        print(f"专用服务器日志写入: {args.log_file}")
+
+    server = DedicatedServer(room_name=args.room_name, host_port=args.port,
+                             tick_rate=args.tick_rate, logger=logger,
+                             multicast_group=DEFAULT_MULTICAST_GROUP if args.multicast else None)
+    # 收到终止信号时正常退出游戏循环
+    signal.signal(signal.SIGTERM, lambda *_: server.stop_event.set())
+    server.run()
+
+def run_room_server(args):
+    """ 以多房间服务器模式运行，房间分布在多个工作进程中 """
+    from multiplayer.room_server import RoomServer
+    from multiplayer.room_discovery import DEFAULT_MULTICAST_GROUP
+
+    server = RoomServer(room_count=args.rooms, workers=args.workers, base_port=args.port,
+                        discovery_port=args.port - 1, room_name=args.room_name,
+                        tick_rate=args.tick_rate, log_file=args.log_file or None,
+                        multicast_group=DEFAULT_MULTICAST_GROUP if args.multicast else None)
+    signal.signal(signal.SIGTERM, lambda *_: server.stop_event.set())
+    server.run()
+
+def main(argv=None):
     """ 主函数，程序的入口点 """
+    args = parse_args(argv)
+    if args.log_levels or args.debug_log:
+        configure_logging(args.log_levels, args.debug_log)
+    if args.server:
+        try:
+            run_server(args)
+        finally:
+            shutdown_logging()
+        return
+
     # 设置统一的FPS配置
     fps_config = set_fps_config("high_performance")  # 使用高性能模式
 
@@ -20,10 +104,41 @@ def main():
     window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
     apply_fps_to_window(window)
 
-    # 显示主菜单
-    main_menu_view = MainMenu()
-    window.show_view(main_menu_view)
-    arcade.run()
+    if args.record_dir:
+        import replay
+        replay.set_replay_directory(args.record_dir)
+
+    if args.hitch_log:
+        import hitch_detector
+        hitch_detector.start_hitch_detector(args.hitch_log)
+
+    if args.trace:
+        from multiplayer.tracing import tracer
+        tracer.start()
+
+    if args.alloc_profile:
+        import alloc_profiler
+        alloc_profiler.start_alloc_profiler(args.alloc_profile)
+
+    if args.gc_tuning:
+        import gc_control
+        gc_control.enable()
+
+    if args.replay:
+        # 播放回放
+        from replay import ReplayView
+        window.show_view(ReplayView(args.replay, speed=args.replay_speed))
+    else:
+        # 显示主菜单
+        main_menu_view = MainMenu()
+        window.show_view(main_menu_view)
+    try:
+        arcade.run()
+    finally:
+        if args.trace:
+            tracer.stop()
+            tracer.export(args.trace)
+        shutdown_logging()
 
 if __name__ == "__main__":
     main()
@@ -120,9 +120,12 @@ MAP_3_WALLS = [
 
 ALL_MAP_LAYOUTS = [MAP_1_WALLS, MAP_2_WALLS, MAP_3_WALLS]
 
-def get_random_map_layout():
-    """随机选择并返回一个地图布局数据。"""
-    return random.choice(ALL_MAP_LAYOUTS) # 恢复随机选择
+def get_random_map_layout(rng=None):
+    """随机选择并返回一个地图布局数据。
+
+    rng: 可选的 random.Random 实例，锁步对局双方用同一个种子选出相同的地图
+    """
+    return (rng or random).choice(ALL_MAP_LAYOUTS) # 恢复随机选择
     # return MAP_1_WALLS # 固定返回地图1进行测试
     # return MAP_2_WALLS # 固定返回地图2进行测试
     # return MAP_3_WALLS # 固定返回地图3进行测试
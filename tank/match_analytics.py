@@ -0,0 +1,362 @@
+"""
+对局回放的离线统计分析
+
+回放文件只保存按键和关键帧，分析时用 ReplayPlayer 重新模拟每一局，
+逐tick采样为列式的 NumPy 数组（extract_columns）：
+    delta      (T,)      帧间隔
+    position   (T, 2, 2) 两个槽位坦克的 x, y（坦克不存在时为 NaN）
+    health     (T, 2)    血量（坦克不存在时为 -1）
+    last_shot  (T, 2)    上次射击时间，增大的tick即为开火
+    bounces    (T, 2)    该tick内各槽位子弹的反弹次数
+    round_over (T,)      回合是否已结束
+之后的统计全部用向量化运算完成：
+- 位置热力图（np.histogram2d，按槽位）
+- 命中率：子弹不会命中自己的坦克，槽位的扣血次数就是对方的命中数
+- 回合时长、击杀用时（败方第一次被命中到被击毁）
+- 射击间隔，以及间隔接近 Tank.shot_cooldown 的比例（射速是否被冷却时间限制）
+- 按地图（文件头的地图校验和，对应 maps.ALL_MAP_LAYOUTS 中的序号）汇总的胜率和回合时长
+
+多个文件分给进程池并行处理，每个进程只返回汇总后的小数组。
+需要安装 numpy（游戏本身不依赖）。
+
+用法（在 tank 目录下）：
+    python -m match_analytics replays --output stats.json
+    python -m match_analytics a.tkr b.tkr --workers 8 --bins 64x32
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 必须在导入arcade之前设置，使用无窗口的OpenGL上下文
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import numpy as np
+except ImportError:  # 只有分析工具需要numpy
+    np = None
+
+# 热力图的默认格子数 (x, y)
+HEATMAP_BINS = (32, 16)
+# 射击间隔不超过 冷却时间 + 该值 时视为受冷却时间限制（约两个tick）
+COOLDOWN_TOLERANCE = 2 / 60
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("对局分析需要 numpy，请先安装：pip install numpy")
+
+
+def find_replays(paths: Sequence[str]) -> List[str]:
+    """展开目录，返回排序后的回放文件列表"""
+    from replay import REPLAY_EXTENSION
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in os.listdir(path)
+                         if name.endswith(REPLAY_EXTENSION))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def extract_columns(path: str) -> Dict[str, object]:
+    """重新模拟一个回放文件，返回逐tick采样的列式数组和文件头信息
+
+    Raises:
+        ValueError: 不是有效的回放文件
+    """
+    _require_numpy()
+    import tank_sprites
+    from multiplayer.dedicated_server import HeadlessWindow
+    from replay import ReplayPlayer, load_replay
+
+    replay_data = load_replay(path)
+    sound_enabled = tank_sprites.SOUND_ENABLED
+    tank_sprites.SOUND_ENABLED = False
+    try:
+        # 游戏代码的调试输出转到标准错误
+        with contextlib.redirect_stdout(sys.stderr):
+            player = ReplayPlayer(replay_data, window=HeadlessWindow())
+            game_view = player.game_view
+            count = replay_data.tick_count
+            delta = np.empty(count, dtype=np.float64)
+            position = np.full((count, 2, 2), np.nan, dtype=np.float32)
+            health = np.full((count, 2), -1, dtype=np.int8)
+            last_shot = np.full((count, 2), -1.0, dtype=np.float64)
+            bounces = np.zeros((count, 2), dtype=np.int16)
+            round_over = np.zeros(count, dtype=bool)
+
+            seen_bounces = {}
+            shot_cooldown = None
+            for tick in range(count):
+                delta[tick] = player.step()
+                slots = (game_view.player_tank, game_view.player2_tank)
+                for slot, tank in enumerate(slots):
+                    if tank and tank.pymunk_body:
+                        position[tick, slot] = tuple(tank.pymunk_body.position)
+                        health[tick, slot] = tank.health
+                        last_shot[tick, slot] = tank.last_shot_time
+                        shot_cooldown = tank.shot_cooldown
+                # 只保留当前存在的子弹，消失的子弹不会留在字典里
+                current = {}
+                for bullet in game_view.bullet_list:
+                    if bullet.owner in slots:
+                        slot = slots.index(bullet.owner)
+                        bounces[tick, slot] += max(0, bullet.bounce_count - seen_bounces.get(bullet, 0))
+                        current[bullet] = bullet.bounce_count
+                seen_bounces = current
+                round_over[tick] = game_view.round_over
+    finally:
+        tank_sprites.SOUND_ENABLED = sound_enabled
+        replay_data.close()
+
+    header = replay_data.header
+    return {
+        "path": path,
+        "mode": header.get("mode"),
+        "map_checksum": header.get("map_checksum"),
+        "shot_cooldown": shot_cooldown,
+        "delta": delta,
+        "position": position,
+        "health": health,
+        "last_shot": last_shot,
+        "bounces": bounces,
+        "round_over": round_over,
+    }
+
+
+def _heatmap_range() -> Tuple[Tuple[float, float], Tuple[float, float]]:
+    from game_views import SCREEN_WIDTH, GAME_AREA_BOTTOM_Y, GAME_AREA_TOP_Y
+    return (0.0, float(SCREEN_WIDTH)), (float(GAME_AREA_BOTTOM_Y), float(GAME_AREA_TOP_Y))
+
+
+def summarize_match(columns: Dict[str, object], bins: Tuple[int, int] = HEATMAP_BINS) -> Dict[str, object]:
+    """把一局的列式数据归约为可以直接相加/拼接的汇总数组"""
+    _require_numpy()
+    time_at = np.cumsum(columns["delta"])
+    position, health = columns["position"], columns["health"]
+    last_shot, round_over = columns["last_shot"], columns["round_over"]
+
+    # 热力图：每个槽位只统计坦克存活的tick
+    x_range, y_range = _heatmap_range()
+    heatmap = np.zeros((2, bins[0], bins[1]), dtype=np.int64)
+    for slot in (0, 1):
+        alive = health[:, slot] > 0
+        heatmap[slot] = np.histogram2d(position[alive, slot, 0], position[alive, slot, 1],
+                                       bins=bins, range=(x_range, y_range))[0]
+
+    # 开火：上次射击时间增大的tick（新回合重建坦克时会变小，不计入）
+    fired = np.zeros(last_shot.shape, dtype=bool)
+    fired[1:] = np.diff(last_shot, axis=0) > 0
+    fired[0] = last_shot[0] >= 0
+    shots = fired.sum(axis=0)
+    intervals = [np.diff(last_shot[fired[:, slot], slot]) for slot in (0, 1)]
+
+    # 扣血：血量减少的tick，槽位的扣血次数就是对方的命中数
+    damaged = np.zeros(health.shape, dtype=bool)
+    damaged[1:] = (np.diff(health.astype(np.int16), axis=0) < 0) & (health[:-1] >= 0)
+    hits = damaged.sum(axis=0)[::-1]
+
+    # 回合：round_over 从 False 变为 True 的tick结束，从 True 变为 False 的tick开始下一回合
+    ends = np.flatnonzero(round_over[1:] & ~round_over[:-1]) + 1
+    starts = np.concatenate(([0], np.flatnonzero(~round_over[1:] & round_over[:-1]) + 1))
+    round_starts = starts[np.searchsorted(starts, ends, side="right") - 1]
+    dead = health[ends] == 0
+    decided = dead.any(axis=1) & ~dead.all(axis=1)
+    ends, round_starts, dead = ends[decided], round_starts[decided], dead[decided]
+    loser = np.argmax(dead, axis=1)
+    durations = time_at[ends] - time_at[round_starts]
+
+    # 击杀用时：败方在本回合第一次被命中到被击毁
+    time_to_kill = np.empty(len(ends), dtype=np.float64)
+    for slot in (0, 1):
+        lost = loser == slot
+        damage_ticks = np.flatnonzero(damaged[:, slot])
+        first_hit = damage_ticks[np.searchsorted(damage_ticks, round_starts[lost])]
+        time_to_kill[lost] = time_at[ends[lost]] - time_at[first_hit]
+
+    return {
+        "path": columns["path"],
+        "map_checksum": columns["map_checksum"],
+        "shot_cooldown": columns["shot_cooldown"],
+        "ticks": len(time_at),
+        "seconds": float(time_at[-1]) if len(time_at) else 0.0,
+        "heatmap": heatmap,
+        "shots": shots,
+        "hits": hits,
+        "bounces": columns["bounces"].sum(axis=0, dtype=np.int64),
+        "shot_intervals": intervals,
+        "round_winner": 1 - loser,
+        "round_duration": durations,
+        "time_to_kill": time_to_kill,
+    }
+
+
+def _analyze_file(path: str, bins: Tuple[int, int]) -> Optional[Dict[str, object]]:
+    """进程池的任务：分析一个文件，无法读取时返回None"""
+    try:
+        return summarize_match(extract_columns(path), bins)
+    except ValueError as e:
+        print(f"⚠️ 跳过 {path}: {e}", file=sys.stderr)
+        return None
+
+
+def _map_names() -> Dict[str, str]:
+    """地图校验和 -> 地图名（maps.ALL_MAP_LAYOUTS 中的序号）"""
+    from maps import ALL_MAP_LAYOUTS
+    from multiplayer.map_sync import MapSyncManager
+    return {MapSyncManager.calculate_map_checksum(list(layout)): f"MAP_{index + 1}"
+            for index, layout in enumerate(ALL_MAP_LAYOUTS)}
+
+
+def _distribution(values) -> Dict[str, Optional[float]]:
+    """数量、平均值和 p50/p90（秒，保留3位小数）"""
+    if len(values) == 0:
+        return {"count": 0, "mean": None, "p50": None, "p90": None}
+    p50, p90 = np.percentile(values, [50, 90])
+    return {"count": int(len(values)), "mean": round(float(np.mean(values)), 3),
+            "p50": round(float(p50), 3), "p90": round(float(p90), 3)}
+
+
+def _accuracy(hits, shots) -> List[Optional[float]]:
+    return [round(float(h) / s, 4) if s else None for h, s in zip(hits, shots)]
+
+
+def aggregate(summaries: Sequence[Dict[str, object]]) -> Dict[str, object]:
+    """合并多局的汇总数组，计算总体和按地图的统计"""
+    _require_numpy()
+    summaries = [summary for summary in summaries if summary]
+    names = _map_names()
+    checksums = sorted({summary["map_checksum"] for summary in summaries}, key=str)
+    map_of_match = np.array([checksums.index(summary["map_checksum"]) for summary in summaries],
+                            dtype=np.int64)
+
+    shots = np.array([summary["shots"] for summary in summaries], dtype=np.int64).reshape(-1, 2)
+    hits = np.array([summary["hits"] for summary in summaries], dtype=np.int64).reshape(-1, 2)
+    bounces = np.array([summary["bounces"] for summary in summaries], dtype=np.int64).reshape(-1, 2)
+    rounds_per_match = np.array([len(summary["round_winner"]) for summary in summaries], dtype=np.int64)
+    round_map = np.repeat(map_of_match, rounds_per_match)
+
+    def concat(key):
+        return np.concatenate([summary[key] for summary in summaries]) if summaries else np.empty(0)
+
+    round_winner = concat("round_winner").astype(np.int64)
+    round_duration = concat("round_duration")
+    time_to_kill = concat("time_to_kill")
+    intervals = np.concatenate([interval for summary in summaries
+                                for interval in summary["shot_intervals"]] or [np.empty(0)])
+    cooldowns = [summary["shot_cooldown"] for summary in summaries if summary["shot_cooldown"]]
+    shot_cooldown = cooldowns[0] if cooldowns else None
+
+    # 按地图分组：bincount 的权重即为每张地图的合计
+    map_count = len(checksums)
+    map_rounds = np.bincount(round_map, minlength=map_count)
+    map_player1_wins = np.bincount(round_map, weights=round_winner == 0, minlength=map_count)
+    map_duration = np.bincount(round_map, weights=round_duration, minlength=map_count)
+    map_ttk = np.bincount(round_map, weights=time_to_kill, minlength=map_count)
+    map_shots = np.stack([np.bincount(map_of_match, weights=shots[:, slot], minlength=map_count)
+                          for slot in (0, 1)], axis=1)
+    map_hits = np.stack([np.bincount(map_of_match, weights=hits[:, slot], minlength=map_count)
+                         for slot in (0, 1)], axis=1)
+
+    maps = []
+    for index, checksum in enumerate(checksums):
+        rounds = int(map_rounds[index])
+        maps.append({
+            "map": names.get(checksum, "未知地图"),
+            "map_checksum": checksum,
+            "matches": int(np.sum(map_of_match == index)),
+            "rounds": rounds,
+            "player1_win_rate": round(float(map_player1_wins[index]) / rounds, 4) if rounds else None,
+            "mean_round_duration": round(float(map_duration[index]) / rounds, 3) if rounds else None,
+            "mean_time_to_kill": round(float(map_ttk[index]) / rounds, 3) if rounds else None,
+            "accuracy": _accuracy(map_hits[index], map_shots[index]),
+        })
+
+    cooldown_bound = None
+    if shot_cooldown and len(intervals):
+        cooldown_bound = round(float(np.mean(intervals <= shot_cooldown + COOLDOWN_TOLERANCE)), 4)
+
+    heatmaps = [summary["heatmap"] for summary in summaries]
+    heatmap = np.sum(heatmaps, axis=0) if heatmaps else np.zeros((2,) + HEATMAP_BINS, dtype=np.int64)
+    x_range, y_range = _heatmap_range()
+
+    return {
+        "matches": len(summaries),
+        "ticks": int(sum(summary["ticks"] for summary in summaries)),
+        "seconds": round(float(sum(summary["seconds"] for summary in summaries)), 3),
+        "rounds": int(len(round_winner)),
+        "player1_win_rate": round(float(np.mean(round_winner == 0)), 4) if len(round_winner) else None,
+        "shots": shots.sum(axis=0).tolist(),
+        "hits": hits.sum(axis=0).tolist(),
+        "accuracy": _accuracy(hits.sum(axis=0), shots.sum(axis=0)),
+        "bounces": bounces.sum(axis=0).tolist(),
+        "round_duration": _distribution(round_duration),
+        "time_to_kill": _distribution(time_to_kill),
+        "shot_cooldown": shot_cooldown,
+        "shot_interval": _distribution(intervals),
+        "cooldown_bound_ratio": cooldown_bound,
+        "maps": maps,
+        "heatmap": {
+            "x_range": list(x_range),
+            "y_range": list(y_range),
+            "bins": list(heatmap.shape[1:]),
+            "counts": heatmap.tolist(),
+        },
+    }
+
+
+def analyze_replays(paths: Sequence[str], workers: int = None,
+                    bins: Tuple[int, int] = HEATMAP_BINS) -> Dict[str, object]:
+    """分析多个回放文件（或目录）；workers 大于1时分给进程池并行处理"""
+    _require_numpy()
+    files = find_replays(paths)
+    workers = workers or min(os.cpu_count() or 1, max(1, len(files)))
+    if workers <= 1 or len(files) <= 1:
+        summaries = [_analyze_file(path, bins) for path in files]
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            summaries = list(executor.map(_analyze_file, files, [bins] * len(files)))
+    return aggregate(summaries)
+
+
+def _parse_bins(text: str) -> Tuple[int, int]:
+    x_bins, _, y_bins = text.lower().partition("x")
+    return int(x_bins), int(y_bins or x_bins)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对局回放的离线统计分析")
+    parser.add_argument("paths", nargs="+", help="回放文件或包含回放文件的目录")
+    parser.add_argument("--workers", type=int, default=None, help="进程数（默认CPU核数）")
+    parser.add_argument("--bins", type=_parse_bins, default=HEATMAP_BINS, help="热力图格子数，例如 32x16")
+    parser.add_argument("--output", default=None, help="JSON结果输出文件（默认输出到标准输出）")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    report = analyze_replays(args.paths, args.workers, args.bins)
+    print(f"⏱️ 分析 {report['matches']} 局用时 {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"✅ 结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+对局状态的保存与恢复
+
+把 GameView 中会随模拟变化的数值（坦克和子弹刚体、血量、射击冷却、比分、回合计时、
+total_time）打包为一段紧凑的二进制数据，恢复时原地修改现有的坦克和子弹，
+不重建墙壁和坦克精灵。用于回放跳转、不同步排查、AI 预判和崩溃恢复，
+开销足够小，可以每个tick调用一次。
+
+数据格式（小端）：
+    头部：版本(1) + total_time(8) + 双方比分(4*2) + 回合结束计时(8)
+          + 回合结束/整局结束/坦克槽位标记(1*3) + 子弹数量(2) + 回合提示长度(2)
+    回合提示文字（UTF-8）
+    坦克 * 槽位标记中的数量：x, y, 角度, vx, vy, 角速度(8*6) + 血量(4) + 上次射击时间(8)
+    子弹 * 子弹数量：所有者槽位(1) + x, y, 角度, vx, vy, 角速度(8*6) + 反弹次数(1)
+"""
+
+import struct
+from typing import List, Optional, Sequence
+
+STATE_VERSION = 1
+
+_HEADER = struct.Struct("<BdiidBBBHH")
+_TANK = struct.Struct("<6did")
+_BULLET = struct.Struct("<B6dB")
+
+
+def _body_values(body) -> tuple:
+    position, velocity = body.position, body.velocity
+    return (position.x, position.y, body.angle, velocity.x, velocity.y, body.angular_velocity)
+
+
+def _set_body(body, x, y, angle, vx, vy, angular_velocity):
+    body.position = (x, y)
+    body.angle = angle
+    body.velocity = (vx, vy)
+    body.angular_velocity = angular_velocity
+
+
+def save_state(game_view) -> bytes:
+    """把当前对局状态打包为二进制数据"""
+    slots = (game_view.player_tank, game_view.player2_tank)
+    text = game_view.round_result_text.encode("utf-8")
+
+    tank_flags = 0
+    tank_data = []
+    for slot, tank in enumerate(slots):
+        if tank and tank.pymunk_body:
+            tank_flags |= 1 << slot
+            tank_data.append(_TANK.pack(*_body_values(tank.pymunk_body),
+                                        tank.health, tank.last_shot_time))
+
+    bullet_data = []
+    for bullet in game_view.bullet_list or ():
+        if bullet.owner in slots and bullet.pymunk_body:
+            bullet_data.append(_BULLET.pack(slots.index(bullet.owner),
+                                            *_body_values(bullet.pymunk_body),
+                                            bullet.bounce_count))
+
+    header = _HEADER.pack(STATE_VERSION, game_view.total_time,
+                          game_view.player1_score, game_view.player2_score,
+                          game_view.round_over_timer, game_view.round_over, game_view.game_over,
+                          tank_flags, len(bullet_data), len(text))
+    return b"".join([header, text, *tank_data, *bullet_data])
+
+
+def load_state(game_view, data: bytes):
+    """把 save_state 的数据原地恢复到 game_view
+
+    Raises:
+        ValueError: 数据版本不对或长度不足
+    """
+    try:
+        (version, total_time, player1_score, player2_score, round_over_timer,
+         round_over, game_over, tank_flags, bullet_count, text_length) = _HEADER.unpack_from(data)
+        if version != STATE_VERSION:
+            raise ValueError(f"不支持的状态版本: {version}")
+        offset = _HEADER.size
+        round_result_text = bytes(data[offset:offset + text_length]).decode("utf-8")
+        offset += text_length
+
+        tanks: List[Optional[tuple]] = [None, None]
+        for slot in (0, 1):
+            if tank_flags & (1 << slot):
+                tanks[slot] = _TANK.unpack_from(data, offset)
+                offset += _TANK.size
+        bullets = []
+        for _ in range(bullet_count):
+            bullets.append(_BULLET.unpack_from(data, offset))
+            offset += _BULLET.size
+    except struct.error as e:
+        raise ValueError(f"状态数据不完整: {e}")
+
+    apply_values(game_view, tanks, bullets,
+                 (total_time, player1_score, player2_score, bool(round_over),
+                  round_over_timer, round_result_text, bool(game_over)))
+
+
+def apply_values(game_view, tanks: Sequence, bullets: Sequence, scalars: Sequence):
+    """按槽位套用坦克和子弹的数值，不重建墙壁和坦克
+
+    tanks：每个槽位 (x, y, 角度, vx, vy, 角速度, 血量, 上次射击时间) 或 None
+    bullets：(所有者槽位, x, y, 角度, vx, vy, 角速度, 反弹次数)，
+             按所有者依次复用现有的子弹，多出的移除，缺少的新建
+    scalars：(total_time, 玩家1比分, 玩家2比分, 回合结束, 回合结束计时, 回合提示, 整局结束)
+    """
+    from tank_sprites import Bullet
+
+    space = game_view.space
+    slots = (game_view.player_tank, game_view.player2_tank)
+    for tank, values in zip(slots, tanks):
+        if not tank or not values or not tank.pymunk_body:
+            continue
+        x, y, angle, vx, vy, angular_velocity, tank.health, tank.last_shot_time = values
+        _set_body(tank.pymunk_body, x, y, angle, vx, vy, angular_velocity)
+        tank.sync_with_pymunk_body()
+
+    unused = list(game_view.bullet_list)
+    for slot, x, y, angle, vx, vy, angular_velocity, bounce_count in bullets:
+        owner = slots[slot]
+        bullet = next((b for b in unused if b.owner is owner), None)
+        if bullet:
+            unused.remove(bullet)
+        elif owner:
+            bullet = Bullet(radius=4, owner=owner, tank_center_x=x, tank_center_y=y,
+                            actual_emission_angle_degrees=0, speed_magnitude=16,
+                            color=owner.get_bullet_color())
+            game_view.bullet_list.append(bullet)
+            space.add(bullet.pymunk_body, bullet.pymunk_shape)
+        else:
+            continue
+        bullet.bounce_count = bounce_count
+        _set_body(bullet.pymunk_body, x, y, angle, vx, vy, angular_velocity)
+        bullet.sync_with_pymunk_body()
+
+    for bullet in unused:
+        game_view.bullet_list.remove(bullet)
+        if bullet.pymunk_body.space is space:
+            space.remove(bullet.pymunk_body, *bullet.pymunk_body.shapes)
+
+    (game_view.total_time, game_view.player1_score, game_view.player2_score,
+     game_view.round_over, game_view.round_over_timer,
+     game_view.round_result_text, game_view.game_over) = scalars
+    game_view.pymunk_bodies_to_remove_post_step.clear()
+    game_view.arcade_sprites_to_remove_post_step.clear()
@@ -23,6 +23,7 @@ from .room_discovery import RoomDiscovery
 from .game_host import GameHost
 from .game_client import GameClient
 from .messages import MessageType, NetworkMessage
+from .transport import Transport, UdpNetwork, LoopbackNetwork
 
 # 注意：network_views 需要 arcade，在测试环境中可能不可用
 try:
@@ -39,7 +40,10 @@ __all__ = [
     'GameHost',
     'GameClient',
     'MessageType',
-    'NetworkMessage'
+    'NetworkMessage',
+    'Transport',
+    'UdpNetwork',
+    'LoopbackNetwork'
 ]
 
 if _VIEWS_AVAILABLE:
@@ -0,0 +1,168 @@
+"""
+发送合并模块
+
+一个tick内发给同一个地址的多条消息（例如 GAME_STATE + GAME_END、MAP_SYNC + GAME_START，
+客户端的输入 + 心跳）先排队，tick结束时合并成尽量少的数据报发送，减少系统调用和包头开销。
+
+合并数据报格式（紧凑的长度前缀分帧）：
+    BATCH_MAGIC(1字节) + [长度(2字节, 大端) + 消息字节] * N
+
+- 普通消息是JSON，以 '{' 开头，不会与 BATCH_MAGIC 混淆
+- 只有一条消息时原样发送，不加分帧，与旧版本兼容
+- 每个合并数据报不超过 BATCH_MTU，单条超过 BATCH_MTU 的消息单独原样发送
+
+接收端每次唤醒取出所有排队的数据报，拆分后用 latest_only 丢弃过时的状态快照，
+只应用最新的一个，卡顿后不会在客户端积压。
+"""
+
+import struct
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .messages import MessageType, NetworkMessage
+
+# 合并数据报的标记字节
+BATCH_MAGIC = 0xB7
+# 合并数据报的最大大小（低于常见路径MTU，避免IP分片）
+BATCH_MTU = 1200
+
+_FRAME_HEADER = struct.Struct("!H")
+_MAGIC_BYTES = bytes([BATCH_MAGIC])
+
+
+def pack_messages(messages: List[bytes], mtu: int = BATCH_MTU) -> List[bytes]:
+    """把多条已编码的消息打包成尽量少的数据报（保持顺序）"""
+    datagrams = []
+    frames: List[bytes] = []
+    size = 1
+
+    def finish():
+        if len(frames) == 1:
+            datagrams.append(frames[0])
+        elif frames:
+            parts = [_MAGIC_BYTES]
+            for frame in frames:
+                parts.append(_FRAME_HEADER.pack(len(frame)))
+                parts.append(frame)
+            datagrams.append(b"".join(parts))
+
+    for data in messages:
+        frame_size = _FRAME_HEADER.size + len(data)
+        if frames and size + frame_size > mtu:
+            finish()
+            frames = []
+            size = 1
+        frames.append(data)
+        size += frame_size
+    finish()
+    return datagrams
+
+
+def unpack_datagram(data: bytes) -> List[bytes]:
+    """拆分接收到的数据报，普通数据报返回只含自身的列表
+
+    Raises:
+        ValueError: 合并数据报的分帧不完整
+    """
+    if not data or data[0] != BATCH_MAGIC:
+        return [data]
+
+    messages = []
+    offset = 1
+    end = len(data)
+    while offset < end:
+        if offset + _FRAME_HEADER.size > end:
+            raise ValueError("合并数据报分帧不完整")
+        (length,) = _FRAME_HEADER.unpack_from(data, offset)
+        offset += _FRAME_HEADER.size
+        if offset + length > end:
+            raise ValueError("合并数据报分帧不完整")
+        messages.append(data[offset:offset + length])
+        offset += length
+    return messages
+
+
+def split_batch(batch: Iterable[Tuple[bytes, tuple]]) -> List[Tuple[bytes, tuple]]:
+    """把一批接收到的数据报拆分成 (消息字节, 来源地址) 列表
+
+    分帧不完整的数据报被丢弃（与UDP丢包一致）。
+    """
+    payloads = []
+    for data, addr in batch:
+        try:
+            payloads.extend((payload, addr) for payload in unpack_datagram(data))
+        except ValueError as e:
+            print(f"丢弃无效的数据报: {e}")
+    return payloads
+
+
+def latest_only(payloads: List[Tuple[bytes, tuple]],
+                msg_type: MessageType = MessageType.GAME_STATE,
+                dropped: Optional[List[bytes]] = None) -> List[Tuple[bytes, tuple]]:
+    """指定类型的消息只保留最新的一条（保持其原位置），其他消息按顺序保留
+
+    用消息前缀判断类型，被丢弃的消息不解码；提供 dropped 时按顺序把它们追加到其中
+    （客户端从中取出子弹的生成/消失事件，这些事件只在少数几个快照中重复发送）。
+    """
+    matches = [NetworkMessage.is_type(payload, msg_type) for payload, _ in payloads]
+    if matches.count(True) <= 1:
+        return payloads
+    newest = len(matches) - 1 - matches[::-1].index(True)
+    if dropped is not None:
+        dropped.extend(payloads[index][0] for index in range(newest) if matches[index])
+    return [item for index, item in enumerate(payloads) if not matches[index] or index == newest]
+
+
+class SendBatcher:
+    """按目标地址排队消息，flush 时合并发送"""
+
+    def __init__(self, mtu: int = BATCH_MTU):
+        self.mtu = mtu
+        self._queues: Dict[tuple, List[bytes]] = {}
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.messages_queued = 0
+        self.datagrams_sent = 0
+
+    def queue(self, addr: tuple, data: bytes):
+        """把一条已编码的消息排队到目标地址"""
+        with self._lock:
+            self._queues.setdefault(addr, []).append(data)
+            self.messages_queued += 1
+
+    def pending_count(self) -> int:
+        """排队中的消息数量"""
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def flush(self, send: Callable[[tuple, bytes], None]) -> int:
+        """合并并发送所有排队的消息，返回发送的数据报数量
+
+        Args:
+            send: 发送函数 send(addr, data)
+        """
+        with self._lock:
+            queues = self._queues
+            self._queues = {}
+
+        sent = 0
+        for addr, messages in queues.items():
+            for datagram in pack_messages(messages, self.mtu):
+                send(addr, datagram)
+                sent += 1
+        self.datagrams_sent += sent
+        return sent
+
+    def clear(self):
+        """丢弃所有排队的消息"""
+        with self._lock:
+            self._queues = {}
+
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        return {
+            "messages_queued": self.messages_queued,
+            "datagrams_sent": self.datagrams_sent,
+            "pending": self.pending_count(),
+        }
@@ -0,0 +1,361 @@
+"""
+子弹事件同步模块
+
+子弹从炮口发射后沿确定的轨迹飞行（撞墙反弹由物理引擎计算），
+因此不需要每次同步都发送所有子弹的位置：
+- 主机端只发送子弹的生成事件（ID、发射原点、角度、速度、发射时间）和消失事件
+- 客户端根据生成事件创建子弹并在本地物理空间中模拟飞行
+- 每个快照附带少量轮流抽样的子弹校验数据，客户端仅在偏差过大时修正
+- 恢复连接后的关键帧附带所有子弹的校验数据（full），客户端据此重建子弹列表
+
+这样 GAME_STATE 的大小只随坦克数量变化，而不随子弹数量增长。
+"""
+
+import math
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional
+
+import pymunk
+
+import game_log
+
+log = game_log.get_logger("net")
+
+# 每个事件重复发送的快照数量（UDP可能丢包，客户端按ID去重）
+EVENT_REDUNDANCY = 5
+# 每个快照附带的子弹校验数量
+CHECKS_PER_SNAPSHOT = 2
+# 本地模拟位置与主机位置偏差超过该值(像素)时进行修正
+CORRECTION_THRESHOLD = 8.0
+# 生成事件到达较晚时，最多向前追赶的时间(秒)
+MAX_CATCHUP_TIME = 0.25
+# 记录最近已消失的子弹ID数量，防止乱序到达的生成事件让子弹"复活"
+DESPAWN_MEMORY = 256
+
+# 标准子弹半径（与tank_sprites.Tank.shoot保持一致）
+BULLET_RADIUS = 4
+
+
+def _owner_id(bullet) -> str:
+    """获取子弹所有者的玩家ID"""
+    owner = getattr(bullet, 'owner', None)
+    if owner is not None:
+        return getattr(owner, 'player_id', None) or 'unknown'
+    return getattr(bullet, 'owner_id', 'unknown')
+
+
+def create_spawn_event(bullet) -> Dict[str, Any]:
+    """根据子弹对象创建生成事件"""
+    return {
+        "id": bullet.bullet_id,
+        "x": round(getattr(bullet, 'origin_x', bullet.center_x), 1),
+        "y": round(getattr(bullet, 'origin_y', bullet.center_y), 1),
+        "angle": round(bullet.angle, 2),
+        "speed": getattr(bullet, 'speed_magnitude', 16),
+        "owner": _owner_id(bullet),
+        "t": round(getattr(bullet, 'spawn_time', 0.0), 4)
+    }
+
+
+def create_check_event(bullet) -> Dict[str, Any]:
+    """根据子弹对象创建校验数据（当前位置和速度）"""
+    body = bullet.pymunk_body
+    return {
+        "id": bullet.bullet_id,
+        "x": round(body.position.x, 1),
+        "y": round(body.position.y, 1),
+        "vx": round(body.velocity.x, 1),
+        "vy": round(body.velocity.y, 1),
+        "b": getattr(bullet, 'bounce_count', 0),
+        "owner": _owner_id(bullet)
+    }
+
+
+def create_keyframe_events(bullet_list) -> Dict[str, list]:
+    """创建关键帧的子弹事件：所有子弹的校验数据，并标记为完整列表"""
+    checks = []
+    if bullet_list is not None:
+        for bullet in bullet_list:
+            if bullet is not None and getattr(bullet, 'pymunk_body', None) is not None:
+                checks.append(create_check_event(bullet))
+    return {"spawn": [], "despawn": [], "check": checks, "full": True}
+
+
+class BulletEventTracker:
+    """主机端子弹事件追踪器
+
+    每次同步时对比子弹列表，生成新增/消失事件。
+    每个事件会在接下来的若干个快照中重复发送，以应对丢包。
+    """
+
+    def __init__(self, redundancy: int = EVENT_REDUNDANCY,
+                 checks_per_snapshot: int = CHECKS_PER_SNAPSHOT):
+        self.redundancy = redundancy
+        self.checks_per_snapshot = checks_per_snapshot
+        self.known_bullets: Dict[int, Any] = {}
+        self.pending_spawns: List[list] = []    # [事件, 剩余发送次数]
+        self.pending_despawns: List[list] = []  # [子弹ID, 剩余发送次数]
+        self._check_cursor = 0
+
+    def reset(self):
+        """清空追踪状态（新游戏开始时调用）"""
+        self.known_bullets.clear()
+        self.pending_spawns.clear()
+        self.pending_despawns.clear()
+        self._check_cursor = 0
+
+    def collect(self, bullet_list) -> Dict[str, list]:
+        """对比当前子弹列表，返回本次快照需要发送的子弹事件"""
+        current = {}
+        if bullet_list is not None:
+            for bullet in bullet_list:
+                if bullet is not None:
+                    current[bullet.bullet_id] = bullet
+
+        # 新出现的子弹 -> 生成事件
+        for bullet_id, bullet in current.items():
+            if bullet_id not in self.known_bullets:
+                self.pending_spawns.append([create_spawn_event(bullet), self.redundancy])
+
+        # 消失的子弹 -> 消失事件
+        for bullet_id in self.known_bullets:
+            if bullet_id not in current:
+                self.pending_despawns.append([bullet_id, self.redundancy])
+
+        self.known_bullets = current
+
+        events = {
+            "spawn": [entry[0] for entry in self.pending_spawns],
+            "despawn": [entry[0] for entry in self.pending_despawns],
+            "check": self._sample_checks(current)
+        }
+
+        self.pending_spawns = self._countdown(self.pending_spawns)
+        self.pending_despawns = self._countdown(self.pending_despawns)
+        return events
+
+    def _sample_checks(self, current: Dict[int, Any]) -> List[Dict[str, Any]]:
+        """轮流抽取少量子弹生成校验数据"""
+        if not current or self.checks_per_snapshot <= 0:
+            return []
+
+        bullets = list(current.values())
+        count = min(self.checks_per_snapshot, len(bullets))
+        checks = []
+        for i in range(count):
+            bullet = bullets[(self._check_cursor + i) % len(bullets)]
+            if bullet.pymunk_body is not None:
+                checks.append(create_check_event(bullet))
+        self._check_cursor = (self._check_cursor + count) % len(bullets)
+        return checks
+
+    @staticmethod
+    def _countdown(entries: List[list]) -> List[list]:
+        """递减剩余发送次数并移除已发送完毕的事件"""
+        remaining = []
+        for entry in entries:
+            entry[1] -= 1
+            if entry[1] > 0:
+                remaining.append(entry)
+        return remaining
+
+
+class BulletEventApplier:
+    """客户端子弹事件应用器
+
+    根据主机发送的事件在本地游戏视图中创建/移除子弹，
+    子弹的飞行由本地物理空间模拟（GameView.step_physics）。
+    """
+
+    def __init__(self, game_view, color_resolver: Optional[Callable[[str], tuple]] = None,
+                 correction_threshold: float = CORRECTION_THRESHOLD):
+        self.game_view = game_view
+        self.color_resolver = color_resolver
+        self.correction_threshold = correction_threshold
+        self._despawned_ids = set()
+        self._despawned_order = deque()
+        self.corrections = 0
+
+    def apply(self, bullet_events: Dict[str, list], game_time: float = 0.0):
+        """应用一次快照中的子弹事件"""
+        if not self.game_view or self.game_view.bullet_list is None:
+            return
+
+        local_bullets = {getattr(bullet, 'bullet_id', None): bullet
+                         for bullet in self.game_view.bullet_list if bullet is not None}
+
+        if bullet_events.get("full"):
+            # 关键帧列出了所有子弹，本地多出的子弹（断线期间已经消失）全部移除
+            live_ids = {check.get("id") for check in bullet_events.get("check", [])}
+            for bullet_id in [bid for bid in local_bullets if bid not in live_ids]:
+                self._remember_despawn(bullet_id)
+                self._remove_bullet(local_bullets.pop(bullet_id))
+
+        for bullet_id in bullet_events.get("despawn", []):
+            self._remember_despawn(bullet_id)
+            bullet = local_bullets.pop(bullet_id, None)
+            if bullet is not None:
+                self._remove_bullet(bullet)
+
+        for event in bullet_events.get("spawn", []):
+            bullet_id = event.get("id")
+            if bullet_id in local_bullets or bullet_id in self._despawned_ids:
+                continue
+            bullet = self._spawn_bullet(event, game_time)
+            if bullet is not None:
+                local_bullets[bullet_id] = bullet
+
+        for check in bullet_events.get("check", []):
+            bullet_id = check.get("id")
+            if bullet_id in self._despawned_ids:
+                continue
+            bullet = local_bullets.get(bullet_id)
+            if bullet is None:
+                # 生成事件丢失或本地预测提前移除了子弹，按校验数据重建
+                bullet = self._spawn_from_check(check)
+                if bullet is not None:
+                    local_bullets[bullet_id] = bullet
+                    self.corrections += 1
+            elif self._correct_bullet(bullet, check):
+                self.corrections += 1
+
+    def _find_owner_tank(self, owner_id: str):
+        """根据玩家ID查找本地坦克（用于忽略子弹与发射者的碰撞）"""
+        player_list = getattr(self.game_view, 'player_list', None)
+        if player_list is None:
+            return None
+        for tank in player_list:
+            if tank is not None and getattr(tank, 'player_id', None) == owner_id:
+                return tank
+        return None
+
+    def _create_bullet(self, x: float, y: float, angle: float, speed: float, owner_id: str):
+        """创建子弹精灵并加入本地物理空间"""
+        from tank_sprites import Bullet
+        import arcade
+
+        owner_tank = self._find_owner_tank(owner_id)
+        if self.color_resolver:
+            bullet_color = self.color_resolver(owner_id)
+        else:
+            bullet_color = arcade.color.YELLOW_ORANGE
+
+        bullet = Bullet(
+            radius=BULLET_RADIUS,
+            owner=owner_tank,
+            tank_center_x=x,
+            tank_center_y=y,
+            actual_emission_angle_degrees=angle,
+            speed_magnitude=speed,
+            color=bullet_color
+        )
+        bullet.owner_id = owner_id
+        return bullet
+
+    def _add_bullet(self, bullet):
+        """把子弹加入列表和物理空间"""
+        self.game_view.bullet_list.append(bullet)
+        space = getattr(self.game_view, 'space', None)
+        if space is not None and bullet.pymunk_body and bullet.pymunk_shape:
+            space.add(bullet.pymunk_body, bullet.pymunk_shape)
+
+    def _spawn_bullet(self, event: Dict[str, Any], game_time: float):
+        """根据生成事件创建子弹，并按事件延迟向前追赶"""
+        try:
+            bullet = self._create_bullet(
+                event.get("x", 0), event.get("y", 0), event.get("angle", 0),
+                event.get("speed", 16), event.get("owner", "unknown")
+            )
+            bullet.bullet_id = event.get("id")
+            bullet.spawn_time = event.get("t", 0.0)
+
+            # 事件到达时子弹在主机上已飞行了一段时间，按直线追赶
+            age = min(max(game_time - bullet.spawn_time, 0.0), MAX_CATCHUP_TIME)
+            if age > 0:
+                body = bullet.pymunk_body
+                start = (body.position.x, body.position.y)
+                end = (start[0] + body.velocity.x * age, start[1] + body.velocity.y * age)
+                # 直线追赶不经过物理引擎，路径上有墙壁时停在墙前，反弹后的偏差由校验数据修正
+                fraction = self._catchup_fraction(start, end, bullet.radius)
+                body.position = (start[0] + (end[0] - start[0]) * fraction,
+                                 start[1] + (end[1] - start[1]) * fraction)
+                bullet.sync_with_pymunk_body()
+
+            self._add_bullet(bullet)
+            return bullet
+        except Exception as e:
+            log.warning("创建同步子弹时出错: %s", e)
+            return None
+
+    def _catchup_fraction(self, start, end, radius: float) -> float:
+        """追赶路径上第一次碰到墙壁的位置（占整段路径的比例），没有墙壁时为1"""
+        space = getattr(self.game_view, 'space', None)
+        if space is None:
+            return 1.0
+        from tank_sprites import COLLISION_TYPE_WALL
+
+        fraction = 1.0
+        for info in space.segment_query(start, end, radius, pymunk.ShapeFilter()):
+            if info.shape is not None and info.shape.collision_type == COLLISION_TYPE_WALL:
+                fraction = min(fraction, info.alpha)
+        return fraction
+
+    def _spawn_from_check(self, check: Dict[str, Any]):
+        """根据校验数据重建子弹"""
+        try:
+            vx = check.get("vx", 0.0)
+            vy = check.get("vy", 0.0)
+            # Bullet中 vx = -v*sin(a), vy = v*cos(a)
+            angle = math.degrees(math.atan2(-vx, vy))
+            speed = math.hypot(vx, vy) / 60
+            bullet = self._create_bullet(check.get("x", 0), check.get("y", 0), angle,
+                                         speed, check.get("owner", "unknown"))
+            bullet.bullet_id = check.get("id")
+            self._apply_check(bullet, check)
+            self._add_bullet(bullet)
+            return bullet
+        except Exception as e:
+            log.warning("重建同步子弹时出错: %s", e)
+            return None
+
+    def _correct_bullet(self, bullet, check: Dict[str, Any]) -> bool:
+        """位置偏差超过阈值时修正本地子弹，返回是否进行了修正"""
+        body = bullet.pymunk_body
+        if body is None:
+            return False
+        error = math.hypot(body.position.x - check.get("x", 0),
+                           body.position.y - check.get("y", 0))
+        if error <= self.correction_threshold:
+            return False
+        self._apply_check(bullet, check)
+        return True
+
+    @staticmethod
+    def _apply_check(bullet, check: Dict[str, Any]):
+        """把校验数据写入子弹物理体"""
+        body = bullet.pymunk_body
+        body.position = (check.get("x", 0), check.get("y", 0))
+        body.velocity = (check.get("vx", 0.0), check.get("vy", 0.0))
+        bullet.bounce_count = check.get("b", bullet.bounce_count)
+        bullet.sync_with_pymunk_body()
+
+    def _remove_bullet(self, bullet):
+        """从物理空间和子弹列表中移除子弹"""
+        try:
+            space = getattr(self.game_view, 'space', None)
+            if space is not None and bullet.pymunk_body is not None:
+                if bullet.pymunk_body in space.bodies:
+                    space.remove(bullet.pymunk_body, *bullet.pymunk_body.shapes)
+            if bullet in self.game_view.bullet_list:
+                self.game_view.bullet_list.remove(bullet)
+        except Exception as e:
+            log.warning("移除同步子弹时出错: %s", e)
+
+    def _remember_despawn(self, bullet_id):
+        """记录已消失的子弹ID（有界）"""
+        if bullet_id in self._despawned_ids:
+            return
+        self._despawned_ids.add(bullet_id)
+        self._despawned_order.append(bullet_id)
+        while len(self._despawned_order) > DESPAWN_MEMORY:
+            self._despawned_ids.discard(self._despawned_order.popleft())
@@ -0,0 +1,315 @@
+"""
+专用服务器模块
+
+不打开窗口、不绘制画面，只运行权威物理模拟和网络同步：
+- 两名玩家都以客户端身份连接（先加入的控制玩家1坦克，后加入的控制玩家2坦克）
+- 固定频率的游戏循环，按绝对截止时间调度，避免 sleep 误差累积
+- 客户端输入在网络线程中排队，在每个tick开始时由游戏循环统一应用
+- 通过房间发现广播房间，玩家可以在房间浏览界面看到服务器
+- 运行日志写入文件（游戏代码中的print输出也会写入日志）
+
+启动方式（在 tank 目录下）：
+    python main.py --server --room-name "我的服务器"
+"""
+
+import contextlib
+import io
+import logging
+import threading
+import time
+from typing import Optional
+
+from .network_views import HostGameView
+
+# 默认的服务器tick频率
+DEFAULT_TICK_RATE = 60
+# 调度器落后超过该tick数时放弃追赶，直接对齐到当前时间
+MAX_CATCH_UP_TICKS = 5
+# 睡眠到截止时间前的这段时间后改为忙等，弥补系统sleep精度不足
+SPIN_THRESHOLD = 0.002
+# 一局结束后等待多久开始下一局（秒）
+RESTART_DELAY = 5.0
+
+
+class HeadlessWindow:
+    """无界面的窗口替身
+
+    只提供游戏视图用到的几个属性，传给 View(window=...) 使用，
+    不会注册为arcade的全局窗口，也不会创建OpenGL上下文。
+    """
+
+    headless = True
+
+    def __init__(self, width: int = 1280, height: int = 720):
+        self.width = width
+        self.height = height
+        self.invalid = False
+        self.background_color = (0, 0, 0, 255)
+        self.current_view = None
+
+    def show_view(self, view):
+        self.current_view = view
+
+    def get_size(self):
+        return self.width, self.height
+
+
+class TickScheduler:
+    """固定频率的tick调度器
+
+    每个tick的截止时间按 起始时间 + n * 间隔 计算，sleep的误差不会累积。
+    临近截止时间时改为忙等；落后太多时放弃追赶并记录一次超时。
+    """
+
+    def __init__(self, tick_rate: int = DEFAULT_TICK_RATE,
+                 max_catch_up: int = MAX_CATCH_UP_TICKS,
+                 spin_threshold: float = SPIN_THRESHOLD):
+        self.tick_rate = tick_rate
+        self.interval = 1.0 / tick_rate
+        self.max_catch_up = max_catch_up
+        self.spin_threshold = spin_threshold
+
+        self.tick_count = 0
+        self.overruns = 0          # 落后超过 max_catch_up 个tick的次数
+        self.max_lateness = 0.0    # tick开始时间相对截止时间的最大延迟
+        self._next_deadline = None
+
+    def reset(self):
+        """从当前时间重新开始计时"""
+        self._next_deadline = time.perf_counter()
+
+    def wait_next_tick(self) -> float:
+        """等待下一个tick，返回本tick应模拟的时间步长（固定值）"""
+        if self._next_deadline is None:
+            self.reset()
+
+        deadline = self._next_deadline
+        remaining = deadline - time.perf_counter()
+        if remaining > self.spin_threshold:
+            time.sleep(remaining - self.spin_threshold)
+        while time.perf_counter() < deadline:
+            pass
+
+        now = time.perf_counter()
+        lateness = now - deadline
+        self.max_lateness = max(self.max_lateness, lateness)
+        if lateness > self.max_catch_up * self.interval:
+            # 落后太多（例如进程被挂起），不再补跑错过的tick
+            self.overruns += 1
+            self._next_deadline = now + self.interval
+        else:
+            self._next_deadline = deadline + self.interval
+
+        self.tick_count += 1
+        return self.interval
+
+    def get_stats(self) -> dict:
+        """获取调度统计"""
+        return {
+            "tick_rate": self.tick_rate,
+            "tick_count": self.tick_count,
+            "overruns": self.overruns,
+            "max_lateness_ms": self.max_lateness * 1000,
+        }
+
+
+class _LogWriter(io.TextIOBase):
+    """把print输出逐行转发到logger的文件对象"""
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+        self._buffer = ""
+
+    def write(self, text):
+        self._buffer += text
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            if line.strip():
+                self.logger.info(line)
+        return len(text)
+
+    def flush(self):
+        if self._buffer.strip():
+            self.logger.info(self._buffer)
+        self._buffer = ""
+
+
+def setup_server_logging(log_file: Optional[str] = None) -> logging.Logger:
+    """配置服务器日志：写入文件（未指定文件时输出到控制台）"""
+    logger = logging.getLogger("tank.server")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+    if log_file:
+        handler = logging.FileHandler(log_file, encoding="utf-8")
+    else:
+        handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    logger.addHandler(handler)
+    return logger
+
+
+class DedicatedServer(HostGameView):
+    """专用服务器
+
+    复用主机视图的权威模拟和状态同步逻辑，但没有窗口，主机本身不控制坦克。
+    """
+
+    # 按加入顺序分配的坦克
+    TANK_SLOTS = ("player_tank", "player2_tank")
+
+    def __init__(self, room_name: str = "专用服务器", host_port: int = 12346,
+                 network=None, tick_rate: int = DEFAULT_TICK_RATE,
+                 logger: Optional[logging.Logger] = None,
+                 restart_delay: float = RESTART_DELAY, discovery_port: Optional[int] = None,
+                 multicast_group: Optional[str] = None):
+        self.headless_window = HeadlessWindow()
+        super().__init__(network=network, window=self.headless_window,
+                         max_clients=len(self.TANK_SLOTS), host_port=host_port,
+                         discovery_port=discovery_port, multicast_group=multicast_group,
+                         host_is_player=False)
+        self.room_name = room_name
+        self.host_name = room_name
+        self.connected_players = []
+
+        self.scheduler = TickScheduler(tick_rate)
+        self.logger = logger or logging.getLogger("tank.server")
+        self.restart_delay = restart_delay
+
+        self.running = False
+        self.stop_event = threading.Event()
+        self.restart_timer = 0.0
+
+        # 网络线程收到的输入在 tick 开头应用；加入/离开回调与 tick 互斥
+        self.state_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    def start(self) -> bool:
+        """启动网络服务和房间广播"""
+        self.game_host.set_callbacks(
+            client_join=self._on_client_join,
+            client_leave=self._on_client_leave,
+            input_received=self._on_input_received,
+            client_suspended=self._on_client_suspended,
+            client_resumed=self._on_client_resumed
+        )
+        if not self.game_host.start_hosting(self.room_name, self.host_name):
+            self.logger.error("启动服务器失败")
+            return False
+
+        self.running = True
+        self.stop_event.clear()
+        self.logger.info(f"服务器已启动: 房间 '{self.room_name}', 端口 {self.game_host.host_port}, "
+                         f"tick频率 {self.scheduler.tick_rate}Hz")
+        return True
+
+    def stop(self):
+        """停止服务器"""
+        if not self.running:
+            return
+        self.running = False
+        self.stop_event.set()
+        self.game_host.stop_hosting()
+        self.logger.info(f"服务器已停止: {self.scheduler.get_stats()}")
+
+    def run(self, duration: Optional[float] = None):
+        """运行游戏循环直到stop()被调用（或运行指定秒数）
+
+        游戏代码中的print输出会被转发到服务器日志。
+        """
+        with contextlib.redirect_stdout(_LogWriter(self.logger)):
+            if not self.running and not self.start():
+                return
+
+            end_time = time.perf_counter() + duration if duration is not None else None
+            self.scheduler.reset()
+            try:
+                while self.running and not self.stop_event.is_set():
+                    if end_time is not None and time.perf_counter() >= end_time:
+                        break
+                    delta_time = self.scheduler.wait_next_tick()
+                    self.tick(delta_time)
+            except KeyboardInterrupt:
+                self.logger.info("收到中断信号")
+            finally:
+                self.stop()
+
+    def tick(self, delta_time: float):
+        """推进一个tick：应用输入、更新模拟、同步状态、处理开局/结束"""
+        with self.state_lock:
+            self._apply_pending_inputs()
+
+            if self.game_phase == "playing" and self.game_view:
+                self.on_update(delta_time)
+                if self.game_view.game_over:
+                    self.logger.info(f"本局结束: {self.game_view.round_result_text}")
+                    self.game_phase = "finished"
+                    self.restart_timer = self.restart_delay
+            elif self.game_phase == "finished":
+                self.restart_timer -= delta_time
+                if self.restart_timer <= 0:
+                    self._try_start_match()
+            else:
+                self._try_start_match()
+
+            if self.game_phase != "playing":
+                # 对局结束后观众仍需按延迟收到最后的快照和结束消息
+                self.game_host.flush_spectators()
+            # 开局时排队的地图同步和开始消息在本tick发出
+            self.game_host.flush_sends()
+
+    # ------------------------------------------------------------------
+    # 对局管理
+    # ------------------------------------------------------------------
+
+    def _try_start_match(self):
+        """两名玩家都已连接时开始新的一局"""
+        if len(self.game_host.clients) < len(self.TANK_SLOTS):
+            self.game_phase = "waiting"
+            return
+        self.logger.info(f"开始对局: {', '.join(self.connected_players)}")
+        self.pending_inputs.clear()
+        self._start_game()
+
+    def _on_client_join(self, client_id: str, player_name: str):
+        """客户端加入（网络线程）"""
+        self.connected_players.append(f"{player_name} ({client_id})")
+        self.logger.info(f"玩家加入: {player_name} ({client_id})")
+
+    def _on_client_leave(self, client_id: str, reason: str):
+        """客户端离开（网络线程），当前对局作废"""
+        with self.state_lock:
+            self.connected_players = [p for p in self.connected_players if client_id not in p]
+            self.logger.info(f"玩家离开: {client_id} ({reason})")
+            if self.game_phase != "waiting":
+                self.game_phase = "waiting"
+                self.game_view = None
+
+    # ------------------------------------------------------------------
+    # 坦克分配
+    # ------------------------------------------------------------------
+
+    def _get_slot(self, client_id: str) -> Optional[int]:
+        """客户端按加入顺序对应的坦克槽位"""
+        for slot, known_id in enumerate(self.game_host.clients):
+            if known_id == client_id:
+                return slot if slot < len(self.TANK_SLOTS) else None
+        return None
+
+    def _get_client_tank(self, client_id: str):
+        slot = self._get_slot(client_id)
+        if slot is None:
+            return None
+        return getattr(self.game_view, self.TANK_SLOTS[slot], None)
+
+    def _get_shot_target(self, client_id: str):
+        slot = self._get_slot(client_id)
+        if slot is None:
+            return None
+        return getattr(self.game_view, self.TANK_SLOTS[1 - slot], None)
@@ -4,28 +4,36 @@
 专为1对1双人游戏设计的客户端网络管理
 """
 
-import socket
 import threading
 import time
 from typing import Optional, Callable, Set, Tuple
 from .messages import MessageFactory, NetworkMessage, MessageType
+from .transport import get_default_network
+from .batching import SendBatcher, split_batch, latest_only
+from .session import HEARTBEAT_INTERVAL, HOST_SILENCE_TIMEOUT, RESUME_WINDOW, RESUME_RETRY_INTERVAL
+from .lockstep import is_lockstep_packet
+from .tracing import tracer
 
 
 class GameClient:
     """游戏客户端类 - 重构版"""
     
-    def __init__(self):
+    def __init__(self, network=None):
         self.connected = False
         self.running = False
         
         # 网络相关
-        self.client_socket = None
+        self.network = network or get_default_network()
+        self.transport = None
         self.network_thread = None
         self.host_address: Optional[Tuple[str, int]] = None
+        # 网络循环每轮的输入和心跳合并成一个数据报发送
+        self.send_batcher = SendBatcher()
         
         # 玩家信息
         self.player_id: Optional[str] = None
         self.player_name = ""
+        self.spectator = False  # 观众只接收状态，不发送输入
         
         # 输入管理
         self.current_keys: Set[str] = set()
@@ -41,15 +49,39 @@ class GameClient:
         self.game_end_callback: Optional[Callable[[dict], None]] = None
         self.tank_selection_callback: Optional[Callable] = None
         self.map_sync_callback: Optional[Callable[[dict], None]] = None
+        self.interrupted_callback: Optional[Callable[[str], None]] = None
+        self.resumed_callback: Optional[Callable[[], None]] = None
+        self.lockstep_input_callback: Optional[Callable[[bytes], None]] = None
+        self.rollback_state_callback: Optional[Callable[[dict], None]] = None
+        self.dropped_state_callback: Optional[Callable[[dict], None]] = None
         
-        # 心跳管理
+        # 最近收到的游戏状态对应的主机游戏时间（随输入上报，用于主机端延迟补偿）
+        self.last_state_time: Optional[float] = None
+
+        # 心跳管理（主机回应心跳，用于发现主机无响应）
         self.last_heartbeat = 0
-        self.heartbeat_interval = 5.0  # 5秒发送一次心跳
+        self.heartbeat_interval = HEARTBEAT_INTERVAL
+        self.last_receive_time = 0.0
+
+        # 会话恢复
+        self.session_token: Optional[str] = None
+        self.resuming = False
+        self.resume_deadline = 0.0
+        self.last_resume_attempt = 0.0
+        self.host_silence_timeout = HOST_SILENCE_TIMEOUT
+        self.resume_window = RESUME_WINDOW
+        self.resume_retry_interval = RESUME_RETRY_INTERVAL
     
     def set_callbacks(self, connection: Callable = None, disconnection: Callable = None,
                      game_state: Callable = None, game_start: Callable = None, game_end: Callable = None,
-                     tank_selection: Callable = None, map_sync: Callable = None):
-        """设置回调函数"""
+                     tank_selection: Callable = None, map_sync: Callable = None,
+                     interrupted: Callable = None, resumed: Callable = None,
+                     lockstep_input: Callable = None, rollback_state: Callable = None,
+                     dropped_state: Callable = None):
+        """设置回调函数（interrupted/resumed：连接中断开始重连、会话恢复成功；
+        lockstep_input：锁步模式下收到主机的二进制输入包；
+        rollback_state：回滚模式下收到主机的权威状态；
+        dropped_state：积压时被较新快照取代的游戏状态，只用于取出其中的子弹事件）"""
         self.connection_callback = connection
         self.disconnection_callback = disconnection
         self.game_state_callback = game_state
@@ -57,37 +89,46 @@ class GameClient:
         self.game_end_callback = game_end
         self.tank_selection_callback = tank_selection
         self.map_sync_callback = map_sync
+        self.interrupted_callback = interrupted
+        self.resumed_callback = resumed
+        self.lockstep_input_callback = lockstep_input
+        self.rollback_state_callback = rollback_state
+        self.dropped_state_callback = dropped_state
     
-    def connect_to_host(self, host_ip: str, host_port: int, player_name: str) -> bool:
-        """连接到游戏主机"""
+    def connect_to_host(self, host_ip: str, host_port: int, player_name: str,
+                        spectator: bool = False) -> bool:
+        """连接到游戏主机（spectator为True时以观众身份连接）"""
         if self.connected:
             return False
         
         self.host_address = (host_ip, host_port)
         self.player_name = player_name
+        self.spectator = spectator
         
         try:
-            # 创建UDP套接字
-            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.client_socket.settimeout(5.0)  # 5秒连接超时
+            # 创建传输
+            self.transport = self.network.create_transport()
             
             # 发送加入请求
-            join_request = MessageFactory.create_join_request(player_name)
-            self.client_socket.sendto(join_request.to_bytes(), self.host_address)
+            join_request = MessageFactory.create_join_request(player_name, spectator)
+            self.transport.send(join_request.to_bytes(), self.host_address)
             
-            # 等待响应
-            data, addr = self.client_socket.recvfrom(8192)
+            # 等待响应（5秒连接超时）
+            batch = self.transport.receive_batch(max_count=1, timeout=5.0)
+            if not batch:
+                raise TimeoutError("等待主机响应超时")
+            data, addr = batch[0]
             response = NetworkMessage.from_bytes(data)
             
             if response.type == MessageType.JOIN_RESPONSE and response.data.get("success"):
                 # 连接成功
                 self.player_id = response.data.get("player_id")
+                self.session_token = response.data.get("session_token")
+                self.resuming = False
+                self.last_receive_time = time.time()
                 self.connected = True
                 self.running = True
                 
-                # 设置非阻塞模式
-                self.client_socket.settimeout(0.1)
-                
                 # 启动网络处理线程
                 self.network_thread = threading.Thread(target=self._network_loop, daemon=True)
                 self.network_thread.start()
@@ -116,10 +157,10 @@ class GameClient:
             return
         
         # 发送断开连接消息
-        if self.client_socket and self.host_address:
+        if self.transport and self.host_address:
             try:
                 disconnect_msg = MessageFactory.create_disconnect("用户断开")
-                self.client_socket.sendto(disconnect_msg.to_bytes(), self.host_address)
+                self.transport.send(disconnect_msg.to_bytes(), self.host_address)
             except:
                 pass
         
@@ -127,13 +168,13 @@ class GameClient:
         self.running = False
         self.connected = False
         
-        # 关闭套接字
-        if self.client_socket:
+        # 关闭传输
+        if self.transport:
             try:
-                self.client_socket.close()
+                self.transport.close()
             except:
                 pass
-            self.client_socket = None
+            self.transport = None
         
         # 等待网络线程结束
         if self.network_thread:
@@ -143,6 +184,7 @@ class GameClient:
         # 清理状态
         self.player_id = None
         self.host_address = None
+        self.last_state_time = None
         with self.input_lock:
             self.current_keys.clear()
             self.pending_key_presses.clear()
@@ -156,7 +198,7 @@ class GameClient:
     
     def send_key_press(self, key: str):
         """发送按键按下事件"""
-        if not self.connected:
+        if not self.connected or self.spectator:
             return
         
         with self.input_lock:
@@ -166,7 +208,7 @@ class GameClient:
     
     def send_key_release(self, key: str):
         """发送按键释放事件"""
-        if not self.connected:
+        if not self.connected or self.spectator:
             return
         
         with self.input_lock:
@@ -176,11 +218,11 @@ class GameClient:
     
     def send_message(self, message: NetworkMessage):
         """发送消息到主机"""
-        if not self.connected or not self.client_socket:
+        if not self.connected or not self.transport:
             return
         
         try:
-            self.client_socket.sendto(message.to_bytes(), self.host_address)
+            self.transport.send(message.to_bytes(), self.host_address)
         except Exception as e:
             print(f"发送消息失败: {e}")
     
@@ -211,21 +253,43 @@ class GameClient:
         """网络处理主循环"""
         while self.running and self.connected:
             try:
-                # 发送待处理的输入
-                self._send_pending_input()
-                
-                # 发送心跳包
-                self._send_heartbeat_if_needed()
+                if self.resuming:
+                    # 重连期间只发送恢复会话请求
+                    self._send_resume_if_needed()
+                else:
+                    # 发送待处理的输入
+                    self._send_pending_input()
+                    
+                    # 发送心跳包
+                    self._send_heartbeat_if_needed()
+
+                    # 合并发送本轮排队的输入和心跳
+                    self._flush_sends()
                 
-                # 接收消息
-                try:
-                    data, addr = self.client_socket.recvfrom(8192)
-                    self._handle_server_message(data)
-                except socket.timeout:
-                    # 超时是正常的，继续循环
-                    pass
+                # 接收所有排队的消息到复用的缓冲区（超时返回空批次，继续循环）。
+                # 卡顿后积压的多个状态快照只完整处理最新的一个
+                batch = self.transport.receive_into(timeout=0.1)
+                if batch:
+                    self.last_receive_time = time.time()
+                dropped = []
+                payloads = latest_only(split_batch(batch), dropped=dropped)
+                self._handle_dropped_states(dropped)
+                for payload, addr in payloads:
+                    tracer.instant("packet_recv", "net", {"bytes": len(payload)})
+                    with tracer.span("handle_message", "callback"):
+                        self._handle_server_message(payload)
+
+                self._check_host_silence()
                 
             except Exception as e:
+                if self.running and self._can_resume():
+                    # 短暂的网络错误不结束对局，携带会话令牌重连
+                    if self.resuming:
+                        time.sleep(self.resume_retry_interval)
+                    else:
+                        self._begin_resume(f"网络错误: {e}")
+                    self._check_host_silence()
+                    continue
                 if self.running:
                     # 检查是否是连接被强制关闭的错误
                     if "10054" in str(e) or "远程主机强迫关闭" in str(e):
@@ -242,37 +306,128 @@ class GameClient:
             if self.pending_key_presses or self.pending_key_releases:
                 message = MessageFactory.create_player_input(
                     self.pending_key_presses.copy(),
-                    self.pending_key_releases.copy()
+                    self.pending_key_releases.copy(),
+                    view_time=self.last_state_time
                 )
                 
                 # 清空待处理列表
                 self.pending_key_presses.clear()
                 self.pending_key_releases.clear()
                 
-                # 发送消息
-                try:
-                    self.client_socket.sendto(message.to_bytes(), self.host_address)
-                except Exception as e:
-                    print(f"发送输入失败: {e}")
+                # 排队，本轮网络循环结束前与心跳合并发送
+                self.send_batcher.queue(self.host_address, message.to_bytes())
     
     def _send_heartbeat_if_needed(self):
         """根据需要发送心跳包"""
         current_time = time.time()
         if current_time - self.last_heartbeat > self.heartbeat_interval:
+            heartbeat = MessageFactory.create_heartbeat()
+            self.send_batcher.queue(self.host_address, heartbeat.to_bytes())
+            self.last_heartbeat = current_time
+
+    def _can_resume(self) -> bool:
+        """是否可以恢复会话（观众没有会话令牌）"""
+        return bool(self.session_token) and not self.spectator
+
+    def _check_host_silence(self):
+        """主机长时间无响应时开始重连，超过恢复窗口时断开"""
+        now = time.time()
+        if self.resuming:
+            if now > self.resume_deadline:
+                self.resuming = False
+                self._handle_connection_lost("重连超时")
+        elif now - self.last_receive_time > self.host_silence_timeout and self._can_resume():
+            self._begin_resume("主机无响应")
+
+    def _begin_resume(self, reason: str):
+        """进入重连状态：重新创建传输（地址可能已经变化），定期发送恢复请求"""
+        print(f"连接中断，尝试恢复会话: {reason}")
+        self.resuming = True
+        self.resume_deadline = time.time() + self.resume_window
+        self.last_resume_attempt = 0.0
+        self.send_batcher.clear()
+        with self.input_lock:
+            self.pending_key_presses.clear()
+            self.pending_key_releases.clear()
+            self.current_keys.clear()
+
+        old_transport = self.transport
+        try:
+            self.transport = self.network.create_transport()
+            if old_transport:
+                old_transport.close()
+        except Exception as e:
+            print(f"重新创建传输失败: {e}")
+
+        if self.interrupted_callback:
             try:
-                heartbeat = MessageFactory.create_heartbeat()
-                self.client_socket.sendto(heartbeat.to_bytes(), self.host_address)
-                self.last_heartbeat = current_time
+                self.interrupted_callback(reason)
             except Exception as e:
-                print(f"发送心跳失败: {e}")
+                print(f"连接中断回调失败: {e}")
+
+    def _send_resume_if_needed(self):
+        """按重试间隔发送恢复会话请求"""
+        now = time.time()
+        if now - self.last_resume_attempt < self.resume_retry_interval:
+            return
+        self.last_resume_attempt = now
+        request = MessageFactory.create_session_resume(self.session_token, self.player_id)
+        self.transport.send(request.to_bytes(), self.host_address)
+
+    def _handle_resume_response(self, message: NetworkMessage):
+        """处理恢复会话的响应"""
+        if not self.resuming:
+            return
+        if not message.data.get("success"):
+            self.resuming = False
+            self._handle_connection_lost(message.data.get("reason") or "会话已过期")
+            return
+
+        self.resuming = False
+        self.last_heartbeat = 0  # 立即发送心跳
+        print("会话已恢复")
+        if self.resumed_callback:
+            try:
+                self.resumed_callback()
+            except Exception as e:
+                print(f"会话恢复回调失败: {e}")
+
+    def send_lockstep_input(self, data: bytes):
+        """立即发送锁步输入包（不等待网络循环的合并发送）"""
+        if not self.connected or self.spectator or self.resuming:
+            return
+        try:
+            self.transport.send(data, self.host_address)
+        except Exception as e:
+            print(f"发送锁步输入失败: {e}")
+
+    def _flush_sends(self):
+        """合并发送排队的消息"""
+        try:
+            self.send_batcher.flush(lambda addr, data: self.transport.send(data, addr))
+        except Exception as e:
+            print(f"发送消息失败: {e}")
     
     def _handle_server_message(self, data: bytes):
         """处理服务器消息"""
+        if is_lockstep_packet(data):
+            if self.lockstep_input_callback:
+                self.lockstep_input_callback(bytes(data))
+            return
+
         try:
-            message = NetworkMessage.from_bytes(data)
+            with tracer.span("decode", "net"):
+                message = NetworkMessage.from_bytes(data)
 
             if message.type == MessageType.GAME_STATE:
                 self._handle_game_state(message)
+            elif message.type == MessageType.STATE_KEYFRAME:
+                self._handle_game_state(message)
+            elif message.type == MessageType.ROLLBACK_STATE:
+                if self.rollback_state_callback:
+                    self.rollback_state_callback(message.data)
+            elif message.type == MessageType.JOIN_RESPONSE and message.data.get("resumed"):
+                self._handle_resume_response(message)
             elif message.type == MessageType.GAME_START:
                 self._handle_game_start(message)
             elif message.type == MessageType.MAP_SYNC:
@@ -294,8 +449,24 @@ class GameClient:
             else:
                 print(f"处理服务器消息失败: {e}")
     
+    def _handle_dropped_states(self, payloads: list):
+        """把被较新快照取代的游戏状态交给 dropped_state 回调（按接收顺序）
+
+        子弹的生成/消失事件只在少数几个快照中重复发送，积压超过这个数量时只看最新的快照会永久丢失事件。
+        只有开启回调时才解码这些快照，且只解码不重新编码。
+        """
+        if not payloads or not self.dropped_state_callback:
+            return
+        for payload in payloads:
+            try:
+                self.dropped_state_callback(NetworkMessage.from_bytes(payload).data)
+            except Exception as e:
+                print(f"过时状态回调失败: {e}")
+
     def _handle_game_state(self, message: NetworkMessage):
         """处理游戏状态更新"""
+        if "game_time" in message.data:
+            self.last_state_time = message.data["game_time"]
         if self.game_state_callback:
             try:
                 self.game_state_callback(message.data)
@@ -1,27 +1,41 @@
 """
 游戏主机类 - 重构版
 
-专为1对1双人游戏设计的主机端网络管理
+专为1对1双人游戏设计的主机端网络管理。
+默认只接受1个客户端（主机自己是另一名玩家）；专用服务器模式下两名玩家都以客户端身份连接，
+此时使用 max_clients=2。
 """
 
-import socket
 import threading
 import time
 import uuid
 from typing import Optional, Callable, Dict, Any, Set
 from .messages import MessageFactory, NetworkMessage, MessageType
 from .room_discovery import RoomDiscovery
+from .transport import get_default_network
+from .spectator import SpectatorFeed, MAX_SPECTATORS, SPECTATOR_SYNC_RATE, SPECTATOR_DELAY
+from .batching import SendBatcher, pack_messages, split_batch
+from .session import SUSPEND_TIMEOUT, RESUME_WINDOW, new_session_token
+from .lockstep import is_lockstep_packet
+from .tracing import tracer
 
 
 class ClientInfo:
     """客户端信息类"""
     
-    def __init__(self, client_id: str, address: tuple, player_name: str):
+    def __init__(self, client_id: str, address: tuple, player_name: str,
+                 session_token: Optional[str] = None):
         self.client_id = client_id
         self.address = address
         self.player_name = player_name
         self.last_heartbeat = time.time()
         self.current_keys: Set[str] = set()
+        # 客户端画面对应的主机游戏时间（随输入上报，用于延迟补偿）
+        self.view_time: Optional[float] = None
+        # 会话恢复：断线期间玩家被挂起，携带令牌重新连接后恢复
+        self.session_token = session_token
+        self.suspended = False
+        self.suspended_at: Optional[float] = None
     
     def update_heartbeat(self):
         """更新心跳时间"""
@@ -35,48 +49,99 @@ class ClientInfo:
 class GameHost:
     """游戏主机类 - 重构版"""
     
-    def __init__(self, host_port: int = 12346):
+    def __init__(self, host_port: int = 12346, network=None, max_clients: int = 1,
+                 discovery_port: Optional[int] = None, max_spectators: int = MAX_SPECTATORS,
+                 spectator_rate: float = SPECTATOR_SYNC_RATE, spectator_delay: float = SPECTATOR_DELAY,
+                 multicast_group: Optional[str] = None, host_is_player: bool = True,
+                 batch_sends: bool = False):
         self.host_port = host_port
+        self.max_clients = max_clients
+        self.host_is_player = host_is_player  # 专用服务器的主机不占玩家名额
+        self.multicast_group = multicast_group
         self.running = False
         
         # 网络相关
-        self.host_socket = None
+        self.network = network or get_default_network()
+        self.transport = None
         self.network_thread = None
+
+        # 发送合并：由tick驱动的主机开启，tick内的消息排队，flush_sends() 时合并发送。
+        # 网络线程中的回复（加入响应、房间查询等）始终立即发送
+        self.send_batcher: Optional[SendBatcher] = SendBatcher() if batch_sends else None
         
         # 房间发现
-        self.room_discovery = RoomDiscovery(host_port - 1)  # 发现端口 = 游戏端口 - 1
+        # 发现端口默认 = 游戏端口 - 1；多房间服务器的所有房间共用一个发现端口
+        if discovery_port is None:
+            discovery_port = host_port - 1
+        self.room_discovery = RoomDiscovery(discovery_port, network=self.network, host_port=host_port,
+                                            multicast_group=multicast_group)
         self.room_name = ""
         
-        # 客户端管理（1对1模式，只有一个客户端）
-        self.client: Optional[ClientInfo] = None
+        # 客户端管理（按加入顺序保存，默认1对1模式只有一个客户端）
+        self.clients: Dict[str, ClientInfo] = {}
+
+        # 观众（只读连接，不占玩家名额）。修改时整体替换字典，发送线程遍历的始终是完整的快照
+        self.max_spectators = max_spectators
+        self.spectators: Dict[str, ClientInfo] = {}
+        self.spectator_feed = SpectatorFeed(spectator_rate, spectator_delay)
+        self.spectator_intro: list = []  # 对局进行中加入的观众立即收到的消息（已编码）
+        # 正常停止后继续发送延迟缓冲区剩余数据的线程
+        self.spectator_drain_thread: Optional[threading.Thread] = None
+        self._drain_stop = threading.Event()
+        
+        # 会话恢复
+        self.suspend_timeout = SUSPEND_TIMEOUT
+        self.resume_window = RESUME_WINDOW
         
         # 回调函数
         self.client_join_callback: Optional[Callable[[str, str], None]] = None
         self.client_leave_callback: Optional[Callable[[str, str], None]] = None
         self.input_received_callback: Optional[Callable[[str, list, list], None]] = None
         self.tank_selection_callback: Optional[Callable] = None
+        self.client_suspended_callback: Optional[Callable[[str], None]] = None
+        self.client_resumed_callback: Optional[Callable[[str], None]] = None
+        self.lockstep_input_callback: Optional[Callable[[str, bytes], None]] = None
     
+    @property
+    def client(self) -> Optional[ClientInfo]:
+        """第一个（1对1模式下唯一的）客户端"""
+        for client in self.clients.values():
+            return client
+        return None
+
+    @client.setter
+    def client(self, client_info: Optional[ClientInfo]):
+        self.clients = {client_info.client_id: client_info} if client_info else {}
+
     def set_callbacks(self, client_join: Callable = None, client_leave: Callable = None,
-                     input_received: Callable = None, tank_selection: Callable = None):
-        """设置回调函数"""
+                     input_received: Callable = None, tank_selection: Callable = None,
+                     client_suspended: Callable = None, client_resumed: Callable = None,
+                     lockstep_input: Callable = None):
+        """设置回调函数（lockstep_input：锁步模式下收到客户端的二进制输入包）"""
         self.client_join_callback = client_join
         self.client_leave_callback = client_leave
         self.input_received_callback = input_received
         self.tank_selection_callback = tank_selection
+        self.client_suspended_callback = client_suspended
+        self.client_resumed_callback = client_resumed
+        self.lockstep_input_callback = lockstep_input
     
     def start_hosting(self, room_name: str, host_name: str = "主机") -> bool:
         """开始主机服务"""
         if self.running:
             return False
+        # 上一次停止后还在给观众发送剩余数据时，立即结束并释放端口
+        self._stop_spectator_drain()
         
         self.room_name = room_name
         
         try:
-            # 创建UDP套接字
-            self.host_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.host_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.host_socket.bind(('', self.host_port))
-            self.host_socket.settimeout(0.1)
+            # 创建传输并绑定游戏端口（使用组播时加入组播组以接收房间查询）
+            if self.multicast_group:
+                self.transport = self.network.create_transport(self.host_port,
+                                                               multicast_group=self.multicast_group)
+            else:
+                self.transport = self.network.create_transport(self.host_port)
             
             self.running = True
             
@@ -85,6 +150,7 @@ class GameHost:
             self.network_thread.start()
             
             # 开始房间广播
+            self._update_room_occupancy()
             self.room_discovery.start_advertising(room_name, host_name)
             
             print(f"游戏主机已启动: {room_name} (端口 {self.host_port})")
@@ -96,77 +162,206 @@ class GameHost:
             return False
     
     def stop_hosting(self, force: bool = False):
-        """停止主机服务"""
+        """停止主机服务
+
+        正常停止时，观战延迟缓冲区中还没发出的数据（最后几秒的快照、决胜的一击和游戏结束消息）
+        由后台线程按延迟继续发送完，再通知观众断开；force为True时立即断开并丢弃这些数据。
+        """
         self.running = False
+        if force:
+            self._stop_spectator_drain()
         
         # 通知客户端断开连接
-        if self.client and not force:
+        if self.clients and not force:
             disconnect_msg = MessageFactory.create_disconnect("主机关闭")
             self._send_to_client(disconnect_msg)
+        if force and self.send_batcher:
+            self.send_batcher.clear()
+        self.flush_sends()
         
+        draining = not force and self._start_spectator_drain()
+        if not draining:
+            self._disconnect_spectators(force)
+
         # 停止房间广播
         self.room_discovery.stop_advertising()
         
-        # 关闭网络套接字
-        if self.host_socket:
+        # 关闭传输（观众数据发送完后由发送线程关闭）
+        if not draining:
+            self._close_transport()
+        
+        # 清理客户端信息
+        clients = list(self.clients.values())
+        self.clients = {}
+        if self.client_leave_callback:
+            for client in clients:
+                self.client_leave_callback(client.client_id, "主机关闭")
+        
+        print("游戏主机已停止")
+    
+    def _disconnect_spectators(self, force: bool = False):
+        """通知观众断开（force为True时不通知），清空观战数据"""
+        if self.spectators and not force:
+            data = MessageFactory.create_disconnect("主机关闭").to_bytes()
+            for spectator in self.spectators.values():
+                self._send_bytes(spectator.address, data)
+        self.spectators = {}
+        self.spectator_feed.reset()
+        self.spectator_intro = []
+
+    def _close_transport(self):
+        """关闭传输并等待网络线程结束"""
+        if self.transport:
             try:
-                self.host_socket.close()
+                self.transport.close()
             except:
                 pass
-            self.host_socket = None
+            self.transport = None
         
-        # 等待网络线程结束
         if self.network_thread:
             self.network_thread.join(timeout=1.0)
             self.network_thread = None
-        
-        # 清理客户端信息
-        if self.client and self.client_leave_callback:
-            self.client_leave_callback(self.client.client_id, "主机关闭")
-        self.client = None
-        
-        print("游戏主机已停止")
-    
+
+    def _start_spectator_drain(self) -> bool:
+        """观战缓冲区中还有数据时启动发送线程，返回是否正在发送"""
+        if self.spectator_drain_thread is not None and self.spectator_drain_thread.is_alive():
+            return True
+        if not self.spectators or not self.spectator_feed.pending_count():
+            return False
+        self._drain_stop.clear()
+        self.spectator_drain_thread = threading.Thread(target=self._drain_spectators, daemon=True)
+        self.spectator_drain_thread.start()
+        return True
+
+    def _stop_spectator_drain(self):
+        """立即结束观战数据的发送线程（剩余数据丢弃，不通知观众）"""
+        if self.spectator_drain_thread is None:
+            return
+        self._drain_stop.set()
+        self.spectator_drain_thread.join(timeout=1.0)
+        self.spectator_drain_thread = None
+
+    def _drain_spectators(self):
+        """主机停止后按观战频率继续发送到期的数据，发送完后通知观众断开并关闭传输"""
+        # 缓冲区中的数据都在停止前采样，最多再等一个观战延迟就全部到期
+        interval = self.spectator_feed.sync_interval or 0.1
+        deadline = time.perf_counter() + self.spectator_feed.delay + interval
+        while self.spectator_feed.pending_count() and time.perf_counter() < deadline:
+            if self._drain_stop.wait(interval):
+                break
+            self.flush_spectators()
+        self._disconnect_spectators(force=self._drain_stop.is_set())
+        self._close_transport()
+
     def get_current_player_count(self) -> int:
         """获取当前玩家数量"""
-        return 1 + (1 if self.client else 0)  # 主机 + 客户端
+        return (1 if self.host_is_player else 0) + len(self.clients)  # 主机 + 客户端
+
+    def get_max_player_count(self) -> int:
+        """获取房间最大玩家数量"""
+        return (1 if self.host_is_player else 0) + self.max_clients
+
+    def _update_room_occupancy(self):
+        """把当前人数同步到房间广播（人数变化时立即广播）"""
+        self.room_discovery.update_occupancy(self.get_current_player_count(),
+                                             self.get_max_player_count())
     
     def is_room_full(self) -> bool:
         """检查房间是否已满"""
-        return self.client is not None
+        return len(self.clients) >= self.max_clients
     
     def get_connected_players(self) -> list:
         """获取连接的玩家列表"""
         players = ["host"]  # 主机自己
-        if self.client:
-            players.append(self.client.client_id)
+        players.extend(self.clients.keys())
         return players
     
     def send_game_state(self, game_state: Dict[str, Any]):
-        """发送游戏状态给客户端"""
-        if not self.client:
+        """发送游戏状态给所有客户端"""
+        if not self.clients:
             return
         
         message = MessageFactory.create_game_state(
             tanks=game_state.get("tanks", []),
-            bullets=game_state.get("bullets", []),
-            scores=game_state.get("scores", {})
+            bullets=game_state.get("bullets"),
+            scores=game_state.get("scores", {}),
+            bullet_events=game_state.get("bullet_events"),
+            game_time=game_state.get("game_time")
         )
         self._send_to_client(message)
     
-    def send_to_client(self, message: NetworkMessage):
-        """发送消息给客户端"""
-        self._send_to_client(message)
+    def send_to_client(self, message: NetworkMessage, client_id: Optional[str] = None):
+        """发送消息给指定客户端（不指定时发送给所有客户端）"""
+        if client_id is None:
+            self._send_to_client(message)
+            return
+        client = self.clients.get(client_id)
+        if client:
+            self._queue_bytes(client.address, message.to_bytes())
     
-    def get_client_input(self) -> Set[str]:
+    def _get_client(self, client_id: Optional[str]) -> Optional[ClientInfo]:
+        if client_id is None:
+            return self.client
+        return self.clients.get(client_id)
+
+    def get_client_view_time(self, client_id: Optional[str] = None) -> Optional[float]:
+        """获取客户端最近上报的画面时间"""
+        client = self._get_client(client_id)
+        if client:
+            return client.view_time
+        return None
+
+    def get_client_input(self, client_id: Optional[str] = None) -> Set[str]:
         """获取客户端当前输入状态"""
-        if self.client:
-            return self.client.current_keys.copy()
+        client = self._get_client(client_id)
+        if client:
+            return client.current_keys.copy()
         return set()
     
+    def get_spectator_count(self) -> int:
+        """获取观众数量"""
+        return len(self.spectators)
+
+    def should_capture_spectator_state(self) -> bool:
+        """是否需要生成新的观战快照（没有观众时不生成）"""
+        return bool(self.spectators) and self.spectator_feed.should_capture()
+
+    def send_spectator_state(self, game_state: Dict[str, Any]):
+        """编码一个观战快照放入延迟缓冲区"""
+        message = MessageFactory.create_game_state(
+            tanks=game_state.get("tanks", []),
+            scores=game_state.get("scores", {}),
+            bullet_events=game_state.get("bullet_events"),
+            game_time=game_state.get("game_time")
+        )
+        self.spectator_feed.capture(message)
+
+    def send_to_spectators(self, message: NetworkMessage):
+        """发送事件消息给观众（与观战快照一起延迟）"""
+        if self.spectators:
+            self.spectator_feed.capture(message, is_snapshot=False)
+
+    def set_spectator_intro(self, messages: list):
+        """设置对局进行中加入的观众需要先收到的消息（地图同步、游戏开始）"""
+        self.spectator_intro = [message.to_bytes() for message in messages]
+
+    def flush_spectators(self) -> int:
+        """把到期的观战数据发送给所有观众，返回发送的数据报数量"""
+        due = self.spectator_feed.pop_due()
+        if not due:
+            return 0
+        # 开启发送合并时，到期的数据只合并一次，所有观众收到相同的数据报
+        if self.send_batcher:
+            due = pack_messages(due, self.send_batcher.mtu)
+        spectators = list(self.spectators.values())
+        for data in due:
+            for spectator in spectators:
+                self._send_bytes(spectator.address, data)
+        return len(due) * len(spectators)
+
     def broadcast_tank_selection_start(self):
         """广播坦克选择开始"""
-        if self.client:
+        if self.clients:
             message = MessageFactory.create_tank_selection_start()
             self._send_to_client(message)
     
@@ -174,13 +369,12 @@ class GameHost:
         """网络处理主循环"""
         while self.running:
             try:
-                # 接收消息
-                data, addr = self.host_socket.recvfrom(8192)
-                self._handle_client_message(data, addr)
+                # 接收所有排队的消息到复用的缓冲区（超时返回空批次，继续循环）
+                for payload, addr in split_batch(self.transport.receive_into(timeout=0.1)):
+                    tracer.instant("packet_recv", "net", {"bytes": len(payload)})
+                    with tracer.span("handle_message", "callback"):
+                        self._handle_client_message(payload, addr)
                 
-            except socket.timeout:
-                # 超时是正常的，继续循环
-                pass
             except Exception as e:
                 if self.running:
                     print(f"网络处理错误: {e}")
@@ -188,21 +382,48 @@ class GameHost:
             # 检查客户端超时
             self._check_client_timeout()
     
+    def _find_spectator_by_address(self, addr: Optional[tuple]) -> Optional[ClientInfo]:
+        """根据来源地址查找观众"""
+        if addr is None:
+            return None
+        for spectator in self.spectators.values():
+            if spectator.address == addr:
+                return spectator
+        return None
+
+    def _find_client_by_address(self, addr: Optional[tuple]) -> Optional[ClientInfo]:
+        """根据来源地址查找客户端（未提供地址时返回第一个客户端）"""
+        if addr is None:
+            return self.client
+        for client in self.clients.values():
+            if client.address == addr:
+                return client
+        return None
+
     def _handle_client_message(self, data: bytes, addr: tuple):
         """处理客户端消息"""
+        if is_lockstep_packet(data):
+            self._handle_lockstep_input(data, addr)
+            return
+
         try:
-            message = NetworkMessage.from_bytes(data)
+            with tracer.span("decode", "net"):
+                message = NetworkMessage.from_bytes(data)
             
             if message.type == MessageType.JOIN_REQUEST:
                 self._handle_join_request(message, addr)
             elif message.type == MessageType.PLAYER_INPUT:
-                self._handle_player_input(message)
+                self._handle_player_input(message, addr)
             elif message.type == MessageType.HEARTBEAT:
-                self._handle_heartbeat(message)
+                self._handle_heartbeat(message, addr)
             elif message.type == MessageType.DISCONNECT:
-                self._handle_client_disconnect(message)
+                self._handle_client_disconnect(message, addr)
             elif message.type == MessageType.TANK_SELECTED:
                 self._handle_tank_selection(message)
+            elif message.type == MessageType.ROOM_QUERY:
+                self.room_discovery.answer_query(self.transport, addr)
+            elif message.type == MessageType.SESSION_RESUME:
+                self._handle_session_resume(message, addr)
             
         except Exception as e:
             print(f"处理客户端消息失败: {e}")
@@ -210,7 +431,19 @@ class GameHost:
     def _handle_join_request(self, message: NetworkMessage, addr: tuple):
         """处理加入请求"""
         player_name = message.data.get("player_name", "未知玩家")
+
+        if message.data.get("spectator"):
+            self._handle_spectate_request(player_name, addr)
+            return
         
+        # 同一地址重复发送加入请求（响应丢失），重发响应
+        existing = self._find_client_by_address(addr) if self.clients else None
+        if existing is not None:
+            response = MessageFactory.create_join_response(True, existing.client_id,
+                                                           session_token=existing.session_token)
+            self._send_to_address(addr, response)
+            return
+
         # 检查是否已满员
         if self.is_room_full():
             response = MessageFactory.create_join_response(
@@ -223,53 +456,157 @@ class GameHost:
         client_id = f"client_{uuid.uuid4().hex[:8]}"
         
         # 创建客户端信息
-        self.client = ClientInfo(client_id, addr, player_name)
+        client = ClientInfo(client_id, addr, player_name, session_token=new_session_token())
+        self.clients[client_id] = client
         
-        # 发送成功响应
-        response = MessageFactory.create_join_response(True, client_id)
+        # 发送成功响应（带会话令牌）
+        response = MessageFactory.create_join_response(True, client_id,
+                                                       session_token=client.session_token)
         self._send_to_address(addr, response)
         
         print(f"玩家 {player_name} ({client_id}) 加入游戏")
+        self._update_room_occupancy()
         
         # 通知游戏逻辑
         if self.client_join_callback:
             self.client_join_callback(client_id, player_name)
     
-    def _handle_player_input(self, message: NetworkMessage):
+    def _handle_spectate_request(self, player_name: str, addr: tuple):
+        """处理观战请求"""
+        spectator = self._find_spectator_by_address(addr)
+        if spectator is None:
+            if len(self.spectators) >= self.max_spectators:
+                response = MessageFactory.create_join_response(False, reason="观众已满", spectator=True)
+                self._send_to_address(addr, response)
+                return
+            spectator = ClientInfo(f"spectator_{uuid.uuid4().hex[:8]}", addr, player_name)
+            self.spectators = {**self.spectators, spectator.client_id: spectator}
+            print(f"观众 {player_name} ({spectator.client_id}) 开始观战")
+
+        response = MessageFactory.create_join_response(True, spectator.client_id, spectator=True)
+        self._send_to_address(addr, response)
+        for data in self.spectator_intro:
+            self._send_bytes(addr, data)
+
+    def _remove_spectator(self, spectator_id: str, reason: str):
+        """移除观众"""
+        if spectator_id in self.spectators:
+            self.spectators = {sid: info for sid, info in self.spectators.items() if sid != spectator_id}
+            print(f"观众 {spectator_id} 离开 ({reason})")
+
+    def _handle_player_input(self, message: NetworkMessage, addr: Optional[tuple] = None):
         """处理玩家输入"""
-        if not self.client:
+        client = self._find_client_by_address(addr)
+        if not client:
             return
         
-        # 更新客户端心跳
-        self.client.update_heartbeat()
+        # 更新客户端心跳（挂起的玩家从原地址恢复通信时自动恢复）
+        client.update_heartbeat()
+        if client.suspended:
+            self._resume_client(client, client.address)
         
         # 处理输入
         keys_pressed = message.data.get("keys_pressed", [])
         keys_released = message.data.get("keys_released", [])
+        if "view_time" in message.data:
+            client.view_time = message.data["view_time"]
         
         # 更新当前按键状态
         for key in keys_pressed:
-            self.client.current_keys.add(key)
+            client.current_keys.add(key)
         for key in keys_released:
-            self.client.current_keys.discard(key)
+            client.current_keys.discard(key)
         
         # 通知游戏逻辑
         if self.input_received_callback:
-            self.input_received_callback(self.client.client_id, keys_pressed, keys_released)
+            self.input_received_callback(client.client_id, keys_pressed, keys_released)
     
-    def _handle_heartbeat(self, message: NetworkMessage):
+    def _handle_lockstep_input(self, data: bytes, addr: Optional[tuple] = None):
+        """处理锁步输入包（二进制，不经过JSON解码）"""
+        client = self._find_client_by_address(addr)
+        if not client:
+            return
+
+        client.update_heartbeat()
+        if client.suspended:
+            self._resume_client(client, client.address)
+
+        if self.lockstep_input_callback:
+            self.lockstep_input_callback(client.client_id, bytes(data))
+
+    def send_lockstep_input(self, data: bytes, client_id: Optional[str] = None):
+        """发送锁步输入包（不指定时发送给所有客户端）"""
+        clients = [self.clients.get(client_id)] if client_id else list(self.clients.values())
+        for client in clients:
+            if client and not client.suspended:
+                self._queue_bytes(client.address, data)
+
+    def _handle_heartbeat(self, message: NetworkMessage, addr: Optional[tuple] = None):
         """处理心跳包"""
-        if self.client:
-            self.client.update_heartbeat()
+        client = self._find_client_by_address(addr) or self._find_spectator_by_address(addr)
+        if client:
+            client.update_heartbeat()
+            if client.suspended:
+                self._resume_client(client, client.address)
+            # 回应心跳，客户端据此判断主机是否仍然可达
+            if addr is not None:
+                self._send_to_address(addr, MessageFactory.create_heartbeat())
+
+    def _handle_session_resume(self, message: NetworkMessage, addr: tuple):
+        """处理恢复会话请求（客户端断线后可能从新的地址发送）"""
+        token = message.data.get("session_token")
+        client = next((c for c in self.clients.values() if token and c.session_token == token), None)
+        if client is None:
+            response = MessageFactory.create_join_response(False, reason="会话已过期", resumed=True)
+            self._send_to_address(addr, response)
+            return
+
+        self._resume_client(client, addr)
+        response = MessageFactory.create_join_response(True, client.client_id,
+                                                       session_token=client.session_token,
+                                                       resumed=True)
+        self._send_to_address(addr, response)
+
+    def _suspend_client(self, client: ClientInfo):
+        """挂起无响应的玩家：松开所有按键，保留会话等待恢复"""
+        client.suspended = True
+        client.suspended_at = time.time()
+        released = list(client.current_keys)
+        client.current_keys.clear()
+        print(f"客户端 {client.client_id} 无响应，挂起等待恢复")
+
+        if released and self.input_received_callback:
+            self.input_received_callback(client.client_id, [], released)
+        if self.client_suspended_callback:
+            self.client_suspended_callback(client.client_id)
+
+    def _resume_client(self, client: ClientInfo, addr: tuple):
+        """恢复玩家会话（更新地址），由游戏逻辑发送关键帧"""
+        was_suspended = client.suspended
+        client.address = addr
+        client.suspended = False
+        client.suspended_at = None
+        client.update_heartbeat()
+        print(f"客户端 {client.client_id} 恢复连接" + ("" if was_suspended else "（未挂起）"))
+
+        if self.client_resumed_callback:
+            self.client_resumed_callback(client.client_id)
     
-    def _handle_client_disconnect(self, message: NetworkMessage):
+    def _handle_client_disconnect(self, message: NetworkMessage, addr: Optional[tuple] = None):
         """处理客户端断开连接"""
-        if self.client:
+        spectator = self._find_spectator_by_address(addr)
+        if spectator:
+            self._remove_spectator(spectator.client_id, message.data.get("reason", "客户端断开"))
+            return
+
+        client = self._find_client_by_address(addr)
+        if client:
             reason = message.data.get("reason", "客户端断开")
-            client_id = self.client.client_id
+            client_id = client.client_id
             
             # 清理客户端
-            self.client = None
+            self.clients.pop(client_id, None)
+            self._update_room_occupancy()
             
             print(f"客户端 {client_id} 断开连接: {reason}")
             
@@ -284,23 +621,56 @@ class GameHost:
     
     def _check_client_timeout(self):
         """检查客户端超时"""
-        if self.client and self.client.is_timeout():
-            print(f"客户端 {self.client.client_id} 超时断开")
+        for spectator in list(self.spectators.values()):
+            if spectator.is_timeout():
+                self._remove_spectator(spectator.client_id, "超时")
+
+        for client in list(self.clients.values()):
+            if not client.suspended:
+                # 短暂无响应先挂起，保留会话
+                if client.is_timeout(self.suspend_timeout):
+                    self._suspend_client(client)
+                continue
+            if time.time() - client.suspended_at <= self.resume_window:
+                continue
+            print(f"客户端 {client.client_id} 超时断开")
             
-            client_id = self.client.client_id
-            self.client = None
+            client_id = client.client_id
+            self.clients.pop(client_id, None)
+            self._update_room_occupancy()
             
             if self.client_leave_callback:
                 self.client_leave_callback(client_id, "超时")
     
     def _send_to_client(self, message: NetworkMessage):
-        """发送消息给客户端"""
-        if self.client:
-            self._send_to_address(self.client.address, message)
+        """发送消息给所有客户端"""
+        if not self.clients:
+            return
+        data = message.to_bytes()
+        for client in list(self.clients.values()):
+            if not client.suspended:
+                self._queue_bytes(client.address, data)
     
     def _send_to_address(self, addr: tuple, message: NetworkMessage):
         """发送消息到指定地址"""
+        self._send_bytes(addr, message.to_bytes())
+
+    def _queue_bytes(self, addr: tuple, data: bytes):
+        """开启发送合并时排队到本tick结束，否则立即发送"""
+        if self.send_batcher:
+            self.send_batcher.queue(addr, data)
+        else:
+            self._send_bytes(addr, data)
+
+    def flush_sends(self) -> int:
+        """合并发送本tick排队的消息（每个tick结束时调用），返回发送的数据报数量"""
+        if not self.send_batcher or not self.transport:
+            return 0
+        return self.send_batcher.flush(self._send_bytes)
+
+    def _send_bytes(self, addr: tuple, data: bytes):
+        """发送已编码的数据到指定地址"""
         try:
-            self.host_socket.sendto(message.to_bytes(), addr)
+            self.transport.send(data, addr)
         except Exception as e:
             print(f"发送消息失败: {e}")
@@ -0,0 +1,305 @@
+"""
+网络损伤模拟模块
+
+在传输层外面包一层，模拟真实网络的各种问题，用于在本机测试同步逻辑：
+- 固定延迟和抖动
+- 随机丢包和突发丢包（Gilbert-Elliott 两状态模型）
+- 重复包
+- 乱序
+- 带宽限制（超出队列上限的数据报被丢弃）
+
+所有随机决策使用带种子的随机数生成器，相同种子下丢包/重复/乱序的决策序列可复现。
+
+使用方法：
+1. 测试中：ImpairedNetwork(LoopbackNetwork(), NetworkImpairment(latency=0.05, loss=0.02, seed=1))
+2. 运行游戏时：设置环境变量 TANK_NET_IMPAIRMENT，值为预设名称或参数列表，例如
+   TANK_NET_IMPAIRMENT=wifi
+   TANK_NET_IMPAIRMENT="latency_ms=80,jitter_ms=20,loss=0.02,burst_loss=0.01,seed=7"
+"""
+
+import heapq
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .transport import Transport, DEFAULT_BATCH_SIZE
+
+# 选择网络损伤配置的环境变量
+IMPAIRMENT_ENV_VAR = "TANK_NET_IMPAIRMENT"
+
+
+class NetworkImpairment:
+    """网络损伤配置（时间单位为秒，带宽单位为字节/秒）"""
+
+    # 预定义的网络环境
+    PRESETS = {
+        "lan": {"latency": 0.001, "jitter": 0.0005},
+        "wifi": {"latency": 0.015, "jitter": 0.01, "loss": 0.005, "burst_loss": 0.002,
+                 "burst_length": 3},
+        "internet": {"latency": 0.04, "jitter": 0.01, "loss": 0.01, "reorder": 0.005},
+        "mobile": {"latency": 0.08, "jitter": 0.03, "loss": 0.02, "burst_loss": 0.01,
+                   "burst_length": 5, "duplicate": 0.005, "reorder": 0.01,
+                   "bandwidth": 64 * 1024},
+    }
+
+    # 环境变量中使用毫秒的参数
+    _MS_KEYS = {"latency_ms": "latency", "jitter_ms": "jitter",
+                "reorder_delay_ms": "reorder_delay", "queue_limit_ms": "queue_limit"}
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, loss: float = 0.0,
+                 burst_loss: float = 0.0, burst_length: float = 4.0,
+                 duplicate: float = 0.0, reorder: float = 0.0, reorder_delay: float = 0.02,
+                 bandwidth: float = 0.0, queue_limit: float = 0.5, seed: Optional[int] = None):
+        """
+        Args:
+            latency: 单向固定延迟
+            jitter: 延迟抖动幅度（在 ±jitter 内均匀分布，不会导致乱序）
+            loss: 随机丢包率
+            burst_loss: 每个数据报进入突发丢包状态的概率
+            burst_length: 突发丢包的平均长度（数据报个数）
+            duplicate: 重复包概率
+            reorder: 乱序概率（被选中的数据报额外延迟 reorder_delay，被后面的包超过）
+            reorder_delay: 乱序数据报的额外延迟
+            bandwidth: 带宽上限，0 表示不限制
+            queue_limit: 带宽受限时发送队列的最大排队时间，超出则丢弃
+            seed: 随机数种子
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.burst_loss = burst_loss
+        self.burst_length = max(burst_length, 1.0)
+        self.duplicate = duplicate
+        self.reorder = reorder
+        self.reorder_delay = reorder_delay
+        self.bandwidth = bandwidth
+        self.queue_limit = queue_limit
+        self.seed = seed
+
+    @classmethod
+    def from_preset(cls, name: str, seed: Optional[int] = None) -> 'NetworkImpairment':
+        """根据预设名称创建配置"""
+        if name not in cls.PRESETS:
+            raise ValueError(f"未知的网络预设: {name}")
+        return cls(seed=seed, **cls.PRESETS[name])
+
+    @classmethod
+    def from_spec(cls, spec: str) -> 'NetworkImpairment':
+        """解析配置字符串
+
+        格式为预设名称，或逗号分隔的 key=value 列表（可以以预设名称开头），例如
+        "mobile,seed=3" 或 "latency_ms=50,loss=0.05"
+        """
+        params: Dict[str, float] = {}
+        seed = None
+        for item in spec.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            if "=" not in item:
+                if item not in cls.PRESETS:
+                    raise ValueError(f"未知的网络预设: {item}")
+                params.update(cls.PRESETS[item])
+                continue
+
+            key, value = (part.strip() for part in item.split("=", 1))
+            if key == "seed":
+                seed = int(value)
+            elif key in cls._MS_KEYS:
+                params[cls._MS_KEYS[key]] = float(value) / 1000.0
+            elif key in ("loss", "burst_loss", "burst_length", "duplicate", "reorder", "bandwidth"):
+                params[key] = float(value)
+            else:
+                raise ValueError(f"未知的网络损伤参数: {key}")
+        return cls(seed=seed, **params)
+
+    def is_active(self) -> bool:
+        """是否有任何损伤效果"""
+        return any((self.latency, self.jitter, self.loss, self.burst_loss,
+                    self.duplicate, self.reorder, self.bandwidth))
+
+    def __repr__(self):
+        return (f"NetworkImpairment(latency={self.latency}, jitter={self.jitter}, loss={self.loss}, "
+                f"burst_loss={self.burst_loss}, burst_length={self.burst_length}, "
+                f"duplicate={self.duplicate}, reorder={self.reorder}, "
+                f"bandwidth={self.bandwidth}, seed={self.seed})")
+
+
+class ImpairedTransport(Transport):
+    """带网络损伤的传输，发送时应用损伤，接收直接透传"""
+
+    def __init__(self, network: 'ImpairedNetwork', inner: Transport):
+        self.network = network
+        self.inner = inner
+
+    def send(self, data: bytes, addr):
+        self.network.submit(self, bytes(data), addr)
+
+    def receive_batch(self, max_count: int = DEFAULT_BATCH_SIZE,
+                      timeout: Optional[float] = None) -> List[Tuple[bytes, tuple]]:
+        return self.inner.receive_batch(max_count, timeout)
+
+    def receive_into(self, max_count: int = DEFAULT_BATCH_SIZE,
+                     timeout: Optional[float] = None) -> List[Tuple[memoryview, tuple]]:
+        return self.inner.receive_into(max_count, timeout)
+
+    def close(self):
+        self.inner.close()
+
+    @property
+    def local_address(self):
+        return self.inner.local_address
+
+
+class ImpairedNetwork:
+    """包装另一个网络对象，对其创建的所有传输应用网络损伤
+
+    延迟发送的数据报由一个后台线程按到期时间发出。
+    """
+
+    def __init__(self, inner_network, impairment: NetworkImpairment):
+        self.inner_network = inner_network
+        self.impairment = impairment
+        self.rng = random.Random(impairment.seed)
+
+        self._lock = threading.Condition()
+        self._queue = []  # 堆: (到期时间, 序号, 传输, 数据, 地址)
+        self._sequence = 0
+        self._thread: Optional[threading.Thread] = None
+        self._in_burst = False
+        self._last_due: Dict[tuple, float] = {}   # 每个目标地址最近一个按序数据报的到期时间
+        self._link_free_at = 0.0                  # 带宽受限时链路空闲的时刻
+
+        # 统计信息
+        self.stats = {"sent": 0, "dropped": 0, "burst_dropped": 0, "queue_dropped": 0,
+                      "duplicated": 0, "reordered": 0, "delivered": 0}
+
+    def create_transport(self, port: Optional[int] = None, broadcast: bool = False,
+                         **kwargs) -> ImpairedTransport:
+        inner = self.inner_network.create_transport(port, broadcast, **kwargs)
+        return ImpairedTransport(self, inner)
+
+    def submit(self, transport: ImpairedTransport, data: bytes, addr):
+        """对一个待发送的数据报应用损伤并安排发送"""
+        imp = self.impairment
+        now = time.perf_counter()
+        deliveries = []
+
+        with self._lock:
+            self.stats["sent"] += 1
+            if self._should_drop():
+                return
+
+            copies = 2 if imp.duplicate and self.rng.random() < imp.duplicate else 1
+            if copies > 1:
+                self.stats["duplicated"] += 1
+
+            for _ in range(copies):
+                departure = now
+                if imp.bandwidth > 0:
+                    start = max(now, self._link_free_at)
+                    if start - now > imp.queue_limit:
+                        self.stats["queue_dropped"] += 1
+                        continue
+                    departure = start + len(data) / imp.bandwidth
+                    self._link_free_at = departure
+
+                due = departure + imp.latency
+                if imp.jitter:
+                    due += self.rng.uniform(-imp.jitter, imp.jitter)
+
+                if imp.reorder and self.rng.random() < imp.reorder:
+                    # 乱序包额外延迟，不影响后续包的顺序约束，因此会被后面的包超过
+                    self.stats["reordered"] += 1
+                    due = max(due, now) + imp.reorder_delay
+                else:
+                    # 抖动不应导致乱序：按序包不早于同一目标的上一个按序包
+                    due = max(due, now, self._last_due.get(addr, 0.0))
+                    self._last_due[addr] = due
+                deliveries.append(due)
+
+            if not deliveries:
+                return
+
+            if all(due <= now for due in deliveries):
+                # 无延迟时直接发送，不经过后台线程
+                pass
+            else:
+                for due in deliveries:
+                    self._sequence += 1
+                    heapq.heappush(self._queue, (due, self._sequence, transport, data, addr))
+                self._ensure_thread()
+                self._lock.notify()
+                return
+
+        for _ in deliveries:
+            self._deliver(transport, data, addr)
+
+    def _should_drop(self) -> bool:
+        """丢包决策（调用时已持有锁）"""
+        imp = self.impairment
+        if self._in_burst:
+            if self.rng.random() < 1.0 / imp.burst_length:
+                self._in_burst = False
+            else:
+                self.stats["dropped"] += 1
+                self.stats["burst_dropped"] += 1
+                return True
+        elif imp.burst_loss and self.rng.random() < imp.burst_loss:
+            self._in_burst = True
+            self.stats["dropped"] += 1
+            self.stats["burst_dropped"] += 1
+            return True
+
+        if imp.loss and self.rng.random() < imp.loss:
+            self.stats["dropped"] += 1
+            return True
+        return False
+
+    def _deliver(self, transport: ImpairedTransport, data: bytes, addr):
+        try:
+            transport.inner.send(data, addr)
+            with self._lock:
+                self.stats["delivered"] += 1
+        except Exception:
+            # 传输已关闭等情况，与网络上丢失等价
+            pass
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._delivery_loop, daemon=True)
+            self._thread.start()
+
+    def _delivery_loop(self):
+        """按到期时间发送延迟的数据报"""
+        while True:
+            with self._lock:
+                while not self._queue:
+                    if not self._lock.wait(timeout=1.0) and not self._queue:
+                        # 空闲一段时间后退出，下次有延迟数据报时重新启动
+                        self._thread = None
+                        return
+                due, _, transport, data, addr = self._queue[0]
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    self._lock.wait(timeout=wait)
+                    continue
+                heapq.heappop(self._queue)
+            self._deliver(transport, data, addr)
+
+    def pending_count(self) -> int:
+        """尚未发出的延迟数据报数量"""
+        with self._lock:
+            return len(self._queue)
+
+
+def network_from_environment(inner_network):
+    """根据环境变量包装网络对象，未设置时原样返回"""
+    spec = os.environ.get(IMPAIRMENT_ENV_VAR, "").strip()
+    if not spec:
+        return inner_network
+    impairment = NetworkImpairment.from_spec(spec)
+    print(f"⚠️ 已启用网络损伤模拟: {impairment}")
+    return ImpairedNetwork(inner_network, impairment)
@@ -0,0 +1,213 @@
+"""
+服务器端延迟补偿模块
+
+客户端看到的主机坦克位置比主机当前位置滞后约半个RTT加上快照间隔。
+主机端保存一小段坦克位置历史，当客户端开火时：
+- 根据客户端上报的画面时间（已应用的最新快照的游戏时间）回退坦克位置
+- 在回退后的位置上对子弹前一段飞行路径做命中检测
+- 未命中时把子弹推进到当前时刻，避免同一段路径被再次检测（目标当前的位置挡在路径上时除外）
+
+回退时间有上限，避免高延迟玩家"打中过去很久的位置"。
+"""
+
+import math
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import pymunk
+
+from tank_sprites import COLLISION_TYPE_WALL
+
+# 最大回退时间(秒)
+MAX_REWIND_TIME = 0.2
+# 每个坦克保留的历史记录数（60Hz下约1秒）
+HISTORY_SIZE = 64
+# 回退检测时的子步长(秒)
+REWIND_SUBSTEP = 1 / 60
+
+
+def _lerp_angle(a: float, b: float, t: float) -> float:
+    """角度插值（度），处理360度回绕"""
+    diff = (b - a + 180.0) % 360.0 - 180.0
+    return a + diff * t
+
+
+def segment_hits_box(start: Tuple[float, float], end: Tuple[float, float],
+                     half_x: float, half_y: float) -> Optional[float]:
+    """检测局部坐标系中的线段是否与以原点为中心的矩形相交
+
+    Returns:
+        相交时返回线段参数 t (0~1)，否则返回 None
+    """
+    t_min, t_max = 0.0, 1.0
+    for s, e, half in ((start[0], end[0], half_x), (start[1], end[1], half_y)):
+        d = e - s
+        if abs(d) < 1e-9:
+            if s < -half or s > half:
+                return None
+            continue
+        t1 = (-half - s) / d
+        t2 = (half - s) / d
+        if t1 > t2:
+            t1, t2 = t2, t1
+        t_min = max(t_min, t1)
+        t_max = min(t_max, t2)
+        if t_min > t_max:
+            return None
+    return t_min
+
+
+def _segment_hits_tank(p0: Tuple[float, float], p1: Tuple[float, float],
+                       transform: Tuple[float, float, float], half_x: float, half_y: float) -> bool:
+    """检测世界坐标中的线段是否与处于 transform (x, y, Arcade角度) 的坦克矩形相交"""
+    tank_x, tank_y, tank_angle = transform
+    d0 = (p0[0] - tank_x, p0[1] - tank_y)
+    d1 = (p1[0] - tank_x, p1[1] - tank_y)
+
+    # 转换到坦克的局部坐标系（Pymunk角度 = 90 - Arcade角度）
+    body_angle = math.radians(90 - tank_angle)
+    cos_a, sin_a = math.cos(-body_angle), math.sin(-body_angle)
+    local0 = (d0[0] * cos_a - d0[1] * sin_a, d0[0] * sin_a + d0[1] * cos_a)
+    local1 = (d1[0] * cos_a - d1[1] * sin_a, d1[0] * sin_a + d1[1] * cos_a)
+    return segment_hits_box(local0, local1, half_x, half_y) is not None
+
+
+class TransformHistory:
+    """坦克位置历史环形缓冲区"""
+
+    def __init__(self, size: int = HISTORY_SIZE):
+        self.samples = deque(maxlen=size)  # (game_time, x, y, angle)
+
+    def record(self, game_time: float, x: float, y: float, angle: float):
+        """记录一个时刻的坦克位置（时间需单调递增）"""
+        if self.samples and game_time <= self.samples[-1][0]:
+            self.samples[-1] = (game_time, x, y, angle)
+            return
+        self.samples.append((game_time, x, y, angle))
+
+    def clear(self):
+        self.samples.clear()
+
+    def sample(self, game_time: float) -> Optional[Tuple[float, float, float]]:
+        """获取指定时刻的坦克位置（线性插值），超出范围时取最近的记录"""
+        if not self.samples:
+            return None
+
+        first = self.samples[0]
+        last = self.samples[-1]
+        if game_time <= first[0]:
+            return first[1], first[2], first[3]
+        if game_time >= last[0]:
+            return last[1], last[2], last[3]
+
+        # 从最新记录向前查找（回退时间通常很短）
+        for i in range(len(self.samples) - 1, 0, -1):
+            prev = self.samples[i - 1]
+            if prev[0] <= game_time:
+                curr = self.samples[i]
+                span = curr[0] - prev[0]
+                t = (game_time - prev[0]) / span if span > 0 else 1.0
+                return (prev[1] + (curr[1] - prev[1]) * t,
+                        prev[2] + (curr[2] - prev[2]) * t,
+                        _lerp_angle(prev[3], curr[3], t))
+        return first[1], first[2], first[3]
+
+
+class LagCompensator:
+    """主机端延迟补偿器"""
+
+    def __init__(self, max_rewind: float = MAX_REWIND_TIME, history_size: int = HISTORY_SIZE):
+        self.max_rewind = max_rewind
+        self.history_size = history_size
+        self.histories: Dict[str, TransformHistory] = {}
+        self.rewound_hits = 0
+
+    def reset(self):
+        """清空所有历史（新游戏开始时调用）"""
+        self.histories.clear()
+        self.rewound_hits = 0
+
+    def record(self, game_time: float, player_list):
+        """记录当前所有坦克的位置"""
+        if player_list is None:
+            return
+        for tank in player_list:
+            if tank is None:
+                continue
+            player_id = getattr(tank, 'player_id', None)
+            if player_id is None:
+                continue
+            history = self.histories.get(player_id)
+            if history is None:
+                history = TransformHistory(self.history_size)
+                self.histories[player_id] = history
+            history.record(game_time, tank.center_x, tank.center_y, tank.angle)
+
+    def rewind_time(self, now: float, view_time: Optional[float]) -> float:
+        """计算需要回退的时间（限制在最大回退窗口内）"""
+        if view_time is None:
+            return 0.0
+        return min(max(now - view_time, 0.0), self.max_rewind)
+
+    def find_rewound_hit(self, bullet, target_tank, now: float, view_time: Optional[float],
+                         space=None) -> Tuple[bool, float]:
+        """在回退的坦克位置上检测子弹前一段路径是否命中
+
+        Args:
+            bullet: 刚发射的子弹（物理体位于炮口）
+            target_tank: 被射击的坦克
+            now: 主机当前游戏时间
+            view_time: 客户端开火时画面对应的游戏时间
+            space: 物理空间，用于检测路径上的墙壁（可选）
+
+        Returns:
+            (是否命中, 回退时间)
+        """
+        rewind = self.rewind_time(now, view_time)
+        history = self.histories.get(getattr(target_tank, 'player_id', None))
+        body = bullet.pymunk_body
+        if rewind <= 0 or history is None or body is None or target_tank.pymunk_shape is None:
+            return False, rewind
+
+        start = (body.position.x, body.position.y)
+        velocity = (body.velocity.x, body.velocity.y)
+        end = (start[0] + velocity[0] * rewind, start[1] + velocity[1] * rewind)
+
+        # 墙壁是静态的，路径上遇到墙壁则只检测墙壁之前的部分
+        path_fraction = 1.0
+        if space is not None:
+            for info in space.segment_query(start, end, bullet.radius, pymunk.ShapeFilter()):
+                if info.shape is not None and info.shape.collision_type == COLLISION_TYPE_WALL:
+                    path_fraction = min(path_fraction, info.alpha)
+
+        vertices = target_tank.pymunk_shape.get_vertices()
+        half_x = max(abs(v.x) for v in vertices) + bullet.radius
+        half_y = max(abs(v.y) for v in vertices) + bullet.radius
+
+        view_start = now - rewind
+        steps = max(1, int(math.ceil(rewind / REWIND_SUBSTEP)))
+        step_time = rewind / steps
+        for i in range(steps):
+            t0 = i / steps
+            t1 = min((i + 1) / steps, path_fraction)
+            if t0 >= path_fraction:
+                break
+
+            transform = history.sample(view_start + i * step_time)
+            if transform is None:
+                break
+
+            p0 = (start[0] + (end[0] - start[0]) * t0, start[1] + (end[1] - start[1]) * t0)
+            p1 = (start[0] + (end[0] - start[0]) * t1, start[1] + (end[1] - start[1]) * t1)
+            if _segment_hits_tank(p0, p1, transform, half_x, half_y):
+                self.rewound_hits += 1
+                return True, rewind
+
+        # 未命中且路径上没有墙壁：把子弹推进到当前时刻，避免对同一段路径重复检测。
+        # 目标当前的位置在这段路径上时不推进（近距离时会直接穿过），交给物理步进处理
+        current = (target_tank.center_x, target_tank.center_y, target_tank.angle)
+        if path_fraction >= 1.0 and not _segment_hits_tank(start, end, current, half_x, half_y):
+            body.position = end
+            bullet.sync_with_pymunk_body()
+        return False, rewind
+
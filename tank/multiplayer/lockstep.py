@@ -0,0 +1,275 @@
+"""
+锁步同步模块
+
+局域网对局的另一种同步方式，与主机权威的状态快照并列（SYNC_SNAPSHOT / SYNC_LOCKSTEP）：
+- 双方运行同一份 GameView 物理模拟，以固定步长 LOCKSTEP_TICK_DT 推进，
+  不再发送世界状态，每个tick只交换双方的按键位掩码（W/S/A/D/SPACE 各占一位）
+- 本地输入延迟 INPUT_DELAY_TICKS 个tick后生效，在这段时间内送达对方，
+  双方在同一个tick按相同顺序应用相同的输入，两名玩家的操作延迟相同
+- 某个tick还没有收到对方的输入时停下等待（不预测），保证双方状态一致
+- 输入包携带对方尚未确认的全部输入，丢包后下一个包自动补齐，不需要单独重传
+- 地图由主机下发的随机种子选择（get_random_map_layout 使用同一个种子）
+
+输入包格式（二进制，首字节与JSON消息的 '{' 和合并数据报的 BATCH_MAGIC 区分）：
+    LOCKSTEP_MAGIC(1字节) + 确认tick(4字节) + 起始tick(4字节) + 位掩码(1字节) * N
+
+确认tick表示发送方已收到对方在该tick之前的全部输入。
+"""
+
+import struct
+import threading
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+# 同步方式
+SYNC_SNAPSHOT = "snapshot"
+SYNC_LOCKSTEP = "lockstep"
+SYNC_ROLLBACK = "rollback"  # 见 rollback.py
+
+# 锁步输入包的标记字节
+LOCKSTEP_MAGIC = 0xB8
+# 固定的模拟频率和步长
+LOCKSTEP_TICK_RATE = 60
+LOCKSTEP_TICK_DT = 1.0 / LOCKSTEP_TICK_RATE
+# 本地输入延迟的tick数（60Hz下为50ms，覆盖局域网的往返延迟）
+INPUT_DELAY_TICKS = 3
+# 一个输入包最多携带的tick数
+MAX_INPUTS_PER_PACKET = 64
+# 一帧内最多追赶的tick数，卡顿后不会长时间连续模拟
+MAX_CATCH_UP_TICKS = 5
+
+# 按键对应的位
+KEY_BITS = {
+    "W": 0x01,
+    "S": 0x02,
+    "A": 0x04,
+    "D": 0x08,
+    "SPACE": 0x10,
+}
+
+_HEADER = struct.Struct("!BII")
+
+
+def keys_to_mask(keys: Iterable[str]) -> int:
+    """把按下的按键集合转换为位掩码（未知按键忽略）"""
+    mask = 0
+    for key in keys:
+        mask |= KEY_BITS.get(key, 0)
+    return mask
+
+
+def mask_to_keys(mask: int) -> List[str]:
+    """把位掩码转换为按键列表（按 KEY_BITS 的固定顺序）"""
+    return [key for key, bit in KEY_BITS.items() if mask & bit]
+
+
+def encode_inputs(ack_tick: int, start_tick: int, masks: List[int]) -> bytes:
+    """编码输入包"""
+    return _HEADER.pack(LOCKSTEP_MAGIC, ack_tick, start_tick) + bytes(masks)
+
+
+def decode_inputs(data: bytes) -> Tuple[int, int, List[int]]:
+    """解码输入包，返回 (确认tick, 起始tick, 位掩码列表)
+
+    Raises:
+        ValueError: 不是锁步输入包或长度不足
+    """
+    if len(data) < _HEADER.size or data[0] != LOCKSTEP_MAGIC:
+        raise ValueError("不是有效的锁步输入包")
+    _, ack_tick, start_tick = _HEADER.unpack_from(data)
+    return ack_tick, start_tick, list(data[_HEADER.size:])
+
+
+def is_lockstep_packet(data: bytes) -> bool:
+    """只检查首字节判断是否为锁步输入包"""
+    return len(data) > 0 and data[0] == LOCKSTEP_MAGIC
+
+
+def apply_input_mask(game_view, tank, previous_mask: int, mask: int):
+    """把一个tick的位掩码应用到坦克上
+
+    与掩码上一次的值比较得到按下/松开的按键，按固定顺序处理，
+    物理效果与本地按键（GameView.on_key_press）和客户端输入相同。
+    """
+    if not tank or not getattr(tank, 'pymunk_body', None):
+        return
+
+    import math
+    from tank_sprites import PLAYER_MOVEMENT_SPEED, PLAYER_TURN_SPEED
+
+    max_speed = PLAYER_MOVEMENT_SPEED * 60
+    turn_speed = math.radians(PLAYER_TURN_SPEED * 60 * 1.0)
+    body = tank.pymunk_body
+
+    for key in mask_to_keys(mask & ~previous_mask):
+        if key == "W":
+            body.velocity = (math.cos(body.angle) * max_speed, math.sin(body.angle) * max_speed)
+        elif key == "S":
+            body.velocity = (-math.cos(body.angle) * max_speed, -math.sin(body.angle) * max_speed)
+        elif key == "A":
+            body.angular_velocity = turn_speed
+        elif key == "D":
+            body.angular_velocity = -turn_speed
+        elif key == "SPACE":
+            bullet = tank.shoot(game_view.total_time)
+            if bullet:
+                game_view.bullet_list.append(bullet)
+                if bullet.pymunk_body and bullet.pymunk_shape:
+                    game_view.space.add(bullet.pymunk_body, bullet.pymunk_shape)
+
+    for key in mask_to_keys(previous_mask & ~mask):
+        if key in ["W", "S"]:
+            body.velocity = (0, 0)
+        elif key in ["A", "D"]:
+            body.angular_velocity = 0
+
+
+class LockstepSession:
+    """一局锁步对局的输入缓冲和固定步长推进
+
+    槽位0控制 player_tank（主机），槽位1控制 player2_tank（客户端）。
+    receive 在网络线程中调用，update/advance 在游戏循环中调用。
+    """
+
+    def __init__(self, local_slot: int, send: Callable[[bytes], None],
+                 input_delay: int = INPUT_DELAY_TICKS):
+        self.local_slot = local_slot
+        self.remote_slot = 1 - local_slot
+        self.send = send
+        self.input_delay = input_delay
+
+        self.tick = 0                 # 下一个要模拟的tick
+        self.local_keys: Set[str] = set()
+        self.accumulator = 0.0
+
+        # 每个槽位: tick -> 位掩码。开局的延迟期内双方输入都为空
+        self._inputs: Tuple[Dict[int, int], Dict[int, int]] = ({}, {})
+        for inputs in self._inputs:
+            for tick in range(input_delay):
+                inputs[tick] = 0
+        self._applied_masks = [0, 0]
+        self._peer_ack = 0            # 对方已收到本地在该tick之前的全部输入
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.stall_count = 0
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.packets_received = 0
+
+    def key_press(self, key: str):
+        """本地按键按下（只记录，下一个tick生效）"""
+        self.local_keys.add(key)
+
+    def key_release(self, key: str):
+        """本地按键松开"""
+        self.local_keys.discard(key)
+
+    def receive(self, data: bytes):
+        """处理对方的输入包"""
+        try:
+            ack_tick, start_tick, masks = decode_inputs(data)
+        except ValueError as e:
+            print(f"丢弃无效的锁步输入: {e}")
+            return
+
+        with self._lock:
+            self.packets_received += 1
+            self._peer_ack = max(self._peer_ack, ack_tick)
+            remote = self._inputs[self.remote_slot]
+            first_pending = self._first_pending_tick()
+            for offset, mask in enumerate(masks):
+                tick = start_tick + offset
+                if tick >= first_pending:
+                    remote.setdefault(tick, mask)
+
+    def _first_pending_tick(self) -> int:
+        """还需要对方输入的第一个tick（更早的输入已经用过，不再保存）"""
+        return self.tick
+
+    def has_remote_input(self, tick: int = None) -> bool:
+        """是否已收到对方在指定tick（默认下一个tick）的输入"""
+        with self._lock:
+            return (self.tick if tick is None else tick) in self._inputs[self.remote_slot]
+
+    def update(self, game_view, delta_time: float) -> int:
+        """按经过的时间以固定步长推进，返回本帧模拟的tick数"""
+        self.accumulator = min(self.accumulator + delta_time,
+                               LOCKSTEP_TICK_DT * MAX_CATCH_UP_TICKS)
+        ticks = 0
+        while self.accumulator >= LOCKSTEP_TICK_DT:
+            if not self.advance(game_view):
+                break
+            self.accumulator -= LOCKSTEP_TICK_DT
+            ticks += 1
+        return ticks
+
+    def advance(self, game_view) -> bool:
+        """模拟一个tick；还没有收到对方输入时返回False（下一帧再试）"""
+        self._schedule_local_input()
+
+        with self._lock:
+            masks = [self._inputs[0].get(self.tick), self._inputs[1].get(self.tick)]
+        if masks[self.remote_slot] is None:
+            self.stall_count += 1
+            return False
+
+        self._step(game_view, masks)
+
+        with self._lock:
+            self._inputs[self.remote_slot].pop(self.tick, None)
+            local = self._inputs[self.local_slot]
+            for tick in [t for t in local if t < min(self.tick, self._peer_ack)]:
+                del local[tick]
+            self.tick += 1
+        return True
+
+    def _step(self, game_view, masks: List[int]):
+        """按槽位顺序应用双方的位掩码，再以固定步长模拟一个tick"""
+        tanks = (game_view.player_tank, game_view.player2_tank)
+        for slot in (0, 1):
+            previous = self._applied_masks[slot]
+            if previous != masks[slot] and getattr(game_view, "replay_recorder", None):
+                # 与 apply_input_mask 的处理顺序相同：先按下再松开
+                for key in mask_to_keys(masks[slot] & ~previous):
+                    game_view.record_input(slot, key, True)
+                for key in mask_to_keys(previous & ~masks[slot]):
+                    game_view.record_input(slot, key, False)
+            apply_input_mask(game_view, tanks[slot], previous, masks[slot])
+            self._applied_masks[slot] = masks[slot]
+        game_view.on_update(LOCKSTEP_TICK_DT)
+
+    def _schedule_local_input(self):
+        """把当前按键排到 tick + 输入延迟，并发送对方尚未确认的输入"""
+        target = self.tick + self.input_delay
+        with self._lock:
+            local = self._inputs[self.local_slot]
+            if target not in local:
+                local[target] = keys_to_mask(self.local_keys)
+
+            # 确认tick：已连续收到的对方输入的下一个tick
+            ack = self._first_pending_tick()
+            remote = self._inputs[self.remote_slot]
+            while ack in remote:
+                ack += 1
+
+            start = max(min(self._peer_ack, target), min(local))
+            end = min(target + 1, start + MAX_INPUTS_PER_PACKET)
+            packet = encode_inputs(ack, start, [local[t] for t in range(start, end)])
+
+        try:
+            self.send(packet)
+            self.packets_sent += 1
+            self.bytes_sent += len(packet)
+        except Exception as e:
+            print(f"发送锁步输入失败: {e}")
+
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        return {
+            "tick": self.tick,
+            "stalls": self.stall_count,
+            "packets_sent": self.packets_sent,
+            "bytes_sent": self.bytes_sent,
+            "packets_received": self.packets_received,
+            "bytes_per_tick": self.bytes_sent / self.tick if self.tick else 0.0,
+        }
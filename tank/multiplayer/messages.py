@@ -15,15 +15,19 @@ class MessageType(Enum):
     
     # 连接管理
     ROOM_ADVERTISE = "room_advertise"      # 房间广播
+    ROOM_QUERY = "room_query"              # 房间查询（主机立即回复房间广播）
     JOIN_REQUEST = "join_request"          # 加入请求  
     JOIN_RESPONSE = "join_response"        # 加入响应
     DISCONNECT = "disconnect"              # 断开连接
     HEARTBEAT = "heartbeat"                # 心跳包
+    SESSION_RESUME = "session_resume"      # 断线后携带会话令牌恢复连接
     
     # 游戏控制
     GAME_START = "game_start"              # 游戏开始
     GAME_END = "game_end"                  # 游戏结束
     GAME_STATE = "game_state"              # 游戏状态同步
+    STATE_KEYFRAME = "state_keyframe"      # 完整状态关键帧（恢复连接后发送）
+    ROLLBACK_STATE = "rollback_state"      # 回滚模式下主机定期发送的权威状态
     PLAYER_INPUT = "player_input"          # 玩家输入
     MAP_SYNC = "map_sync"                  # 地图同步
     
@@ -34,6 +38,12 @@ class MessageType(Enum):
     TANK_SELECTION_SYNC = "tank_selection_sync"      # 选择状态同步
 
 
+# 编码后消息的开头，用于不解码判断消息类型
+_TYPE_PREFIXES = {
+    msg_type: ('{"type": "%s"' % msg_type.value).encode('utf-8') for msg_type in MessageType
+}
+
+
 class NetworkMessage:
     """网络消息类 - 重构版"""
     
@@ -56,9 +66,9 @@ class NetworkMessage:
     
     @classmethod
     def from_bytes(cls, data: bytes) -> 'NetworkMessage':
-        """从字节数据反序列化"""
+        """从字节数据反序列化（也接受接收缓冲区的 memoryview）"""
         try:
-            msg_dict = json.loads(data.decode('utf-8'))
+            msg_dict = json.loads(str(data, 'utf-8'))
             msg_type = MessageType(msg_dict["type"])
             return cls(
                 msg_type,
@@ -68,38 +78,84 @@ class NetworkMessage:
         except (json.JSONDecodeError, KeyError, UnicodeDecodeError, ValueError) as e:
             raise ValueError(f"无效的消息格式: {e}")
 
+    @staticmethod
+    def is_type(data: bytes, msg_type: MessageType) -> bool:
+        """不解码消息，只比较前缀判断消息类型（to_bytes 总是先写入 type 字段）"""
+        prefix = _TYPE_PREFIXES[msg_type]
+        return data[:len(prefix)] == prefix
+
 
 class MessageFactory:
     """消息工厂类 - 简化版"""
     
     @staticmethod
-    def create_room_advertise(room_name: str, host_name: str = "主机") -> NetworkMessage:
-        """创建房间广播消息"""
+    def create_room_advertise(room_name: str, host_name: str = "主机",
+                              host_port: Optional[int] = None, players: int = 1,
+                              max_players: int = 2, interval: Optional[float] = None,
+                              closed: bool = False) -> NetworkMessage:
+        """创建房间广播消息
+
+        Args:
+            host_port: 房间实际的游戏端口
+            players: 当前玩家数（普通主机包括主机自己）
+            interval: 下一次定期广播的间隔，浏览器据此判断房间过期
+            closed: 房间已关闭，浏览器应立即移除
+        """
         data = {
             "room_name": room_name,
             "host_name": host_name,
-            "players": 1,  # 主机自己
-            "max_players": 2,
+            "players": players,
+            "max_players": max_players,
             "game_mode": "1v1"
         }
+        if host_port is not None:
+            data["host_port"] = host_port
+        if interval is not None:
+            data["interval"] = interval
+        if closed:
+            data["closed"] = True
         return NetworkMessage(MessageType.ROOM_ADVERTISE, data)
+
+    @staticmethod
+    def create_room_query() -> NetworkMessage:
+        """创建房间查询消息"""
+        return NetworkMessage(MessageType.ROOM_QUERY, {})
     
     @staticmethod
-    def create_join_request(player_name: str) -> NetworkMessage:
-        """创建加入请求"""
+    def create_join_request(player_name: str, spectator: bool = False) -> NetworkMessage:
+        """创建加入请求（spectator为True时以观众身份加入）"""
         data = {"player_name": player_name}
+        if spectator:
+            data["spectator"] = True
         return NetworkMessage(MessageType.JOIN_REQUEST, data)
     
     @staticmethod
     def create_join_response(success: bool, player_id: str = None, 
-                           reason: str = None) -> NetworkMessage:
-        """创建加入响应"""
+                           reason: str = None, spectator: bool = False,
+                           session_token: str = None, resumed: bool = False) -> NetworkMessage:
+        """创建加入响应
+
+        session_token: 会话令牌，断线后用于恢复连接
+        resumed: 是否为恢复会话请求的响应
+        """
         data = {
             "success": success,
             "player_id": player_id,
             "reason": reason
         }
+        if spectator:
+            data["spectator"] = True
+        if session_token:
+            data["session_token"] = session_token
+        if resumed:
+            data["resumed"] = True
         return NetworkMessage(MessageType.JOIN_RESPONSE, data)
+
+    @staticmethod
+    def create_session_resume(session_token: str, player_id: str = None) -> NetworkMessage:
+        """创建恢复会话请求"""
+        data = {"session_token": session_token}
+        return NetworkMessage(MessageType.SESSION_RESUME, data, player_id)
     
     @staticmethod
     def create_disconnect(reason: str = "用户断开") -> NetworkMessage:
@@ -140,23 +196,65 @@ class MessageFactory:
         return NetworkMessage(MessageType.MAP_SYNC, data)
     
     @staticmethod
-    def create_game_state(tanks: list, bullets: list, scores: Dict[str, int] = None) -> NetworkMessage:
-        """创建游戏状态消息"""
+    def create_game_state(tanks: list, bullets: list = None, scores: Dict[str, int] = None,
+                          bullet_events: Dict[str, list] = None,
+                          game_time: float = None) -> NetworkMessage:
+        """创建游戏状态消息
+
+        子弹默认以事件形式同步（bullet_events），只有显式传入bullets时才附带完整子弹列表
+        """
         data = {
             "tanks": tanks,
-            "bullets": bullets,
             "scores": scores or {},
             "timestamp": time.time()
         }
+        if bullets is not None:
+            data["bullets"] = bullets
+        if bullet_events is not None:
+            data["bullet_events"] = bullet_events
+        if game_time is not None:
+            data["game_time"] = game_time
         return NetworkMessage(MessageType.GAME_STATE, data)
     
     @staticmethod
-    def create_player_input(keys_pressed: list, keys_released: list) -> NetworkMessage:
-        """创建玩家输入消息"""
+    def create_state_keyframe(tanks: list, scores: Dict[str, int], bullet_events: Dict[str, list],
+                              game_time: float = None, round_info: Dict[str, Any] = None) -> NetworkMessage:
+        """创建完整状态关键帧
+
+        bullet_events 的 check 中包含所有存在的子弹，并带有 full 标记，
+        客户端据此重建子弹并移除断线期间已消失的子弹
+        """
+        data = {
+            "tanks": tanks,
+            "scores": scores or {},
+            "bullet_events": bullet_events,
+            "keyframe": True,
+            "timestamp": time.time()
+        }
+        if game_time is not None:
+            data["game_time"] = game_time
+        if round_info:
+            data["round_info"] = round_info
+        return NetworkMessage(MessageType.STATE_KEYFRAME, data)
+
+    @staticmethod
+    def create_rollback_state(tick: int, state: Dict[str, Any]) -> NetworkMessage:
+        """创建回滚模式的权威状态（主机在该tick开始时的模拟状态）"""
+        return NetworkMessage(MessageType.ROLLBACK_STATE, {"tick": tick, "state": state})
+
+    @staticmethod
+    def create_player_input(keys_pressed: list, keys_released: list,
+                            view_time: float = None) -> NetworkMessage:
+        """创建玩家输入消息
+
+        view_time: 客户端当前画面对应的主机游戏时间，用于主机端延迟补偿
+        """
         data = {
             "keys_pressed": keys_pressed,
             "keys_released": keys_released
         }
+        if view_time is not None:
+            data["view_time"] = view_time
         return NetworkMessage(MessageType.PLAYER_INPUT, data)
     
     @staticmethod
@@ -204,7 +302,8 @@ EXAMPLE_MESSAGES = {
         "player_id": "client_001",
         "data": {
             "keys_pressed": ["W", "SPACE"],
-            "keys_released": ["A"]
+            "keys_released": ["A"],
+            "view_time": 12.48
         },
         "timestamp": 1234567890.123
     },
@@ -228,18 +327,36 @@ EXAMPLE_MESSAGES = {
                     "health": 3
                 }
             ],
-            "bullets": [
-                {
-                    "x": 150,
-                    "y": 250,
-                    "angle": 45,
-                    "owner": "host"
-                }
-            ],
+            "bullet_events": {
+                "spawn": [
+                    {
+                        "id": 7,
+                        "x": 100,
+                        "y": 200,
+                        "angle": 45,
+                        "speed": 16,
+                        "owner": "host",
+                        "t": 12.5
+                    }
+                ],
+                "despawn": [5],
+                "check": [
+                    {
+                        "id": 6,
+                        "x": 150,
+                        "y": 250,
+                        "vx": -678.8,
+                        "vy": 678.8,
+                        "b": 1,
+                        "owner": "client_001"
+                    }
+                ]
+            },
             "scores": {
                 "host": 1,
                 "client_001": 0
-            }
+            },
+            "game_time": 12.55
         },
         "timestamp": 1234567890.123
     }
@@ -5,15 +5,35 @@
 """
 
 import arcade
+import math
+import threading
+from collections import deque
 from typing import List, Dict, Any
 from .game_host import GameHost
 from .game_client import GameClient
-from .room_discovery import RoomDiscovery, RoomInfo
+from .room_discovery import RoomDiscovery, RoomInfo, DEFAULT_MULTICAST_GROUP
 from .messages import MessageFactory
+from .bullet_sync import BulletEventTracker, BulletEventApplier, create_keyframe_events
+from .lag_compensation import LagCompensator
+from .lockstep import (LockstepSession, SYNC_SNAPSHOT, SYNC_LOCKSTEP, SYNC_ROLLBACK, KEY_BITS,
+                       LOCKSTEP_TICK_RATE, INPUT_DELAY_TICKS)
+from .rollback import RollbackSession
+
+# 主机等待界面按 L 依次切换的同步方式
+SYNC_MODE_NAMES = {
+    SYNC_SNAPSHOT: "状态快照",
+    SYNC_LOCKSTEP: "锁步",
+    SYNC_ROLLBACK: "回滚",
+}
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from fps_config import get_fps_config, NetworkSyncOptimizer
+from frame_profiler import profiler
+from .tracing import tracer
+import game_log
+
+log = game_log.get_logger("net")
 
 
 # 文本绘制优化说明：
@@ -26,7 +46,7 @@ class RoomBrowserView(arcade.View):
 
     def __init__(self):
         super().__init__()
-        self.room_discovery = RoomDiscovery()
+        self.room_discovery = RoomDiscovery(multicast_group=DEFAULT_MULTICAST_GROUP)
         self.discovered_rooms: List[RoomInfo] = []
         self.selected_room_index = 0
         self.player_name = "玩家"
@@ -56,7 +76,7 @@ class RoomBrowserView(arcade.View):
         )
 
         self.instruction_text = arcade.Text(
-            "按 ENTER 加入选中房间 | 上下箭头选择房间",
+            "按 ENTER 加入选中房间 | 按 V 观战 | 上下箭头选择房间",
             x=0, y=0,
             color=arcade.color.YELLOW,
             font_size=14,
@@ -184,14 +204,15 @@ class RoomBrowserView(arcade.View):
             host_view = HostGameView()
             self.window.show_view(host_view)
 
-        elif key == arcade.key.ENTER and self.discovered_rooms:
-            # 加入选中房间
+        elif key in (arcade.key.ENTER, arcade.key.V) and self.discovered_rooms:
+            # 加入选中房间（按V以观众身份加入）
             selected_room = self.discovered_rooms[self.selected_room_index]
             client_view = ClientGameView()
             success = client_view.connect_to_room(
                 selected_room.host_ip,
                 selected_room.host_port,
-                self.player_name
+                self.player_name,
+                spectator=(key == arcade.key.V)
             )
             if success:
                 self.window.show_view(client_view)
@@ -217,9 +238,13 @@ class RoomBrowserView(arcade.View):
 class HostGameView(arcade.View):
     """主机游戏视图 - 重构版"""
 
-    def __init__(self):
-        super().__init__()
-        self.game_host = GameHost()
+    def __init__(self, network=None, window=None, max_clients: int = 1, host_port: int = 12346,
+                 discovery_port: int = None, sync_mode: str = SYNC_SNAPSHOT, **host_options):
+        super().__init__(window)
+        # 每帧的消息排队，帧末合并发送（见 on_update）
+        host_options.setdefault("batch_sends", True)
+        self.game_host = GameHost(host_port=host_port, network=network, max_clients=max_clients,
+                                  discovery_port=discovery_port, **host_options)
         self.room_name = "我的房间"
         self.host_name = "主机"
 
@@ -234,6 +259,26 @@ class HostGameView(arcade.View):
         # 网络同步优化器
         self.sync_optimizer = None
 
+        # 子弹事件追踪器（子弹以生成/消失事件同步）
+        self.bullet_tracker = BulletEventTracker()
+        # 观战数据流频率较低，单独追踪子弹事件
+        self.spectator_bullet_tracker = BulletEventTracker()
+
+        # 延迟补偿器（记录坦克位置历史，回退检测客户端射击）
+        self.lag_compensator = LagCompensator()
+
+        # 网络线程收到的客户端输入，在主线程的 on_update 开头应用
+        # （射击的延迟补偿会移动子弹、修改血量和比分，不能与物理步进同时进行）
+        self.pending_inputs = deque()
+
+        # 会话恢复：本局的地图同步和开始消息，恢复连接的客户端需要补发关键帧
+        self.match_intro = []
+        self.pending_keyframes = []
+
+        # 同步方式：状态快照（主机权威），或锁步/回滚（双方模拟，只交换输入）
+        self.sync_mode = sync_mode
+        self.lockstep = None  # LockstepSession 或 RollbackSession
+
         # 预创建静态文本对象
         self.waiting_text = arcade.Text(
             "等待玩家加入...",
@@ -258,16 +303,28 @@ class HostGameView(arcade.View):
             font_size=14,
             anchor_x="center"
         )
+
+        self.sync_mode_text = arcade.Text(
+            "",
+            x=0, y=0,
+            color=arcade.color.LIGHT_GRAY,
+            font_size=14,
+            anchor_x="center"
+        )
     
     def on_show_view(self):
         """显示视图时的初始化"""
-        arcade.set_background_color(arcade.color.DARK_GREEN)
+        if not getattr(self.window, "headless", False):
+            arcade.set_background_color(arcade.color.DARK_GREEN)
         
         # 设置回调
         self.game_host.set_callbacks(
             client_join=self._on_client_join,
             client_leave=self._on_client_leave,
-            input_received=self._on_input_received
+            input_received=self._on_input_received,
+            client_suspended=self._on_client_suspended,
+            client_resumed=self._on_client_resumed,
+            lockstep_input=self._on_lockstep_input
         )
         
         # 启动主机
@@ -280,6 +337,8 @@ class HostGameView(arcade.View):
     
     def on_hide_view(self):
         """隐藏视图时的清理"""
+        if self.game_view:
+            self.game_view.stop_replay_recording()
         self.game_host.stop_hosting()
     
     def on_draw(self):
@@ -315,15 +374,33 @@ class HostGameView(arcade.View):
             self.back_text.y = 100
             self.back_text.draw()
 
+            self.sync_mode_text.text = f"同步方式: {SYNC_MODE_NAMES[self.sync_mode]}（按 L 切换）"
+            self.sync_mode_text.x = self.window.width // 2
+            self.sync_mode_text.y = 70
+            self.sync_mode_text.draw()
+
         elif self.game_phase == "playing" and self.game_view:
             # 游戏进行中，委托给游戏视图
             self.game_view.on_draw()
     
     def on_update(self, delta_time):
         """更新逻辑"""
-        if self.game_phase == "playing" and self.game_view:
+        self._apply_pending_inputs()
+
+        if self.game_phase == "playing" and self.game_view and self.lockstep:
+            # 锁步/回滚：以固定步长模拟双方的输入，不发送状态快照
+            self.lockstep.update(self.game_view, delta_time)
+
+        elif self.game_phase == "playing" and self.game_view:
             self.game_view.on_update(delta_time)
 
+            # 恢复连接的客户端先收到完整关键帧，之后继续接收增量状态
+            self._send_keyframes()
+
+            # 记录坦克位置历史，用于客户端射击的延迟补偿
+            self.lag_compensator.record(getattr(self.game_view, 'total_time', 0),
+                                        getattr(self.game_view, 'player_list', None))
+
             # 使用优化的网络同步机制
             if self.sync_optimizer is None:
                 fps_config = get_fps_config()
@@ -334,15 +411,31 @@ class HostGameView(arcade.View):
             # 检查是否应该进行网络同步
             if self.sync_optimizer.should_sync(current_time):
                 # 获取并优化游戏状态
-                raw_game_state = self._get_game_state()
-                optimized_state = self.sync_optimizer.optimize_sync_data(raw_game_state)
+                started = profiler.start()
+                with tracer.span("state_extract", "host"):
+                    raw_game_state = self._get_game_state()
+                    optimized_state = self.sync_optimizer.optimize_sync_data(raw_game_state)
+                started = profiler.lap("state_extract", started)
 
                 # 发送优化后的游戏状态给客户端
-                self.game_host.send_game_state(optimized_state)
-
-                # 修复：主机端也需要应用自己的游戏状态以确保能看到所有子弹
-                # 这样主机端就能看到自己发射的子弹和客户端发射的子弹
-                self._apply_host_game_state(raw_game_state)
+                with tracer.span("state_encode", "net"):
+                    self.game_host.send_game_state(optimized_state)
+                profiler.lap("network_encode", started)
+
+        self._update_spectators()
+
+        # 本帧排队的消息（状态、游戏结束、地图同步等）合并成尽量少的数据报
+        started = profiler.start()
+        with tracer.span("flush_sends", "net"):
+            self.game_host.flush_sends()
+        profiler.lap("network_encode", started)
+
+    def _update_spectators(self):
+        """按观战频率生成快照（只编码一次），并发送延迟到期的观战数据"""
+        if (self.game_phase == "playing" and self.game_view
+                and self.game_host.should_capture_spectator_state()):
+            self.game_host.send_spectator_state(self._get_game_state(self.spectator_bullet_tracker))
+        self.game_host.flush_spectators()
     
     def on_key_press(self, key, _modifiers):
         """处理按键事件"""
@@ -358,14 +451,40 @@ class HostGameView(arcade.View):
             else:
                 print("需要2个玩家才能开始游戏")
 
+        elif key == arcade.key.L and self.game_phase == "waiting":
+            # 切换同步方式
+            modes = list(SYNC_MODE_NAMES)
+            self.sync_mode = modes[(modes.index(self.sync_mode) + 1) % len(modes)]
+            print(f"同步方式: {self.sync_mode}")
+
         elif self.game_phase == "playing" and self.game_view:
-            # 转发给游戏视图
-            self.game_view.on_key_press(key, _modifiers)
+            key_name = self._get_lockstep_key(key)
+            if self.lockstep and key_name:
+                # 锁步/回滚：按键在输入延迟后与对方的输入同时生效（回滚模式没有延迟）
+                self.lockstep.key_press(key_name)
+            else:
+                # 转发给游戏视图
+                self.game_view.on_key_press(key, _modifiers)
 
     def on_key_release(self, key, _modifiers):
         """处理按键释放事件"""
         if self.game_phase == "playing" and self.game_view:
-            self.game_view.on_key_release(key, _modifiers)
+            key_name = self._get_lockstep_key(key)
+            if self.lockstep and key_name:
+                self.lockstep.key_release(key_name)
+            else:
+                self.game_view.on_key_release(key, _modifiers)
+
+    def _get_lockstep_key(self, key) -> str:
+        """锁步模式下本地玩家使用的按键名称"""
+        key_map = {
+            arcade.key.W: "W",
+            arcade.key.A: "A",
+            arcade.key.S: "S",
+            arcade.key.D: "D",
+            arcade.key.SPACE: "SPACE"
+        }
+        return key_map.get(key, "")
     
     def _on_client_join(self, client_id: str, player_name: str):
         """客户端加入回调"""
@@ -381,13 +500,60 @@ class HostGameView(arcade.View):
         # 如果游戏进行中，暂停游戏
         if self.game_phase == "playing":
             self.game_phase = "waiting"
+            if self.game_view:
+                self.game_view.stop_replay_recording()
             self.game_view = None
+            self.lockstep = None
     
+    def _on_client_suspended(self, client_id: str):
+        """客户端无响应回调：主机已松开该玩家的所有按键，坦克原地等待恢复"""
+        print(f"玩家 {client_id} 连接中断，等待重新连接")
+
+    def _on_client_resumed(self, client_id: str):
+        """客户端恢复连接回调（网络线程），下一帧发送关键帧"""
+        print(f"玩家 {client_id} 恢复连接")
+        self.pending_keyframes.append(client_id)
+
+    def _send_keyframes(self):
+        """给恢复连接的客户端补发本局开始消息和一个完整状态关键帧"""
+        if not self.pending_keyframes:
+            return
+        client_ids, self.pending_keyframes = self.pending_keyframes, []
+        state = self._get_game_state(keyframe=True)
+        keyframe = MessageFactory.create_state_keyframe(
+            tanks=state["tanks"],
+            scores=state["scores"],
+            bullet_events=state["bullet_events"],
+            game_time=state["game_time"],
+            round_info=state["round_info"]
+        )
+        for client_id in dict.fromkeys(client_ids):
+            # 断线期间可能错过了开局消息（已在对局中的客户端会忽略重复的开始消息）
+            for message in self.match_intro:
+                self.game_host.send_to_client(message, client_id)
+            self.game_host.send_to_client(keyframe, client_id)
+
+    def _on_lockstep_input(self, _client_id: str, data: bytes):
+        """锁步输入包回调（网络线程）"""
+        lockstep = self.lockstep
+        if lockstep:
+            lockstep.receive(data)
+
+    def _send_rollback_state(self, tick: int, state: dict):
+        """回滚模式下定期发送已确认tick的权威状态"""
+        self.game_host.send_to_client(MessageFactory.create_rollback_state(tick, state))
+
     def _on_input_received(self, client_id: str, keys_pressed: list, keys_released: list):
-        """输入接收回调"""
-        if self.game_phase == "playing" and self.game_view:
-            # 将客户端输入应用到游戏中
-            self._apply_client_input(client_id, keys_pressed, keys_released)
+        """输入接收回调（网络线程），排队到下一次 on_update 应用"""
+        self.pending_inputs.append((client_id, keys_pressed, keys_released))
+
+    def _apply_pending_inputs(self):
+        """按接收顺序应用排队的客户端输入（不在对局中时丢弃）"""
+        while self.pending_inputs:
+            client_id, keys_pressed, keys_released = self.pending_inputs.popleft()
+            if self.game_phase == "playing" and self.game_view:
+                with tracer.span("apply_input", "host"):
+                    self._apply_client_input(client_id, keys_pressed, keys_released)
     
     def _start_game(self):
         """开始游戏"""
@@ -395,11 +561,19 @@ class HostGameView(arcade.View):
         from .map_sync import MapSyncManager
 
         # 创建游戏视图
-        self.game_view = game_views.GameView(mode="network_host")
+        self.game_view = game_views.GameView(mode="network_host", window=self.window)
 
         # 设置网络回调
         self.game_view.set_network_callback(self._on_game_event)
 
+        # 锁步/回滚对局：地图由随机种子选择，客户端用同一个种子得到相同的地图
+        map_seed = None
+        if self.sync_mode != SYNC_SNAPSHOT:
+            import random
+            from maps import get_random_map_layout
+            map_seed = random.randrange(2 ** 31)
+            self.game_view.set_map_layout(get_random_map_layout(random.Random(map_seed)))
+
         # 重要：先获取地图布局，再调用setup
         map_layout = self.game_view.get_map_layout()
 
@@ -418,12 +592,25 @@ class HostGameView(arcade.View):
             print(f"❌ 地图序列化失败: {e}")
             return
 
-        # 调用setup方法初始化游戏元素
+        # 调用setup方法初始化游戏元素（回滚对局会重新模拟，不录制回放）
+        self.game_view.allow_replay_recording = self.sync_mode != SYNC_ROLLBACK
         self.game_view.setup()
+        self.bullet_tracker.reset()
+        self.spectator_bullet_tracker.reset()
+        self.lag_compensator.reset()
 
         self.game_phase = "playing"
 
-        print("游戏开始！")
+        self.lockstep = None
+        if self.sync_mode != SYNC_SNAPSHOT:
+            if self.sync_mode == SYNC_ROLLBACK:
+                self.lockstep = RollbackSession(local_slot=0, send=self.game_host.send_lockstep_input,
+                                                state_sync=self._send_rollback_state)
+            else:
+                self.lockstep = LockstepSession(local_slot=0, send=self.game_host.send_lockstep_input)
+            print(f"游戏开始！（{SYNC_MODE_NAMES[self.sync_mode]}同步，种子 {map_seed}）")
+        else:
+            print("游戏开始！")
 
         # 发送地图同步消息给客户端
         map_sync_msg = MessageFactory.create_map_sync(
@@ -433,12 +620,26 @@ class HostGameView(arcade.View):
         self.game_host.send_to_client(map_sync_msg)
 
         # 通知客户端游戏开始
-        start_msg = MessageFactory.create_game_start({
+        game_config = {
             "map_layout": map_layout,
             "map_checksum": map_data['checksum']
-        })
+        }
+        if self.lockstep:
+            game_config.update({
+                "sync_mode": self.sync_mode,
+                "map_seed": map_seed,
+                "tick_rate": LOCKSTEP_TICK_RATE,
+                "input_delay": self.lockstep.input_delay
+            })
+        start_msg = MessageFactory.create_game_start(game_config)
         self.game_host.send_to_client(start_msg)
 
+        # 观众：新加入的观众先收到地图和开始消息，已有观众按观战延迟收到
+        self.match_intro = [map_sync_msg, start_msg]
+        self.game_host.set_spectator_intro(self.match_intro)
+        self.game_host.send_to_spectators(map_sync_msg)
+        self.game_host.send_to_spectators(start_msg)
+
     def _on_game_event(self, event_type: str, event_data: dict):
         """处理游戏事件"""
         if event_type == "game_end":
@@ -450,10 +651,13 @@ class HostGameView(arcade.View):
                 winner_text=event_data.get("winner_text")
             )
             self.game_host.send_to_client(game_end_msg)
+            self.game_host.send_to_spectators(game_end_msg)
             print(f"主机端发送游戏结束消息: {event_data.get('winner_text')}")
 
-    def _get_game_state(self) -> Dict[str, Any]:
-        """获取当前游戏状态"""
+    def _get_game_state(self, bullet_tracker: BulletEventTracker = None,
+                        keyframe: bool = False) -> Dict[str, Any]:
+        """获取当前游戏状态（bullet_tracker 默认为玩家数据流的子弹事件追踪器，
+        keyframe 为True时附带所有子弹的完整数据，不影响事件追踪）"""
         if not self.game_view:
             return {}
 
@@ -474,30 +678,16 @@ class HostGameView(arcade.View):
             except Exception as e:
                 print(f"获取坦克状态时出错: {e}")
 
-        # 提取子弹状态 - 修复子弹同步问题
-        bullets = []
-        if hasattr(self.game_view, 'bullet_list') and self.game_view.bullet_list is not None:
-            try:
-                for i, bullet in enumerate(self.game_view.bullet_list):
-                    if bullet is not None:  # 确保子弹对象不为None
-                        # 获取子弹所有者信息
-                        owner_id = 'unknown'
-                        if bullet.owner:
-                            owner_id = getattr(bullet.owner, 'player_id', 'unknown')
-
-                        # 添加子弹唯一ID以便跟踪
-                        bullet_data = {
-                            "id": getattr(bullet, 'bullet_id', i),  # 使用子弹ID或索引
-                            "x": bullet.center_x,
-                            "y": bullet.center_y,
-                            "angle": getattr(bullet, 'angle', 0),
-                            "owner": owner_id,
-                            "speed": getattr(bullet, 'speed_magnitude', 16),  # 添加速度信息
-                            "timestamp": getattr(self.game_view, 'total_time', 0)  # 添加时间戳
-                        }
-                        bullets.append(bullet_data)
-            except Exception as e:
-                print(f"获取子弹状态时出错: {e}")
+        # 提取子弹事件 - 只同步生成/消失事件，客户端本地模拟飞行轨迹
+        bullet_events = {"spawn": [], "despawn": [], "check": []}
+        try:
+            if keyframe:
+                bullet_events = create_keyframe_events(getattr(self.game_view, 'bullet_list', None))
+            else:
+                tracker = bullet_tracker or self.bullet_tracker
+                bullet_events = tracker.collect(getattr(self.game_view, 'bullet_list', None))
+        except Exception as e:
+            print(f"获取子弹事件时出错: {e}")
 
         # 提取分数和游戏状态
         scores = {}
@@ -517,166 +707,47 @@ class HostGameView(arcade.View):
 
         return {
             "tanks": tanks,
-            "bullets": bullets,
+            "bullet_events": bullet_events,
             "scores": scores,
-            "round_info": round_info
+            "round_info": round_info,
+            "game_time": getattr(self.game_view, 'total_time', 0)
         }
 
-    def _apply_host_game_state(self, game_state: Dict[str, Any]):
-        """主机端应用自己的游戏状态 - 修复主机端子弹显示问题"""
-        if not self.game_view or not game_state:
-            return
+    def _get_client_tank(self, _client_id: str):
+        """获取客户端控制的坦克（1对1模式下客户端控制player2_tank）"""
+        return getattr(self.game_view, 'player2_tank', None)
 
-        # 主机端不需要更新坦克状态（坦克状态由本地物理引擎控制）
-        # 但需要确保子弹状态正确同步，这样主机端就能看到所有子弹
-
-        # 更新子弹状态 - 使用与客户端相同的逻辑
-        bullets_data = game_state.get("bullets", [])
-        if hasattr(self.game_view, 'bullet_list') and self.game_view.bullet_list is not None:
-            try:
-                # 使用相同的子弹ID匹配策略
-                current_bullets = {getattr(bullet, 'bullet_id', i): bullet
-                                 for i, bullet in enumerate(self.game_view.bullet_list) if bullet is not None}
-                server_bullets = {bullet_data.get("id", i): bullet_data
-                                for i, bullet_data in enumerate(bullets_data)}
-
-                # 移除不再存在的子弹
-                bullets_to_remove = []
-                for bullet_id, bullet in current_bullets.items():
-                    if bullet_id not in server_bullets:
-                        bullets_to_remove.append(bullet)
-
-                for bullet in bullets_to_remove:
-                    try:
-                        # 从物理空间移除
-                        if hasattr(self.game_view, 'space') and self.game_view.space:
-                            if bullet.pymunk_body and bullet.pymunk_body in self.game_view.space.bodies:
-                                self.game_view.space.remove(bullet.pymunk_body)
-                            if hasattr(bullet, 'pymunk_shape') and bullet.pymunk_shape:
-                                if bullet.pymunk_shape in self.game_view.space.shapes:
-                                    self.game_view.space.remove(bullet.pymunk_shape)
-                        # 从列表移除
-                        if bullet in self.game_view.bullet_list:
-                            self.game_view.bullet_list.remove(bullet)
-                    except Exception as e:
-                        print(f"主机端移除过期子弹时出错: {e}")
-
-                # 创建新子弹（主机端也需要处理客户端发射的子弹）
-                for bullet_id, bullet_data in server_bullets.items():
-                    if bullet_id not in current_bullets:
-                        # 创建客户端发射的子弹在主机端显示
-                        bullet_x = bullet_data.get("x", 0)
-                        bullet_y = bullet_data.get("y", 0)
-                        bullet_angle = bullet_data.get("angle", 0)
-                        bullet_owner = bullet_data.get("owner", "unknown")
-
-                        # 只为客户端发射的子弹创建显示对象
-                        if bullet_owner != "host":
-                            try:
-                                from tank_sprites import Bullet
-
-                                # 根据子弹所有者确定正确的子弹颜色
-                                bullet_color = self._get_bullet_color_for_owner(bullet_owner)
-
-                                # 使用标准子弹半径
-                                BULLET_RADIUS = 4
-
-                                # 创建子弹对象（主机端显示客户端子弹用）
-                                bullet = Bullet(
-                                    radius=BULLET_RADIUS,
-                                    owner=None,  # 主机端显示用，不需要owner引用
-                                    tank_center_x=bullet_x,
-                                    tank_center_y=bullet_y,
-                                    actual_emission_angle_degrees=bullet_angle,
-                                    speed_magnitude=bullet_data.get("speed", 16),
-                                    color=bullet_color
-                                )
-
-                                # 设置子弹ID用于跟踪
-                                bullet.bullet_id = bullet_id
-
-                                # 设置子弹位置
-                                bullet.center_x = bullet_x
-                                bullet.center_y = bullet_y
-                                bullet.angle = bullet_angle
-
-                                # 添加到子弹列表
-                                self.game_view.bullet_list.append(bullet)
-
-                                # 将子弹添加到物理空间
-                                if hasattr(self.game_view, 'space') and self.game_view.space:
-                                    if bullet.pymunk_body and bullet.pymunk_shape:
-                                        bullet.pymunk_body.position = (bullet_x, bullet_y)
-                                        self.game_view.space.add(bullet.pymunk_body, bullet.pymunk_shape)
-
-                                print(f"🔫 主机端创建客户端子弹: 位置({bullet_x:.1f}, {bullet_y:.1f}), 角度{bullet_angle:.1f}")
-
-                            except Exception as e:
-                                print(f"主机端创建客户端子弹时出错: {e}")
-
-                # 更新现有子弹位置（主要是客户端子弹的位置同步）
-                for bullet_id, bullet_data in server_bullets.items():
-                    if bullet_id in current_bullets:
-                        bullet = current_bullets[bullet_id]
-                        bullet_owner = bullet_data.get("owner", "unknown")
-
-                        # 只同步客户端子弹的位置，主机端子弹由物理引擎控制
-                        if bullet_owner != "host":
-                            bullet_x = bullet_data.get("x", bullet.center_x)
-                            bullet_y = bullet_data.get("y", bullet.center_y)
-                            bullet_angle = bullet_data.get("angle", bullet.angle)
-
-                            bullet.center_x = bullet_x
-                            bullet.center_y = bullet_y
-                            bullet.angle = bullet_angle
-
-                            # 同步到物理体
-                            if bullet.pymunk_body:
-                                bullet.pymunk_body.position = (bullet_x, bullet_y)
-
-            except Exception as e:
-                print(f"主机端应用子弹状态时出错: {e}")
-
-    def _get_bullet_color_for_owner(self, owner_id: str):
-        """根据子弹所有者确定子弹颜色（与tank_sprites.py中的逻辑保持一致）"""
-        import arcade
-
-        # 默认颜色
-        bullet_color = arcade.color.YELLOW_ORANGE
-
-        # 根据所有者ID找到对应的坦克
-        if hasattr(self.game_view, 'player_list') and self.game_view.player_list is not None:
-            for tank in self.game_view.player_list:
-                if tank is not None and hasattr(tank, 'player_id'):
-                    if getattr(tank, 'player_id', None) == owner_id:
-                        # 找到对应的坦克，根据其图片文件确定颜色
-                        if hasattr(tank, 'tank_image_file') and tank.tank_image_file:
-                            path = tank.tank_image_file.lower()
-                            if 'green' in path:
-                                bullet_color = (0, 255, 0)  # 绿色
-                            elif 'desert' in path:
-                                bullet_color = (255, 165, 0)  # 沙漠色
-                            elif 'grey' in path:
-                                bullet_color = (128, 128, 128)  # 灰色
-                            elif 'blue' in path:
-                                bullet_color = (0, 0, 128)  # 蓝色
-                        break
+    def _get_shot_target(self, _client_id: str):
+        """获取客户端射击的目标坦克"""
+        return getattr(self.game_view, 'player_tank', None)
 
-        # 如果没有找到对应坦克，根据owner_id使用默认颜色方案
-        if owner_id == "host":
-            bullet_color = (0, 255, 0)  # 主机默认绿色
-        elif owner_id.startswith("client"):
-            bullet_color = (0, 0, 128)  # 客户端默认蓝色
+    def _compensate_client_shot(self, bullet, client_id: str = None):
+        """对客户端发射的子弹进行回退命中检测"""
+        target_tank = self._get_shot_target(client_id)
+        if target_tank is None or not target_tank.is_alive():
+            return
 
-        return bullet_color
+        try:
+            hit, rewind = self.lag_compensator.find_rewound_hit(
+                bullet,
+                target_tank,
+                now=self.game_view.total_time,
+                view_time=self.game_host.get_client_view_time(client_id),
+                space=self.game_view.space
+            )
+            if hit:
+                self.game_view.apply_bullet_hit(bullet, target_tank)
+                log.debug("🎯 延迟补偿命中: 回退 %.0fms", rewind * 1000)
+        except Exception as e:
+            log.warning("延迟补偿检测时出错: %s", e)
 
     def _apply_client_input(self, _client_id: str, keys_pressed: list, keys_released: list):
         """应用客户端输入到游戏中"""
         if not self.game_view or not hasattr(self.game_view, 'player2_tank'):
             return
 
-        # 假设客户端控制player2_tank
-        tank = self.game_view.player2_tank
+        # 1对1模式下客户端控制player2_tank（专用服务器按加入顺序分配）
+        tank = self._get_client_tank(_client_id)
         if not tank or not hasattr(tank, 'pymunk_body') or not tank.pymunk_body:
             return
 
@@ -691,6 +762,13 @@ class HostGameView(arcade.View):
         PYMUNK_PLAYER_MAX_SPEED = PLAYER_MOVEMENT_SPEED * 60  # 增大移动速度倍率
         PYMUNK_PLAYER_TURN_RAD_PER_SEC = math.radians(PLAYER_TURN_SPEED * 60 * 1.0)  # 增大旋转速度倍率
 
+        # 录制回放：主机的模拟中按槽位记录客户端的按键
+        slot = 0 if tank is self.game_view.player_tank else 1
+        for key in keys_pressed:
+            self.game_view.record_input(slot, key, True)
+        for key in keys_released:
+            self.game_view.record_input(slot, key, False)
+
         # 处理按键按下
         for key in keys_pressed:
             if key == "W":
@@ -719,13 +797,17 @@ class HostGameView(arcade.View):
                         self.game_view.bullet_list.append(bullet)
                         if bullet.pymunk_body and bullet.pymunk_shape:
                             self.game_view.space.add(bullet.pymunk_body, bullet.pymunk_shape)
+                        # 延迟补偿：在客户端开火时看到的主机坦克位置上检测命中
+                        self._compensate_client_shot(bullet, _client_id)
                         # 添加调试信息
-                        print(f"🔫 客户端发射子弹: 位置({bullet.center_x:.1f}, {bullet.center_y:.1f}), 角度{bullet.angle:.1f}, 子弹总数: {len(self.game_view.bullet_list)}")
+                        log.debug("🔫 客户端发射子弹: 位置(%.1f, %.1f), 角度%.1f, 子弹总数: %d",
+                                  bullet.center_x, bullet.center_y, bullet.angle, len(self.game_view.bullet_list))
                     else:
                         # 射击失败的调试信息
-                        print(f"🚫 客户端射击失败: 冷却时间未到 (当前时间: {self.game_view.total_time:.2f}, 上次射击: {tank.last_shot_time:.2f})")
+                        log.debug("🚫 客户端射击失败: 冷却时间未到 (当前时间: %.2f, 上次射击: %.2f)",
+                                  self.game_view.total_time, tank.last_shot_time)
                 else:
-                    print("🚫 客户端射击失败: 游戏视图缺少total_time属性")
+                    log.warning("🚫 客户端射击失败: 游戏视图缺少total_time属性")
 
         # 处理按键释放
         for key in keys_released:
@@ -740,9 +822,9 @@ class HostGameView(arcade.View):
 class ClientGameView(arcade.View):
     """客户端游戏视图 - 重构版"""
 
-    def __init__(self):
-        super().__init__()
-        self.game_client = GameClient()
+    def __init__(self, network=None, window=None):
+        super().__init__(window)
+        self.game_client = GameClient(network=network)
         self.game_state = {}
         self.connected = False
 
@@ -766,6 +848,19 @@ class ClientGameView(arcade.View):
         self.should_show_game_over = False
         self.game_end_data = None
 
+        # 子弹事件同步：网络线程收到的每个快照的子弹事件按顺序排队，主线程每帧全部应用，
+        # 主线程卡顿期间收到多个快照时，被新快照覆盖的生成/消失事件也不会丢失
+        self.bullet_applier = None
+        self.pending_bullet_states = []
+        self._bullet_states_lock = threading.Lock()
+
+        # 会话恢复：短暂断线时保留游戏视图，恢复后先应用关键帧
+        self.reconnecting = False
+
+        # 锁步对局：本地运行完整模拟，只与主机交换输入
+        self.lockstep_config = None
+        self.lockstep = None
+
         # 地图布局（从主机接收）
         self.received_map_layout = None
         self.received_map_checksum = None
@@ -788,19 +883,33 @@ class ClientGameView(arcade.View):
             anchor_x="center"
         )
 
-    def connect_to_room(self, host_ip: str, host_port: int, player_name: str) -> bool:
-        """连接到房间"""
+        self.reconnecting_text = arcade.Text(
+            "连接中断，正在重新连接...",
+            x=0, y=0,
+            color=arcade.color.ORANGE,
+            font_size=24,
+            anchor_x="center"
+        )
+
+    def connect_to_room(self, host_ip: str, host_port: int, player_name: str,
+                        spectator: bool = False) -> bool:
+        """连接到房间（spectator为True时只观战）"""
         # 设置回调
         self.game_client.set_callbacks(
             connection=self._on_connected,
             disconnection=self._on_disconnected,
             game_state=self._on_game_state_update,
+            dropped_state=self._on_dropped_game_state,
             game_start=self._on_game_start,
             game_end=self._on_game_end,
-            map_sync=self._on_map_sync
+            map_sync=self._on_map_sync,
+            interrupted=self._on_connection_interrupted,
+            resumed=self._on_connection_resumed,
+            lockstep_input=self._on_lockstep_input,
+            rollback_state=self._on_rollback_state
         )
 
-        return self.game_client.connect_to_host(host_ip, host_port, player_name)
+        return self.game_client.connect_to_host(host_ip, host_port, player_name, spectator)
 
     def on_show_view(self):
         """显示视图时的初始化"""
@@ -820,6 +929,9 @@ class ClientGameView(arcade.View):
         self.is_switching_view = False
         self.should_return_to_browser = False
 
+        if self.game_view:
+            self.game_view.stop_replay_recording()
+
         # 断开网络连接
         self.game_client.disconnect()
 
@@ -843,6 +955,11 @@ class ClientGameView(arcade.View):
             # 游戏进行中，委托给游戏视图
             self.game_view.on_draw()
 
+        if self.reconnecting:
+            self.reconnecting_text.x = self.window.width // 2
+            self.reconnecting_text.y = self.window.height // 2
+            self.reconnecting_text.draw()
+
     def on_update(self, _delta_time):
         """更新逻辑"""
         # 检查是否需要返回主菜单（回退机制）
@@ -876,9 +993,22 @@ class ClientGameView(arcade.View):
             except Exception as e:
                 print(f"显示游戏结束界面时出错: {e}")
 
-        if self.game_phase == "playing" and self.game_view:
+        if self.game_phase == "playing" and self.game_view and self.lockstep:
+            # 锁步/回滚：以固定步长模拟双方的输入
+            self.lockstep.update(self.game_view, _delta_time)
+
+        elif self.game_phase == "playing" and self.game_view:
             # 应用服务器状态到本地游戏视图
-            self._apply_server_state()
+            started = profiler.start()
+            with tracer.span("state_apply", "client"):
+                self._apply_server_state()
+            profiler.lap("state_apply", started)
+
+            # 本地模拟子弹飞行（坦克位置已由服务器状态确定）
+            try:
+                self.game_view.step_physics(_delta_time)
+            except Exception as e:
+                print(f"本地物理模拟出错: {e}")
 
     def on_key_press(self, key, _modifiers):
         """处理按键事件"""
@@ -895,16 +1025,22 @@ class ClientGameView(arcade.View):
                     print(f"ESC返回主菜单时出错: {e}")
                 finally:
                     self.is_switching_view = False
+        elif key == arcade.key.F3 and self.game_view:
+            self.game_view.toggle_profiler()
         else:
             # 发送按键到服务器
             key_name = self._get_key_name(key)
-            if key_name:
+            if self.lockstep and key_name in KEY_BITS:
+                self.lockstep.key_press(key_name)
+            elif key_name:
                 self.game_client.send_key_press(key_name)
 
     def on_key_release(self, key, _modifiers):
         """处理按键释放事件"""
         key_name = self._get_key_name(key)
-        if key_name:
+        if self.lockstep and key_name in KEY_BITS:
+            self.lockstep.key_release(key_name)
+        elif key_name:
             self.game_client.send_key_release(key_name)
 
     def _on_connected(self, player_id: str):
@@ -978,6 +1114,10 @@ class ClientGameView(arcade.View):
         """游戏开始回调"""
         print("收到游戏开始消息")
 
+        # 锁步/回滚对局的配置（地图种子、输入延迟）
+        self.lockstep_config = (game_config if game_config.get("sync_mode") in (SYNC_LOCKSTEP, SYNC_ROLLBACK)
+                                else None)
+
         # 保存地图布局
         if "map_layout" in game_config:
             self._process_received_map(game_config["map_layout"], game_config.get("map_checksum"))
@@ -987,8 +1127,41 @@ class ClientGameView(arcade.View):
             self.should_initialize_game = True
 
     def _on_game_state_update(self, state: dict):
-        """游戏状态更新回调"""
+        """游戏状态更新回调（网络线程）"""
+        if state.get("bullet_events"):
+            # 坦克和分数只需要最新的快照，子弹事件（包括关键帧的完整子弹列表）每个快照都要应用
+            with self._bullet_states_lock:
+                self.pending_bullet_states.append(state)
         self.game_state = state
+        tracer.instant("state_received", "client", {"game_time": state.get("game_time")})
+
+    def _on_dropped_game_state(self, state: dict):
+        """积压时被较新快照取代的游戏状态（网络线程）：只保留其中的子弹事件"""
+        if state.get("bullet_events"):
+            with self._bullet_states_lock:
+                self.pending_bullet_states.append(state)
+
+    def _on_lockstep_input(self, data: bytes):
+        """锁步输入包回调（网络线程）；本地对局还未初始化时丢弃，主机会重发未确认的输入"""
+        lockstep = self.lockstep
+        if lockstep:
+            lockstep.receive(data)
+
+    def _on_rollback_state(self, data: dict):
+        """回滚模式下主机的权威状态回调（网络线程），在下一次推进时校正"""
+        lockstep = self.lockstep
+        if isinstance(lockstep, RollbackSession) and "tick" in data and "state" in data:
+            lockstep.receive_state(data["tick"], data["state"])
+
+    def _on_connection_interrupted(self, reason: str):
+        """连接中断回调：保留游戏视图，显示重连提示"""
+        print(f"连接中断，正在重连: {reason}")
+        self.reconnecting = True
+
+    def _on_connection_resumed(self):
+        """会话恢复回调：主机随后发送关键帧"""
+        print("已重新连接到主机")
+        self.reconnecting = False
 
     def _on_game_end(self, game_end_data: dict):
         """游戏结束回调"""
@@ -1074,7 +1247,14 @@ class ClientGameView(arcade.View):
             print("❌ 地图数据验证失败，无法初始化游戏")
             return
 
-        self.game_view = game_views.GameView(mode="network_client")
+        if self.lockstep_config:
+            # 锁步/回滚：双方运行相同的权威逻辑（与主机相同的模式）
+            self.game_view = game_views.GameView(mode="network_host", window=self.window)
+            # 回滚对局会重新模拟，按tick录制的输入无法重放
+            self.game_view.allow_replay_recording = self.lockstep_config["sync_mode"] != SYNC_ROLLBACK
+            self._check_lockstep_map()
+        else:
+            self.game_view = game_views.GameView(mode="network_client", window=self.window)
 
         # 设置固定地图
         self.game_view.set_map_layout(self.received_map_layout)
@@ -1090,9 +1270,39 @@ class ClientGameView(arcade.View):
         # 重要：调用setup方法初始化游戏元素，包括player_list
         self.game_view.setup()
 
+        # 子弹事件应用器（子弹在本地物理空间中模拟）
+        self.bullet_applier = BulletEventApplier(self.game_view, self._get_bullet_color_for_owner)
+
+        if self.lockstep_config:
+            session_class = (RollbackSession if self.lockstep_config["sync_mode"] == SYNC_ROLLBACK
+                             else LockstepSession)
+            self.lockstep = session_class(
+                local_slot=1,
+                send=self.game_client.send_lockstep_input,
+                input_delay=self.lockstep_config.get("input_delay", INPUT_DELAY_TICKS)
+            )
+
         self.game_phase = "playing"
         print("🎮 客户端游戏开始！")
 
+    def _check_lockstep_map(self):
+        """用主机下发的种子选择地图，与接收到的地图比较（不一致说明双方版本不同）"""
+        import random
+        from maps import get_random_map_layout
+        from .map_sync import MapSyncManager
+
+        if self.lockstep_config.get("tick_rate", LOCKSTEP_TICK_RATE) != LOCKSTEP_TICK_RATE:
+            print("❌ 锁步模拟频率与主机不一致，双方版本可能不同")
+
+        seed = self.lockstep_config.get("map_seed")
+        if seed is None:
+            return
+        seeded_layout = get_random_map_layout(random.Random(seed))
+        if MapSyncManager.compare_maps(seeded_layout, self.received_map_layout):
+            print(f"✅ 锁步地图种子验证通过: {seed}")
+        else:
+            print("❌ 锁步地图种子与主机地图不一致，使用主机的地图（双方版本可能不同）")
+
     def _apply_server_state(self):
         """应用服务器状态到本地游戏视图"""
         if not self.game_view or not self.game_state:
@@ -1111,6 +1321,12 @@ class ClientGameView(arcade.View):
                             tank.angle = tank_data.get("angle", tank.angle)
                             if hasattr(tank, 'health'):
                                 tank.health = tank_data.get("health", tank.health)
+                            # 同步物理体位置，使本地模拟的子弹在正确的位置与坦克碰撞
+                            if getattr(tank, 'pymunk_body', None) is not None:
+                                tank.pymunk_body.position = (tank.center_x, tank.center_y)
+                                tank.pymunk_body.angle = math.radians(90 - tank.angle)
+                                tank.pymunk_body.velocity = (0, 0)
+                                tank.pymunk_body.angular_velocity = 0
                             # 更新坦克图片文件信息（用于子弹颜色计算）
                             if "tank_image_file" in tank_data and tank_data["tank_image_file"]:
                                 tank.tank_image_file = tank_data["tank_image_file"]
@@ -1118,128 +1334,14 @@ class ClientGameView(arcade.View):
                             if "player_id" in tank_data:
                                 tank.player_id = tank_data["player_id"]
             except Exception as e:
-                print(f"应用坦克状态时出错: {e}")
+                log.warning("应用坦克状态时出错: %s", e)
 
-        # 更新子弹状态 - 修复子弹同步问题
-        bullets_data = self.game_state.get("bullets", [])
-        if hasattr(self.game_view, 'bullet_list') and self.game_view.bullet_list is not None:
-            try:
-                # 改进的子弹同步策略：基于子弹ID进行精确匹配
-                current_bullets = {getattr(bullet, 'bullet_id', i): bullet
-                                 for i, bullet in enumerate(self.game_view.bullet_list) if bullet is not None}
-                server_bullets = {bullet_data.get("id", i): bullet_data
-                                for i, bullet_data in enumerate(bullets_data)}
-
-                # 移除不再存在的子弹
-                bullets_to_remove = []
-                for bullet_id, bullet in current_bullets.items():
-                    if bullet_id not in server_bullets:
-                        bullets_to_remove.append(bullet)
-
-                for bullet in bullets_to_remove:
-                    try:
-                        # 从物理空间移除
-                        if hasattr(self.game_view, 'space') and self.game_view.space:
-                            if bullet.pymunk_body and bullet.pymunk_body in self.game_view.space.bodies:
-                                self.game_view.space.remove(bullet.pymunk_body)
-                            if hasattr(bullet, 'pymunk_shape') and bullet.pymunk_shape:
-                                if bullet.pymunk_shape in self.game_view.space.shapes:
-                                    self.game_view.space.remove(bullet.pymunk_shape)
-                        # 从列表移除
-                        if bullet in self.game_view.bullet_list:
-                            self.game_view.bullet_list.remove(bullet)
-                    except Exception as e:
-                        print(f"移除过期子弹时出错: {e}")
-
-                # 更新现有子弹或创建新子弹
-                for bullet_id, bullet_data in server_bullets.items():
-                    bullet_x = bullet_data.get("x", 0)
-                    bullet_y = bullet_data.get("y", 0)
-                    bullet_angle = bullet_data.get("angle", 0)
-                    bullet_owner = bullet_data.get("owner", "unknown")
-
-                    if bullet_id in current_bullets:
-                        # 更新现有子弹位置
-                        bullet = current_bullets[bullet_id]
-                        bullet.center_x = bullet_x
-                        bullet.center_y = bullet_y
-                        bullet.angle = bullet_angle
-
-                        # 同步到物理体并设置正确的速度
-                        if bullet.pymunk_body:
-                            bullet.pymunk_body.position = (bullet_x, bullet_y)
-
-                            # 修复：为客户端子弹设置正确的物理速度，避免卡顿
-                            import math
-                            speed = bullet_data.get("speed", 16)
-                            pymunk_speed = speed * 60  # 转换为Pymunk速度
-                            angle_rad = math.radians(bullet_angle)
-
-                            # 计算速度向量（与tank_sprites.py中的逻辑保持一致）
-                            vx = -pymunk_speed * math.sin(angle_rad)
-                            vy = pymunk_speed * math.cos(angle_rad)
-                            bullet.pymunk_body.velocity = (vx, vy)
-
-                    else:
-                        # 创建新子弹
-                        try:
-                            from tank_sprites import Bullet
-
-                            # 根据子弹所有者确定正确的子弹颜色
-                            bullet_color = self._get_bullet_color_for_owner(bullet_owner)
-
-                            # 使用标准子弹半径（与tank_sprites.py保持一致）
-                            BULLET_RADIUS = 4
-
-                            # 创建子弹对象（客户端显示用，但保留基本物理属性以支持碰撞检测）
-                            bullet = Bullet(
-                                radius=BULLET_RADIUS,
-                                owner=None,  # 客户端显示用，不需要owner引用
-                                tank_center_x=bullet_x,
-                                tank_center_y=bullet_y,
-                                actual_emission_angle_degrees=bullet_angle,
-                                speed_magnitude=bullet_data.get("speed", 16),  # 使用服务器提供的速度
-                                color=bullet_color
-                            )
-
-                            # 设置子弹ID用于跟踪
-                            bullet.bullet_id = bullet_id
-
-                            # 设置子弹位置（确保精确同步）
-                            bullet.center_x = bullet_x
-                            bullet.center_y = bullet_y
-                            bullet.angle = bullet_angle
-
-                            # 添加到子弹列表
-                            self.game_view.bullet_list.append(bullet)
-
-                            # 将子弹添加到物理空间（保持物理属性以支持碰撞检测）
-                            if hasattr(self.game_view, 'space') and self.game_view.space:
-                                if bullet.pymunk_body and bullet.pymunk_shape:
-                                    # 设置子弹位置
-                                    bullet.pymunk_body.position = (bullet_x, bullet_y)
-
-                                    # 修复：为新创建的客户端子弹设置正确的物理速度
-                                    import math
-                                    speed = bullet_data.get("speed", 16)
-                                    pymunk_speed = speed * 60  # 转换为Pymunk速度
-                                    angle_rad = math.radians(bullet_angle)
-
-                                    # 计算速度向量（与tank_sprites.py中的逻辑保持一致）
-                                    vx = -pymunk_speed * math.sin(angle_rad)
-                                    vy = pymunk_speed * math.cos(angle_rad)
-                                    bullet.pymunk_body.velocity = (vx, vy)
-
-                                    # 添加到物理空间
-                                    self.game_view.space.add(bullet.pymunk_body, bullet.pymunk_shape)
-
-                                    print(f"🔫 客户端创建子弹: 位置({bullet_x:.1f}, {bullet_y:.1f}), 角度{bullet_angle:.1f}, 速度({vx:.1f}, {vy:.1f})")
-
-                        except Exception as e:
-                            print(f"创建客户端子弹时出错: {e}")
-
-            except Exception as e:
-                print(f"应用子弹状态时出错: {e}")
+        # 更新子弹状态 - 按到达顺序应用上一帧以来所有快照的子弹事件（每个快照只应用一次），
+        # 飞行轨迹由本地物理模拟；恢复连接后的关键帧按完整列表重建子弹
+        with self._bullet_states_lock:
+            states, self.pending_bullet_states = self.pending_bullet_states, []
+        for state in states:
+            self._apply_bullet_events(state)
 
         # 更新分数
         scores = self.game_state.get("scores", {})
@@ -1258,6 +1360,15 @@ class ClientGameView(arcade.View):
             if hasattr(self.game_view, 'round_result_text') and "round_result_text" in round_info:
                 self.game_view.round_result_text = round_info["round_result_text"]
 
+    def _apply_bullet_events(self, state: dict):
+        """应用一个快照中的子弹事件"""
+        bullet_events = state.get("bullet_events")
+        if bullet_events and self.bullet_applier:
+            try:
+                self.bullet_applier.apply(bullet_events, state.get("game_time", 0.0))
+            except Exception as e:
+                log.warning("应用子弹事件时出错: %s", e)
+
     def _get_bullet_color_for_owner(self, owner_id: str):
         """根据子弹所有者确定子弹颜色（与tank_sprites.py中的逻辑保持一致）"""
         import arcade
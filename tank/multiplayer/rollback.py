@@ -0,0 +1,293 @@
+"""
+回滚同步模块
+
+在锁步同步（lockstep.py）的基础上去掉输入延迟：
+- 本地输入在当前tick立即生效，对方的输入还没到时按对方最后确认的按键预测
+- 模拟每个tick之前保存一份轻量的状态快照（坦克和子弹刚体、血量、射击冷却、比分、回合计时）
+- 对方的真实输入到达后与预测比较，不一致时恢复到该tick的快照，用真实输入重新模拟到当前tick
+- 预测超过 MAX_ROLLBACK_TICKS 个tick仍未确认时停下等待，重新模拟的量不会超过一帧的预算
+
+输入包格式和确认/重发机制与锁步同步相同（LOCKSTEP_MAGIC），双方可以使用同一条通道。
+
+快照只保存刚体的状态，不保存物理引擎内部的接触缓存（pymunk 无法单独保存，
+Space.copy 也无法深拷贝关联了精灵的刚体），回滚后的结果与未回滚时可能有极小差异。
+因此主机每隔 STATE_SYNC_INTERVAL 个tick发送一次已确认tick的权威状态（ROLLBACK_STATE），
+客户端与自己在该tick的快照比较，不一致时恢复快照、套用主机的数值并重新模拟到当前tick，
+差异不会累积成不同的比分。
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+
+import pymunk
+
+from match_state import apply_values
+
+from .lockstep import LockstepSession
+
+# 回滚模式的本地输入延迟（0表示本地操作没有延迟）
+ROLLBACK_INPUT_DELAY = 0
+# 最多预测的tick数（60Hz下约133ms），超过时等待对方输入
+MAX_ROLLBACK_TICKS = 8
+# 主机发送权威状态的间隔（tick）
+STATE_SYNC_INTERVAL = 30
+# 已确认tick之前保留的快照数，用于套用主机稍晚送达的权威状态
+STATE_HISTORY_TICKS = 30
+
+
+class SimulationSnapshot:
+    """GameView 模拟状态的轻量快照
+
+    保存对象引用和刚体的数值状态，恢复时原地修改，不重建墙壁和精灵。
+    回合重置时创建的新坦克、快照之后生成或消失的子弹都会被移除/放回。
+    """
+
+    __slots__ = ("bodies", "tanks", "bullets", "player_tank", "player2_tank",
+                 "player_sprites", "bullet_sprites", "scalars", "masks")
+
+    @classmethod
+    def capture(cls, game_view, masks: Optional[List[int]] = None) -> "SimulationSnapshot":
+        """保存当前状态（masks：此时已应用的输入位掩码）"""
+        snapshot = cls()
+        snapshot.bodies = [(body, body.position, body.angle, body.velocity, body.angular_velocity)
+                           for body in game_view.space.bodies
+                           if body.body_type == pymunk.Body.DYNAMIC]
+        snapshot.player_sprites = list(game_view.player_list)
+        snapshot.bullet_sprites = list(game_view.bullet_list)
+        snapshot.tanks = [(tank, tank.health, tank.last_shot_time) for tank in snapshot.player_sprites]
+        snapshot.bullets = [(bullet, bullet.bounce_count) for bullet in snapshot.bullet_sprites]
+        snapshot.player_tank = game_view.player_tank
+        snapshot.player2_tank = game_view.player2_tank
+        snapshot.scalars = (game_view.total_time, game_view.player1_score, game_view.player2_score,
+                            game_view.round_over, game_view.round_over_timer,
+                            game_view.round_result_text, game_view.game_over)
+        snapshot.masks = list(masks) if masks is not None else None
+        return snapshot
+
+    def restore(self, game_view):
+        """把 game_view 原地恢复到快照时的状态"""
+        space = game_view.space
+        saved_bodies = {body for body, *_ in self.bodies}
+        for body in space.bodies:
+            if body.body_type == pymunk.Body.DYNAMIC and body not in saved_bodies:
+                space.remove(body, *body.shapes)
+        current_bodies = set(space.bodies)
+        for body, position, angle, velocity, angular_velocity in self.bodies:
+            if body not in current_bodies:
+                space.add(body, *body.shapes)
+            body.position = position
+            body.angle = angle
+            body.velocity = velocity
+            body.angular_velocity = angular_velocity
+
+        for sprite_list, sprites in ((game_view.player_list, self.player_sprites),
+                                     (game_view.bullet_list, self.bullet_sprites)):
+            if list(sprite_list) != sprites:
+                sprite_list.clear()
+                sprite_list.extend(sprites)
+
+        for tank, health, last_shot_time in self.tanks:
+            tank.health = health
+            tank.last_shot_time = last_shot_time
+            tank.sync_with_pymunk_body()
+        for bullet, bounce_count in self.bullets:
+            bullet.bounce_count = bounce_count
+            bullet.sync_with_pymunk_body()
+
+        game_view.player_tank = self.player_tank
+        game_view.player2_tank = self.player2_tank
+        (game_view.total_time, game_view.player1_score, game_view.player2_score,
+         game_view.round_over, game_view.round_over_timer,
+         game_view.round_result_text, game_view.game_over) = self.scalars
+        game_view.pymunk_bodies_to_remove_post_step.clear()
+        game_view.arcade_sprites_to_remove_post_step.clear()
+
+    def to_state(self) -> Dict[str, Any]:
+        """转换为可以JSON编码的数值状态（坦克按槽位，子弹记录所有者的槽位）"""
+        bodies = {body: (position, angle, velocity, angular_velocity)
+                  for body, position, angle, velocity, angular_velocity in self.bodies}
+        tank_values = {tank: (health, last_shot_time) for tank, health, last_shot_time in self.tanks}
+        slots = (self.player_tank, self.player2_tank)
+
+        tanks = []
+        for tank in slots:
+            if tank in tank_values and tank.pymunk_body in bodies:
+                position, angle, velocity, angular_velocity = bodies[tank.pymunk_body]
+                tanks.append([position.x, position.y, angle, velocity.x, velocity.y,
+                              angular_velocity, *tank_values[tank]])
+            else:
+                tanks.append(None)
+
+        bullets = []
+        for bullet, bounce_count in self.bullets:
+            if bullet.owner not in slots or bullet.pymunk_body not in bodies:
+                continue
+            position, angle, velocity, angular_velocity = bodies[bullet.pymunk_body]
+            bullets.append([slots.index(bullet.owner), position.x, position.y, angle,
+                            velocity.x, velocity.y, angular_velocity, bounce_count])
+
+        return {"tanks": tanks, "bullets": bullets, "scalars": list(self.scalars)}
+
+
+def apply_state(game_view, state: Dict[str, Any]):
+    """把主机的权威状态（SimulationSnapshot.to_state 的结果）套用到 game_view"""
+    apply_values(game_view, state.get("tanks", []), state.get("bullets", []), state["scalars"])
+
+
+class RollbackSession(LockstepSession):
+    """一局回滚对局：预测对方输入，输入到达后回滚并重新模拟
+
+    state_sync(tick, state)：主机设置，定期发送已确认tick的权威状态；
+    客户端收到后调用 receive_state，在下一次推进时校正。
+    """
+
+    def __init__(self, local_slot: int, send, input_delay: int = ROLLBACK_INPUT_DELAY,
+                 max_rollback: int = MAX_ROLLBACK_TICKS,
+                 state_sync: Optional[Callable[[int, Dict[str, Any]], None]] = None):
+        super().__init__(local_slot, send, input_delay)
+        self.max_rollback = max_rollback
+        self.state_sync = state_sync
+
+        self.confirmed_tick = 0        # 该tick之前都已用对方的真实输入模拟
+        self._last_confirmed_mask = 0  # 预测值：对方最后确认的输入
+        self._used_remote: Dict[int, int] = {}
+        self._snapshots: Dict[int, SimulationSnapshot] = {}
+        self._last_sync_tick = 0
+        self._pending_state = None     # (tick, state)：主机的权威状态，在游戏循环中套用
+
+        # 统计信息
+        self.rollback_count = 0
+        self.resimulated_ticks = 0
+        self.max_rollback_depth = 0
+        self.correction_count = 0
+
+    def _first_pending_tick(self) -> int:
+        return self.confirmed_tick
+
+    def advance(self, game_view) -> bool:
+        """模拟一个tick；预测窗口已满时返回False（下一帧再试）"""
+        self._schedule_local_input()
+        self._reconcile(game_view)
+
+        if self.tick - self.confirmed_tick >= self.max_rollback:
+            self.stall_count += 1
+            return False
+
+        self._simulate(game_view, self.tick)
+        self.tick += 1
+        return True
+
+    def _reconcile(self, game_view):
+        """确认新到达的对方输入，与预测不一致时回滚到最早的错误tick重新模拟"""
+        with self._lock:
+            remote = dict(self._inputs[self.remote_slot])
+
+        mismatch = None
+        for tick in range(self.confirmed_tick, self.tick):
+            if tick in remote and remote[tick] != self._used_remote[tick]:
+                mismatch = tick
+                break
+
+        confirmed = self.confirmed_tick
+        while confirmed < self.tick and confirmed in remote:
+            confirmed += 1
+        if confirmed > self.confirmed_tick:
+            self._last_confirmed_mask = remote[confirmed - 1]
+        self.confirmed_tick = confirmed
+
+        if mismatch is not None:
+            self._rollback(game_view, mismatch)
+        self._sync_state(game_view)
+        self._discard_before(confirmed - STATE_HISTORY_TICKS)
+
+    def receive_state(self, tick: int, state: Dict[str, Any]):
+        """收到主机的权威状态（网络线程调用，只保留最新的一份）"""
+        with self._lock:
+            if self._pending_state is None or tick > self._pending_state[0]:
+                self._pending_state = (tick, state)
+
+    def _sync_state(self, game_view):
+        """主机：定期发送权威状态；客户端：套用已确认范围内的权威状态"""
+        confirmed = self.confirmed_tick
+        if self.state_sync:
+            sync_tick = confirmed - 1
+            if sync_tick >= self._last_sync_tick + STATE_SYNC_INTERVAL and sync_tick in self._snapshots:
+                self._last_sync_tick = sync_tick
+                self.state_sync(sync_tick, self._snapshots[sync_tick].to_state())
+            return
+
+        with self._lock:
+            pending = self._pending_state
+            # 还有未确认的对方输入时，之后的回滚会覆盖校正，等确认后再套用
+            if pending is None or pending[0] > confirmed:
+                return
+            self._pending_state = None
+
+        tick, state = pending
+        snapshot = self._snapshots.get(tick)
+        if snapshot is None:
+            print(f"⚠️ 回滚权威状态过旧，已丢弃: tick {tick}")
+            return
+        if snapshot.to_state() != state:
+            self._rollback(game_view, tick, state)
+            self.correction_count += 1
+
+    def _rollback(self, game_view, from_tick: int, state: Optional[Dict[str, Any]] = None):
+        """恢复 from_tick 之前的快照（可再套用主机的权威状态），重新模拟到当前tick（不重复播放音效）"""
+        import tank_sprites
+
+        depth = self.tick - from_tick
+        snapshot = self._snapshots[from_tick]
+        snapshot.restore(game_view)
+        if state is not None:
+            apply_state(game_view, state)
+        self._applied_masks = list(snapshot.masks)
+
+        sound_enabled = tank_sprites.SOUND_ENABLED
+        tank_sprites.SOUND_ENABLED = False
+        try:
+            for tick in range(from_tick, self.tick):
+                self._simulate(game_view, tick)
+        finally:
+            tank_sprites.SOUND_ENABLED = sound_enabled
+
+        self.rollback_count += 1
+        self.resimulated_ticks += depth
+        self.max_rollback_depth = max(self.max_rollback_depth, depth)
+
+    def _simulate(self, game_view, tick: int):
+        """保存快照后模拟一个tick，对方输入未到时使用预测值"""
+        self._snapshots[tick] = SimulationSnapshot.capture(game_view, self._applied_masks)
+        with self._lock:
+            local = self._inputs[self.local_slot][tick]
+            remote = self._inputs[self.remote_slot].get(tick, self._last_confirmed_mask)
+        self._used_remote[tick] = remote
+
+        masks = [0, 0]
+        masks[self.local_slot] = local
+        masks[self.remote_slot] = remote
+        self._step(game_view, masks)
+
+    def _discard_before(self, tick: int):
+        """丢弃不会再回滚到的快照和输入"""
+        for old in [t for t in self._snapshots if t < tick]:
+            del self._snapshots[old]
+            self._used_remote.pop(old, None)
+        with self._lock:
+            remote = self._inputs[self.remote_slot]
+            for old in [t for t in remote if t < tick]:
+                del remote[old]
+            local = self._inputs[self.local_slot]
+            for old in [t for t in local if t < min(tick, self._peer_ack)]:
+                del local[old]
+
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        stats = super().get_stats()
+        stats.update({
+            "confirmed_tick": self.confirmed_tick,
+            "rollbacks": self.rollback_count,
+            "resimulated_ticks": self.resimulated_ticks,
+            "max_rollback_depth": self.max_rollback_depth,
+            "corrections": self.correction_count,
+        })
+        return stats
@@ -1,14 +1,32 @@
 """
 房间发现模块 - 重构版
 
-专为1对1双人游戏设计的简化房间发现机制
+专为1对1双人游戏设计的简化房间发现机制：
+- 主机定期广播房间信息，人数变化时立即广播，满员后降低广播频率
+- 浏览器启动时主动发送查询，主机收到后立即回复，不必等待下一次定期广播
+- 可选使用组播组代替广播
+- 房间关闭时发送关闭通知，浏览器立即移除
 """
 
-import socket
 import threading
 import time
 from typing import Dict, List, Callable, Optional, Tuple
 from .messages import MessageFactory, NetworkMessage, MessageType
+from .transport import get_default_network, BROADCAST_ADDRESS
+from .tracing import tracer
+
+# 定期广播间隔（秒）
+ADVERTISE_INTERVAL = 2.0
+# 房间满员后的广播间隔（仍需广播以便观众加入，但不需要频繁广播）
+FULL_ADVERTISE_INTERVAL = 5.0
+# 超过 广播间隔 × 该倍数 没有收到广播时房间过期
+EXPIRY_FACTOR = 2.5
+# 开始搜索后发送查询的时间点（秒），重复发送以应对丢包
+QUERY_SCHEDULE = (0.0, 0.25, 1.0)
+# 查询发送到的游戏端口数量（从发现端口+1开始，覆盖同一台机器上的多房间服务器）
+QUERY_PORT_RANGE = 32
+# 默认组播组
+DEFAULT_MULTICAST_GROUP = "239.255.77.77"
 
 
 class RoomInfo:
@@ -23,10 +41,17 @@ class RoomInfo:
         self.players = 1  # 主机自己
         self.max_players = 2
         self.game_mode = "1v1"
+        self.advertise_interval = ADVERTISE_INTERVAL  # 主机声明的广播间隔
     
-    def is_expired(self, timeout: float = 10.0) -> bool:
-        """检查房间信息是否过期"""
+    def is_expired(self, timeout: Optional[float] = None) -> bool:
+        """检查房间信息是否过期（默认按主机的广播间隔计算超时）"""
+        if timeout is None:
+            timeout = self.advertise_interval * EXPIRY_FACTOR
         return time.time() - self.last_seen > timeout
+
+    def is_full(self) -> bool:
+        """房间玩家是否已满"""
+        return self.players >= self.max_players
     
     def update_last_seen(self):
         """更新最后看到的时间"""
@@ -39,18 +64,31 @@ class RoomInfo:
 class RoomDiscovery:
     """房间发现类 - 重构版"""
     
-    def __init__(self, discovery_port: int = 12345):
+    def __init__(self, discovery_port: int = 12345, network=None, host_port: Optional[int] = None,
+                 multicast_group: Optional[str] = None, query_ports: Optional[List[int]] = None):
         self.discovery_port = discovery_port
+        # 广播的游戏端口（默认是发现端口+1，同一台机器上运行多个房间时各不相同）
+        self.host_port = host_port if host_port is not None else discovery_port + 1
         self.running = False
+        self.network = network or get_default_network()
+        # 组播组（None 表示使用广播）
+        self.multicast_group = multicast_group
+        # 浏览器发送查询的游戏端口
+        if query_ports is None:
+            query_ports = range(discovery_port + 1, discovery_port + 1 + QUERY_PORT_RANGE)
+        self.query_ports = list(query_ports)
         
         # 房间广播相关
-        self.broadcast_socket = None
+        self.broadcast_transport = None
         self.broadcast_thread = None
         self.room_name = ""
         self.host_name = ""
+        self.players = 1
+        self.max_players = 2
+        self.advertise_wakeup = threading.Event()  # 人数变化时唤醒广播线程立即广播
         
         # 房间搜索相关
-        self.listen_socket = None
+        self.listen_transport = None
         self.listen_thread = None
         self.discovered_rooms: Dict[str, RoomInfo] = {}
         self.room_update_callback: Optional[Callable[[List[RoomInfo]], None]] = None
@@ -67,11 +105,11 @@ class RoomDiscovery:
         self.host_name = host_name
         
         try:
-            # 创建广播套接字
-            self.broadcast_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.broadcast_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            # 创建广播传输
+            self.broadcast_transport = self.network.create_transport(broadcast=True)
             
             self.running = True
+            self.advertise_wakeup.clear()
             self.broadcast_thread = threading.Thread(target=self._broadcast_loop, daemon=True)
             self.broadcast_thread.start()
             
@@ -85,14 +123,20 @@ class RoomDiscovery:
     
     def stop_advertising(self):
         """停止广播房间"""
+        was_running = self.running
         self.running = False
+        self.advertise_wakeup.set()
+        
+        # 通知浏览器房间已关闭
+        if was_running and self.broadcast_transport:
+            self._send_advertise(closed=True)
         
-        if self.broadcast_socket:
+        if self.broadcast_transport:
             try:
-                self.broadcast_socket.close()
+                self.broadcast_transport.close()
             except:
                 pass
-            self.broadcast_socket = None
+            self.broadcast_transport = None
         
         if self.broadcast_thread:
             self.broadcast_thread.join(timeout=1.0)
@@ -108,11 +152,8 @@ class RoomDiscovery:
         self.room_update_callback = room_update_callback
         
         try:
-            # 创建监听套接字
-            self.listen_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.listen_socket.bind(('', self.discovery_port))
-            self.listen_socket.settimeout(1.0)
+            # 创建监听传输并绑定发现端口
+            self.listen_transport = self._create_listen_transport()
             
             self.running = True
             self.listen_thread = threading.Thread(target=self._discovery_loop, daemon=True)
@@ -130,12 +171,12 @@ class RoomDiscovery:
         """停止搜索房间"""
         self.running = False
         
-        if self.listen_socket:
+        if self.listen_transport:
             try:
-                self.listen_socket.close()
+                self.listen_transport.close()
             except:
                 pass
-            self.listen_socket = None
+            self.listen_transport = None
         
         if self.listen_thread:
             self.listen_thread.join(timeout=1.0)
@@ -160,44 +201,114 @@ class RoomDiscovery:
             
             return list(self.discovered_rooms.values())
     
+    def update_occupancy(self, players: int, max_players: Optional[int] = None):
+        """更新房间人数，发生变化时立即广播"""
+        if max_players is None:
+            max_players = self.max_players
+        if (players, max_players) == (self.players, self.max_players):
+            return
+        self.players = players
+        self.max_players = max_players
+        self.advertise_wakeup.set()
+
+    def get_advertise_interval(self) -> float:
+        """当前的定期广播间隔（满员后降低频率）"""
+        if self.players >= self.max_players:
+            return FULL_ADVERTISE_INTERVAL
+        return ADVERTISE_INTERVAL
+
+    def create_advertise_message(self, closed: bool = False) -> NetworkMessage:
+        """创建本房间的广播消息"""
+        return MessageFactory.create_room_advertise(
+            self.room_name, self.host_name, self.host_port,
+            players=self.players, max_players=self.max_players,
+            interval=self.get_advertise_interval(), closed=closed
+        )
+
+    def answer_query(self, transport, addr: Tuple[str, int]):
+        """回复浏览器的房间查询（由主机在游戏端口上收到查询时调用）"""
+        if not self.running or not self.room_name:
+            return
+        try:
+            transport.send(self.create_advertise_message().to_bytes(), addr)
+        except Exception as e:
+            print(f"回复房间查询失败: {e}")
+
+    def _send_advertise(self, closed: bool = False):
+        """广播一次房间信息（使用组播组时发送到组播组）"""
+        target = self.multicast_group or BROADCAST_ADDRESS
+        tracer.instant("advertise", "discovery", {"closed": closed})
+        try:
+            self.broadcast_transport.send(
+                self.create_advertise_message(closed).to_bytes(),
+                (target, self.discovery_port)
+            )
+        except Exception as e:
+            print(f"房间广播错误: {e}")
+
     def _broadcast_loop(self):
-        """房间广播循环"""
+        """房间广播循环：定期广播，人数变化时立即广播"""
         while self.running:
+            self._send_advertise()
+            
+            # 等待下次广播（人数变化时提前唤醒）
+            self.advertise_wakeup.wait(self.get_advertise_interval())
+            self.advertise_wakeup.clear()
+
+    def _create_listen_transport(self):
+        """创建监听传输，加入组播组失败时退回只接收广播"""
+        if self.multicast_group:
             try:
-                # 创建房间广播消息
-                message = MessageFactory.create_room_advertise(self.room_name, self.host_name)
-                
-                # 广播到局域网
-                self.broadcast_socket.sendto(
-                    message.to_bytes(),
-                    ('<broadcast>', self.discovery_port)
-                )
-                
-                # 等待下次广播
-                time.sleep(2.0)  # 每2秒广播一次
-                
-            except Exception as e:
-                if self.running:
-                    print(f"房间广播错误: {e}")
-                break
+                return self.network.create_transport(self.discovery_port, broadcast=True,
+                                                     multicast_group=self.multicast_group)
+            except OSError as e:
+                print(f"加入组播组失败，只使用广播: {e}")
+                self.multicast_group = None
+        return self.network.create_transport(self.discovery_port, broadcast=True)
+
+    def refresh(self):
+        """立即发送房间查询"""
+        if not self.listen_transport:
+            return
+        data = MessageFactory.create_room_query().to_bytes()
+        targets = [BROADCAST_ADDRESS]
+        if self.multicast_group:
+            targets.append(self.multicast_group)
+        for target in targets:
+            for port in self.query_ports:
+                try:
+                    self.listen_transport.send(data, (target, port))
+                except Exception:
+                    # 广播不可用（例如没有网络接口）时只依赖定期广播
+                    pass
     
     def _discovery_loop(self):
         """房间发现循环"""
+        start_time = time.time()
+        pending_queries = list(QUERY_SCHEDULE)
         while self.running:
+            # 按计划发送查询
+            elapsed = time.time() - start_time
+            while pending_queries and pending_queries[0] <= elapsed:
+                pending_queries.pop(0)
+                self.refresh()
+            timeout = 1.0
+            if pending_queries:
+                timeout = min(timeout, max(0.0, pending_queries[0] - elapsed))
+
             try:
-                # 接收广播消息
-                data, addr = self.listen_socket.recvfrom(1024)
-                self._handle_room_advertise(data, addr)
+                # 接收广播消息（超时返回空批次，继续循环）
+                for data, addr in self.listen_transport.receive_batch(timeout=timeout):
+                    tracer.instant("packet_recv", "discovery", {"bytes": len(data)})
+                    with tracer.span("handle_advertise", "discovery"):
+                        self._handle_room_advertise(data, addr)
                 
-            except socket.timeout:
-                # 超时是正常的，继续循环
-                pass
             except Exception as e:
                 if self.running:
                     print(f"房间发现错误: {e}")
                 break
             
-            # 定期清理过期房间并通知更新
+            # 清理过期房间并通知更新
             self._cleanup_and_notify()
     
     def _handle_room_advertise(self, data: bytes, addr: Tuple[str, int]):
@@ -214,21 +325,32 @@ class RoomDiscovery:
             host_name = room_data.get("host_name", "未知主机")
             host_ip = addr[0]
             
-            # 假设游戏端口是发现端口+1
-            host_port = self.discovery_port + 1
+            # 使用广播中的游戏端口（旧版本主机没有该字段，游戏端口是发现端口+1）
+            host_port = room_data.get("host_port", self.discovery_port + 1)
             
             # 创建房间信息
             room_key = f"{host_ip}:{host_port}"
             
             with self.rooms_lock:
-                if room_key in self.discovered_rooms:
+                if room_data.get("closed"):
+                    # 房间已关闭，立即移除
+                    if self.discovered_rooms.pop(room_key, None):
+                        print(f"房间已关闭: {room_name}")
+                    return
+
+                room_info = self.discovered_rooms.get(room_key)
+                if room_info is not None:
                     # 更新现有房间
-                    self.discovered_rooms[room_key].update_last_seen()
+                    room_info.update_last_seen()
                 else:
                     # 添加新房间
                     room_info = RoomInfo(room_name, host_name, host_ip, host_port)
                     self.discovered_rooms[room_key] = room_info
                     print(f"发现新房间: {room_info}")
+
+                room_info.players = room_data.get("players", room_info.players)
+                room_info.max_players = room_data.get("max_players", room_info.max_players)
+                room_info.advertise_interval = room_data.get("interval", ADVERTISE_INTERVAL)
             
         except Exception as e:
             print(f"处理房间广播失败: {e}")
@@ -0,0 +1,173 @@
+"""
+多房间服务器模块
+
+在一台机器上同时运行多个1对1房间（例如比赛之夜的20+场对局）：
+- 每个房间占用端口段中的一个游戏端口（base_port, base_port+1, ...）
+- 所有房间在同一个发现端口上广播，广播中带有房间实际的游戏端口，
+  玩家在房间浏览界面选择房间后直接连接该端口
+- 房间分配到多个工作进程，每个进程用一个tick调度器推进自己的所有房间，
+  避免单个进程的GIL限制房间数量
+
+启动方式（在 tank 目录下）：
+    python main.py --server --rooms 20 --workers 4
+"""
+
+import contextlib
+import multiprocessing
+import os
+import signal
+import time
+from typing import List, Optional, Tuple
+
+from .dedicated_server import (DedicatedServer, TickScheduler, DEFAULT_TICK_RATE,
+                               _LogWriter, setup_server_logging)
+
+# 默认的起始游戏端口和发现端口（与单房间模式一致）
+DEFAULT_BASE_PORT = 12346
+DEFAULT_DISCOVERY_PORT = 12345
+
+RoomSpec = Tuple[str, int]  # (房间名称, 游戏端口)
+
+
+def assign_rooms(room_count: int, worker_count: int, base_port: int = DEFAULT_BASE_PORT,
+                 room_name: str = "房间") -> List[List[RoomSpec]]:
+    """把房间轮流分配给工作进程
+
+    Returns:
+        每个工作进程负责的 (房间名称, 游戏端口) 列表
+    """
+    worker_count = max(1, min(worker_count, room_count))
+    shards: List[List[RoomSpec]] = [[] for _ in range(worker_count)]
+    for index in range(room_count):
+        shards[index % worker_count].append((f"{room_name} {index + 1}", base_port + index))
+    return shards
+
+
+def _worker_log_file(log_file: Optional[str], worker_id: int) -> Optional[str]:
+    """每个工作进程写自己的日志文件，例如 server.log -> server.worker0.log"""
+    if not log_file:
+        return None
+    root, ext = os.path.splitext(log_file)
+    return f"{root}.worker{worker_id}{ext}"
+
+
+def run_room_worker(worker_id: int, rooms: List[RoomSpec], discovery_port: int,
+                    tick_rate: int, log_file: Optional[str], stop_event, ready_queue=None,
+                    multicast_group: Optional[str] = None):
+    """工作进程入口：启动分配到的房间，并用一个调度器推进所有房间"""
+    import tank_sprites
+    tank_sprites.SOUND_ENABLED = False  # 服务器不播放音效
+    # Ctrl+C 由主进程处理，工作进程通过 stop_event 退出，保证房间正常关闭
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    logger = setup_server_logging(_worker_log_file(log_file, worker_id))
+    scheduler = TickScheduler(tick_rate)
+    servers = []
+
+    with contextlib.redirect_stdout(_LogWriter(logger)):
+        try:
+            for room_name, port in rooms:
+                server = DedicatedServer(room_name, host_port=port, tick_rate=tick_rate,
+                                         logger=logger, discovery_port=discovery_port,
+                                         multicast_group=multicast_group)
+                server.scheduler = scheduler
+                if server.start():
+                    servers.append(server)
+            logger.info(f"工作进程 {worker_id} (pid {os.getpid()}) 已启动 {len(servers)}/{len(rooms)} 个房间")
+            if ready_queue is not None:
+                ready_queue.put((worker_id, [server.game_host.host_port for server in servers]))
+
+            scheduler.reset()
+            while not stop_event.is_set():
+                delta_time = scheduler.wait_next_tick()
+                for server in servers:
+                    try:
+                        server.tick(delta_time)
+                    except Exception as e:
+                        # 一个房间出错不影响同一进程中的其他房间
+                        logger.exception(f"房间 {server.room_name} 更新出错: {e}")
+        finally:
+            for server in servers:
+                server.stop()
+            logger.info(f"工作进程 {worker_id} 已退出: {scheduler.get_stats()}")
+
+
+class RoomServer:
+    """多房间服务器：管理工作进程"""
+
+    def __init__(self, room_count: int = 20, workers: Optional[int] = None,
+                 base_port: int = DEFAULT_BASE_PORT, discovery_port: int = DEFAULT_DISCOVERY_PORT,
+                 room_name: str = "房间", tick_rate: int = DEFAULT_TICK_RATE,
+                 log_file: Optional[str] = None, multicast_group: Optional[str] = None):
+        self.room_count = room_count
+        self.workers = workers or min(os.cpu_count() or 1, room_count)
+        self.base_port = base_port
+        self.discovery_port = discovery_port
+        self.room_name = room_name
+        self.tick_rate = tick_rate
+        self.log_file = log_file
+        self.multicast_group = multicast_group
+
+        # 使用spawn启动工作进程，不继承父进程的线程和套接字
+        self.context = multiprocessing.get_context("spawn")
+        self.stop_event = self.context.Event()
+        self.processes: List[multiprocessing.Process] = []
+        self.room_ports: List[int] = []
+
+    def start(self, timeout: float = 30.0) -> bool:
+        """启动所有工作进程，等待它们报告房间就绪"""
+        shards = assign_rooms(self.room_count, self.workers, self.base_port, self.room_name)
+        ready_queue = self.context.Queue()
+        self.stop_event.clear()
+
+        for worker_id, rooms in enumerate(shards):
+            process = self.context.Process(
+                target=run_room_worker,
+                args=(worker_id, rooms, self.discovery_port, self.tick_rate,
+                      self.log_file, self.stop_event, ready_queue, self.multicast_group),
+                name=f"tank-room-worker-{worker_id}",
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+
+        deadline = time.time() + timeout
+        for _ in shards:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                _, ports = ready_queue.get(timeout=remaining)
+            except Exception:
+                break
+            self.room_ports.extend(ports)
+        self.room_ports.sort()
+
+        print(f"多房间服务器已启动: {len(self.room_ports)}/{self.room_count} 个房间, "
+              f"{len(self.processes)} 个工作进程, 端口 {self.base_port}-{self.base_port + self.room_count - 1}")
+        return len(self.room_ports) == self.room_count
+
+    def stop(self, timeout: float = 5.0):
+        """通知工作进程退出并等待"""
+        self.stop_event.set()
+        for process in self.processes:
+            try:
+                process.join(timeout=timeout)
+            except KeyboardInterrupt:
+                pass
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        self.room_ports = []
+        print("多房间服务器已停止")
+
+    def run(self):
+        """启动并阻塞直到中断或所有工作进程退出"""
+        self.start()
+        try:
+            while not self.stop_event.is_set() and any(p.is_alive() for p in self.processes):
+                self.stop_event.wait(1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
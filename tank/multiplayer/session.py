@@ -0,0 +1,31 @@
+"""
+会话恢复模块
+
+短暂断线（Wi-Fi切换、信号中断）不再直接结束对局：
+- 加入成功时主机在 JOIN_RESPONSE 中下发会话令牌
+- 主机回应客户端的心跳，双方都能在几秒内发现对方无响应
+- 客户端无响应时主机先挂起该玩家（松开所有按键，坦克原地不动），
+  在恢复窗口内保留会话，超过窗口才移除
+- 客户端发现主机无响应或网络出错时，重新创建传输并携带令牌发送 SESSION_RESUME，
+  地址变化也可以恢复
+- 恢复成功后主机发送一个完整的关键帧（STATE_KEYFRAME：坦克、所有子弹、分数），
+  之后继续发送增量状态
+"""
+
+import secrets
+
+# 客户端心跳间隔（秒），主机回应每个心跳
+HEARTBEAT_INTERVAL = 1.0
+# 主机超过该时间没有收到客户端消息时挂起该玩家
+SUSPEND_TIMEOUT = 3.0
+# 客户端超过该时间没有收到主机消息时开始恢复会话
+HOST_SILENCE_TIMEOUT = 3.0
+# 会话保留时间：挂起/开始重连后超过该时间仍未恢复则断开
+RESUME_WINDOW = 30.0
+# 重连期间发送恢复请求的间隔
+RESUME_RETRY_INTERVAL = 0.5
+
+
+def new_session_token() -> str:
+    """生成会话令牌"""
+    return secrets.token_hex(8)
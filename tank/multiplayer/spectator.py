@@ -0,0 +1,86 @@
+"""
+观战模块
+
+观众以只读身份连接房间，不发送输入，也不占用玩家名额：
+- 观战快照以较低频率生成（默认10Hz），每个快照只编码一次
+- 编码后的字节进入延迟缓冲区（默认2秒），到期后原样发送给所有观众，
+  每个观众的开销只是一次 sendto，不重复序列化
+- 地图同步、游戏开始/结束等消息同样经过延迟缓冲区，保证观众看到的顺序一致
+"""
+
+import time
+from collections import deque
+from typing import List, Optional
+
+from .messages import NetworkMessage
+
+# 观战快照频率（Hz）
+SPECTATOR_SYNC_RATE = 10
+# 观战延迟（秒）
+SPECTATOR_DELAY = 2.0
+# 每个房间的最大观众数
+MAX_SPECTATORS = 64
+
+
+class SpectatorFeed:
+    """观战数据流：按频率采样快照，编码一次后延迟发送"""
+
+    def __init__(self, sync_rate: float = SPECTATOR_SYNC_RATE, delay: float = SPECTATOR_DELAY):
+        self.sync_rate = sync_rate
+        self.sync_interval = 1.0 / sync_rate if sync_rate > 0 else 0.0
+        self.delay = delay
+
+        self._buffer: deque = deque()  # (采样时间, 已编码的字节)
+        self._last_capture: Optional[float] = None
+
+        # 统计信息
+        self.snapshots_encoded = 0
+        self.bytes_encoded = 0
+
+    def reset(self):
+        """清空缓冲区（新游戏开始时调用）"""
+        self._buffer.clear()
+        self._last_capture = None
+
+    def should_capture(self, now: Optional[float] = None) -> bool:
+        """是否到了采样下一个观战快照的时间"""
+        now = time.perf_counter() if now is None else now
+        return self._last_capture is None or now - self._last_capture >= self.sync_interval
+
+    def capture(self, message: NetworkMessage, now: Optional[float] = None, is_snapshot: bool = True):
+        """编码消息并放入延迟缓冲区
+
+        Args:
+            message: 要发送给观众的消息
+            now: 采样时间（默认当前时间）
+            is_snapshot: 是否为定时快照（地图/开始/结束等事件消息不影响采样节奏）
+        """
+        now = time.perf_counter() if now is None else now
+        data = message.to_bytes()
+        self._buffer.append((now, data))
+        if is_snapshot:
+            self._last_capture = now
+        self.snapshots_encoded += 1
+        self.bytes_encoded += len(data)
+
+    def pop_due(self, now: Optional[float] = None) -> List[bytes]:
+        """取出已经达到延迟时间的数据（按采样顺序）"""
+        now = time.perf_counter() if now is None else now
+        due = []
+        while self._buffer and now - self._buffer[0][0] >= self.delay:
+            due.append(self._buffer.popleft()[1])
+        return due
+
+    def pending_count(self) -> int:
+        """延迟缓冲区中的数据数量"""
+        return len(self._buffer)
+
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        return {
+            "sync_rate": self.sync_rate,
+            "delay": self.delay,
+            "snapshots_encoded": self.snapshots_encoded,
+            "bytes_encoded": self.bytes_encoded,
+            "pending": len(self._buffer),
+        }
@@ -0,0 +1,150 @@
+"""
+跨线程的时间线追踪
+
+游戏的工作分布在arcade主线程、GameHost/GameClient 的网络线程和 RoomDiscovery 的广播/监听线程，
+回调在线程之间传递数据。开启追踪后各线程记录：
+- 区间（begin/end 或 with tracer.span(...)）：解码、消息回调、状态应用、绘制等
+- 瞬时事件（tracer.instant）：收到数据报、发送广播等
+时间戳使用 time.perf_counter_ns，每个线程写入自己的缓冲区（deque 的 append 本身是线程安全的，
+不需要加锁），每个线程最多保留 MAX_EVENTS_PER_THREAD 个事件，超出后丢弃最旧的。
+
+导出为 Chrome trace-event JSON，用 chrome://tracing 或 https://ui.perfetto.dev 打开，
+可以直接看到各线程的排队和争用情况。
+
+默认关闭：关闭时 span 返回共享的空上下文，instant/begin/end 只做一次属性判断。
+
+启用：main.py --trace FILE（退出时写入文件）
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# 每个线程最多保留的事件数
+MAX_EVENTS_PER_THREAD = 200000
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class _Span:
+    """with 语句使用的区间，进入时记录 B 事件，退出时记录 E 事件"""
+
+    __slots__ = ("tracer", "name", "category", "args")
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.tracer.begin(self.name, self.category, self.args)
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.end(self.name, self.category)
+        return False
+
+
+class Tracer:
+    """记录各线程的区间和瞬时事件"""
+
+    def __init__(self, max_events: int = MAX_EVENTS_PER_THREAD):
+        self.enabled = False
+        self.max_events = max_events
+        self._local = threading.local()
+        self._buffers: List[tuple] = []   # (序号, 线程名, 事件缓冲区)
+        self._register_lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+
+    def start(self):
+        """清空之前的事件并开始记录"""
+        self.clear()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def clear(self):
+        with self._register_lock:
+            for _, _, events in self._buffers:
+                events.clear()
+        self._origin_ns = time.perf_counter_ns()
+
+    def _events(self) -> deque:
+        """当前线程的缓冲区（每个线程第一次记录时注册，之后不再加锁）"""
+        events = getattr(self._local, "events", None)
+        if events is None:
+            events = self._local.events = deque(maxlen=self.max_events)
+            thread = threading.current_thread()
+            with self._register_lock:
+                # 线程结束后 ident 会被新线程复用，按注册顺序编号作为 trace 中的 tid
+                self._buffers.append((len(self._buffers) + 1, thread.name, events))
+        return events
+
+    def begin(self, name: str, category: str = "", args: Optional[Dict[str, Any]] = None):
+        if self.enabled:
+            self._events().append(("B", name, category, time.perf_counter_ns(), args))
+
+    def end(self, name: str, category: str = ""):
+        if self.enabled:
+            self._events().append(("E", name, category, time.perf_counter_ns(), None))
+
+    def instant(self, name: str, category: str = "", args: Optional[Dict[str, Any]] = None):
+        if self.enabled:
+            self._events().append(("i", name, category, time.perf_counter_ns(), args))
+
+    def span(self, name: str, category: str = "", args: Optional[Dict[str, Any]] = None):
+        """with tracer.span("decode", "net"): ...（关闭时返回共享的空上下文）"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def event_count(self) -> int:
+        with self._register_lock:
+            return sum(len(events) for _, _, events in self._buffers)
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """转换为 Chrome trace-event 格式（时间单位为微秒，相对于 start 的时刻）"""
+        pid = os.getpid()
+        with self._register_lock:
+            buffers = [(tid, name, list(events)) for tid, name, events in self._buffers]
+
+        trace_events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                         "args": {"name": "tank"}}]
+        for tid, thread_name, events in buffers:
+            if not events:
+                continue
+            trace_events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                                 "args": {"name": thread_name}})
+            for phase, name, category, timestamp, args in events:
+                event = {"name": name, "cat": category or "default", "ph": phase,
+                         "ts": (timestamp - self._origin_ns) / 1000, "pid": pid, "tid": tid}
+                if phase == "i":
+                    event["s"] = "t"  # 瞬时事件只画在所在线程上
+                if args:
+                    event["args"] = args
+                trace_events.append(event)
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export(self, path: str) -> int:
+        """写入 Chrome trace JSON 文件，返回事件数"""
+        trace = self.to_chrome_trace()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, ensure_ascii=False)
+        count = sum(1 for event in trace["traceEvents"] if event["ph"] != "M")
+        print(f"🧵 追踪数据已写入 {path}（{count} 个事件）")
+        return count
+
+
+# 全局实例，各线程直接使用
+tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """获取全局的追踪器"""
+    return tracer
@@ -0,0 +1,360 @@
+"""
+传输层模块
+
+GameHost、GameClient 和 RoomDiscovery 不直接操作套接字，而是通过一个很小的
+传输接口收发数据报：
+- send(data, addr)            发送一个数据报
+- receive_batch(max, timeout) 等待并批量取出已到达的数据报
+- receive_into(max, timeout)  同上，数据报接收到传输自己的预分配缓冲区（热路径使用）
+- close()                     关闭传输
+
+提供两种实现：
+- UDP：基于真实套接字，用于正常联机
+- 内存回环：同一进程内的虚拟网络，不占用端口、没有系统调用，
+  主机和客户端可以在一个进程里运行，适合测试和基准测试
+
+网络对象（UdpNetwork / LoopbackNetwork）负责创建传输，传给
+GameHost(network=...)、GameClient(network=...)、RoomDiscovery(network=...)。
+"""
+
+import socket
+import struct
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# 单个数据报的最大接收大小
+MAX_DATAGRAM_SIZE = 8192
+# 每次批量接收的默认最大数据报数量
+DEFAULT_BATCH_SIZE = 64
+# 广播地址（与socket模块的写法一致）
+BROADCAST_ADDRESS = '<broadcast>'
+# 组播包的生存跳数（只在局域网内传播）
+MULTICAST_TTL = 1
+
+Address = Tuple[str, int]
+
+
+def is_multicast_address(ip: str) -> bool:
+    """是否为IPv4组播地址（224.0.0.0 - 239.255.255.255）"""
+    try:
+        return 224 <= int(ip.split('.')[0]) <= 239
+    except (ValueError, AttributeError):
+        return False
+
+
+class Transport:
+    """数据报传输接口"""
+
+    def send(self, data: bytes, addr: Address):
+        """发送一个数据报到指定地址"""
+        raise NotImplementedError
+
+    def receive_batch(self, max_count: int = DEFAULT_BATCH_SIZE,
+                      timeout: Optional[float] = None) -> List[Tuple[bytes, Address]]:
+        """接收一批数据报
+
+        最多等待 timeout 秒直到第一个数据报到达，然后取出所有已到达的数据报
+        （不超过 max_count 个）。超时返回空列表。
+        """
+        raise NotImplementedError
+
+    def receive_into(self, max_count: int = DEFAULT_BATCH_SIZE,
+                     timeout: Optional[float] = None) -> List[Tuple[memoryview, Address]]:
+        """接收一批数据报到预分配的缓冲区，不为每个数据报分配新的bytes对象
+
+        返回的数据只在下一次调用 receive_into 之前有效，需要保留时调用方自行复制。
+        默认实现直接返回 receive_batch 的结果。
+        """
+        return self.receive_batch(max_count, timeout)
+
+    def close(self):
+        """关闭传输"""
+        raise NotImplementedError
+
+    @property
+    def local_address(self) -> Optional[Address]:
+        """本地绑定地址"""
+        return None
+
+
+class UdpTransport(Transport):
+    """基于UDP套接字的传输"""
+
+    def __init__(self, port: Optional[int] = None, broadcast: bool = False,
+                 buffer_size: int = MAX_DATAGRAM_SIZE, multicast_group: Optional[str] = None):
+        self.buffer_size = buffer_size
+        self._timeout = None
+        # receive_into 使用的接收缓冲区池（按需增长，之后一直复用）
+        self._buffers: List[memoryview] = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            if broadcast:
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            if port is not None:
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                self.sock.bind(('', port))
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+            if multicast_group:
+                self.join_multicast_group(multicast_group)
+        except Exception:
+            self.sock.close()
+            raise
+
+    def join_multicast_group(self, group: str):
+        """加入组播组，接收发送到该组（本端口）的数据报"""
+        membership = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton("0.0.0.0"))
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+
+    def send(self, data: bytes, addr: Address):
+        self.sock.sendto(data, addr)
+
+    def _set_timeout(self, timeout: Optional[float]):
+        """设置套接字超时（0表示非阻塞），只在变化时调用settimeout，避免多余的系统调用"""
+        if timeout != self._timeout:
+            self.sock.settimeout(timeout)
+            self._timeout = timeout
+
+    def _recv_first(self, recv, *args, timeout: Optional[float] = None):
+        """接收第一个数据报：已有数据时直接取出，否则最多等待 timeout 秒
+
+        返回时套接字总是处于非阻塞模式，随后取出其余数据报时不会等待。
+        （设置了超时的套接字即使传 MSG_DONTWAIT，CPython 也会先等待整个超时时间）
+        """
+        self._set_timeout(0.0)
+        try:
+            return recv(*args)
+        except BlockingIOError:
+            if timeout == 0:
+                raise
+        self._set_timeout(timeout)
+        try:
+            return recv(*args)
+        finally:
+            self._set_timeout(0.0)
+
+    def receive_batch(self, max_count: int = DEFAULT_BATCH_SIZE,
+                      timeout: Optional[float] = None) -> List[Tuple[bytes, Address]]:
+        try:
+            batch = [self._recv_first(self.sock.recvfrom, self.buffer_size, timeout=timeout)]
+        except (BlockingIOError, socket.timeout):
+            return []
+
+        # 取出已经在缓冲区中的其余数据报，不再等待
+        while len(batch) < max_count:
+            try:
+                batch.append(self._recv_nowait())
+            except (BlockingIOError, socket.timeout):
+                break
+        return batch
+
+    def receive_into(self, max_count: int = DEFAULT_BATCH_SIZE,
+                     timeout: Optional[float] = None) -> List[Tuple[memoryview, Address]]:
+        while len(self._buffers) < max_count:
+            self._buffers.append(memoryview(bytearray(self.buffer_size)))
+
+        try:
+            buffer = self._buffers[0]
+            nbytes, addr = self._recv_first(self.sock.recvfrom_into, buffer, timeout=timeout)
+        except (BlockingIOError, socket.timeout):
+            return []
+        batch = [(buffer[:nbytes], addr)]
+
+        # 取出已经在缓冲区中的其余数据报，每个数据报使用池中的下一个缓冲区
+        while len(batch) < max_count:
+            buffer = self._buffers[len(batch)]
+            try:
+                nbytes, addr = self._recv_into_nowait(buffer)
+            except (BlockingIOError, socket.timeout):
+                break
+            batch.append((buffer[:nbytes], addr))
+        return batch
+
+    def _recv_into_nowait(self, buffer: memoryview) -> Tuple[int, Address]:
+        """非阻塞接收一个数据报到指定缓冲区（_recv_first 之后套接字已是非阻塞模式）"""
+        return self.sock.recvfrom_into(buffer)
+
+    def _recv_nowait(self) -> Tuple[bytes, Address]:
+        """非阻塞接收一个数据报（_recv_first 之后套接字已是非阻塞模式）"""
+        return self.sock.recvfrom(self.buffer_size)
+
+    def close(self):
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
+    @property
+    def local_address(self) -> Optional[Address]:
+        try:
+            return self.sock.getsockname()
+        except OSError:
+            return None
+
+
+class UdpNetwork:
+    """创建UDP传输的网络对象"""
+
+    def create_transport(self, port: Optional[int] = None, broadcast: bool = False,
+                         multicast_group: Optional[str] = None) -> UdpTransport:
+        """创建传输
+
+        Args:
+            port: 绑定的本地端口，None 表示不绑定（由系统在首次发送时分配）
+            broadcast: 是否允许发送广播
+            multicast_group: 要加入的组播组（用于接收组播）
+        """
+        return UdpTransport(port, broadcast, multicast_group=multicast_group)
+
+
+class LoopbackTransport(Transport):
+    """内存回环网络中的一个端点"""
+
+    def __init__(self, network: 'LoopbackNetwork', address: Address):
+        self.network = network
+        self.address = address
+        self.closed = False
+        self.multicast_groups = set()
+        self._queue = deque()
+        self._condition = threading.Condition()
+
+    def send(self, data: bytes, addr: Address):
+        if self.closed:
+            raise OSError("传输已关闭")
+        self.network.deliver(bytes(data), self.address, addr)
+
+    def receive_batch(self, max_count: int = DEFAULT_BATCH_SIZE,
+                      timeout: Optional[float] = None) -> List[Tuple[bytes, Address]]:
+        with self._condition:
+            if not self._queue and not self.closed:
+                self._condition.wait(timeout)
+            if self.closed:
+                raise OSError("传输已关闭")
+            batch = []
+            while self._queue and len(batch) < max_count:
+                batch.append(self._queue.popleft())
+            return batch
+
+    def enqueue(self, data: bytes, source: Address):
+        """由网络对象调用，把数据报放入接收队列"""
+        with self._condition:
+            if self.closed:
+                return
+            self._queue.append((data, source))
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            if self.closed:
+                return
+            self.closed = True
+            self._queue.clear()
+            self._condition.notify_all()
+        self.network.unregister(self)
+
+    def join_multicast_group(self, group: str):
+        self.multicast_groups.add(group)
+
+    @property
+    def local_address(self) -> Optional[Address]:
+        return self.address
+
+
+class LoopbackNetwork:
+    """进程内的虚拟网络
+
+    端点按 (IP, 端口) 注册，数据报直接放入目标端点的队列。
+    发送到 ('<broadcast>', 端口) 的数据报投递给所有绑定该端口的端点，
+    发送到组播地址的数据报投递给绑定该端口并加入了该组的端点。
+    发送到不存在的地址时数据报被丢弃（与UDP一致）。
+    """
+
+    EPHEMERAL_PORT_START = 50000
+
+    def __init__(self, host_ip: str = '127.0.0.1'):
+        self.host_ip = host_ip
+        self.endpoints: Dict[Address, LoopbackTransport] = {}
+        self.lock = threading.Lock()
+        self._next_port = self.EPHEMERAL_PORT_START
+
+        # 统计信息
+        self.datagrams_sent = 0
+        self.bytes_sent = 0
+        self.datagrams_dropped = 0
+
+    def create_transport(self, port: Optional[int] = None, broadcast: bool = False,
+                         host_ip: Optional[str] = None,
+                         multicast_group: Optional[str] = None) -> LoopbackTransport:
+        """创建传输
+
+        Args:
+            port: 绑定的端口，None 或 0 表示自动分配
+            broadcast: 兼容UDP网络的参数（回环网络总是允许广播）
+            host_ip: 端点的虚拟IP，用于在一个进程内模拟多台机器
+            multicast_group: 要加入的组播组
+        """
+        ip = host_ip or self.host_ip
+        with self.lock:
+            if not port:
+                port = self._allocate_port(ip)
+            address = (ip, port)
+            if address in self.endpoints:
+                raise OSError(f"地址已被占用: {ip}:{port}")
+            transport = LoopbackTransport(self, address)
+            if multicast_group:
+                transport.join_multicast_group(multicast_group)
+            self.endpoints[address] = transport
+            return transport
+
+    def _allocate_port(self, ip: str) -> int:
+        while (ip, self._next_port) in self.endpoints:
+            self._next_port += 1
+        port = self._next_port
+        self._next_port += 1
+        return port
+
+    def unregister(self, transport: LoopbackTransport):
+        """移除端点（端点关闭时调用）"""
+        with self.lock:
+            if self.endpoints.get(transport.address) is transport:
+                del self.endpoints[transport.address]
+
+    def _normalize(self, ip: str) -> str:
+        if ip in ('', '0.0.0.0', 'localhost'):
+            return self.host_ip
+        return ip
+
+    def deliver(self, data: bytes, source: Address, dest: Address):
+        """把数据报投递到目标端点"""
+        dest_ip, dest_port = dest
+        with self.lock:
+            self.datagrams_sent += 1
+            self.bytes_sent += len(data)
+            if dest_ip == BROADCAST_ADDRESS:
+                targets = [endpoint for address, endpoint in self.endpoints.items()
+                           if address[1] == dest_port and endpoint.address != source]
+            elif is_multicast_address(dest_ip):
+                targets = [endpoint for address, endpoint in self.endpoints.items()
+                           if address[1] == dest_port and endpoint.address != source
+                           and dest_ip in endpoint.multicast_groups]
+            else:
+                endpoint = self.endpoints.get((self._normalize(dest_ip), dest_port))
+                targets = [endpoint] if endpoint is not None else []
+            if not targets:
+                self.datagrams_dropped += 1
+
+        for endpoint in targets:
+            endpoint.enqueue(data, source)
+
+
+# 默认网络（真实UDP，可通过环境变量叠加网络损伤模拟）
+_default_network = None
+
+
+def get_default_network():
+    """获取默认网络对象"""
+    global _default_network
+    if _default_network is None:
+        from .impairment import network_from_environment
+        _default_network = network_from_environment(UdpNetwork())
+    return _default_network
@@ -0,0 +1,471 @@
+"""
+对局回放的录制与播放
+
+录制（ReplayRecorder）：
+- 开局时写入文件头：对局模式、双方坦克图片、地图布局和校验和
+- 每个tick追加一条记录：本tick的帧间隔和此前发生的按键事件（每个事件1字节），
+  没有按键时每个tick 10 字节
+- 每隔 KEYFRAME_INTERVAL 个tick追加一个状态关键帧（GameView.save_state）
+- 记录先在内存中攒成块，由后台线程写入文件，录制不会阻塞游戏循环
+- 文件只追加，结束录制时在文件尾写入关键帧索引；异常退出时已写入的部分仍然可以播放
+
+播放（ReplayPlayer / ReplayView）：
+用文件头中的地图重新创建 GameView，按tick重放按键事件和帧间隔；
+到达关键帧时与当前状态比较，并以关键帧为准（主机的延迟补偿等输入之外的效果由关键帧纠正）。
+文件以内存映射方式打开，跳转时按索引找到最近的关键帧，载入后只模拟剩下不到
+KEYFRAME_INTERVAL 个tick。ReplayView 可以 1x~16x 速度播放，拖动进度条跳转。
+
+启用录制：main.py --record-dir DIR，之后本地对局和主机（回滚模式除外）的对局都会录制到 DIR。
+
+文件格式（小端）：
+    REPLAY_MAGIC(4) + 版本(1) + 文件头JSON长度(4) + 文件头JSON
+    记录：REC_TICK(1) + 帧间隔(8) + 事件数(1) + 事件(1) * N
+          REC_KEYFRAME(1) + tick(4) + 长度(4) + GameView.save_state() 的数据
+          （关键帧紧跟在同一个tick的 REC_TICK 记录之后）
+    文件尾：REC_INDEX(1) + tick总数(4) + 关键帧数(4) + (关键帧tick(4) + 该tick记录的偏移量(8)) * N
+          + 索引偏移量(8) + INDEX_MAGIC(4)
+    事件字节：位0~2 按键序号（KEY_NAMES），位3 按下，位4 槽位
+"""
+
+import bisect
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import arcade
+
+from multiplayer.lockstep import KEY_BITS, apply_input_mask
+
+REPLAY_MAGIC = b"TKRP"
+REPLAY_VERSION = 1
+REPLAY_EXTENSION = ".tkr"
+
+# 关键帧间隔（tick），60Hz下约2秒
+KEYFRAME_INTERVAL = 120
+# 攒够这么多字节后交给写入线程
+WRITE_CHUNK_SIZE = 4096
+# 可以录制的模式（本机运行完整模拟的模式）
+RECORDABLE_MODES = ("pvc", "pvp", "network_host")
+# 播放速度档位
+REPLAY_SPEEDS = (1, 2, 4, 8, 16)
+# ←/→ 每次跳转的tick数（60Hz下5秒）
+SEEK_STEP_TICKS = 300
+
+REC_TICK = 0x01
+REC_KEYFRAME = 0x02
+REC_INDEX = 0x03
+INDEX_MAGIC = b"TKRX"
+
+# 事件字节中的按键序号
+KEY_NAMES = tuple(KEY_BITS)
+
+_FILE_HEADER = struct.Struct("<4sBI")
+_TICK = struct.Struct("<BdB")
+_KEYFRAME = struct.Struct("<BII")
+_INDEX = struct.Struct("<BII")
+_INDEX_ENTRY = struct.Struct("<IQ")
+_TRAILER = struct.Struct("<Q4s")
+
+# 录制目录（None表示不录制），由 set_replay_directory 设置
+replay_directory: Optional[str] = None
+
+
+def set_replay_directory(path: Optional[str]):
+    """设置录制目录，传None关闭录制"""
+    global replay_directory
+    if path:
+        os.makedirs(path, exist_ok=True)
+    replay_directory = path
+
+
+def new_replay_path(mode: str) -> str:
+    """在录制目录中生成新的回放文件名"""
+    name = time.strftime("replay_%Y%m%d_%H%M%S") + f"_{mode}{REPLAY_EXTENSION}"
+    return os.path.join(replay_directory or ".", name)
+
+
+def encode_event(slot: int, key: str, pressed: bool) -> int:
+    """把一个按键事件编码为1字节"""
+    return KEY_NAMES.index(key) | (0x08 if pressed else 0) | (slot << 4)
+
+
+def decode_event(event: int) -> Tuple[int, str, bool]:
+    """解码按键事件，返回 (槽位, 按键, 是否按下)"""
+    return (event >> 4) & 0x01, KEY_NAMES[event & 0x07], bool(event & 0x08)
+
+
+class ReplayRecorder:
+    """对局录制器：GameView 在按键和每次 on_update 时调用"""
+
+    def __init__(self, path: str, game_view, keyframe_interval: int = KEYFRAME_INTERVAL):
+        from multiplayer.map_sync import MapSyncManager
+
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.tick = 0
+        self.bytes_written = 0
+        self._events: List[int] = []
+        self._buffer = bytearray()
+        self._flushed = 0                        # 已交给写入线程的字节数
+        self._index: List[Tuple[int, int]] = []  # (关键帧tick, 该tick记录的偏移量)
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self.closed = False
+
+        map_layout = [list(wall) for wall in game_view.current_map_layout]
+        header = json.dumps({
+            "mode": game_view.mode,
+            "player1_tank_image": os.path.basename(game_view.player1_tank_image),
+            "player2_tank_image": os.path.basename(game_view.player2_tank_image),
+            "map_layout": map_layout,
+            "map_checksum": MapSyncManager.calculate_map_checksum(map_layout),
+            "keyframe_interval": keyframe_interval,
+            "created": time.time(),
+        }).encode("utf-8")
+        self._buffer += _FILE_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, len(header)) + header
+
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def record_input(self, slot: int, key: str, pressed: bool):
+        """记录一个按键事件（在下一个tick的记录中写入）"""
+        if key in KEY_NAMES:
+            self._events.append(encode_event(slot, key, pressed))
+
+    def record_tick(self, game_view, delta_time: float):
+        """记录一个tick（在 on_update 模拟之前调用，此时按键事件已经生效）"""
+        if self.closed:
+            return
+        events = self._events[:255]
+        self._events = self._events[255:]
+        offset = self._flushed + len(self._buffer)
+        self._buffer += _TICK.pack(REC_TICK, delta_time, len(events)) + bytes(events)
+
+        if self.tick % self.keyframe_interval == 0:
+            self._index.append((self.tick, offset))
+            state = game_view.save_state()
+            self._buffer += _KEYFRAME.pack(REC_KEYFRAME, self.tick, len(state)) + state
+        self.tick += 1
+
+        if len(self._buffer) >= WRITE_CHUNK_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._queue.put(bytes(self._buffer))
+            self._flushed += len(self._buffer)
+            self._buffer.clear()
+
+    def _write_loop(self):
+        """后台写入线程"""
+        try:
+            with open(self.path, "wb") as replay_file:
+                while True:
+                    chunk = self._queue.get()
+                    if chunk is None:
+                        break
+                    replay_file.write(chunk)
+                    replay_file.flush()
+                    self.bytes_written += len(chunk)
+        except OSError as e:
+            print(f"❌ 回放写入失败: {e}")
+
+    def close(self):
+        """写完剩余数据和文件尾的关键帧索引，结束写入线程"""
+        if self.closed:
+            return
+        self.closed = True
+        index_offset = self._flushed + len(self._buffer)
+        self._buffer += _INDEX.pack(REC_INDEX, self.tick, len(self._index))
+        for tick, offset in self._index:
+            self._buffer += _INDEX_ENTRY.pack(tick, offset)
+        self._buffer += _TRAILER.pack(index_offset, INDEX_MAGIC)
+        self._flush()
+        self._queue.put(None)
+        self._writer.join(timeout=2.0)
+        print(f"📼 回放已保存: {self.path}（{self.tick} 个tick，{self.bytes_written} 字节）")
+
+
+class ReplayData:
+    """内存映射的回放文件
+
+    有索引时只读取文件头和文件尾的关键帧索引，tick记录在播放时按偏移量读取；
+    没有索引（录制中断）时扫描一遍记录头重建索引，末尾不完整的记录被忽略。
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as replay_file:
+            try:
+                self._data = mmap.mmap(replay_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("回放文件不完整")
+        try:
+            self._read_header()
+            self.indexed = self._read_index()
+            if not self.indexed:
+                self._scan()
+        except (ValueError, struct.error) as e:
+            self.close()
+            raise ValueError(f"无效的回放文件: {e}")
+
+    def _read_header(self):
+        data = self._data
+        magic, version, header_length = _FILE_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC:
+            raise ValueError("不是回放文件")
+        if version != REPLAY_VERSION:
+            raise ValueError(f"不支持的回放版本: {version}")
+        offset = _FILE_HEADER.size
+        self.header = json.loads(bytes(data[offset:offset + header_length]).decode("utf-8"))
+        self.records_start = offset + header_length
+
+    def _read_index(self) -> bool:
+        """读取文件尾的关键帧索引，没有索引时返回False"""
+        data = self._data
+        if len(data) < self.records_start + _INDEX.size + _TRAILER.size:
+            return False
+        index_offset, magic = _TRAILER.unpack_from(data, len(data) - _TRAILER.size)
+        if magic != INDEX_MAGIC or data[index_offset] != REC_INDEX:
+            return False
+        _, self.tick_count, count = _INDEX.unpack_from(data, index_offset)
+        entries = [_INDEX_ENTRY.unpack_from(data, index_offset + _INDEX.size + i * _INDEX_ENTRY.size)
+                   for i in range(count)]
+        self.keyframe_ticks = [tick for tick, _ in entries]
+        self._keyframe_offsets = [offset for _, offset in entries]
+        self.records_end = index_offset
+        return True
+
+    def _scan(self):
+        """没有索引时扫描记录头，得到tick数和关键帧位置"""
+        data, offset, end = self._data, self.records_start, len(self._data)
+        self.tick_count = 0
+        self.keyframe_ticks, self._keyframe_offsets = [], []
+        while offset + _TICK.size <= end and data[offset] == REC_TICK:
+            next_offset = offset + _TICK.size + data[offset + _TICK.size - 1]
+            keyframe_tick = None
+            if next_offset < end and data[next_offset] == REC_KEYFRAME:
+                if next_offset + _KEYFRAME.size > end:
+                    break
+                _, keyframe_tick, length = _KEYFRAME.unpack_from(data, next_offset)
+                next_offset += _KEYFRAME.size + length
+            if next_offset > end:
+                break
+            if keyframe_tick is not None:
+                self.keyframe_ticks.append(keyframe_tick)
+                self._keyframe_offsets.append(offset)
+            self.tick_count += 1
+            offset = next_offset
+        self.records_end = offset
+
+    def read_tick(self, offset: int) -> Tuple[float, bytes, Optional[bytes], int]:
+        """读取一个tick记录，返回 (帧间隔, 事件字节, 该tick的关键帧或None, 下一个记录的偏移量)"""
+        data = self._data
+        _, delta_time, count = _TICK.unpack_from(data, offset)
+        offset += _TICK.size
+        events = data[offset:offset + count]
+        offset += count
+        keyframe = None
+        if offset < self.records_end and data[offset] == REC_KEYFRAME:
+            _, _, length = _KEYFRAME.unpack_from(data, offset)
+            offset += _KEYFRAME.size
+            keyframe = data[offset:offset + length]
+            offset += length
+        return delta_time, events, keyframe, offset
+
+    def peek_delta(self, offset: int) -> float:
+        """读取一个tick记录的帧间隔"""
+        return _TICK.unpack_from(self._data, offset)[1]
+
+    def nearest_keyframe(self, tick: int) -> Tuple[int, int]:
+        """不晚于 tick 的最近关键帧，返回 (关键帧tick, 该tick记录的偏移量)"""
+        index = max(bisect.bisect_right(self.keyframe_ticks, tick) - 1, 0)
+        return self.keyframe_ticks[index], self._keyframe_offsets[index]
+
+    def close(self):
+        self._data.close()
+
+
+def load_replay(path: str) -> ReplayData:
+    """打开回放文件
+
+    Raises:
+        ValueError: 不是回放文件、版本不支持或没有完整的记录
+    """
+    replay = ReplayData(path)
+    if not replay.keyframe_ticks:
+        replay.close()
+        raise ValueError("回放文件没有完整的关键帧")
+    return replay
+
+
+class ReplayPlayer:
+    """按tick重放一局对局，可以跳转到任意tick"""
+
+    def __init__(self, replay: ReplayData, window=None):
+        import game_views
+        from multiplayer.map_sync import MapSyncManager
+
+        self.replay = replay
+        header = replay.header
+        image_dir = os.path.dirname(game_views.PLAYER_IMAGE_PATH_GREEN)
+        self.game_view = game_views.GameView(
+            mode=header["mode"],
+            player1_tank_image=os.path.join(image_dir, header["player1_tank_image"]),
+            player2_tank_image=os.path.join(image_dir, header["player2_tank_image"]),
+            window=window
+        )
+        self.game_view.allow_replay_recording = False
+        self.game_view.headless = True  # 整局结束时不切换到GameOverView，停在最后一帧
+
+        map_layout = [tuple(wall) for wall in header["map_layout"]]
+        if MapSyncManager.calculate_map_checksum(map_layout) != header.get("map_checksum"):
+            print("⚠️ 回放地图校验和不一致")
+        self.game_view.set_map_layout(map_layout)
+        self.game_view.setup()
+
+        self.tick = 0
+        self._offset = replay.records_start
+        self.keyframe_mismatches = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.tick >= self.replay.tick_count
+
+    def next_delta(self) -> float:
+        """下一个tick的帧间隔"""
+        return self.replay.peek_delta(self._offset)
+
+    def step(self) -> float:
+        """重放一个tick，返回该tick的帧间隔"""
+        game_view = self.game_view
+        delta_time, events, keyframe, self._offset = self.replay.read_tick(self._offset)
+        tanks = (game_view.player_tank, game_view.player2_tank)
+        for event in events:
+            # 逐个事件应用，每次只有这一个按键变化，与录制时的处理顺序相同
+            slot, key, pressed = decode_event(event)
+            bit = KEY_BITS[key]
+            apply_input_mask(game_view, tanks[slot], 0 if pressed else bit, bit if pressed else 0)
+
+        if keyframe is not None:
+            if game_view.save_state() != keyframe:
+                self.keyframe_mismatches += 1
+            game_view.load_state(keyframe)
+
+        game_view.on_update(delta_time)
+        self.tick += 1
+        return delta_time
+
+    def seek(self, tick: int):
+        """跳转到 tick（之前的tick都已模拟）：从最近的关键帧开始，只模拟剩下的tick（不播放音效）
+
+        关键帧包含该tick的按键效果，因此从不晚于 tick - 1 的关键帧开始，至少模拟一个tick。
+        """
+        import tank_sprites
+
+        tick = max(0, min(tick, self.replay.tick_count))
+        if tick == 0:
+            self.tick, self._offset = 0, self.replay.records_start
+            self.game_view.load_state(self.replay.read_tick(self._offset)[2])
+            return
+
+        keyframe_tick, offset = self.replay.nearest_keyframe(tick - 1)
+        if not keyframe_tick <= self.tick <= tick:
+            # 从关键帧tick开始时会先载入关键帧，之前的状态不影响结果
+            self.tick, self._offset = keyframe_tick, offset
+
+        sound_enabled = tank_sprites.SOUND_ENABLED
+        tank_sprites.SOUND_ENABLED = False
+        try:
+            while self.tick < tick:
+                self.step()
+        finally:
+            tank_sprites.SOUND_ENABLED = sound_enabled
+
+
+class ReplayView(arcade.View):
+    """回放播放视图：↑/↓ 调整速度，←/→ 后退/前进5秒，点击或拖动进度条跳转，空格暂停，Esc 返回主菜单"""
+
+    def __init__(self, path: str, speed: int = 1):
+        super().__init__()
+        self.path = path
+        self.speed_index = REPLAY_SPEEDS.index(speed) if speed in REPLAY_SPEEDS else 0
+        self.paused = False
+        self.player: Optional[ReplayPlayer] = None
+        self.accumulator = 0.0
+        self.status_text = arcade.Text("", 10, 10, arcade.color.BLACK, 14)
+
+    def on_show_view(self):
+        self.player = ReplayPlayer(load_replay(self.path), window=self.window)
+        arcade.set_background_color(arcade.color.LIGHT_GRAY)
+        print(f"📼 播放回放: {self.path}（{self.player.replay.tick_count} 个tick）")
+
+    def on_hide_view(self):
+        if self.player:
+            self.player.replay.close()
+
+    def on_update(self, delta_time):
+        if not self.player or self.paused:
+            return
+        # 按录制时的帧间隔推进，高倍速时一帧重放多个tick
+        self.accumulator += delta_time * REPLAY_SPEEDS[self.speed_index]
+        while not self.player.finished and self.accumulator >= self.player.next_delta():
+            self.accumulator -= self.player.step()
+        if self.player.finished:
+            self.accumulator = 0.0
+
+    def _scrubber_bounds(self):
+        """进度条的位置 (左, 右, 下, 上)"""
+        return 10, self.window.width - 10, 34, 44
+
+    def _seek(self, tick: int):
+        self.player.seek(tick)
+        self.accumulator = 0.0
+
+    def on_draw(self):
+        self.clear()
+        if not self.player:
+            return
+        self.player.game_view.on_draw()
+
+        left, right, bottom, top = self._scrubber_bounds()
+        progress = self.player.tick / max(self.player.replay.tick_count, 1)
+        arcade.draw_lrbt_rectangle_filled(left, right, bottom, top, arcade.color.GRAY)
+        arcade.draw_lrbt_rectangle_filled(left, left + (right - left) * progress, bottom, top,
+                                          arcade.color.DARK_BLUE)
+
+        state = "已结束" if self.player.finished else ("暂停" if self.paused else "播放中")
+        self.status_text.text = (f"回放 {state}  {REPLAY_SPEEDS[self.speed_index]}x  "
+                                 f"tick {self.player.tick}/{self.player.replay.tick_count}"
+                                 f"（↑/↓ 速度，←/→ 跳转，空格 暂停，Esc 返回）")
+        self.status_text.draw()
+
+    def on_mouse_press(self, x, y, button, modifiers):
+        self._scrub_to(x, y)
+
+    def on_mouse_drag(self, x, y, dx, dy, buttons, modifiers):
+        self._scrub_to(x, y)
+
+    def _scrub_to(self, x, y):
+        """点击/拖动进度条时跳转到对应的tick"""
+        left, right, bottom, top = self._scrubber_bounds()
+        if self.player and left <= x <= right and bottom - 6 <= y <= top + 6:
+            self._seek(round((x - left) / (right - left) * self.player.replay.tick_count))
+
+    def on_key_press(self, key, modifiers):
+        if key == arcade.key.UP:
+            self.speed_index = min(self.speed_index + 1, len(REPLAY_SPEEDS) - 1)
+        elif key == arcade.key.DOWN:
+            self.speed_index = max(self.speed_index - 1, 0)
+        elif key == arcade.key.LEFT and self.player:
+            self._seek(self.player.tick - SEEK_STEP_TICKS)
+        elif key == arcade.key.RIGHT and self.player:
+            self._seek(self.player.tick + SEEK_STEP_TICKS)
+        elif key == arcade.key.SPACE:
+            self.paused = not self.paused
+        elif key == arcade.key.ESCAPE:
+            from game_views import MainMenu
+            self.window.show_view(MainMenu())
@@ -2,6 +2,9 @@ import arcade
 import math
 import os
 import pymunk # <--- 添加Pymunk导入
+import game_log
+
+log = game_log.get_logger("tank")
 
 # --- 常量 ---
 SCREEN_WIDTH = 1280
@@ -27,6 +30,8 @@ PLAYER_IMAGE_PATH_GREY = os.path.join(BASE_DIR, "tank-img", "grey_tank.png")
 
 # 音效文件路径
 EXPLOSION_SOUND = os.path.join(BASE_DIR, "tank_voice", "explosion.wav")
+# 是否播放音效（专用服务器没有音频输出，启动时关闭）
+SOUND_ENABLED = True
 
 # Pymunk碰撞类型常量
 COLLISION_TYPE_BULLET = 1
@@ -141,7 +146,8 @@ class Tank(arcade.Sprite):
         self.health -= amount
         if self.health < 0:
             self.health = 0
-        print(f"Tank at ({self.center_x:.0f},{self.center_y:.0f}) took {amount} damage, health: {self.health}")
+        log.debug("Tank at (%.0f,%.0f) took %s damage, health: %s",
+                  self.center_x, self.center_y, amount, self.health)
 
     def is_alive(self):
         return self.health > 0
@@ -157,6 +163,18 @@ class Tank(arcade.Sprite):
             self.angle = 90 - math.degrees(self.pymunk_body.angle)
 
 
+    def get_bullet_color(self):
+        """根据坦克图片确定子弹颜色"""
+        bullet_color = arcade.color.YELLOW_ORANGE
+
+        if hasattr(self, 'tank_image_file') and self.tank_image_file:
+            path = self.tank_image_file.lower()
+            if 'green' in path: bullet_color = (0, 255, 0)
+            elif 'desert' in path: bullet_color = (255, 165, 0)
+            elif 'grey' in path: bullet_color = (128, 128, 128)
+            elif 'blue' in path: bullet_color = (0, 0, 128)
+        return bullet_color
+
     def shoot(self, current_time): # 接收当前时间参数
         # 检查射击冷却时间
         if current_time - self.last_shot_time < self.shot_cooldown:
@@ -167,7 +185,7 @@ class Tank(arcade.Sprite):
 
         # 播放射击音效（仅在非测试环境下）
         try:
-            if os.path.exists(EXPLOSION_SOUND):
+            if SOUND_ENABLED and os.path.exists(EXPLOSION_SOUND):
                 arcade.play_sound(arcade.load_sound(EXPLOSION_SOUND))
         except Exception as e:
             # 在测试环境中可能没有音频设备，忽略音效错误
@@ -176,14 +194,7 @@ class Tank(arcade.Sprite):
         IMAGE_BARREL_DIRECTION_OFFSET = 0
         actual_bullet_angle = IMAGE_BARREL_DIRECTION_OFFSET - self.angle
 
-        bullet_color = arcade.color.YELLOW_ORANGE
-
-        if hasattr(self, 'tank_image_file') and self.tank_image_file:
-            path = self.tank_image_file.lower()
-            if 'green' in path: bullet_color = (0, 255, 0)
-            elif 'desert' in path: bullet_color = (255, 165, 0)
-            elif 'grey' in path: bullet_color = (128, 128, 128)
-            elif 'blue' in path: bullet_color = (0, 0, 128)
+        bullet_color = self.get_bullet_color()
 
         # 定义子弹半径和速度
         BULLET_RADIUS = 4
@@ -196,6 +207,8 @@ class Tank(arcade.Sprite):
                        actual_emission_angle_degrees=actual_bullet_angle,
                        speed_magnitude=BULLET_SPEED_MAGNITUDE,
                        color=bullet_color)
+        # 记录发射时间，用于网络同步中的子弹生成事件
+        bullet.spawn_time = current_time
         return bullet
 
 # --- 子弹类 ---
@@ -223,6 +236,11 @@ class Bullet(arcade.SpriteCircle):
         # 保存速度信息用于网络同步
         self.speed_magnitude = speed_magnitude
 
+        # 保存发射原点和发射时间，网络同步时客户端据此重建相同的轨迹
+        self.origin_x = tank_center_x
+        self.origin_y = tank_center_y
+        self.spawn_time = 0.0
+
         self.pymunk_body = None
         self.pymunk_shape = None
         mass = 0.001
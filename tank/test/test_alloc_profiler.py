@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+内存分配统计和垃圾回收控制测试
+
+确保：
+1. 每帧存活下来的分配按代码行归类，报告中的每帧字节数与实际分配相符
+2. 帧内创建又释放的临时对象计入瞬时峰值，不计入净增
+3. 开启垃圾回收控制后，setup 之后冻结长期对象，回合进行中推迟2代回收，回合结束时恢复
+"""
+
+import sys
+import os
+import gc
+import random
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tank_sprites
+import game_views
+import gc_control
+from maps import get_random_map_layout
+from multiplayer.dedicated_server import HeadlessWindow
+from alloc_profiler import AllocationProfiler
+
+FRAMES = 20
+
+
+def _retain(store: list):
+    """每帧保留一块内存（应被归类到这一行）"""
+    store.append(bytearray(4000))
+
+
+def _temporary():
+    """每帧创建后立即释放的临时内存"""
+    return len(bytearray(200000))
+
+
+class TestAllocationProfiler(unittest.TestCase):
+    """测试内存分配统计"""
+
+    def _start(self, **kwargs):
+        tracker = AllocationProfiler(every=FRAMES, **kwargs)
+        tracker.start()
+        self.addCleanup(tracker.stop)
+        return tracker
+
+    def test_retained_allocations_attributed(self):
+        """存活下来的分配归类到代码行"""
+        print("  测试分配归类...")
+        tracker = self._start(top=5)
+        store = []
+        report = None
+        for _ in range(FRAMES):
+            _retain(store)
+            report = tracker.end_frame() or report
+
+        self.assertIsNotNone(report)
+        self.assertEqual(report["frames"], FRAMES)
+        top_site = report["sites"][0]
+        self.assertIn("test_alloc_profiler.py", top_site["site"])
+        self.assertGreaterEqual(top_site["bytes_per_frame"], 4000)
+        self.assertLess(top_site["bytes_per_frame"], 4500)
+        self.assertGreaterEqual(top_site["blocks_per_frame"], 1.0)
+        self.assertGreaterEqual(report["net_bytes_per_frame"], 4000)
+        self.assertEqual(len(report["gc_per_frame"]), 3)
+        print(f"    ✅ {top_site['site']} {top_site['bytes_per_frame']} B/帧")
+
+    def test_temporary_allocations_in_peak(self):
+        """临时对象计入瞬时峰值，不计入净增"""
+        print("  测试瞬时峰值...")
+        tracker = self._start()
+        report = None
+        for _ in range(FRAMES):
+            _temporary()
+            report = tracker.end_frame() or report
+
+        self.assertGreaterEqual(report["peak_bytes_per_frame"], 200000)
+        self.assertLess(abs(report["net_bytes_per_frame"]), 2000)
+        self.assertFalse(any(site["bytes_per_frame"] > 10000 for site in report["sites"]))
+        print(f"    ✅ 瞬时峰值 {report['peak_bytes_per_frame']:.0f} B/帧，"
+              f"净增 {report['net_bytes_per_frame']:.0f} B/帧")
+
+
+class TestGcControl(unittest.TestCase):
+    """测试垃圾回收控制"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+        self.threshold = gc.get_threshold()
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+        gc_control.disable()
+        gc.set_threshold(*self.threshold)
+
+    def test_disabled_does_nothing(self):
+        """未开启时 setup 和回合不改变回收设置"""
+        print("  测试未开启...")
+        game_view = game_views.GameView(mode="pvp", window=HeadlessWindow())
+        game_view.set_map_layout(get_random_map_layout(random.Random(3)))
+        game_view.setup()
+        self.assertFalse(gc_control.is_deferring())
+        self.assertEqual(gc.get_threshold(), self.threshold)
+        print("    ✅ 回收设置不变")
+
+    def test_freeze_and_defer(self):
+        """setup 后冻结，回合内推迟2代回收，回合结束时恢复"""
+        print("  测试冻结和推迟...")
+        gc_control.enable()
+        game_view = game_views.GameView(mode="pvp", window=HeadlessWindow())
+        game_view.set_map_layout(get_random_map_layout(random.Random(3)))
+        game_view.setup()
+
+        self.assertGreater(gc.get_freeze_count(), 0)
+        self.assertTrue(gc_control.is_deferring())
+        self.assertEqual(gc.get_threshold()[2], gc_control.DEFERRED_GEN2_THRESHOLD)
+        self.assertEqual(gc.get_threshold()[:2], self.threshold[:2])
+
+        # 回合结束的间隙恢复阈值
+        game_view.round_over = True
+        game_view.round_over_timer = 10.0
+        game_view.on_update(1 / 60)
+        self.assertFalse(gc_control.is_deferring())
+        self.assertEqual(gc.get_threshold(), self.threshold)
+
+        # 下一回合再次推迟，离开游戏视图时恢复
+        game_view.start_new_round()
+        self.assertTrue(gc_control.is_deferring())
+        game_view.on_hide_view()
+        self.assertEqual(gc.get_threshold(), self.threshold)
+
+        gc_control.disable()
+        self.assertEqual(gc.get_freeze_count(), 0)
+        print("    ✅ 冻结、推迟和恢复正确")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+子弹事件同步测试
+
+测试子弹以生成/消失事件同步的机制，确保：
+1. 主机端只在子弹生成和消失时发送事件（带重发冗余）
+2. 客户端根据事件创建子弹并按ID去重
+3. 抽样校验只在偏差过大时修正本地子弹
+4. GAME_STATE 的大小不随子弹数量增长
+5. 较晚到达的生成事件向前追赶时不会穿过墙壁
+6. 客户端主线程卡顿期间收到的多个快照，子弹事件全部按顺序应用
+"""
+
+import sys
+import os
+import unittest
+from types import SimpleNamespace
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arcade
+import pymunk
+
+from tank_sprites import Tank, PLAYER_IMAGE_PATH_GREEN, PLAYER_IMAGE_PATH_BLUE, COLLISION_TYPE_WALL
+from multiplayer.bullet_sync import (BulletEventTracker, BulletEventApplier, create_spawn_event,
+                                     MAX_CATCHUP_TIME)
+from multiplayer.messages import MessageFactory
+from multiplayer.network_views import ClientGameView
+from multiplayer.transport import LoopbackNetwork
+from multiplayer.dedicated_server import HeadlessWindow
+
+
+def _make_game_view():
+    """创建只包含子弹同步所需属性的游戏视图"""
+    host_tank = Tank(PLAYER_IMAGE_PATH_GREEN, 0.08, 100, 300)
+    host_tank.player_id = "host"
+    client_tank = Tank(PLAYER_IMAGE_PATH_BLUE, 0.08, 1000, 300)
+    client_tank.player_id = "client"
+
+    player_list = arcade.SpriteList()
+    player_list.append(host_tank)
+    player_list.append(client_tank)
+
+    return SimpleNamespace(
+        player_list=player_list,
+        bullet_list=arcade.SpriteList(),
+        space=pymunk.Space()
+    )
+
+
+class TestBulletEventSync(unittest.TestCase):
+    """测试子弹事件同步"""
+
+    def setUp(self):
+        self.host_view = _make_game_view()
+        self.client_view = _make_game_view()
+        self.tracker = BulletEventTracker(redundancy=3, checks_per_snapshot=2)
+        self.applier = BulletEventApplier(self.client_view, lambda owner_id: (0, 255, 0))
+
+    def _fire(self, tank_index=0, current_time=1.0):
+        tank = self.host_view.player_list[tank_index]
+        tank.last_shot_time = -1.0
+        bullet = tank.shoot(current_time)
+        self.host_view.bullet_list.append(bullet)
+        self.host_view.space.add(bullet.pymunk_body, bullet.pymunk_shape)
+        return bullet
+
+    def test_spawn_event_is_redundant_then_stops(self):
+        """生成事件重复发送指定次数后停止"""
+        print("  测试生成事件冗余发送...")
+        bullet = self._fire()
+
+        spawn_counts = []
+        for _ in range(5):
+            events = self.tracker.collect(self.host_view.bullet_list)
+            spawn_counts.append(len(events["spawn"]))
+
+        self.assertEqual(spawn_counts, [1, 1, 1, 0, 0])
+        event = create_spawn_event(bullet)
+        self.assertEqual(event["owner"], "host")
+        self.assertEqual(event["t"], 1.0)
+        self.assertEqual(event["x"], 100.0)
+        print("    ✅ 生成事件冗余发送正确")
+
+    def test_despawn_event(self):
+        """子弹移除后发送消失事件"""
+        print("  测试消失事件...")
+        bullet = self._fire()
+        self.tracker.collect(self.host_view.bullet_list)
+        self.host_view.bullet_list.remove(bullet)
+
+        events = self.tracker.collect(self.host_view.bullet_list)
+        self.assertEqual(events["despawn"], [bullet.bullet_id])
+        self.assertEqual(events["check"], [])
+        print("    ✅ 消失事件正确")
+
+    def test_client_spawns_once_and_matches_host_trajectory(self):
+        """客户端按事件创建子弹，重复事件不会重复创建，轨迹与主机一致"""
+        print("  测试客户端子弹创建...")
+        bullet = self._fire()
+        events = self.tracker.collect(self.host_view.bullet_list)
+
+        self.applier.apply(events, game_time=1.0)
+        self.applier.apply(events, game_time=1.0)
+        self.assertEqual(len(self.client_view.bullet_list), 1)
+
+        client_bullet = self.client_view.bullet_list[0]
+        self.assertEqual(client_bullet.bullet_id, bullet.bullet_id)
+        self.assertIs(client_bullet.owner, self.client_view.player_list[0])
+
+        for _ in range(10):
+            self.host_view.space.step(1 / 60)
+            self.client_view.space.step(1 / 60)
+        dx = bullet.pymunk_body.position.x - client_bullet.pymunk_body.position.x
+        dy = bullet.pymunk_body.position.y - client_bullet.pymunk_body.position.y
+        self.assertLess(abs(dx) + abs(dy), 0.5)
+        print("    ✅ 客户端子弹轨迹与主机一致")
+
+    def test_despawned_bullet_not_revived(self):
+        """已消失的子弹不会被乱序到达的生成事件复活"""
+        print("  测试消失后不复活...")
+        bullet = self._fire()
+        spawn_events = self.tracker.collect(self.host_view.bullet_list)
+        self.host_view.bullet_list.remove(bullet)
+        despawn_events = self.tracker.collect(self.host_view.bullet_list)
+
+        self.applier.apply(despawn_events, game_time=1.1)
+        self.applier.apply(spawn_events, game_time=1.0)
+        self.assertEqual(len(self.client_view.bullet_list), 0)
+        print("    ✅ 乱序事件处理正确")
+
+    def test_catchup_stops_at_wall(self):
+        """较晚到达的生成事件追赶时停在墙前，不会出现在墙内或墙后"""
+        print("  测试追赶不穿墙...")
+        wall = pymunk.Segment(self.client_view.space.static_body, (200, 0), (200, 600), 2)
+        wall.collision_type = COLLISION_TYPE_WALL
+        self.client_view.space.add(wall)
+
+        # 向右飞行，追赶距离(16*60*0.25=240像素)远超到墙的距离
+        event = {"id": "late", "x": 150.0, "y": 300.0, "angle": -90.0, "speed": 16,
+                 "owner": "client", "t": 0.0}
+        self.applier.apply({"spawn": [event]}, game_time=MAX_CATCHUP_TIME)
+        bullet = self.client_view.bullet_list[0]
+        self.assertGreater(bullet.pymunk_body.position.x, 150.0)
+        self.assertLessEqual(bullet.pymunk_body.position.x + bullet.radius, 198.5)
+        print(f"    ✅ 子弹停在 x={bullet.pymunk_body.position.x:.1f}")
+
+    def test_correction_only_on_divergence(self):
+        """只有偏差超过阈值时才修正"""
+        print("  测试偏差修正...")
+        bullet = self._fire()
+        self.applier.apply(self.tracker.collect(self.host_view.bullet_list), game_time=1.0)
+        client_bullet = self.client_view.bullet_list[0]
+
+        # 小偏差不修正
+        client_bullet.pymunk_body.position = (bullet.pymunk_body.position.x + 2,
+                                              bullet.pymunk_body.position.y)
+        self.applier.apply(self.tracker.collect(self.host_view.bullet_list), game_time=1.0)
+        self.assertEqual(self.applier.corrections, 0)
+
+        # 大偏差修正到主机位置
+        client_bullet.pymunk_body.position = (bullet.pymunk_body.position.x + 50,
+                                              bullet.pymunk_body.position.y)
+        self.applier.apply(self.tracker.collect(self.host_view.bullet_list), game_time=1.0)
+        self.assertEqual(self.applier.corrections, 1)
+        self.assertAlmostEqual(client_bullet.pymunk_body.position.x,
+                               bullet.pymunk_body.position.x, delta=0.1)
+        print("    ✅ 偏差修正正确")
+
+    def test_lost_spawn_recovered_from_check(self):
+        """生成事件全部丢失时，客户端根据校验数据重建子弹"""
+        print("  测试丢包恢复...")
+        bullet = self._fire(tank_index=1)
+        for _ in range(3):
+            self.tracker.collect(self.host_view.bullet_list)  # 这些快照全部丢失
+
+        events = self.tracker.collect(self.host_view.bullet_list)
+        self.assertEqual(events["spawn"], [])
+        self.applier.apply(events, game_time=1.1)
+
+        self.assertEqual(len(self.client_view.bullet_list), 1)
+        client_bullet = self.client_view.bullet_list[0]
+        self.assertEqual(client_bullet.bullet_id, bullet.bullet_id)
+        self.assertIs(client_bullet.owner, self.client_view.player_list[1])
+        self.assertAlmostEqual(client_bullet.pymunk_body.velocity.x,
+                               bullet.pymunk_body.velocity.x, delta=0.1)
+        print("    ✅ 丢包恢复正确")
+
+    def test_game_state_size_independent_of_bullet_count(self):
+        """稳定状态下GAME_STATE大小不随子弹数量增长"""
+        print("  测试GAME_STATE大小...")
+        tanks = [{"player_id": "host", "x": 100.0, "y": 300.0, "angle": 0.0, "health": 5},
+                 {"player_id": "client", "x": 1000.0, "y": 300.0, "angle": 0.0, "health": 5}]
+
+        def steady_state_size(bullet_count):
+            view = _make_game_view()
+            tracker = BulletEventTracker()
+            tank = view.player_list[0]
+            for i in range(bullet_count):
+                tank.last_shot_time = -1.0
+                view.bullet_list.append(tank.shoot(float(i)))
+            for _ in range(tracker.redundancy + 1):
+                events = tracker.collect(view.bullet_list)
+            message = MessageFactory.create_game_state(tanks, bullet_events=events, game_time=1.0)
+            return len(message.to_bytes())
+
+        size_10 = steady_state_size(10)
+        size_200 = steady_state_size(200)
+        self.assertLess(abs(size_200 - size_10), 16)
+        print(f"    ✅ 10颗子弹: {size_10}字节, 200颗子弹: {size_200}字节")
+
+    def test_client_keeps_events_of_overwritten_states(self):
+        """主线程一帧内收到超过冗余次数的快照，被覆盖的快照中的事件仍然应用"""
+        print("  测试客户端卡顿时的子弹事件...")
+        client = ClientGameView(network=LoopbackNetwork(), window=HeadlessWindow())
+        client.game_view = self.client_view
+        client.bullet_applier = self.applier
+        tracker = BulletEventTracker(redundancy=3, checks_per_snapshot=0)
+
+        def snapshot(game_time):
+            client._on_game_state_update({"tanks": [], "game_time": game_time,
+                                          "bullet_events": tracker.collect(self.host_view.bullet_list)})
+
+        first = self._fire(tank_index=0)
+        snapshot(1.0)
+        client._apply_server_state()
+        self.assertEqual([b.bullet_id for b in self.client_view.bullet_list], [first.bullet_id])
+
+        # 主线程卡顿期间：发射第二颗子弹，第一颗消失，之后的快照已不再携带这两个事件
+        second = self._fire(tank_index=1, current_time=1.1)
+        snapshot(1.1)
+        self.host_view.bullet_list.remove(first)
+        for i in range(tracker.redundancy + 2):
+            snapshot(1.2 + i * 0.1)
+        self.assertEqual(client.game_state["bullet_events"]["spawn"], [])
+        self.assertEqual(client.game_state["bullet_events"]["despawn"], [])
+
+        client._apply_server_state()
+        self.assertEqual([b.bullet_id for b in self.client_view.bullet_list], [second.bullet_id])
+        self.assertEqual(client.pending_bullet_states, [])
+        print("    ✅ 卡顿期间的生成和消失事件都已应用")
+
+
+if __name__ == "__main__":
+    unittest.main()
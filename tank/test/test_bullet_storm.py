@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+子弹风暴压力测试的测试
+
+确保：
+1. 齐射通过 Tank.shoot 把子弹数量补到目标附近，坦克持续旋转且不会死亡
+2. 每一级的统计包含帧时间、物理时间、GAME_STATE 大小和垃圾回收次数
+3. 低于60FPS的子弹数取平均帧时间第一次超过帧预算的那一级
+"""
+
+import sys
+import os
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tank_sprites
+from maps import ALL_MAP_LAYOUTS
+from frame_profiler import profiler
+from benchmarks.bullet_storm import BulletStorm, find_fps_limit, run_map
+
+
+class TestBulletStorm(unittest.TestCase):
+    """测试子弹风暴压力测试"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+
+    def test_volleys_reach_target(self):
+        """齐射把子弹补到目标数量，坦克旋转且存活"""
+        print("  测试齐射...")
+        profiler.acquire("test")
+        self.addCleanup(profiler.release, "test")
+        storm = BulletStorm(list(ALL_MAP_LAYOUTS[0]))
+        angles = [tank.angle for tank in storm.game_view.player_list]
+        for _ in range(30):
+            result = storm.tick(80)
+        self.assertGreaterEqual(result["bullets"], 60)
+        self.assertLessEqual(result["bullets"], 80 + 2)
+        self.assertGreater(result["physics"], 0)
+        self.assertGreater(result["state_bytes"], 0)
+        for tank, angle in zip(storm.game_view.player_list, angles):
+            self.assertNotAlmostEqual(tank.angle, angle, places=1)
+            self.assertTrue(tank.is_alive())
+        self.assertFalse(storm.game_view.round_over)
+        print(f"    ✅ {result['bullets']} 颗子弹，共发射 {storm.shots} 颗")
+
+    def test_run_map_levels(self):
+        """每一级的统计随子弹数量增长"""
+        print("  测试逐级运行...")
+        report = run_map(list(ALL_MAP_LAYOUTS[1]), [0, 100], ticks=20, warmup=20)
+        low, high = report["levels"]
+        self.assertFalse(profiler.enabled)
+        self.assertLess(low["bullets"], high["bullets"])
+        self.assertGreater(high["shots_per_tick"], low["shots_per_tick"])
+        self.assertGreater(high["physics_ms"]["mean"], low["physics_ms"]["mean"])
+        self.assertGreater(high["game_state_bytes"]["mean"], low["game_state_bytes"]["mean"])
+        self.assertEqual(len(high["gc_per_second"]), 3)
+        print(f"    ✅ {high['bullets']} 颗子弹时物理 {high['physics_ms']['mean']}ms")
+
+    def test_fps_limit(self):
+        """取第一次低于60FPS的那一级"""
+        print("  测试60FPS界限...")
+        levels = [{"bullets": 100.0, "fps": 300.0}, {"bullets": 400.0, "fps": 58.0},
+                  {"bullets": 500.0, "fps": 61.0}]
+        self.assertEqual(find_fps_limit(levels), 400.0)
+        self.assertIsNone(find_fps_limit(levels[:1]))
+        print("    ✅ 界限正确")
+
+
+if __name__ == "__main__":
+    unittest.main()
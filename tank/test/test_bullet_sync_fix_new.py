@@ -193,7 +193,7 @@ class TestBulletSyncFix:
         debug_checks = [
             ("射击调试信息", "🔫 客户端发射子弹" in source),
             ("射击失败调试", "🚫 客户端射击失败" in source),
-            ("调试打印", "print(" in source)
+            ("调试日志", "log.debug(" in source)
         ]
         
         all_passed = True
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+专用服务器测试
+
+测试无窗口的专用服务器模式，确保：
+1. tick调度器按固定频率运行，落后太多时不补跑
+2. 主机支持多个客户端，按来源地址区分输入
+3. 两名玩家以客户端身份连接后自动开局，输入控制各自的坦克
+"""
+
+import sys
+import os
+import threading
+import time
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tank_sprites
+from multiplayer.transport import LoopbackNetwork
+from multiplayer.game_host import GameHost
+from multiplayer.game_client import GameClient
+from multiplayer.messages import MessageFactory
+from multiplayer.dedicated_server import DedicatedServer, TickScheduler
+
+
+def _wait_for(condition, timeout=3.0):
+    """等待条件成立"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+class TestTickScheduler(unittest.TestCase):
+    """测试tick调度器"""
+
+    def test_fixed_rate(self):
+        """按固定频率运行，时间步长固定"""
+        print("  测试固定频率...")
+        scheduler = TickScheduler(tick_rate=100)
+        start = time.perf_counter()
+        steps = [scheduler.wait_next_tick() for _ in range(30)]
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(set(steps), {0.01})
+        self.assertAlmostEqual(elapsed, 0.29, delta=0.05)
+        self.assertEqual(scheduler.overruns, 0)
+        print(f"    ✅ 30个tick耗时 {elapsed * 1000:.0f}ms")
+
+    def test_overrun_does_not_catch_up(self):
+        """落后太多时记录超时并重新对齐"""
+        print("  测试超时处理...")
+        scheduler = TickScheduler(tick_rate=100, max_catch_up=2)
+        scheduler.wait_next_tick()
+        time.sleep(0.1)  # 模拟一次很慢的tick
+        scheduler.wait_next_tick()
+
+        start = time.perf_counter()
+        scheduler.wait_next_tick()
+        self.assertEqual(scheduler.overruns, 1)
+        self.assertGreater(time.perf_counter() - start, 0.005)
+        print("    ✅ 超时后不补跑错过的tick")
+
+
+class TestMultiClientHost(unittest.TestCase):
+    """测试多客户端主机"""
+
+    def test_inputs_routed_by_address(self):
+        """按来源地址区分不同客户端的输入"""
+        print("  测试多客户端输入路由...")
+        network = LoopbackNetwork()
+        host = GameHost(network=network, max_clients=2)
+        received = []
+        host.set_callbacks(input_received=lambda cid, pressed, released: received.append((cid, pressed)))
+        self.assertTrue(host.start_hosting("测试房间", "服务器"))
+
+        clients = []
+        try:
+            for name in ("玩家A", "玩家B", "玩家C"):
+                client = GameClient(network=network)
+                clients.append((client, client.connect_to_host("127.0.0.1", host.host_port, name)))
+            self.assertEqual([ok for _, ok in clients], [True, True, False])
+            self.assertTrue(host.is_room_full())
+
+            first, second = clients[0][0], clients[1][0]
+            first.send_key_press("W")
+            second.send_key_press("SPACE")
+            self.assertTrue(_wait_for(lambda: len(received) >= 2))
+
+            self.assertEqual(host.get_client_input(first.get_player_id()), {"W"})
+            self.assertEqual(host.get_client_input(second.get_player_id()), {"SPACE"})
+        finally:
+            for client, ok in clients:
+                if ok:
+                    client.disconnect()
+            host.stop_hosting()
+        print("    ✅ 输入按客户端区分")
+
+    def test_broadcast_to_all_clients(self):
+        """发送给客户端的消息广播到所有客户端"""
+        print("  测试广播消息...")
+        network = LoopbackNetwork()
+        host = GameHost(network=network, max_clients=2)
+        self.assertTrue(host.start_hosting("测试房间", "服务器"))
+
+        starts = []
+        clients = []
+        try:
+            for name in ("玩家A", "玩家B"):
+                client = GameClient(network=network)
+                client.set_callbacks(game_start=lambda config, name=name: starts.append(name))
+                self.assertTrue(client.connect_to_host("127.0.0.1", host.host_port, name))
+                clients.append(client)
+
+            host.send_to_client(MessageFactory.create_game_start({}))
+            self.assertTrue(_wait_for(lambda: len(starts) == 2))
+        finally:
+            for client in clients:
+                client.disconnect()
+            host.stop_hosting()
+        print("    ✅ 所有客户端都收到消息")
+
+
+class TestDedicatedServer(unittest.TestCase):
+    """测试专用服务器"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+
+    def test_match_between_two_clients(self):
+        """两名客户端连接后开局，各自控制一辆坦克"""
+        print("  测试专用服务器对局...")
+        network = LoopbackNetwork()
+        server = DedicatedServer("测试服务器", network=network)
+        thread = threading.Thread(target=server.run, kwargs={"duration": 10.0}, daemon=True)
+        thread.start()
+
+        states = []
+        clients = []
+        try:
+            self.assertTrue(_wait_for(lambda: server.running))
+            for name in ("玩家A", "玩家B"):
+                client = GameClient(network=network)
+                client.set_callbacks(game_state=states.append)
+                self.assertTrue(client.connect_to_host("127.0.0.1", 12346, name))
+                clients.append(client)
+
+            self.assertTrue(_wait_for(lambda: server.game_phase == "playing" and len(states) > 0))
+            game_view = server.game_view
+            self.assertIsNone(game_view.window.current_view)
+            start_y = game_view.player_tank.center_y
+            start_angle = game_view.player2_tank.angle
+
+            # 玩家A控制玩家1坦克前进，玩家B控制玩家2坦克旋转
+            clients[0].send_key_press("W")
+            clients[1].send_key_press("A")
+            self.assertTrue(_wait_for(lambda: game_view.player_tank.center_y != start_y
+                                      and game_view.player2_tank.angle != start_angle))
+
+            # 一名玩家离开后回到等待状态
+            clients[1].disconnect()
+            self.assertTrue(_wait_for(lambda: server.game_phase == "waiting"))
+        finally:
+            for client in clients:
+                client.disconnect()
+            server.stop_event.set()
+            thread.join(timeout=5.0)
+        self.assertFalse(server.running)
+        print("    ✅ 专用服务器对局正确")
+
+
+if __name__ == "__main__":
+    unittest.main()
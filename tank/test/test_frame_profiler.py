@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+帧耗时统计测试
+
+测试分阶段的帧耗时统计，确保：
+1. 环形缓冲区只保留最近的值，百分位数按保留的值计算
+2. 关闭时不记录任何数据
+3. 开启后物理步进的各阶段都被计时，同一帧内多次计时累加，超过帧预算的阶段被标记
+"""
+
+import sys
+import os
+import random
+import time
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tank_sprites
+import game_views
+from maps import get_random_map_layout
+from multiplayer.dedicated_server import HeadlessWindow
+from frame_profiler import FrameProfiler, RingBuffer, profiler
+
+
+class TestFrameProfiler(unittest.TestCase):
+    """测试帧耗时统计"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+        profiler.set_enabled(False)
+        profiler.reset()
+
+    def test_ring_buffer(self):
+        """写满后覆盖最旧的值"""
+        print("  测试环形缓冲区...")
+        buffer = RingBuffer(4)
+        self.assertIsNone(buffer.percentile(0.5))
+        for value in range(1, 7):
+            buffer.append(float(value))
+        self.assertEqual(buffer.count, 4)
+        self.assertEqual(buffer.values(), [3.0, 4.0, 5.0, 6.0])
+        self.assertEqual(buffer.percentile(0.0), 3.0)
+        self.assertEqual(buffer.percentile(0.99), 6.0)
+        print("    ✅ 环形缓冲区正确")
+
+    def test_disabled_records_nothing(self):
+        """关闭时 start/lap/end_frame 不记录数据"""
+        print("  测试关闭时不计时...")
+        frame_profiler = FrameProfiler()
+        started = frame_profiler.start()
+        self.assertEqual(frame_profiler.lap("space_step", started), 0.0)
+        frame_profiler.end_frame()
+        self.assertEqual(frame_profiler.get_stats(), {})
+        self.assertEqual(frame_profiler.frame_count, 0)
+        print("    ✅ 关闭时没有记录")
+
+    def test_phases_and_budget(self):
+        """物理步进的各阶段被计时，同一帧内的计时累加"""
+        print("  测试各阶段计时...")
+        game_view = game_views.GameView(mode="pvp", window=HeadlessWindow())
+        game_view.set_map_layout(get_random_map_layout(random.Random(1)))
+        game_view.setup()
+
+        profiler.set_enabled(True)
+        for _ in range(10):
+            game_view.on_update(1 / 60)
+            started = profiler.start()
+            time.sleep(0.001)
+            started = profiler.lap("draw_ui", started)
+            time.sleep(0.001)
+            profiler.lap("draw_ui", started)
+            profiler.end_frame()
+
+        stats = profiler.get_stats()
+        for phase in ("space_step", "sprite_sync", "bullet_cull", "post_step_remove", "draw_ui", "frame"):
+            self.assertIn(phase, stats)
+        self.assertEqual(list(stats)[0], "space_step")
+        self.assertEqual(stats["space_step"]["count"], 10)
+        self.assertEqual(stats["frame"]["count"], 9)
+        self.assertGreaterEqual(stats["draw_ui"]["p50"], 2.0)
+
+        lines = profiler.format_lines(budget_ms=1.0)
+        flagged = [text.split()[0] for text, over_budget in lines if over_budget]
+        self.assertEqual(len(lines), len(stats))
+        self.assertIn("draw_ui", flagged)
+        self.assertNotIn("post_step_remove", flagged)
+        print(f"    ✅ space_step p50 {stats['space_step']['p50']:.3f}ms，超过预算: {flagged}")
+
+
+if __name__ == "__main__":
+    unittest.main()
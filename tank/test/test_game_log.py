@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+分级日志测试
+
+确保：
+1. 级别设置可以整体指定，也可以按子系统指定
+2. 级别未开启时调试输出不格式化参数，热路径上的射击和受伤不再打印
+3. 开启后记录由后台线程写入文件，停止时写完队列中剩余的记录
+4. 消息在调用时格式化，之后修改参数不影响写入的内容
+"""
+
+import sys
+import os
+import io
+import logging
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import game_log
+import tank_sprites
+from tank_sprites import Tank, PLAYER_IMAGE_PATH_GREEN
+
+
+class _Counted:
+    """记录被格式化的次数"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self):
+        self.count += 1
+        return "counted"
+
+
+class TestGameLog(unittest.TestCase):
+    """测试分级日志"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+        game_log.shutdown_logging()
+
+    def test_parse_levels(self):
+        """整体级别和子系统级别"""
+        print("  测试级别解析...")
+        self.assertEqual(game_log.parse_levels("debug"),
+                         {subsystem: logging.DEBUG for subsystem in game_log.SUBSYSTEMS})
+        levels = game_log.parse_levels("info,net=debug")
+        self.assertEqual(levels["net"], logging.DEBUG)
+        self.assertEqual(levels["game"], logging.INFO)
+        self.assertEqual(game_log.parse_levels("tank=warning"), {"tank": logging.WARNING})
+        with self.assertRaises(ValueError):
+            game_log.parse_levels("loud")
+        with self.assertRaises(ValueError):
+            game_log.parse_levels("audio=debug")
+        print("    ✅ 级别解析正确")
+
+    def test_disabled_debug_is_free(self):
+        """默认级别下调试输出不格式化，受伤不打印"""
+        print("  测试默认关闭...")
+        counted = _Counted()
+        game_log.get_logger("net").debug("🔫 %s", counted)
+        self.assertEqual(counted.count, 0)
+
+        tank = Tank(PLAYER_IMAGE_PATH_GREEN, 0.1, 100, 100)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            tank.take_damage(1)
+        self.assertEqual(output.getvalue(), "")
+        print("    ✅ 未格式化也未打印")
+
+    def test_async_file_handler(self):
+        """开启后由后台线程写入文件"""
+        print("  测试写入文件...")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "debug.log")
+            game_log.configure_logging(game_log.parse_levels("warning,tank=debug"), path)
+            counted = _Counted()
+            game_log.get_logger("net").debug("net %s", counted)
+            Tank(PLAYER_IMAGE_PATH_GREEN, 0.1, 100, 100).take_damage(1)
+            game_log.get_logger("game").warning("round %d", 3)
+            game_log.shutdown_logging()
+
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        self.assertEqual(counted.count, 0)
+        self.assertEqual(len(lines), 2)
+        self.assertIn("tank.tank: Tank at (100,100) took 1 damage", lines[0])
+        self.assertIn("[WARNING] tank.game: round 3", lines[1])
+        # 停止后恢复默认级别
+        self.assertFalse(game_log.get_logger("tank").isEnabledFor(logging.DEBUG))
+        print(f"    ✅ 写入 {len(lines)} 条记录")
+
+    def test_args_formatted_at_call_time(self):
+        """参数在调用时格式化，写入线程看不到之后的修改"""
+        print("  测试调用时格式化...")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "debug.log")
+            game_log.configure_logging(game_log.parse_levels("debug"), path)
+            position = [100, 200]
+            game_log.get_logger("net").debug("position %s", position)
+            position[0] = 999
+            game_log.shutdown_logging()
+
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn("position [100, 200]", lines[0])
+        print("    ✅ 写入调用时的值")
+
+
+if __name__ == "__main__":
+    unittest.main()
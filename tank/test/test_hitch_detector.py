@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+卡顿检测测试
+
+测试慢帧的自动记录，确保：
+1. 正常的帧不写日志，停止后GC回调和分阶段计时都被释放
+2. 慢帧的记录包含各阶段耗时、帧内的垃圾回收、实体数量和看门狗在帧内采到的主线程调用栈
+3. 日志按大小滚动，旧文件数量有上限
+4. 菜单、大厅里停留的时间不计入下一局的第一帧
+"""
+
+import sys
+import os
+import gc
+import json
+import random
+import shutil
+import tempfile
+import time
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tank_sprites
+import game_views
+import hitch_detector
+from maps import get_random_map_layout
+from multiplayer.dedicated_server import HeadlessWindow
+from frame_profiler import profiler
+from hitch_detector import HitchDetector
+
+THRESHOLD = 0.05
+
+
+def _slow_phase(seconds: float):
+    """模拟一帧中耗时过长的代码（看门狗应在这里采到调用栈）"""
+    time.sleep(seconds)
+
+
+class TestHitchDetector(unittest.TestCase):
+    """测试卡顿检测"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.temp_dir, "hitch.log")
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _start(self, **kwargs):
+        detector = HitchDetector(self.log_path, threshold=THRESHOLD, **kwargs)
+        detector.start()
+        self.addCleanup(detector.stop)
+        return detector
+
+    def _read_records(self):
+        with open(self.log_path, encoding="utf-8") as log_file:
+            return [json.loads(line) for line in log_file if line.strip()]
+
+    def test_fast_frames_not_logged(self):
+        """正常的帧不记录，停止后释放GC回调和计时"""
+        print("  测试正常帧...")
+        detector = self._start()
+        self.assertIn(detector._on_gc, gc.callbacks)
+        self.assertTrue(profiler.enabled)
+        for _ in range(5):
+            self.assertIsNone(detector.end_frame())
+        self.assertEqual(detector.hitch_count, 0)
+
+        detector.stop()
+        self.assertNotIn(detector._on_gc, gc.callbacks)
+        self.assertFalse(profiler.enabled)
+        self.assertEqual(self._read_records(), [])
+        print("    ✅ 正常帧没有记录")
+
+    def test_slow_frame_captured(self):
+        """慢帧记录各阶段耗时、垃圾回收、实体数量和调用栈"""
+        print("  测试慢帧记录...")
+        game_view = game_views.GameView(mode="pvp", window=HeadlessWindow())
+        game_view.set_map_layout(get_random_map_layout(random.Random(2)))
+        game_view.setup()
+        detector = self._start()
+
+        detector.end_frame(game_view)
+        _slow_phase(THRESHOLD * 3)
+        game_view.on_update(1 / 60)
+        gc.collect(0)
+        gc.collect(2)
+        profiler.end_frame()
+        record = detector.end_frame(game_view)
+
+        self.assertIsNotNone(record)
+        self.assertGreater(record["frame_ms"], THRESHOLD * 1000)
+        self.assertIn("space_step", record["phases_ms"])
+        self.assertGreaterEqual(record["gc"]["collections"][0], 1)
+        self.assertGreaterEqual(record["gc"]["collections"][2], 1)
+        self.assertEqual(record["entities"]["tanks"], 2)
+        self.assertEqual(record["entities"]["bullets"], 0)
+        self.assertIn("main", record["stacks"])
+        self.assertTrue(any("_slow_phase" in line for line in record["stacks"]["main"]))
+
+        # 下一帧正常，计数从零开始
+        self.assertIsNone(detector.end_frame(game_view))
+        self.assertEqual(self._read_records(), [record])
+        print(f"    ✅ 记录卡顿 {record['frame_ms']:.1f}ms，采样线程: {sorted(record['stacks'])}")
+
+    def test_view_change_not_a_hitch(self):
+        """离开游戏视图到下一局开始之间的时间不算作一帧"""
+        print("  测试切换视图...")
+        detector = hitch_detector.start_hitch_detector(self.log_path, THRESHOLD)
+        self.addCleanup(hitch_detector.stop_hitch_detector)
+        game_view = game_views.GameView(mode="pvp", window=HeadlessWindow())
+        game_view.set_map_layout(get_random_map_layout(random.Random(2)))
+        game_view.setup()
+        profiler.end_frame()
+        detector.end_frame(game_view)
+
+        # 回到菜单停留一段时间后开始下一局
+        game_view.on_hide_view()
+        time.sleep(THRESHOLD * 3)
+        next_view = game_views.GameView(mode="pvp", window=HeadlessWindow())
+        next_view.set_map_layout(get_random_map_layout(random.Random(3)))
+        next_view.setup()
+
+        profiler.end_frame()
+        self.assertIsNone(detector.end_frame(next_view))
+        self.assertNotIn("frame", profiler.last_frame)
+        profiler.end_frame()
+        self.assertIsNone(detector.end_frame(next_view))
+        self.assertLess(profiler.last_frame["frame"], THRESHOLD)
+        self.assertEqual(detector.hitch_count, 0)
+        print("    ✅ 切换视图没有记为卡顿")
+
+    def test_log_rotation(self):
+        """日志按大小滚动"""
+        print("  测试日志滚动...")
+        detector = self._start(max_bytes=500, backups=2)
+        detector.end_frame()
+        for _ in range(10):
+            detector._frame_start -= THRESHOLD * 2
+            self.assertIsNotNone(detector.end_frame())
+        files = sorted(name for name in os.listdir(self.temp_dir) if name.startswith("hitch.log"))
+        self.assertEqual(files, ["hitch.log", "hitch.log.1", "hitch.log.2"])
+        print("    ✅ 日志滚动正确")
+
+
+if __name__ == "__main__":
+    unittest.main()
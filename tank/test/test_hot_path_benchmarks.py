@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+热点路径微基准测试的测试
+
+确保：
+1. 与基线对比时先按校准工作量换算机器速度，只把超过阈值且超过噪声下限的用例记为退化，基线中没有的用例跳过
+2. 各组用例可以无窗口运行，结果包含计时统计和消息大小
+3. 仓库中保存的基线覆盖所有用例
+"""
+
+import sys
+import os
+import json
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.hot_paths import (DEFAULT_BASELINE, best_of, compare_results, load_baseline,
+                                  run_benchmarks)
+
+
+class TestHotPathBenchmarks(unittest.TestCase):
+    """测试热点路径微基准测试"""
+
+    def test_compare_results(self):
+        """超过阈值和噪声下限的用例记为退化"""
+        print("  测试基线对比...")
+        baseline = {
+            "slow": {"p50_us": 100.0},
+            "noise": {"p50_us": 1.0},
+            "fast": {"p50_us": 100.0},
+        }
+        results = {
+            "slow": {"p50_us": 150.0},
+            "noise": {"p50_us": 2.5},
+            "fast": {"p50_us": 110.0},
+            "new": {"p50_us": 500.0},
+        }
+        regressions = compare_results(results, baseline, threshold=0.3)
+        self.assertEqual([item["name"] for item in regressions], ["slow"])
+        self.assertEqual(regressions[0]["ratio"], 1.5)
+        self.assertEqual(compare_results(results, baseline, threshold=0.6), [])
+
+        best = best_of([{"a": {"p50_us": 3.0}}, {"a": {"p50_us": 2.0}, "b": {"p50_us": 1.0}}])
+        self.assertEqual(best, {"a": {"p50_us": 2.0}, "b": {"p50_us": 1.0}})
+
+        # 按校准工作量换算：机器整体慢了一倍时不算退化，校准不变时算退化
+        baseline = {"case": {"p50_us": 100.0, "calib_us": 10.0}}
+        slower_machine = {"case": {"p50_us": 190.0, "calib_us": 20.0}}
+        self.assertEqual(compare_results(slower_machine, baseline, threshold=0.3), [])
+        same_machine = {"case": {"p50_us": 190.0, "calib_us": 10.0}}
+        self.assertEqual(len(compare_results(same_machine, baseline, threshold=0.3)), 1)
+        best = best_of([{"case": {"p50_us": 150.0, "calib_us": 30.0}}, slower_machine])
+        self.assertEqual(best["case"]["p50_us"], 150.0)
+        print("    ✅ 只有 slow 被记为退化")
+
+    def test_run_headless(self):
+        """各组用例无窗口运行"""
+        print("  测试无窗口运行...")
+        results = run_benchmarks(repeat=3, bullet_counts=(0, 20))
+        for prefix in ("physics_step/map1/20", "state_encode/snapshot", "state_decode/keyframe20",
+                       "get_game_state/20", "apply_server_state/20", "game_view_setup/map1",
+                       "map_checksum/map1"):
+            self.assertIn(prefix, results)
+            self.assertGreater(results[prefix]["p50_us"], 0)
+            self.assertGreater(results[prefix]["calib_us"], 0)
+        self.assertGreater(results["state_encode/keyframe20"]["bytes"],
+                           results["state_encode/snapshot"]["bytes"])
+
+        only = run_benchmarks(repeat=3, bullet_counts=(0,), name_filter="map_checksum")
+        self.assertTrue(only)
+        self.assertTrue(all(name.startswith("map_checksum/") for name in only))
+        print(f"    ✅ {len(results)} 个用例")
+
+    def test_baseline_covers_all_cases(self):
+        """保存的基线覆盖默认配置的所有用例"""
+        print("  测试保存的基线...")
+        baseline = load_baseline(DEFAULT_BASELINE)
+        with open(DEFAULT_BASELINE, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["benchmark"], "hot_paths")
+        for name in ("physics_step/map3/500", "state_encode/keyframe500", "get_game_state/500",
+                     "apply_server_state/500", "game_view_setup/map3", "map_checksum/map3"):
+            self.assertIn(name, baseline)
+            self.assertGreater(baseline[name]["calib_us"], 0)
+        print(f"    ✅ 基线包含 {len(baseline)} 个用例")
+
+
+if __name__ == "__main__":
+    unittest.main()
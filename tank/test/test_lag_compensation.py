@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+服务器端延迟补偿测试
+
+测试主机端对客户端射击的回退命中检测，确保：
+1. 坦克位置历史按时间插值（含角度回绕）
+2. 回退时间被限制在最大窗口内
+3. 在回退后的位置上命中时判定命中，未命中时子弹推进到当前时刻
+4. 路径上有墙壁时不会穿墙命中
+5. 目标当前的位置挡在路径上时未命中的子弹不推进，不会穿过目标
+6. 主机在网络线程收到的输入排队到主线程的 on_update 中应用
+"""
+
+import sys
+import os
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pymunk
+
+import tank_sprites
+from tank_sprites import Tank, PLAYER_IMAGE_PATH_GREEN, PLAYER_IMAGE_PATH_BLUE, COLLISION_TYPE_WALL
+from multiplayer.lag_compensation import LagCompensator, TransformHistory, MAX_REWIND_TIME
+from multiplayer.messages import MessageFactory, NetworkMessage
+from multiplayer.transport import LoopbackNetwork
+from multiplayer.dedicated_server import HeadlessWindow
+from multiplayer.network_views import HostGameView
+
+
+class TestLagCompensation(unittest.TestCase):
+    """测试延迟补偿"""
+
+    def setUp(self):
+        # 客户端坦克在左侧，朝右
+        self.shooter = Tank(PLAYER_IMAGE_PATH_BLUE, 0.08, 100, 300)
+        self.shooter.player_id = "client"
+        self.shooter.angle = 90
+        # 主机坦克在客户端画面中位于射击路径上，现在已经移开
+        self.target = Tank(PLAYER_IMAGE_PATH_GREEN, 0.08, 200, 600)
+        self.target.player_id = "host"
+
+        self.compensator = LagCompensator()
+        history = TransformHistory()
+        for i in range(11):
+            t = 0.9 + i * 0.01
+            y = 300 if t < 0.985 else 600
+            history.record(t, 200, y, 0)
+        self.compensator.histories["host"] = history
+
+    def _shoot(self):
+        self.shooter.last_shot_time = -1.0
+        return self.shooter.shoot(1.0)
+
+    def test_history_interpolation(self):
+        """位置历史线性插值，角度按最短方向插值"""
+        print("  测试位置历史插值...")
+        history = TransformHistory(size=4)
+        history.record(0.0, 0, 0, 350)
+        history.record(1.0, 10, 20, 10)
+
+        x, y, angle = history.sample(0.5)
+        self.assertAlmostEqual(x, 5)
+        self.assertAlmostEqual(y, 10)
+        self.assertAlmostEqual(angle % 360, 0)
+        self.assertEqual(history.sample(-1.0), (0, 0, 350))
+        self.assertEqual(history.sample(2.0), (10, 20, 10))
+
+        for i in range(2, 10):
+            history.record(float(i), i, i, 0)
+        self.assertEqual(len(history.samples), 4)
+        print("    ✅ 位置历史插值正确")
+
+    def test_rewind_is_capped(self):
+        """回退时间被限制在最大窗口内"""
+        print("  测试回退上限...")
+        self.assertEqual(self.compensator.rewind_time(1.0, None), 0.0)
+        self.assertAlmostEqual(self.compensator.rewind_time(1.0, 0.95), 0.05)
+        self.assertEqual(self.compensator.rewind_time(1.0, 0.0), MAX_REWIND_TIME)
+        self.assertEqual(self.compensator.rewind_time(1.0, 1.5), 0.0)
+        print("    ✅ 回退上限正确")
+
+    def test_hit_on_rewound_position(self):
+        """客户端画面中坦克在路径上时判定命中"""
+        print("  测试回退命中...")
+        bullet = self._shoot()
+        hit, rewind = self.compensator.find_rewound_hit(bullet, self.target, now=1.0, view_time=0.9)
+        self.assertTrue(hit)
+        self.assertAlmostEqual(rewind, 0.1)
+        print("    ✅ 回退命中正确")
+
+    def test_no_rewind_without_view_time(self):
+        """没有画面时间时不回退，子弹保持在炮口"""
+        print("  测试无画面时间...")
+        bullet = self._shoot()
+        start_x = bullet.pymunk_body.position.x
+        hit, rewind = self.compensator.find_rewound_hit(bullet, self.target, now=1.0, view_time=None)
+        self.assertFalse(hit)
+        self.assertEqual(rewind, 0.0)
+        self.assertEqual(bullet.pymunk_body.position.x, start_x)
+        print("    ✅ 无画面时间时不回退")
+
+    def test_miss_advances_bullet(self):
+        """未命中时子弹推进到当前时刻"""
+        print("  测试未命中推进...")
+        bullet = self._shoot()
+        start_x = bullet.pymunk_body.position.x
+        hit, rewind = self.compensator.find_rewound_hit(bullet, self.target, now=1.0, view_time=0.97)
+        self.assertFalse(hit)
+        expected_x = start_x + bullet.pymunk_body.velocity.x * rewind
+        self.assertAlmostEqual(bullet.pymunk_body.position.x, expected_x, delta=0.01)
+        print("    ✅ 未命中推进正确")
+
+    def test_miss_not_advanced_through_current_target(self):
+        """回退位置未命中，但目标现在位于推进路径上时不推进"""
+        print("  测试不穿过目标当前位置...")
+        history = TransformHistory()
+        for i in range(11):
+            history.record(0.9 + i * 0.01, 200, 600, 0)
+        self.compensator.histories["host"] = history
+        # 目标刚移动到射击路径上
+        self.target.center_x, self.target.center_y = 200, 300
+
+        bullet = self._shoot()
+        start_x = bullet.pymunk_body.position.x
+        hit, rewind = self.compensator.find_rewound_hit(bullet, self.target, now=1.0, view_time=0.9)
+        self.assertFalse(hit)
+        self.assertGreater(start_x + bullet.pymunk_body.velocity.x * rewind, 200)
+        self.assertEqual(bullet.pymunk_body.position.x, start_x)
+        print("    ✅ 子弹留给物理步进处理")
+
+    def test_wall_blocks_rewound_hit(self):
+        """路径上有墙壁时不判定命中"""
+        print("  测试墙壁遮挡...")
+        space = pymunk.Space()
+        wall_body = pymunk.Body(body_type=pymunk.Body.STATIC)
+        wall = pymunk.Segment(wall_body, (150, 0), (150, 720), 5)
+        wall.collision_type = COLLISION_TYPE_WALL
+        space.add(wall_body, wall)
+
+        bullet = self._shoot()
+        start_x = bullet.pymunk_body.position.x
+        hit, _ = self.compensator.find_rewound_hit(bullet, self.target, now=1.0, view_time=0.9,
+                                                   space=space)
+        self.assertFalse(hit)
+        self.assertEqual(bullet.pymunk_body.position.x, start_x)
+        print("    ✅ 墙壁遮挡正确")
+
+    def test_view_time_in_player_input(self):
+        """玩家输入消息携带画面时间"""
+        print("  测试输入消息画面时间...")
+        message = MessageFactory.create_player_input(["SPACE"], [], view_time=12.5)
+        received = NetworkMessage.from_bytes(message.to_bytes())
+        self.assertEqual(received.data["view_time"], 12.5)
+        self.assertNotIn("view_time", MessageFactory.create_player_input([], []).data)
+        print("    ✅ 输入消息画面时间正确")
+
+
+class TestHostInputQueue(unittest.TestCase):
+    """测试主机端客户端输入的应用时机"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+
+    def test_inputs_applied_on_main_thread(self):
+        """输入回调只排队，射击和移动在 on_update 开头应用"""
+        print("  测试输入排队...")
+        host_view = HostGameView(network=LoopbackNetwork(), window=HeadlessWindow())
+        host_view._start_game()
+        tank = host_view.game_view.player2_tank
+        tank.last_shot_time = -1.0
+
+        host_view._on_input_received("client", ["W", "SPACE"], [])
+        self.assertEqual(len(host_view.game_view.bullet_list), 0)
+        self.assertEqual(tuple(tank.pymunk_body.velocity), (0, 0))
+
+        host_view.on_update(1 / 60)
+        self.assertEqual(len(host_view.pending_inputs), 0)
+        self.assertEqual(len(host_view.game_view.bullet_list), 1)
+        self.assertNotEqual(tuple(tank.pymunk_body.velocity), (0, 0))
+        print("    ✅ 输入在主线程应用")
+
+
+if __name__ == "__main__":
+    unittest.main()
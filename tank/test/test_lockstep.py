@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+锁步同步测试
+
+测试只交换输入的锁步模式，确保：
+1. 输入包编码紧凑，位掩码与按键互相转换
+2. 缺少对方输入时停下等待，不会提前模拟
+3. 两个独立的模拟在相同输入下（即使丢包）得到完全相同的状态
+4. 输入包经主机/客户端的二进制通道传递，种子选出相同的地图
+"""
+
+import sys
+import os
+import random
+import time
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tank_sprites
+import game_views
+from maps import get_random_map_layout
+from multiplayer.transport import LoopbackNetwork
+from multiplayer.game_host import GameHost
+from multiplayer.game_client import GameClient
+from multiplayer.dedicated_server import HeadlessWindow
+from multiplayer.lockstep import (LockstepSession, encode_inputs, decode_inputs,
+                                  keys_to_mask, mask_to_keys, INPUT_DELAY_TICKS)
+
+
+def _wait_for(condition, timeout=3.0):
+    """等待条件成立"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def _create_game_view(map_seed: int):
+    """创建无界面的锁步游戏视图"""
+    game_view = game_views.GameView(mode="network_host", window=HeadlessWindow())
+    game_view.set_map_layout(get_random_map_layout(random.Random(map_seed)))
+    game_view.setup()
+    return game_view
+
+
+def _snapshot(game_view) -> tuple:
+    """记录用于比较的完整状态"""
+    tanks = tuple((tuple(t.pymunk_body.position), t.pymunk_body.angle, t.health)
+                  for t in game_view.player_list)
+    bullets = tuple(tuple(b.pymunk_body.position) for b in game_view.bullet_list)
+    return (tanks, bullets, game_view.player1_score, game_view.player2_score, game_view.total_time)
+
+
+class TestInputEncoding(unittest.TestCase):
+    """测试输入包格式"""
+
+    def test_round_trip(self):
+        """输入包往返，每个tick只占一个字节"""
+        print("  测试输入包编码...")
+        mask = keys_to_mask(["W", "SPACE", "UP"])
+        self.assertEqual(mask_to_keys(mask), ["W", "SPACE"])
+
+        packet = encode_inputs(7, 10, [mask, 0, keys_to_mask(["A"])])
+        self.assertEqual(len(packet), 12)
+        self.assertEqual(decode_inputs(packet), (7, 10, [mask, 0, keys_to_mask(["A"])]))
+        with self.assertRaises(ValueError):
+            decode_inputs(b'{"type": "heartbeat"}')
+        print(f"    ✅ 3个tick的输入包 {len(packet)} 字节")
+
+
+class TestLockstepSimulation(unittest.TestCase):
+    """测试两个锁步模拟的一致性"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+        self.views = [_create_game_view(42), _create_game_view(42)]
+        self.outboxes = [[], []]
+        self.sessions = [LockstepSession(slot, self.outboxes[slot].append) for slot in (0, 1)]
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+
+    def _deliver(self, drop_every: int = 0):
+        """把双方发出的输入包交给对方（可按间隔丢包）"""
+        for slot in (0, 1):
+            for index, packet in enumerate(self.outboxes[slot]):
+                if drop_every and index % drop_every == 0:
+                    continue
+                self.sessions[1 - slot].receive(packet)
+            self.outboxes[slot].clear()
+
+    def test_stall_without_remote_input(self):
+        """输入延迟期过后，收不到对方输入就停下等待"""
+        print("  测试等待对方输入...")
+        session, game_view = self.sessions[0], self.views[0]
+        for _ in range(INPUT_DELAY_TICKS):
+            self.assertTrue(session.advance(game_view))
+        self.assertFalse(session.advance(game_view))
+        self.assertEqual(session.tick, INPUT_DELAY_TICKS)
+        self.assertEqual(session.stall_count, 1)
+
+        # 对方推进一个tick时发出延迟期之后的第一个输入
+        self.assertTrue(self.sessions[1].advance(self.views[1]))
+        self._deliver()
+        self.assertTrue(session.advance(game_view))
+        print("    ✅ 缺少输入时停下等待")
+
+    def test_identical_simulation_with_packet_loss(self):
+        """相同的输入（丢包情况下）得到完全相同的状态"""
+        print("  测试模拟一致性...")
+        script = {5: ("W", None), 20: ("A", None), 40: (None, "A"), 45: ("SPACE", None),
+                  50: (None, "SPACE"), 90: (None, "W"), 100: ("D", "SPACE")}
+        rng = random.Random(1)
+        start = tuple(self.views[0].player_tank.pymunk_body.position)
+        ticks = [0, 0]
+        frame = 0
+        while min(ticks) < 240:
+            frame += 1
+            for slot in (0, 1):
+                action = script.get(ticks[slot] + slot * 7)
+                if action:
+                    press, release = action
+                    if press:
+                        self.sessions[slot].key_press(press)
+                    if release:
+                        self.sessions[slot].key_release(release)
+                # 两个模拟的节奏不同
+                for _ in range(rng.randint(0, 2)):
+                    if self.sessions[slot].advance(self.views[slot]):
+                        ticks[slot] += 1
+            self._deliver(drop_every=3)
+            self.assertLess(frame, 2000)
+
+        # 双方推进到同一个tick后比较
+        while ticks[0] != ticks[1]:
+            slot = 0 if ticks[0] < ticks[1] else 1
+            if self.sessions[slot].advance(self.views[slot]):
+                ticks[slot] += 1
+            self._deliver()
+
+        self.assertEqual(_snapshot(self.views[0]), _snapshot(self.views[1]))
+        self.assertNotEqual(tuple(self.views[0].player_tank.pymunk_body.position), start)
+        stats = self.sessions[0].get_stats()
+        self.assertLess(stats["bytes_per_tick"], 20)
+        print(f"    ✅ {ticks[0]} 个tick后状态一致，平均 {stats['bytes_per_tick']:.1f} 字节/tick")
+
+
+class TestLockstepTransport(unittest.TestCase):
+    """测试输入包经主机和客户端传递"""
+
+    def test_binary_channel(self):
+        """锁步输入包绕过JSON解码，双向送达"""
+        print("  测试锁步输入通道...")
+        network = LoopbackNetwork()
+        host = GameHost(network=network)
+        client = GameClient(network=network)
+        host_received, client_received = [], []
+        host.set_callbacks(lockstep_input=lambda cid, data: host_received.append((cid, data)))
+        client.set_callbacks(lockstep_input=client_received.append)
+        try:
+            self.assertTrue(host.start_hosting("锁步房间", "主机"))
+            self.assertTrue(client.connect_to_host("127.0.0.1", host.host_port, "玩家"))
+
+            packet = encode_inputs(0, 3, [keys_to_mask(["W"])])
+            client.send_lockstep_input(packet)
+            self.assertTrue(_wait_for(lambda: host_received))
+            self.assertEqual(host_received[0], (client.player_id, packet))
+
+            host.send_lockstep_input(packet)
+            self.assertTrue(_wait_for(lambda: client_received))
+            self.assertEqual(client_received[0], packet)
+        finally:
+            client.disconnect()
+            host.stop_hosting()
+        print("    ✅ 锁步输入双向送达")
+
+    def test_seeded_map(self):
+        """同一个种子选出相同的地图"""
+        print("  测试种子地图...")
+        for seed in range(10):
+            self.assertIs(get_random_map_layout(random.Random(seed)),
+                          get_random_map_layout(random.Random(seed)))
+        print("    ✅ 种子地图一致")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+端到端延迟基准测试的冒烟测试
+
+确保基准测试在回环网络上可以跑通：客户端完成游戏初始化，
+状态快照从主机发出并被客户端应用，统计中包含各阶段耗时和 GAME_STATE 大小。
+"""
+
+import sys
+import os
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tank_sprites
+from multiplayer.dedicated_server import HeadlessWindow
+from benchmarks.loopback_latency import run_scenario
+
+
+class TestLoopbackLatency(unittest.TestCase):
+    """测试端到端延迟基准测试"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+
+    def test_scenario_runs(self):
+        """短时间运行一轮，状态快照被测量到"""
+        print("  测试延迟基准测试冒烟...")
+        result = run_scenario(20, 0.5, window=HeadlessWindow())
+        self.assertGreater(result["ticks"], 0)
+        self.assertGreater(result["states_applied"], 0)
+        self.assertGreater(result["stages_ms"]["network"]["count"], 0)
+        self.assertGreater(result["game_state_bytes"]["mean"], 0)
+        print(f"    ✅ 应用 {result['states_applied']} 个状态，"
+              f"延迟 p50 {result['tick_to_apply_ms']['p50']}ms")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+对局统计分析测试
+
+测试从回放文件提取列式数据并汇总，确保：
+1. 开火、命中、回合时长和击杀用时按列式数据正确计算
+2. 重新模拟回放得到的开火次数和位置与录制时一致，热力图只统计存活的tick
+3. 进程池并行分析多个文件的结果与逐个分析相同，按地图分组
+"""
+
+import sys
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tank_sprites
+import game_views
+from maps import ALL_MAP_LAYOUTS
+from multiplayer.dedicated_server import HeadlessWindow
+from match_analytics import (np, extract_columns, summarize_match, aggregate,
+                             analyze_replays, _analyze_file, HEATMAP_BINS)
+
+
+def _columns(health, last_shot, round_over, delta=0.1):
+    """构造一局的列式数据（坦克位置固定在场地中央）"""
+    count = len(round_over)
+    position = np.zeros((count, 2, 2), dtype=np.float32)
+    position[:, :, 0], position[:, :, 1] = 640.0, 360.0
+    return {
+        "path": "synthetic.tkr",
+        "mode": "pvp",
+        "map_checksum": "synthetic",
+        "shot_cooldown": 0.4,
+        "delta": np.full(count, delta),
+        "position": position,
+        "health": np.array(health, dtype=np.int8).T,
+        "last_shot": np.array(last_shot, dtype=np.float64).T,
+        "bounces": np.zeros((count, 2), dtype=np.int16),
+        "round_over": np.array(round_over, dtype=bool),
+    }
+
+
+@unittest.skipIf(np is None, "需要 numpy")
+class TestMatchAnalytics(unittest.TestCase):
+    """测试对局统计分析"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _record(self, name: str, map_index: int, ticks: int = 240) -> dict:
+        """录制一局本地PVP对局，返回录制时每个槽位的开火次数和最终位置"""
+        key = game_views.arcade.key
+        script = {
+            2: [(key.W, True), (key.UP, True)],
+            30: [(key.SPACE, True), (key.A, True)],
+            31: [(key.SPACE, False)],
+            60: [(key.ENTER, True), (key.A, False)],
+            61: [(key.ENTER, False)],
+            100: [(key.SPACE, True), (key.LEFT, True)],
+            101: [(key.SPACE, False)],
+            103: [(key.SPACE, True)],  # 冷却中，不会开火
+            104: [(key.SPACE, False)],
+            160: [(key.W, False), (key.UP, False), (key.LEFT, False)],
+        }
+        game_view = game_views.GameView(mode="pvp", window=HeadlessWindow())
+        game_view.set_map_layout(ALL_MAP_LAYOUTS[map_index])
+        game_view.setup()
+        path = os.path.join(self.temp_dir, name)
+        game_view.start_replay_recording(path)
+
+        rng = random.Random(map_index)
+        tanks = (game_view.player_tank, game_view.player2_tank)
+        shots = [0, 0]
+        for tick in range(ticks):
+            before = [tank.last_shot_time for tank in tanks]
+            for pressed_key, pressed in script.get(tick, []):
+                if pressed:
+                    game_view.on_key_press(pressed_key, 0)
+                else:
+                    game_view.on_key_release(pressed_key, 0)
+            game_view.on_update(rng.choice([1 / 60, 1 / 50]))
+            for slot, tank in enumerate(tanks):
+                shots[slot] += tank.last_shot_time != before[slot]
+        game_view.stop_replay_recording()
+        return {"path": path, "shots": shots,
+                "positions": [tuple(tank.pymunk_body.position) for tank in tanks]}
+
+    def test_summarize_columns(self):
+        """开火、命中、回合和击杀用时"""
+        print("  测试列式数据汇总...")
+        columns = _columns(
+            health=[[5, 5, 4, 4, 3, 3, 0, 0, 5, 5],
+                    [5, 5, 5, 5, 5, 5, 5, 5, 5, 5]],
+            last_shot=[[-1, -1, -1, -1, -1, -1, -1, -1, -1, -1],
+                       [-1, 0.2, 0.2, 0.4, 0.4, 0.6, 0.6, 0.6, 0.6, 0.6]],
+            round_over=[False] * 6 + [True, True] + [False, False])
+        summary = summarize_match(columns)
+
+        self.assertEqual(summary["shots"].tolist(), [0, 3])
+        self.assertEqual(summary["hits"].tolist(), [0, 3])
+        self.assertEqual(summary["round_winner"].tolist(), [1])
+        self.assertAlmostEqual(summary["round_duration"][0], 0.6)
+        self.assertAlmostEqual(summary["time_to_kill"][0], 0.4)
+        self.assertTrue(np.allclose(summary["shot_intervals"][1], [0.2, 0.2]))
+        # 槽位0死亡的两个tick不计入热力图
+        self.assertEqual(summary["heatmap"].sum(axis=(1, 2)).tolist(), [8, 10])
+
+        report = aggregate([summary, summary])
+        self.assertEqual(report["rounds"], 2)
+        self.assertEqual(report["player1_win_rate"], 0.0)
+        self.assertEqual(report["accuracy"], [None, 1.0])
+        self.assertEqual(report["cooldown_bound_ratio"], 1.0)
+        self.assertEqual(report["maps"][0]["map"], "未知地图")
+        print("    ✅ 汇总结果正确")
+
+    def test_extract_from_replay(self):
+        """重新模拟得到的开火次数和位置与录制时一致"""
+        print("  测试从回放提取数据...")
+        recorded = self._record("match.tkr", 0)
+        columns = extract_columns(recorded["path"])
+
+        self.assertEqual(len(columns["delta"]), 240)
+        self.assertEqual(columns["position"].shape, (240, 2, 2))
+        summary = summarize_match(columns)
+        self.assertEqual(summary["shots"].tolist(), recorded["shots"])
+        self.assertEqual(recorded["shots"], [2, 1])
+        for slot in (0, 1):
+            self.assertTrue(np.allclose(columns["position"][-1, slot], recorded["positions"][slot],
+                                        atol=0.01))
+        self.assertEqual(summary["heatmap"].shape, (2,) + HEATMAP_BINS)
+        self.assertEqual(summary["heatmap"].sum(), 480)
+        print(f"    ✅ 开火 {recorded['shots']}，反弹 {summary['bounces'].tolist()}")
+
+    def test_process_pool(self):
+        """进程池并行分析与逐个分析相同，按地图分组"""
+        print("  测试进程池并行分析...")
+        paths = [self._record("a.tkr", 0)["path"], self._record("b.tkr", 1)["path"]]
+        serial = aggregate([_analyze_file(path, HEATMAP_BINS) for path in paths])
+        parallel = analyze_replays([self.temp_dir], workers=2)
+
+        self.assertEqual(parallel, serial)
+        self.assertEqual(parallel["matches"], 2)
+        self.assertEqual(sorted(entry["map"] for entry in parallel["maps"]), ["MAP_1", "MAP_2"])
+        print("    ✅ 并行结果一致")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+对局状态保存/恢复测试
+
+测试 GameView.save_state / load_state，确保：
+1. 恢复后坦克、子弹、比分、回合计时和射击冷却与保存时完全相同
+2. 恢复时复用现有的坦克和墙壁，子弹按需新建和移除
+3. 状态数据紧凑，可以每个tick保存一次
+"""
+
+import sys
+import os
+import time
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tank_sprites
+import game_views
+from maps import get_random_map_layout
+from multiplayer.dedicated_server import HeadlessWindow
+from multiplayer.lockstep import LockstepSession, keys_to_mask
+
+
+def _create_game_view():
+    """创建无界面的游戏视图"""
+    game_view = game_views.GameView(mode="network_host", window=HeadlessWindow())
+    game_view.set_map_layout(get_random_map_layout())
+    game_view.setup()
+    return game_view
+
+
+def _snapshot(game_view) -> tuple:
+    """记录用于比较的完整状态"""
+    tanks = tuple((tuple(t.pymunk_body.position), t.pymunk_body.angle, tuple(t.pymunk_body.velocity),
+                   t.health, t.last_shot_time) for t in game_view.player_list)
+    bullets = tuple((tuple(b.pymunk_body.position), tuple(b.pymunk_body.velocity), b.bounce_count)
+                    for b in game_view.bullet_list)
+    return (tanks, bullets, game_view.player1_score, game_view.player2_score, game_view.round_over,
+            game_view.round_over_timer, game_view.round_result_text, game_view.total_time)
+
+
+class TestMatchState(unittest.TestCase):
+    """测试对局状态的保存和恢复"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+        self.game_view = _create_game_view()
+        self.session = LockstepSession(0, lambda data: None, input_delay=0)
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+
+    def _run(self, ticks: int, masks):
+        for _ in range(ticks):
+            self.session._step(self.game_view, masks)
+
+    def test_round_trip(self):
+        """恢复后状态与保存时完全相同，墙壁和坦克不重建"""
+        print("  测试状态往返...")
+        game_view = self.game_view
+        self._run(20, [keys_to_mask(["W", "SPACE"]), keys_to_mask(["A", "SPACE"])])
+        game_view.player1_score, game_view.round_result_text = 1, "主机 本回合胜利!"
+        self.assertGreater(len(game_view.bullet_list), 0)
+
+        saved = _snapshot(game_view)
+        data = game_view.save_state()
+        tanks, walls = list(game_view.player_list), list(game_view.wall_list)
+        bullets = list(game_view.bullet_list)
+
+        self._run(40, [keys_to_mask(["D"]), keys_to_mask(["S"])])
+        self.assertNotEqual(_snapshot(game_view), saved)
+
+        game_view.load_state(data)
+        self.assertEqual(_snapshot(game_view), saved)
+        self.assertEqual(list(game_view.player_list), tanks)
+        self.assertEqual(list(game_view.wall_list), walls)
+        self.assertEqual(game_view.save_state(), data)
+        self.assertEqual(len(game_view.bullet_list), len(bullets))
+        print(f"    ✅ 状态往返正确，{len(data)} 字节")
+
+    def test_bullets_created_and_removed(self):
+        """恢复时补建已消失的子弹，移除之后才发射的子弹"""
+        print("  测试子弹重建...")
+        game_view = self.game_view
+        empty = game_view.save_state()
+        self._run(5, [keys_to_mask(["SPACE"]), keys_to_mask(["SPACE"])])
+        with_bullets = game_view.save_state()
+        saved = _snapshot(game_view)
+
+        game_view.load_state(empty)
+        self.assertEqual(len(game_view.bullet_list), 0)
+        dynamic = [b for b in game_view.space.bodies if b.body_type == b.DYNAMIC]
+        self.assertEqual(len(dynamic), 2)
+
+        game_view.load_state(with_bullets)
+        self.assertEqual(_snapshot(game_view), saved)
+        for bullet in game_view.bullet_list:
+            self.assertIs(bullet.pymunk_body.space, game_view.space)
+        print("    ✅ 子弹重建正确")
+
+    def test_invalid_data(self):
+        """不完整或版本不对的数据抛出 ValueError"""
+        print("  测试无效数据...")
+        data = self.game_view.save_state()
+        with self.assertRaises(ValueError):
+            self.game_view.load_state(data[:10])
+        with self.assertRaises(ValueError):
+            self.game_view.load_state(b"\xff" + data[1:])
+        print("    ✅ 无效数据被拒绝")
+
+    def test_fast_enough_per_tick(self):
+        """保存和恢复的开销远小于一个tick"""
+        print("  测试保存/恢复耗时...")
+        game_view = self.game_view
+        self._run(5, [keys_to_mask(["SPACE"]), keys_to_mask(["SPACE"])])
+        start = time.perf_counter()
+        for _ in range(200):
+            game_view.load_state(game_view.save_state())
+        per_call = (time.perf_counter() - start) / 200
+        self.assertLess(per_call, 1.0 / 60 / 4)
+        print(f"    ✅ 保存+恢复每次 {per_call * 1e6:.0f} 微秒")
+
+
+if __name__ == "__main__":
+    unittest.main()
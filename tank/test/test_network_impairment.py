@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+网络损伤模拟测试
+
+测试包装在传输层外的网络损伤模拟，确保：
+1. 相同种子下丢包决策可复现，丢包率接近配置值
+2. 突发丢包产生连续丢包
+3. 重复、乱序、延迟、带宽限制按配置生效
+4. 可以通过环境变量字符串选择配置
+"""
+
+import sys
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multiplayer.transport import LoopbackNetwork, UdpNetwork
+from multiplayer.impairment import (ImpairedNetwork, NetworkImpairment, IMPAIRMENT_ENV_VAR,
+                                    network_from_environment)
+
+
+def _make_pair(impairment):
+    """创建带损伤的发送端和普通接收端"""
+    loopback = LoopbackNetwork()
+    network = ImpairedNetwork(loopback, impairment)
+    receiver = loopback.create_transport(9000)
+    sender = network.create_transport()
+    return network, sender, receiver
+
+
+def _drain(receiver, expected, timeout=2.0):
+    """接收数据报直到数量达到预期或超时"""
+    received = []
+    deadline = time.time() + timeout
+    while len(received) < expected and time.time() < deadline:
+        received.extend(data for data, _ in receiver.receive_batch(timeout=0.05))
+    return received
+
+
+class TestNetworkImpairment(unittest.TestCase):
+    """测试网络损伤模拟"""
+
+    def test_loss_is_reproducible(self):
+        """相同种子产生相同的丢包序列"""
+        print("  测试丢包可复现...")
+        results = []
+        for _ in range(2):
+            network, sender, receiver = _make_pair(NetworkImpairment(loss=0.2, seed=42))
+            for i in range(500):
+                sender.send(i.to_bytes(2, "big"), ("127.0.0.1", 9000))
+            results.append(_drain(receiver, 500, timeout=0.1))
+
+        self.assertEqual(results[0], results[1])
+        loss_rate = 1 - len(results[0]) / 500
+        self.assertAlmostEqual(loss_rate, 0.2, delta=0.06)
+        print(f"    ✅ 丢包率 {loss_rate:.1%}")
+
+    def test_burst_loss(self):
+        """突发丢包产生连续丢包"""
+        print("  测试突发丢包...")
+        network, sender, receiver = _make_pair(
+            NetworkImpairment(burst_loss=0.02, burst_length=8, seed=1))
+        for i in range(2000):
+            sender.send(i.to_bytes(2, "big"), ("127.0.0.1", 9000))
+        received = [int.from_bytes(data, "big") for data in _drain(receiver, 2000, timeout=0.1)]
+
+        longest_gap = max(b - a - 1 for a, b in zip(received, received[1:]))
+        self.assertGreater(network.stats["burst_dropped"], 0)
+        self.assertGreaterEqual(longest_gap, 4)
+        print(f"    ✅ 最长连续丢包 {longest_gap}")
+
+    def test_duplication(self):
+        """重复包"""
+        print("  测试重复包...")
+        network, sender, receiver = _make_pair(NetworkImpairment(duplicate=0.5, seed=3))
+        for i in range(100):
+            sender.send(bytes([i]), ("127.0.0.1", 9000))
+        received = _drain(receiver, 100 + network.stats["duplicated"], timeout=0.1)
+
+        self.assertGreater(network.stats["duplicated"], 20)
+        self.assertEqual(len(received), 100 + network.stats["duplicated"])
+        print("    ✅ 重复包正确")
+
+    def test_latency_and_jitter_preserve_order(self):
+        """延迟生效，抖动不导致乱序"""
+        print("  测试延迟和抖动...")
+        network, sender, receiver = _make_pair(
+            NetworkImpairment(latency=0.05, jitter=0.02, seed=5))
+        start = time.perf_counter()
+        for i in range(20):
+            sender.send(bytes([i]), ("127.0.0.1", 9000))
+        self.assertEqual(receiver.receive_batch(timeout=0), [])
+
+        received = _drain(receiver, 20)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.03)
+        self.assertEqual(received, [bytes([i]) for i in range(20)])
+        print("    ✅ 延迟和抖动正确")
+
+    def test_reordering(self):
+        """乱序包被后面的包超过"""
+        print("  测试乱序...")
+        network, sender, receiver = _make_pair(
+            NetworkImpairment(reorder=0.2, reorder_delay=0.03, seed=7))
+        for i in range(50):
+            sender.send(bytes([i]), ("127.0.0.1", 9000))
+        received = _drain(receiver, 50)
+
+        self.assertEqual(sorted(received), [bytes([i]) for i in range(50)])
+        self.assertNotEqual(received, [bytes([i]) for i in range(50)])
+        self.assertGreater(network.stats["reordered"], 0)
+        print("    ✅ 乱序正确")
+
+    def test_bandwidth_cap(self):
+        """带宽限制拉长发送时间，超出队列上限时丢弃"""
+        print("  测试带宽限制...")
+        network, sender, receiver = _make_pair(
+            NetworkImpairment(bandwidth=10000, queue_limit=0.1, seed=9))
+        start = time.perf_counter()
+        for _ in range(20):
+            sender.send(b"x" * 200, ("127.0.0.1", 9000))  # 共4000字节，约0.4秒
+        received = _drain(receiver, 20, timeout=0.6)
+
+        # 队列最多排0.1秒，约5个数据报
+        self.assertLess(len(received), 10)
+        self.assertGreater(network.stats["queue_dropped"], 0)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.08)
+        print(f"    ✅ 带宽限制下送达 {len(received)} 个数据报")
+
+    def test_spec_parsing(self):
+        """解析配置字符串"""
+        print("  测试配置解析...")
+        impairment = NetworkImpairment.from_spec("mobile,latency_ms=100,loss=0.1,seed=3")
+        self.assertAlmostEqual(impairment.latency, 0.1)
+        self.assertEqual(impairment.loss, 0.1)
+        self.assertEqual(impairment.seed, 3)
+        self.assertEqual(impairment.bandwidth, NetworkImpairment.PRESETS["mobile"]["bandwidth"])
+        self.assertFalse(NetworkImpairment().is_active())
+        with self.assertRaises(ValueError):
+            NetworkImpairment.from_spec("unknown=1")
+        print("    ✅ 配置解析正确")
+
+    def test_environment_selection(self):
+        """通过环境变量启用网络损伤"""
+        print("  测试环境变量...")
+        inner = UdpNetwork()
+        with patch.dict(os.environ, {IMPAIRMENT_ENV_VAR: ""}):
+            self.assertIs(network_from_environment(inner), inner)
+        with patch.dict(os.environ, {IMPAIRMENT_ENV_VAR: "wifi,seed=2"}):
+            network = network_from_environment(inner)
+        self.assertIsInstance(network, ImpairedNetwork)
+        self.assertEqual(network.impairment.seed, 2)
+        print("    ✅ 环境变量正确")
+
+
+if __name__ == "__main__":
+    unittest.main()
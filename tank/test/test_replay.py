@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+对局回放测试
+
+测试回放的录制和播放，确保：
+1. 按键事件编码为1字节，无输入的tick开销很小
+2. 本地PVP对局（不固定的帧间隔）重放后与录制结束时的状态完全相同，关键帧全部一致
+3. 锁步对局按槽位录制双方的输入，同样可以重放
+4. 录制中断、文件末尾不完整时仍然可以播放已写入的部分
+5. 按文件尾的关键帧索引跳转到任意tick，结果与从头播放一致
+"""
+
+import sys
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tank_sprites
+import game_views
+from maps import get_random_map_layout
+from multiplayer.dedicated_server import HeadlessWindow
+from multiplayer.lockstep import LockstepSession, keys_to_mask
+from replay import (ReplayPlayer, load_replay, encode_event, decode_event,
+                    KEYFRAME_INTERVAL, REPLAY_MAGIC)
+
+
+def _read_all(replay_data) -> list:
+    """按顺序读出所有tick记录 (帧间隔, 事件字节, 关键帧)"""
+    records, offset = [], replay_data.records_start
+    for _ in range(replay_data.tick_count):
+        delta_time, events, keyframe, offset = replay_data.read_tick(offset)
+        records.append((delta_time, events, keyframe))
+    return records
+
+
+def _pvp_script() -> dict:
+    """每个tick按下/松开的本地按键（玩家1 WASD+空格，玩家2 方向键+回车）
+
+    使用 game_views 导入的 arcade 按键常量，与 GameView 的按键处理保持一致。
+    """
+    key = game_views.arcade.key
+    return {
+        2: [(key.W, True), (key.LEFT, True)],
+        20: [(key.A, True), (key.LEFT, False), (key.UP, True)],
+        45: [(key.A, False), (key.SPACE, True)],
+        47: [(key.SPACE, False), (key.ENTER, True)],
+        48: [(key.ENTER, False)],
+        90: [(key.SPACE, True), (key.D, True)],
+        91: [(key.SPACE, False)],
+        130: [(key.W, False), (key.S, True), (key.UP, False)],
+        200: [(key.ENTER, True), (key.RIGHT, True)],
+        201: [(key.ENTER, False)],
+        260: [(key.S, False), (key.D, False), (key.RIGHT, False)],
+    }
+
+
+def _state_values(game_view) -> tuple:
+    """(坦克和子弹的位置, 血量, 子弹数, 比分, total_time)"""
+    positions = [tuple(t.pymunk_body.position) for t in game_view.player_list]
+    positions += [tuple(b.pymunk_body.position) for b in game_view.bullet_list]
+    return (positions, tuple(t.health for t in game_view.player_list), len(game_view.bullet_list),
+            game_view.player1_score, game_view.player2_score, game_view.total_time)
+
+
+class TestReplay(unittest.TestCase):
+    """测试回放录制和播放"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "match.tkr")
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _record_pvp(self, ticks: int = 320):
+        """录制一局本地PVP对局，返回录制结束时的状态"""
+        game_view = game_views.GameView(mode="pvp", window=HeadlessWindow())
+        game_view.set_map_layout(get_random_map_layout(random.Random(5)))
+        game_view.setup()
+        game_view.start_replay_recording(self.path)
+        rng = random.Random(3)
+        script = _pvp_script()
+        for tick in range(ticks):
+            for key, pressed in script.get(tick, []):
+                if pressed:
+                    game_view.on_key_press(key, 0)
+                else:
+                    game_view.on_key_release(key, 0)
+            game_view.on_update(rng.choice([1 / 60, 1 / 50, 1 / 75]))
+        final_state = game_view.save_state()
+        game_view.stop_replay_recording()
+        return final_state
+
+    def _play(self, replay_data):
+        player = ReplayPlayer(replay_data, window=HeadlessWindow())
+        while not player.finished:
+            player.step()
+        return player
+
+    def _open(self):
+        replay_data = load_replay(self.path)
+        self.addCleanup(replay_data.close)
+        return replay_data
+
+    def test_event_encoding(self):
+        """按键事件编码为1字节"""
+        print("  测试事件编码...")
+        for slot in (0, 1):
+            for key in ("W", "S", "A", "D", "SPACE"):
+                for pressed in (True, False):
+                    event = encode_event(slot, key, pressed)
+                    self.assertLess(event, 256)
+                    self.assertEqual(decode_event(event), (slot, key, pressed))
+        print("    ✅ 事件编码正确")
+
+    def test_pvp_round_trip(self):
+        """本地对局重放后状态完全相同"""
+        print("  测试PVP录制和重放...")
+        final_state = self._record_pvp()
+        with open(self.path, "rb") as replay_file:
+            self.assertEqual(replay_file.read(4), REPLAY_MAGIC)
+
+        replay_data = self._open()
+        self.assertTrue(replay_data.indexed)
+        self.assertEqual(replay_data.tick_count, 320)
+        self.assertEqual(replay_data.keyframe_ticks, list(range(0, 320, KEYFRAME_INTERVAL)))
+        self.assertEqual(replay_data.header["mode"], "pvp")
+        records = _read_all(replay_data)
+
+        player = self._play(replay_data)
+        self.assertEqual(player.keyframe_mismatches, 0)
+        self.assertEqual(player.game_view.save_state(), final_state)
+        recorded_events = sum(len(events) for _, events, _ in records)
+        self.assertEqual(recorded_events, sum(len(actions) for actions in _pvp_script().values()))
+
+        # 不含关键帧时每个tick的开销
+        keyframe_bytes = sum(len(keyframe) + 9 for _, _, keyframe in records if keyframe)
+        tick_bytes = sum(10 + len(events) for _, events, _ in records)
+        self.assertLess(tick_bytes / replay_data.tick_count, 11)
+        print(f"    ✅ 重放一致，文件 {os.path.getsize(self.path)} 字节"
+              f"（tick {tick_bytes}，关键帧 {keyframe_bytes}）")
+
+    def test_lockstep_recording(self):
+        """锁步对局录制双方的输入，重放结果相同"""
+        print("  测试锁步对局录制...")
+        game_view = game_views.GameView(mode="network_host", window=HeadlessWindow())
+        game_view.set_map_layout(get_random_map_layout(random.Random(5)))
+        game_view.setup()
+        game_view.start_replay_recording(self.path)
+        session = LockstepSession(0, lambda data: None, input_delay=0)
+        for tick in range(200):
+            masks = [keys_to_mask(["W", "A"] if tick % 60 < 30 else ["SPACE"]),
+                     keys_to_mask(["S", "D", "SPACE"] if tick % 40 < 10 else [])]
+            session._step(game_view, masks)
+        final_state = game_view.save_state()
+        game_view.stop_replay_recording()
+
+        player = self._play(self._open())
+        self.assertEqual(player.keyframe_mismatches, 0)
+        self.assertEqual(player.game_view.save_state(), final_state)
+        print("    ✅ 锁步对局重放一致")
+
+    def test_truncated_file(self):
+        """文件末尾不完整时播放已写入的部分"""
+        print("  测试不完整的回放文件...")
+        self._record_pvp(ticks=150)
+        with open(self.path, "rb") as replay_file:
+            data = replay_file.read()
+        complete = self._open()
+        with open(self.path, "wb") as replay_file:
+            replay_file.write(data[:len(data) * 2 // 3])
+
+        replay_data = self._open()
+        self.assertFalse(replay_data.indexed)
+        self.assertLess(replay_data.tick_count, 150)
+        self.assertGreater(replay_data.tick_count, 0)
+        self.assertEqual(replay_data.keyframe_ticks,
+                         [tick for tick in complete.keyframe_ticks if tick < replay_data.tick_count])
+        self._play(replay_data)
+
+        with open(self.path, "wb") as replay_file:
+            replay_file.write(b"not a replay")
+        with self.assertRaises(ValueError):
+            load_replay(self.path)
+        print("    ✅ 不完整的文件可以播放")
+
+    def test_seek(self):
+        """跳转到任意tick的状态与从头播放到该tick相同"""
+        print("  测试回放跳转...")
+        self._record_pvp()
+        player = ReplayPlayer(self._open(), window=HeadlessWindow())
+        states = [_state_values(player.game_view)]
+        while not player.finished:
+            player.step()
+            states.append(_state_values(player.game_view))
+
+        for tick in (250, 30, KEYFRAME_INTERVAL, KEYFRAME_INTERVAL + 1, 319, 5, 6, 320, 200, 1):
+            player.seek(tick)
+            self.assertEqual(player.tick, tick)
+            self._assert_close(_state_values(player.game_view), states[tick])
+
+        # 从头跳转时载入第一个关键帧，继续播放结果相同
+        player.seek(0)
+        player.seek(100)
+        self._assert_close(_state_values(player.game_view), states[100])
+        print("    ✅ 跳转结果与从头播放一致")
+
+    def _assert_close(self, actual, expected):
+        """判定相同，位置只允许物理接触缓存带来的极小误差（关键帧不包含接触缓存）"""
+        self.assertEqual(actual[1:], expected[1:])
+        self.assertEqual(len(actual[0]), len(expected[0]))
+        for position, ref_position in zip(actual[0], expected[0]):
+            self.assertAlmostEqual(position[0], ref_position[0], delta=1.0)
+            self.assertAlmostEqual(position[1], ref_position[1], delta=1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+回滚同步测试
+
+测试预测对方输入、迟到后回滚重新模拟的回滚模式，确保：
+1. 快照恢复后状态与保存时相同（子弹的生成/消失、比分和计时都被撤销）
+2. 本地输入没有延迟，预测窗口满时停下等待
+3. 主机的权威状态经JSON编码后可以完整套用到另一个模拟上
+4. 有网络延迟时发生回滚，最终状态与直接使用真实输入的模拟一致
+"""
+
+import sys
+import os
+import json
+import random
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tank_sprites
+import game_views
+from maps import get_random_map_layout
+from multiplayer.dedicated_server import HeadlessWindow
+from multiplayer.lockstep import LockstepSession, keys_to_mask
+from multiplayer.messages import MessageFactory, NetworkMessage
+from multiplayer.rollback import (RollbackSession, SimulationSnapshot, apply_state,
+                                  MAX_ROLLBACK_TICKS)
+
+
+def _create_game_view(map_seed: int = 7):
+    """创建无界面的游戏视图"""
+    game_view = game_views.GameView(mode="network_host", window=HeadlessWindow())
+    game_view.set_map_layout(get_random_map_layout(random.Random(map_seed)))
+    game_view.setup()
+    return game_view
+
+
+def _snapshot(game_view) -> tuple:
+    """记录用于比较的完整状态"""
+    tanks = tuple((tuple(t.pymunk_body.position), t.pymunk_body.angle, t.health, t.last_shot_time)
+                  for t in game_view.player_list)
+    bullets = tuple(tuple(b.pymunk_body.position) for b in game_view.bullet_list)
+    return (tanks, bullets, game_view.player1_score, game_view.player2_score,
+            game_view.round_over, game_view.total_time)
+
+
+# 每个槽位在哪个tick按下/松开哪些按键
+SCRIPT = [
+    {3: ("W", None), 12: ("A", None), 30: (None, "A"), 31: ("SPACE", None), 33: (None, "SPACE"),
+     60: ("SPACE", None), 62: (None, "SPACE"), 80: (None, "W")},
+    {5: ("D", None), 18: (None, "D"), 19: ("W", None), 40: ("SPACE", None), 42: (None, "SPACE"),
+     70: (None, "W"), 71: ("S", None), 90: (None, "S")},
+]
+
+
+def _script_mask(slot: int, tick: int) -> int:
+    """脚本在某个tick的按键位掩码"""
+    keys = set()
+    for t in range(tick + 1):
+        press, release = SCRIPT[slot].get(t, (None, None))
+        if press:
+            keys.add(press)
+        if release:
+            keys.discard(release)
+    return keys_to_mask(keys)
+
+
+def _apply_script(session, slot: int, tick: int):
+    action = SCRIPT[slot].get(tick)
+    if action:
+        press, release = action
+        if press:
+            session.key_press(press)
+        if release:
+            session.key_release(release)
+
+
+class TestSimulationSnapshot(unittest.TestCase):
+    """测试状态快照"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+
+    def test_restore_undoes_simulation(self):
+        """恢复快照撤销之后的移动、子弹和计时"""
+        print("  测试快照恢复...")
+        game_view = _create_game_view()
+        game_view.on_update(1 / 60)
+        saved = _snapshot(game_view)
+        snapshot = SimulationSnapshot.capture(game_view)
+
+        session = LockstepSession(0, lambda data: None, input_delay=0)
+        session._inputs[1].update({tick: keys_to_mask(["W", "SPACE"]) for tick in range(30)})
+        session.key_press("W")
+        session.key_press("SPACE")
+        for _ in range(30):
+            self.assertTrue(session.advance(game_view))
+        self.assertNotEqual(_snapshot(game_view), saved)
+        self.assertGreater(len(game_view.bullet_list), 0)
+
+        snapshot.restore(game_view)
+        self.assertEqual(_snapshot(game_view), saved)
+        self.assertEqual(len(game_view.bullet_list), 0)
+        bullet_bodies = [b for b in game_view.space.bodies if hasattr(b, "sprite")
+                         and b.sprite not in game_view.player_list]
+        self.assertEqual(bullet_bodies, [])
+        print("    ✅ 快照恢复正确")
+
+    def test_apply_state(self):
+        """权威状态经消息往返后套用，子弹按需新建和移除"""
+        print("  测试套用权威状态...")
+        source, target = _create_game_view(), _create_game_view()
+        session = LockstepSession(0, lambda data: None, input_delay=0)
+        for tick in range(45):
+            session._step(source, [_script_mask(0, tick), _script_mask(1, tick)])
+        self.assertGreater(len(source.bullet_list), 0)
+
+        state = SimulationSnapshot.capture(source).to_state()
+        message = NetworkMessage.from_bytes(MessageFactory.create_rollback_state(45, state).to_bytes())
+        self.assertEqual(message.data["state"], json.loads(json.dumps(state)))
+
+        apply_state(target, message.data["state"])
+        self.assertEqual(_snapshot(target), _snapshot(source))
+        self.assertEqual(SimulationSnapshot.capture(target).to_state(), state)
+
+        # 多出的子弹被移除
+        apply_state(target, SimulationSnapshot.capture(_create_game_view()).to_state())
+        self.assertEqual(len(target.bullet_list), 0)
+        self.assertEqual(len([b for b in target.space.bodies if b.body_type == b.DYNAMIC]), 2)
+        print("    ✅ 权威状态套用正确")
+
+
+class TestRollbackSession(unittest.TestCase):
+    """测试回滚同步"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+
+    def test_prediction_window(self):
+        """本地输入立即生效，预测窗口满时等待"""
+        print("  测试预测窗口...")
+        game_view = _create_game_view()
+        session = RollbackSession(0, lambda data: None)
+        session.key_press("W")
+        self.assertTrue(session.advance(game_view))
+        self.assertNotEqual(tuple(game_view.player_tank.pymunk_body.velocity), (0, 0))
+
+        for _ in range(MAX_ROLLBACK_TICKS - 1):
+            self.assertTrue(session.advance(game_view))
+        self.assertFalse(session.advance(game_view))
+        self.assertEqual(session.tick, MAX_ROLLBACK_TICKS)
+        print("    ✅ 本地无延迟，预测窗口正确")
+
+    def test_rollback_converges(self):
+        """有延迟时回滚并接受主机校正，结果与直接使用真实输入的模拟一致"""
+        print("  测试回滚后状态一致...")
+        views = [_create_game_view(), _create_game_view()]
+        in_flight = []  # (送达的帧, 目标槽位, 数据)
+        sessions = [RollbackSession(slot, lambda data, slot=slot: in_flight.append(
+            (frame + 4, 1 - slot, data))) for slot in (0, 1)]
+        sessions[0].state_sync = lambda tick, state: in_flight.append(
+            (frame + 4, 1, MessageFactory.create_rollback_state(tick, state).to_bytes()))
+
+        def deliver():
+            for item in [item for item in in_flight if item[0] <= frame]:
+                in_flight.remove(item)
+                if item[2][:1] == b"{":
+                    data = NetworkMessage.from_bytes(item[2]).data
+                    sessions[item[1]].receive_state(data["tick"], data["state"])
+                else:
+                    sessions[item[1]].receive(item[2])
+
+        frame = 0
+        while min(session.tick for session in sessions) < 150:
+            frame += 1
+            for slot, session in enumerate(sessions):
+                _apply_script(session, slot, session.tick)
+                session.advance(views[slot])
+            deliver()
+            self.assertLess(frame, 1000)
+
+        # 停止输入，双方确认全部tick后推进到同一个tick
+        target = max(session.tick for session in sessions) + MAX_ROLLBACK_TICKS
+        while any(session.tick < target or session.confirmed_tick < target for session in sessions):
+            frame += 1
+            for slot, session in enumerate(sessions):
+                if session.tick < target:
+                    session.advance(views[slot])
+                else:
+                    session._schedule_local_input()
+                    session._reconcile(views[slot])
+            deliver()
+            self.assertLess(frame, 2000)
+
+        # 参考模拟：不回滚，直接使用双方的真实输入
+        reference_view = _create_game_view()
+        reference = LockstepSession(0, lambda data: None, input_delay=0)
+        for tick in range(target):
+            reference._step(reference_view, [_script_mask(0, tick), _script_mask(1, tick)])
+
+        self.assertGreater(sessions[0].rollback_count + sessions[1].rollback_count, 0)
+        for view in views:
+            self._assert_close(view, reference_view)
+        stats = sessions[1].get_stats()
+        print(f"    ✅ {target} 个tick后状态一致，回滚 {stats['rollbacks']} 次，"
+              f"最深 {stats['max_rollback_depth']} 个tick，校正 {stats['corrections']} 次")
+
+    def _assert_close(self, game_view, reference_view):
+        """判定（血量、比分、子弹数量）相同，位置只允许物理接触缓存带来的极小误差"""
+        actual, expected = _snapshot(game_view), _snapshot(reference_view)
+        self.assertEqual(actual[2:], expected[2:])
+        self.assertEqual(len(actual[1]), len(expected[1]))
+        for (position, angle, health, last_shot), (ref_position, ref_angle, ref_health, ref_last_shot) \
+                in zip(actual[0], expected[0]):
+            self.assertEqual((health, last_shot), (ref_health, ref_last_shot))
+            self.assertAlmostEqual(position[0], ref_position[0], delta=1.0)
+            self.assertAlmostEqual(position[1], ref_position[1], delta=1.0)
+            self.assertAlmostEqual(angle, ref_angle, delta=0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+快速房间发现测试
+
+测试房间发现的查询/回复和变化驱动广播，确保：
+1. 浏览器启动后立即查询，已有房间在毫秒级被发现（回环网络和真实UDP套接字）
+2. 房间人数变化时立即广播，满员后降低广播频率
+3. 房间关闭时浏览器立即移除
+4. 可选的组播组
+"""
+
+import sys
+import os
+import socket
+import time
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multiplayer.transport import LoopbackNetwork, UdpNetwork
+from multiplayer.game_host import GameHost
+from multiplayer.game_client import GameClient
+from multiplayer.room_discovery import (RoomDiscovery, FULL_ADVERTISE_INTERVAL,
+                                        DEFAULT_MULTICAST_GROUP)
+
+
+def _wait_for(condition, timeout=3.0):
+    """等待条件成立"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.002)
+    return condition()
+
+
+class TestFastDiscovery(unittest.TestCase):
+    """测试查询/回复和变化驱动广播"""
+
+    def setUp(self):
+        self.network = LoopbackNetwork()
+        self.host = GameHost(host_port=9101, network=self.network)
+        self.browser = RoomDiscovery(9100, network=self.network)
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.disconnect()
+        self.host.stop_hosting()
+        self.browser.stop_discovery()
+
+    def test_query_finds_existing_room(self):
+        """浏览器晚于主机启动时，通过查询立即发现房间"""
+        print("  测试查询发现已有房间...")
+        self.assertTrue(self.host.start_hosting("查询房间", "主机"))
+        time.sleep(0.1)  # 主机的第一次定期广播已经错过
+
+        start = time.perf_counter()
+        self.assertTrue(self.browser.start_discovery())
+        self.assertTrue(_wait_for(lambda: len(self.browser.get_discovered_rooms()) == 1, timeout=1.0))
+        elapsed = time.perf_counter() - start
+
+        room = self.browser.get_discovered_rooms()[0]
+        self.assertEqual(room.host_port, 9101)
+        self.assertLess(elapsed, 0.2)
+        print(f"    ✅ {elapsed * 1000:.1f}ms 发现房间")
+
+    def test_occupancy_change_advertised(self):
+        """玩家加入后立即广播满员，满员后降低广播频率"""
+        print("  测试人数变化广播...")
+        self.assertTrue(self.browser.start_discovery())
+        self.assertTrue(self.host.start_hosting("人数房间", "主机"))
+        self.assertTrue(_wait_for(lambda: len(self.browser.get_discovered_rooms()) == 1))
+        self.assertFalse(self.browser.get_discovered_rooms()[0].is_full())
+
+        client = GameClient(network=self.network)
+        self.assertTrue(client.connect_to_host("127.0.0.1", 9101, "玩家"))
+        self.clients.append(client)
+
+        self.assertTrue(_wait_for(lambda: self.browser.get_discovered_rooms()[0].is_full(), timeout=0.5))
+        room = self.browser.get_discovered_rooms()[0]
+        self.assertEqual((room.players, room.max_players), (2, 2))
+        self.assertEqual(room.advertise_interval, FULL_ADVERTISE_INTERVAL)
+
+        client.disconnect()
+        self.assertTrue(_wait_for(lambda: not self.browser.get_discovered_rooms()[0].is_full(), timeout=0.5))
+        print("    ✅ 人数变化立即广播")
+
+    def test_closed_room_removed(self):
+        """房间关闭时浏览器立即移除"""
+        print("  测试房间关闭...")
+        self.assertTrue(self.browser.start_discovery())
+        self.assertTrue(self.host.start_hosting("关闭房间", "主机"))
+        self.assertTrue(_wait_for(lambda: len(self.browser.get_discovered_rooms()) == 1))
+
+        self.host.stop_hosting()
+        self.assertTrue(_wait_for(lambda: len(self.browser.get_discovered_rooms()) == 0, timeout=0.5))
+        print("    ✅ 关闭的房间立即移除")
+
+
+def _free_port_pair() -> int:
+    """找一个与前一个端口都空闲的UDP端口（发现端口 = 游戏端口 - 1）"""
+    for _ in range(50):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+            probe.bind(('', 0))
+            port = probe.getsockname()[1]
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+                probe.bind(('', port - 1))
+            return port
+        except OSError:
+            continue
+    raise RuntimeError("找不到空闲端口")
+
+
+class TestUdpDiscovery(unittest.TestCase):
+    """测试真实UDP套接字上的房间发现"""
+
+    def test_query_reply_latency(self):
+        """查询的回复到达后立即处理，不等待接收超时"""
+        print("  测试UDP查询发现...")
+        port = _free_port_pair()
+        network = UdpNetwork()
+        host = GameHost(host_port=port, network=network)
+        browser = RoomDiscovery(port - 1, network=network, query_ports=[port])
+        try:
+            self.assertTrue(host.start_hosting("UDP房间", "主机"))
+            time.sleep(0.1)  # 主机的第一次定期广播已经错过
+
+            start = time.perf_counter()
+            self.assertTrue(browser.start_discovery())
+            if not _wait_for(lambda: len(browser.get_discovered_rooms()) == 1, timeout=3.0):
+                self.skipTest("当前环境不支持UDP广播")
+            elapsed = time.perf_counter() - start
+            self.assertEqual(browser.get_discovered_rooms()[0].host_port, port)
+            self.assertLess(elapsed, 0.2)
+        finally:
+            host.stop_hosting()
+            browser.stop_discovery()
+        print(f"    ✅ {elapsed * 1000:.1f}ms 发现房间")
+
+
+class TestMulticastDiscovery(unittest.TestCase):
+    """测试组播发现"""
+
+    def test_multicast_rooms(self):
+        """房间广播和查询通过组播组传递"""
+        print("  测试组播房间...")
+        network = LoopbackNetwork()
+        host = GameHost(host_port=9201, network=network, multicast_group=DEFAULT_MULTICAST_GROUP)
+        group_browser = RoomDiscovery(9200, network=network, multicast_group=DEFAULT_MULTICAST_GROUP)
+        try:
+            self.assertTrue(host.start_hosting("组播房间", "主机"))
+            time.sleep(0.05)
+            self.assertTrue(group_browser.start_discovery())
+            self.assertTrue(_wait_for(lambda: len(group_browser.get_discovered_rooms()) == 1, timeout=1.0))
+            self.assertEqual(group_browser.get_discovered_rooms()[0].host_port, 9201)
+        finally:
+            host.stop_hosting()
+            group_browser.stop_discovery()
+        print("    ✅ 组播房间发现正确")
+
+    def test_udp_multicast_transport(self):
+        """UDP传输加入组播组后收到组播数据报"""
+        print("  测试UDP组播...")
+        network = UdpNetwork()
+        try:
+            receiver = network.create_transport(0, multicast_group=DEFAULT_MULTICAST_GROUP)
+        except OSError as e:
+            self.skipTest(f"当前环境不支持组播: {e}")
+        sender = network.create_transport()
+        try:
+            port = receiver.local_address[1]
+            sender.send(b"room", (DEFAULT_MULTICAST_GROUP, port))
+            batch = receiver.receive_batch(timeout=1.0)
+            if not batch:
+                self.skipTest("当前环境没有组播路由")
+            self.assertEqual(batch[0][0], b"room")
+        finally:
+            sender.close()
+            receiver.close()
+        print("    ✅ UDP组播正确")
+
+
+if __name__ == "__main__":
+    unittest.main()
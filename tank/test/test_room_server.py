@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+多房间服务器测试
+
+测试在一台机器上运行多个房间，确保：
+1. 房间均匀分配到工作进程，端口连续
+2. 房间广播带有实际的游戏端口，多个房间共用一个发现端口
+3. 工作进程中的房间可以被客户端连接
+"""
+
+import sys
+import os
+import time
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multiplayer.transport import LoopbackNetwork, UdpNetwork
+from multiplayer.game_host import GameHost
+from multiplayer.game_client import GameClient
+from multiplayer.room_discovery import RoomDiscovery
+from multiplayer.room_server import RoomServer, assign_rooms
+
+
+class TestRoomAssignment(unittest.TestCase):
+    """测试房间分配"""
+
+    def test_round_robin(self):
+        """房间轮流分配给工作进程"""
+        print("  测试房间分配...")
+        shards = assign_rooms(22, 4, base_port=20000, room_name="比赛")
+        self.assertEqual([len(shard) for shard in shards], [6, 6, 5, 5])
+        ports = sorted(port for shard in shards for _, port in shard)
+        self.assertEqual(ports, list(range(20000, 20022)))
+        self.assertEqual(shards[1][0], ("比赛 2", 20001))
+
+        # 工作进程数不超过房间数
+        self.assertEqual(len(assign_rooms(2, 8)), 2)
+        print("    ✅ 房间分配正确")
+
+
+class TestSharedDiscoveryPort(unittest.TestCase):
+    """测试多个房间共用发现端口"""
+
+    def test_adverts_carry_game_port(self):
+        """每个房间的广播带有自己的游戏端口"""
+        print("  测试房间广播端口...")
+        network = LoopbackNetwork()
+        browser = RoomDiscovery(9000, network=network)
+        self.assertTrue(browser.start_discovery())
+
+        hosts = [GameHost(host_port=port, network=network, discovery_port=9000)
+                 for port in (9100, 9101, 9102)]
+        try:
+            for index, host in enumerate(hosts):
+                self.assertTrue(host.start_hosting(f"房间 {index + 1}", "服务器"))
+
+            deadline = time.time() + 3.0
+            while time.time() < deadline and len(browser.get_discovered_rooms()) < 3:
+                time.sleep(0.05)
+            ports = sorted(room.host_port for room in browser.get_discovered_rooms())
+            self.assertEqual(ports, [9100, 9101, 9102])
+        finally:
+            for host in hosts:
+                host.stop_hosting()
+            browser.stop_discovery()
+        print("    ✅ 广播中的游戏端口正确")
+
+
+class TestRoomServer(unittest.TestCase):
+    """测试多进程房间服务器"""
+
+    def test_rooms_in_worker_processes(self):
+        """工作进程中的房间接受客户端连接"""
+        print("  测试多进程房间服务器...")
+        base_port = 31000 + os.getpid() % 1000 * 8
+        server = RoomServer(room_count=4, workers=2, base_port=base_port,
+                            discovery_port=base_port - 1, tick_rate=30)
+        clients = []
+        try:
+            self.assertTrue(server.start(timeout=60.0))
+            self.assertEqual(server.room_ports, list(range(base_port, base_port + 4)))
+            self.assertEqual(len(server.processes), 2)
+
+            # 不同工作进程中的房间都可以连接
+            for port in (base_port, base_port + 3):
+                client = GameClient(network=UdpNetwork())
+                self.assertTrue(client.connect_to_host("127.0.0.1", port, "玩家"))
+                clients.append(client)
+        finally:
+            for client in clients:
+                client.disconnect()
+            server.stop()
+        self.assertEqual(server.processes, [])
+        print("    ✅ 多进程房间服务器正确")
+
+
+if __name__ == "__main__":
+    unittest.main()
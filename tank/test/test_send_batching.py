@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+发送合并测试
+
+测试一个tick内的多条消息合并成一个数据报发送，确保：
+1. 长度前缀分帧可以正确拆分，单条消息原样发送
+2. 合并数据报不超过MTU，超长消息单独发送
+3. 主机的 GAME_STATE + GAME_END 合并发送，客户端逐条处理
+4. 客户端的输入和心跳合并发送
+"""
+
+import sys
+import os
+import time
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multiplayer.transport import LoopbackNetwork
+from multiplayer.game_host import GameHost
+from multiplayer.game_client import GameClient
+from multiplayer.messages import MessageFactory, NetworkMessage, MessageType
+from multiplayer.batching import (SendBatcher, pack_messages, unpack_datagram,
+                                  BATCH_MAGIC, BATCH_MTU)
+
+
+def _wait_for(condition, timeout=3.0):
+    """等待条件成立"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return condition()
+
+
+class TestFraming(unittest.TestCase):
+    """测试分帧格式"""
+
+    def test_round_trip(self):
+        """多条消息打包后按顺序拆出"""
+        print("  测试分帧往返...")
+        messages = [MessageFactory.create_heartbeat().to_bytes(),
+                    MessageFactory.create_game_end("host").to_bytes(),
+                    b"{}"]
+        datagrams = pack_messages(messages)
+        self.assertEqual(len(datagrams), 1)
+        self.assertEqual(datagrams[0][0], BATCH_MAGIC)
+        self.assertEqual(unpack_datagram(datagrams[0]), messages)
+        print("    ✅ 分帧往返正确")
+
+    def test_single_and_oversized(self):
+        """单条消息原样发送，超过MTU时拆成多个数据报"""
+        print("  测试单条和超长消息...")
+        message = MessageFactory.create_heartbeat().to_bytes()
+        self.assertEqual(pack_messages([message]), [message])
+        self.assertEqual(unpack_datagram(message), [message])
+
+        large = b"{" + b"x" * (BATCH_MTU * 2) + b"}"
+        small = [b"{" + b"y" * 500 + b"}" for _ in range(5)]
+        datagrams = pack_messages(small[:2] + [large] + small[2:])
+        self.assertIn(large, datagrams)
+        self.assertTrue(all(len(d) <= BATCH_MTU for d in datagrams if d is not large))
+        unpacked = [m for d in datagrams for m in unpack_datagram(d)]
+        self.assertEqual(unpacked, small[:2] + [large] + small[2:])
+
+        with self.assertRaises(ValueError):
+            unpack_datagram(datagrams[0][:-10])
+        print("    ✅ 单条和超长消息正确")
+
+    def test_batcher_per_address(self):
+        """按地址分别合并"""
+        print("  测试按地址合并...")
+        batcher = SendBatcher()
+        for i in range(3):
+            batcher.queue(("a", 1), b"{%d}" % i)
+        batcher.queue(("b", 2), b"{9}")
+        sent = []
+        self.assertEqual(batcher.flush(lambda addr, data: sent.append((addr, data))), 2)
+        self.assertEqual(dict(sent)[("b", 2)], b"{9}")
+        self.assertEqual(len(unpack_datagram(dict(sent)[("a", 1)])), 3)
+        self.assertEqual(batcher.pending_count(), 0)
+        print("    ✅ 按地址合并正确")
+
+
+class TestHostClientBatching(unittest.TestCase):
+    """测试主机和客户端的合并发送"""
+
+    def setUp(self):
+        self.network = LoopbackNetwork()
+        self.host = GameHost(network=self.network, batch_sends=True)
+        self.assertTrue(self.host.start_hosting("测试房间", "主机"))
+        self.client = GameClient(network=self.network)
+        self.assertTrue(self.client.connect_to_host("127.0.0.1", self.host.host_port, "玩家"))
+
+    def tearDown(self):
+        self.client.disconnect()
+        self.host.stop_hosting()
+
+    def test_state_and_game_end_in_one_datagram(self):
+        """GAME_STATE 和 GAME_END 在tick末合并成一个数据报"""
+        print("  测试主机合并发送...")
+        received = []
+        self.client.set_callbacks(game_state=lambda state: received.append("state"),
+                                  game_end=lambda data: received.append("end"))
+
+        self.host.send_game_state({"tanks": [], "scores": {}, "game_time": 1.0})
+        self.host.send_to_client(MessageFactory.create_game_end("host"))
+        self.assertEqual(received, [])  # tick结束前不发送
+
+        self.assertEqual(self.host.flush_sends(), 1)
+        self.assertTrue(_wait_for(lambda: len(received) == 2))
+        self.assertEqual(received, ["state", "end"])
+        print("    ✅ 两条消息一个数据报")
+
+    def test_client_input_and_heartbeat(self):
+        """客户端同一轮的输入和心跳合并发送"""
+        print("  测试客户端合并发送...")
+        receiver = self.network.create_transport(9300)
+        client = GameClient(network=self.network)
+        client.transport = self.network.create_transport()
+        client.host_address = ("127.0.0.1", 9300)
+        try:
+            # 与网络循环一轮的顺序相同：输入、心跳、合并发送
+            client.pending_key_presses.append("W")
+            client._send_pending_input()
+            client._send_heartbeat_if_needed()
+            client._flush_sends()
+
+            batch = receiver.receive_batch(timeout=1.0)
+            self.assertEqual(len(batch), 1)
+            types = [NetworkMessage.from_bytes(data).type for data in unpack_datagram(batch[0][0])]
+            self.assertEqual(types, [MessageType.PLAYER_INPUT, MessageType.HEARTBEAT])
+        finally:
+            client.transport.close()
+            receiver.close()
+        print("    ✅ 输入和心跳一个数据报")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+会话恢复测试
+
+测试短暂断线后恢复会话，确保：
+1. 加入响应带有会话令牌，主机回应心跳
+2. 无响应的玩家被挂起（按键全部松开），超过恢复窗口才移除
+3. 客户端网络出错或主机无响应时携带令牌重连，可以从新的地址恢复
+4. 过期的令牌被拒绝，客户端断开
+"""
+
+import sys
+import os
+import time
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multiplayer.transport import LoopbackNetwork
+from multiplayer.game_host import GameHost
+from multiplayer.game_client import GameClient
+from multiplayer.messages import MessageFactory, NetworkMessage, MessageType
+from multiplayer.bullet_sync import create_keyframe_events
+
+
+def _wait_for(condition, timeout=3.0):
+    """等待条件成立"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+class TestSessionResume(unittest.TestCase):
+    """测试会话挂起和恢复"""
+
+    def setUp(self):
+        self.network = LoopbackNetwork()
+        self.host = GameHost(network=self.network)
+        self.events = []
+        self.host.set_callbacks(
+            client_leave=lambda cid, reason: self.events.append(("leave", cid)),
+            input_received=lambda cid, pressed, released: self.events.append(("input", pressed, released)),
+            client_suspended=lambda cid: self.events.append(("suspended", cid)),
+            client_resumed=lambda cid: self.events.append(("resumed", cid))
+        )
+        self.assertTrue(self.host.start_hosting("测试房间", "主机"))
+        self.client = GameClient(network=self.network)
+        self.client.host_silence_timeout = 0.3
+        self.client.resume_retry_interval = 0.05
+        self.assertTrue(self.client.connect_to_host("127.0.0.1", self.host.host_port, "玩家"))
+
+    def tearDown(self):
+        self.client.disconnect()
+        self.host.stop_hosting()
+
+    def test_token_and_heartbeat_echo(self):
+        """加入时获得令牌，主机回应心跳"""
+        print("  测试会话令牌和心跳回应...")
+        self.assertTrue(self.client.session_token)
+        self.assertEqual(self.host.client.session_token, self.client.session_token)
+
+        # 心跳每秒发送一次，主机回应使客户端不会进入重连
+        time.sleep(1.5)
+        self.assertFalse(self.client.resuming)
+        self.assertTrue(self.client.is_connected())
+        print("    ✅ 令牌和心跳回应正确")
+
+    def test_suspend_and_expire(self):
+        """无响应的玩家被挂起并松开按键，超过恢复窗口后移除"""
+        print("  测试挂起和过期...")
+        info = self.host.client
+        info.current_keys = {"W", "SPACE"}
+        info.last_heartbeat = time.time() - 10
+
+        self.host._check_client_timeout()
+        self.assertTrue(info.suspended)
+        self.assertEqual(len(self.host.clients), 1)
+        self.assertIn(("suspended", info.client_id), self.events)
+        released = [e for e in self.events if e[0] == "input"]
+        self.assertEqual(sorted(released[0][2]), ["SPACE", "W"])
+
+        info.suspended_at = time.time() - self.host.resume_window - 1
+        self.host._check_client_timeout()
+        self.assertEqual(self.host.clients, {})
+        self.assertIn(("leave", info.client_id), self.events)
+        print("    ✅ 挂起和过期正确")
+
+    def test_resume_after_network_error(self):
+        """网络出错后从新的地址恢复同一个会话"""
+        print("  测试网络错误后恢复...")
+        interrupted, resumed = [], []
+        self.client.interrupted_callback = interrupted.append
+        self.client.resumed_callback = lambda: resumed.append(True)
+        player_id = self.client.player_id
+        old_address = self.host.client.address
+
+        self.client.transport.close()  # 模拟网卡断开
+        self.assertTrue(_wait_for(lambda: resumed))
+        self.assertEqual(len(interrupted), 1)
+        self.assertEqual(self.client.player_id, player_id)
+        self.assertEqual(len(self.host.clients), 1)
+        self.assertNotEqual(self.host.client.address, old_address)
+        self.assertIn(("resumed", player_id), self.events)
+
+        # 恢复后输入正常到达主机
+        self.client.send_key_press("A")
+        self.assertTrue(_wait_for(lambda: ("input", ["A"], []) in self.events))
+        print("    ✅ 网络错误后恢复正确")
+
+    def test_resume_after_host_silence(self):
+        """主机无响应时进入重连，恢复后收到关键帧"""
+        print("  测试主机无响应后恢复...")
+        states = []
+        self.client.set_callbacks(game_state=states.append,
+                                  resumed=lambda: self.host.send_to_client(
+                                      MessageFactory.create_state_keyframe([], {}, create_keyframe_events([]))))
+
+        # 主机暂时丢弃所有消息
+        handler = self.host._handle_client_message
+        self.host._handle_client_message = lambda data, addr: None
+        self.client.last_receive_time = time.time() - 1
+        self.assertTrue(_wait_for(lambda: self.client.resuming, timeout=1.0))
+        self.host._handle_client_message = handler
+
+        self.assertTrue(_wait_for(lambda: states and states[-1].get("keyframe")))
+        self.assertFalse(self.client.resuming)
+        self.assertTrue(states[-1]["bullet_events"]["full"])
+        print("    ✅ 主机无响应后恢复正确")
+
+    def test_expired_token_rejected(self):
+        """主机不认识的令牌被拒绝，客户端断开"""
+        print("  测试过期令牌...")
+        disconnected = []
+        self.client.disconnection_callback = disconnected.append
+        self.host.clients = {}
+        self.client.last_receive_time = time.time() - 1
+        self.assertTrue(_wait_for(lambda: disconnected, timeout=2.0))
+        self.assertEqual(disconnected[0], "会话已过期")
+        self.assertFalse(self.client.is_connected())
+        print("    ✅ 过期令牌被拒绝")
+
+
+class TestKeyframeMessage(unittest.TestCase):
+    """测试关键帧消息"""
+
+    def test_keyframe_round_trip(self):
+        """关键帧不会被当作过时的状态快照丢弃"""
+        print("  测试关键帧消息...")
+        message = MessageFactory.create_state_keyframe([{"player_id": "host"}], {"host": 1},
+                                                       create_keyframe_events(None), game_time=3.0)
+        decoded = NetworkMessage.from_bytes(message.to_bytes())
+        self.assertEqual(decoded.type, MessageType.STATE_KEYFRAME)
+        self.assertTrue(decoded.data["keyframe"])
+        self.assertFalse(NetworkMessage.is_type(message.to_bytes(), MessageType.GAME_STATE))
+        print("    ✅ 关键帧消息正确")
+
+
+if __name__ == "__main__":
+    unittest.main()
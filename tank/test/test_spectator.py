@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+观战测试
+
+测试观众连接和观战数据流，确保：
+1. 观战快照按较低频率采样，只编码一次，并按延迟发出
+2. 观众不占用玩家名额，发送的输入被忽略
+3. 同一份编码数据发送给所有观众
+4. 专用服务器对局可以被观战
+5. 主机结束对局切换界面后，观众仍按延迟收到最后的快照和游戏结束消息
+"""
+
+import sys
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tank_sprites
+from multiplayer.transport import LoopbackNetwork
+from multiplayer.game_host import GameHost
+from multiplayer.game_client import GameClient
+from multiplayer.messages import MessageFactory, NetworkMessage, MessageType
+from multiplayer.spectator import SpectatorFeed
+from multiplayer.dedicated_server import DedicatedServer, HeadlessWindow
+from multiplayer.network_views import HostGameView
+
+
+def _wait_for(condition, timeout=3.0):
+    """等待条件成立"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+class TestSpectatorFeed(unittest.TestCase):
+    """测试观战数据流"""
+
+    def test_rate_and_delay(self):
+        """按频率采样，延迟到期后按顺序取出"""
+        print("  测试观战采样和延迟...")
+        feed = SpectatorFeed(sync_rate=10, delay=1.0)
+        self.assertTrue(feed.should_capture(now=0.0))
+        feed.capture(MessageFactory.create_game_state([], game_time=0.0), now=0.0)
+        self.assertFalse(feed.should_capture(now=0.05))
+        self.assertTrue(feed.should_capture(now=0.1))
+        feed.capture(MessageFactory.create_game_state([], game_time=0.1), now=0.1)
+
+        # 事件消息不影响采样节奏
+        feed.capture(MessageFactory.create_game_end("player1"), now=0.15, is_snapshot=False)
+        self.assertTrue(feed.should_capture(now=0.2))
+
+        self.assertEqual(feed.pop_due(now=0.99), [])
+        due = feed.pop_due(now=1.12)
+        self.assertEqual([NetworkMessage.from_bytes(data).data["game_time"] for data in due], [0.0, 0.1])
+        self.assertEqual(feed.pending_count(), 1)
+        self.assertEqual(feed.snapshots_encoded, 3)
+        print("    ✅ 采样频率和延迟正确")
+
+
+class TestSpectatorConnections(unittest.TestCase):
+    """测试观众连接"""
+
+    def setUp(self):
+        self.network = LoopbackNetwork()
+        self.host = GameHost(network=self.network, spectator_delay=0.0)
+        self.inputs = []
+        self.host.set_callbacks(input_received=lambda *args: self.inputs.append(args))
+        self.assertTrue(self.host.start_hosting("测试房间", "主机"))
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.disconnect()
+        self.host.stop_hosting()
+
+    def _connect(self, name, spectator=False):
+        client = GameClient(network=self.network)
+        ok = client.connect_to_host("127.0.0.1", self.host.host_port, name, spectator=spectator)
+        if ok:
+            self.clients.append(client)
+        return client, ok
+
+    def test_spectators_do_not_take_player_slot(self):
+        """观众不占玩家名额，输入被忽略"""
+        print("  测试观众名额和输入...")
+        spectator, ok = self._connect("观众", spectator=True)
+        self.assertTrue(ok)
+        player, ok = self._connect("玩家")
+        self.assertTrue(ok)
+        self.assertEqual(self.host.get_spectator_count(), 1)
+        self.assertEqual(len(self.host.clients), 1)
+
+        # 观众客户端不发送输入；即使伪造输入消息，主机也忽略
+        spectator.send_key_press("W")
+        spectator.transport.send(MessageFactory.create_player_input(["SPACE"], []).to_bytes(),
+                                 spectator.host_address)
+        player.send_key_press("A")
+        self.assertTrue(_wait_for(lambda: len(self.inputs) >= 1))
+        time.sleep(0.1)
+        self.assertEqual([args[1] for args in self.inputs], [["A"]])
+
+        spectator.disconnect()
+        self.assertTrue(_wait_for(lambda: self.host.get_spectator_count() == 0))
+        print("    ✅ 观众不影响对局")
+
+    def test_encode_once_fan_out(self):
+        """每个快照只编码一次，发送给所有观众"""
+        print("  测试编码一次广播...")
+        states = []
+        for i in range(5):
+            spectator, ok = self._connect(f"观众{i}", spectator=True)
+            self.assertTrue(ok)
+            spectator.set_callbacks(game_state=states.append)
+
+        with patch.object(NetworkMessage, "to_bytes", autospec=True,
+                          side_effect=NetworkMessage.to_bytes) as to_bytes:
+            self.host.send_spectator_state({"tanks": [], "scores": {}, "game_time": 1.5})
+            sent = self.host.flush_spectators()
+        self.assertEqual(to_bytes.call_count, 1)
+        self.assertEqual(sent, 5)
+        self.assertTrue(_wait_for(lambda: len(states) == 5))
+        self.assertTrue(all(state["game_time"] == 1.5 for state in states))
+        print("    ✅ 5个观众收到同一份快照")
+
+
+class TestSpectateDedicatedServer(unittest.TestCase):
+    """测试观战专用服务器对局"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+
+    def test_spectate_match(self):
+        """观众收到地图、开始消息和延迟的状态快照"""
+        print("  测试观战专用服务器...")
+        network = LoopbackNetwork()
+        server = DedicatedServer("观战测试", network=network)
+        server.game_host.spectator_feed.delay = 0.3
+        thread = threading.Thread(target=server.run, kwargs={"duration": 10.0}, daemon=True)
+        thread.start()
+
+        received = []
+        clients = []
+        try:
+            self.assertTrue(_wait_for(lambda: server.running))
+            spectator = GameClient(network=network)
+            spectator.set_callbacks(game_start=lambda config: received.append("start"),
+                                    game_state=lambda state: received.append("state"))
+            self.assertTrue(spectator.connect_to_host("127.0.0.1", 12346, "观众", spectator=True))
+            clients.append(spectator)
+
+            for name in ("玩家A", "玩家B"):
+                client = GameClient(network=network)
+                self.assertTrue(client.connect_to_host("127.0.0.1", 12346, name))
+                clients.append(client)
+
+            self.assertTrue(_wait_for(lambda: server.game_phase == "playing"))
+            started = time.perf_counter()
+            self.assertTrue(_wait_for(lambda: received.count("state") >= 3))
+            self.assertGreaterEqual(time.perf_counter() - started, 0.25)
+            self.assertEqual(received[0], "start")
+        finally:
+            for client in clients:
+                client.disconnect()
+            server.stop_event.set()
+            thread.join(timeout=5.0)
+        print("    ✅ 观众按延迟收到对局")
+
+
+class TestSpectateHostGameOver(unittest.TestCase):
+    """测试观战有窗口的主机对局结束"""
+
+    def setUp(self):
+        tank_sprites.SOUND_ENABLED = False
+
+    def tearDown(self):
+        tank_sprites.SOUND_ENABLED = True
+
+    def test_game_end_reaches_spectators(self):
+        """对局结束后主机视图被隐藏，观众仍收到延迟的结束消息后才断开"""
+        print("  测试观战对局结束...")
+        network = LoopbackNetwork()
+        host_view = HostGameView(network=network, window=HeadlessWindow(), spectator_delay=0.3)
+        host_view.on_show_view()
+
+        received = []
+        spectator = GameClient(network=network)
+        spectator.set_callbacks(game_state=lambda state: received.append("state"),
+                                game_end=lambda data: received.append("end"),
+                                disconnection=lambda reason: received.append("disconnect"))
+        player = GameClient(network=network)
+        try:
+            self.assertTrue(spectator.connect_to_host("127.0.0.1", 12346, "观众", spectator=True))
+            self.assertTrue(player.connect_to_host("127.0.0.1", 12346, "玩家"))
+            host_view._start_game()
+            for _ in range(10):
+                host_view.on_update(1 / 60)
+
+            # 主机赢下最后一回合，回合间隙结束时整局结束
+            game_view = host_view.game_view
+            game_view.player1_score = game_view.max_score
+            game_view.round_over = True
+            game_view.round_over_timer = 0.0
+            host_view.on_update(1 / 60)
+            self.assertTrue(game_view.game_over)
+
+            # 有窗口时切换到GameOverView会隐藏主机视图
+            host_view.on_hide_view()
+            self.assertTrue(_wait_for(lambda: "disconnect" in received))
+            self.assertIn("end", received)
+            self.assertLess(received.index("end"), received.index("disconnect"))
+            self.assertGreater(received.count("state"), 0)
+        finally:
+            player.disconnect()
+            spectator.disconnect()
+            host_view.game_host.stop_hosting(force=True)
+        print(f"    ✅ 观众收到 {received.count('state')} 个快照和结束消息")
+
+
+if __name__ == "__main__":
+    unittest.main()
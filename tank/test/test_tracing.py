@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+时间线追踪测试
+
+测试跨线程的时间线追踪，确保：
+1. 关闭时不记录任何事件
+2. 各线程的事件写入各自的缓冲区，导出的 Chrome trace 中区间成对、带线程名
+3. 主机和客户端通过回环网络通信时，收包、解码和消息处理记录在各自的网络线程上
+"""
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multiplayer.game_host import GameHost
+from multiplayer.game_client import GameClient
+from multiplayer.transport import LoopbackNetwork
+from multiplayer.tracing import Tracer, tracer
+
+
+def _wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def _by_thread(trace: dict) -> dict:
+    """线程名 -> 该线程的事件（不含元数据）"""
+    names = {event["tid"]: event["args"]["name"] for event in trace["traceEvents"]
+             if event["ph"] == "M" and event["name"] == "thread_name"}
+    events = {}
+    for event in trace["traceEvents"]:
+        if event["ph"] != "M":
+            events.setdefault(names[event["tid"]], []).append(event)
+    return events
+
+
+class TestTracer(unittest.TestCase):
+    """测试追踪器"""
+
+    def test_disabled_records_nothing(self):
+        """关闭时不记录事件"""
+        print("  测试关闭时不记录...")
+        local_tracer = Tracer()
+        with local_tracer.span("decode", "net"):
+            local_tracer.instant("packet_recv", "net")
+        local_tracer.begin("draw")
+        local_tracer.end("draw")
+        self.assertEqual(local_tracer.event_count(), 0)
+        self.assertEqual(local_tracer.to_chrome_trace()["traceEvents"][1:], [])
+        print("    ✅ 没有事件")
+
+    def test_threads_export(self):
+        """每个线程的区间成对导出，时间戳递增"""
+        print("  测试多线程导出...")
+        local_tracer = Tracer()
+        local_tracer.start()
+
+        def work(index):
+            for _ in range(50):
+                with local_tracer.span("work", "test", {"index": index}):
+                    local_tracer.instant("tick", "test")
+
+        threads = [threading.Thread(target=work, args=(index,), name=f"worker-{index}") for index in range(4)]
+        for thread in threads:
+            thread.start()
+        work(-1)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(local_tracer.event_count(), 5 * 150)
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, "trace.json")
+            self.assertEqual(local_tracer.export(path), 5 * 150)
+            with open(path, encoding="utf-8") as trace_file:
+                trace = json.load(trace_file)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        events = _by_thread(trace)
+        self.assertEqual(sorted(events), ["MainThread"] + [f"worker-{index}" for index in range(4)])
+        for thread_events in events.values():
+            self.assertEqual([event["ph"] for event in thread_events[:3]], ["B", "i", "E"])
+            self.assertEqual(sum(event["ph"] == "B" for event in thread_events),
+                             sum(event["ph"] == "E" for event in thread_events))
+            timestamps = [event["ts"] for event in thread_events]
+            self.assertEqual(timestamps, sorted(timestamps))
+        print("    ✅ 5个线程的事件导出正确")
+
+    def test_buffer_limit(self):
+        """每个线程只保留最近的事件"""
+        print("  测试缓冲区上限...")
+        local_tracer = Tracer(max_events=10)
+        local_tracer.start()
+        for index in range(25):
+            local_tracer.instant("tick", args={"index": index})
+        events = local_tracer.to_chrome_trace()["traceEvents"]
+        self.assertEqual([event["args"]["index"] for event in events if event["ph"] == "i"],
+                         list(range(15, 25)))
+        print("    ✅ 只保留最近10个事件")
+
+
+class TestNetworkTracing(unittest.TestCase):
+    """测试网络线程的追踪"""
+
+    def setUp(self):
+        tracer.start()
+        self.network = LoopbackNetwork()
+        self.host = GameHost(network=self.network)
+        self.assertTrue(self.host.start_hosting("测试房间", "主机"))
+        self.client = GameClient(network=self.network)
+        self.assertTrue(self.client.connect_to_host("127.0.0.1", self.host.host_port, "玩家"))
+
+    def tearDown(self):
+        self.client.disconnect()
+        self.host.stop_hosting()
+        tracer.stop()
+        tracer.clear()
+
+    def test_network_threads(self):
+        """收包、解码和消息处理记录在主机和客户端的网络线程上"""
+        print("  测试网络线程追踪...")
+        received = []
+        self.client.set_callbacks(game_state=received.append)
+        self.host.send_game_state({"tanks": [], "scores": {}, "game_time": 1.0})
+        self.host.flush_sends()
+        self.assertTrue(_wait_for(lambda: received))
+        self.client.send_key_press("W")
+        host_thread = self.host.network_thread.name
+        self.assertTrue(_wait_for(lambda: any(
+            event["name"] == "decode"
+            for event in _by_thread(tracer.to_chrome_trace()).get(host_thread, []))))
+
+        events = _by_thread(tracer.to_chrome_trace())
+        for thread in (self.host.network_thread, self.client.network_thread):
+            names = {event["name"] for event in events[thread.name]}
+            self.assertTrue({"packet_recv", "decode", "handle_message"} <= names, names)
+        self.assertNotIn("MainThread", events)
+        print("    ✅ 主机和客户端网络线程的事件都已记录")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+传输层测试
+
+测试传输接口的UDP实现和进程内回环实现，确保：
+1. 回环网络按地址投递数据报，广播投递给所有绑定该端口的端点
+2. 主机和客户端可以在同一进程中通过回环网络完成加入、输入和状态同步
+3. 房间发现可以在回环网络上工作
+4. UDP传输批量接收已到达的数据报（已有数据时立即返回），receive_into 复用预分配的缓冲区
+5. 积压的状态快照只完整处理最新的一个，被丢弃快照中的子弹事件交给客户端
+"""
+
+import sys
+import os
+import time
+import threading
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multiplayer.transport import LoopbackNetwork, UdpNetwork, BROADCAST_ADDRESS
+from multiplayer.game_host import GameHost
+from multiplayer.game_client import GameClient
+from multiplayer.room_discovery import RoomDiscovery
+from multiplayer.messages import MessageFactory, NetworkMessage, MessageType
+from multiplayer.batching import pack_messages, split_batch, latest_only
+from multiplayer.bullet_sync import EVENT_REDUNDANCY
+
+
+def _wait_until(condition, timeout=2.0):
+    """等待条件成立"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return condition()
+
+
+class TestLoopbackTransport(unittest.TestCase):
+    """测试回环传输"""
+
+    def setUp(self):
+        self.network = LoopbackNetwork()
+
+    def test_send_and_receive_batch(self):
+        """数据报按顺序投递，批量取出"""
+        print("  测试回环收发...")
+        server = self.network.create_transport(9000)
+        client = self.network.create_transport()
+        for i in range(5):
+            client.send(bytes([i]), ('127.0.0.1', 9000))
+
+        batch = server.receive_batch(max_count=3, timeout=0)
+        self.assertEqual([data for data, _ in batch], [b'\x00', b'\x01', b'\x02'])
+        self.assertEqual(batch[0][1], client.local_address)
+        self.assertEqual(len(server.receive_batch(timeout=0)), 2)
+        self.assertEqual(server.receive_batch(timeout=0.01), [])
+        print("    ✅ 回环收发正确")
+
+    def test_unknown_address_and_port_conflict(self):
+        """发送到不存在的地址时丢弃，重复绑定报错"""
+        print("  测试丢弃和端口冲突...")
+        client = self.network.create_transport()
+        client.send(b'lost', ('127.0.0.1', 9999))
+        self.assertEqual(self.network.datagrams_dropped, 1)
+
+        self.network.create_transport(9000)
+        with self.assertRaises(OSError):
+            self.network.create_transport(9000)
+        print("    ✅ 丢弃和端口冲突正确")
+
+    def test_broadcast(self):
+        """广播投递给所有绑定该端口的端点"""
+        print("  测试回环广播...")
+        listener_a = self.network.create_transport(9001, host_ip='10.0.0.2')
+        listener_b = self.network.create_transport(9001, host_ip='10.0.0.3')
+        sender = self.network.create_transport(broadcast=True)
+        sender.send(b'hello', (BROADCAST_ADDRESS, 9001))
+
+        self.assertEqual(listener_a.receive_batch(timeout=0)[0][0], b'hello')
+        self.assertEqual(listener_b.receive_batch(timeout=0)[0][0], b'hello')
+        print("    ✅ 回环广播正确")
+
+    def test_close_releases_address(self):
+        """关闭后释放地址，接收抛出异常"""
+        print("  测试关闭传输...")
+        transport = self.network.create_transport(9002)
+        transport.close()
+        with self.assertRaises(OSError):
+            transport.receive_batch(timeout=0)
+        self.network.create_transport(9002)
+        print("    ✅ 关闭传输正确")
+
+
+class TestLoopbackGameSession(unittest.TestCase):
+    """测试主机和客户端在回环网络上的完整会话"""
+
+    def setUp(self):
+        self.network = LoopbackNetwork()
+        self.host = GameHost(network=self.network)
+        self.client = GameClient(network=self.network)
+        self.received_states = []
+        self.received_inputs = []
+        self.host.set_callbacks(
+            input_received=lambda client_id, pressed, released: self.received_inputs.append(pressed)
+        )
+        self.client.set_callbacks(game_state=self.received_states.append)
+
+    def tearDown(self):
+        self.client.disconnect()
+        self.host.stop_hosting()
+
+    def test_join_input_and_state(self):
+        """加入、输入转发和状态同步"""
+        print("  测试回环游戏会话...")
+        self.assertTrue(self.host.start_hosting("测试房间"))
+        self.assertTrue(self.client.connect_to_host("127.0.0.1", 12346, "玩家"))
+        self.assertTrue(_wait_until(lambda: self.host.client is not None))
+
+        self.client.send_key_press("W")
+        self.assertTrue(_wait_until(lambda: self.received_inputs == [["W"]]))
+        self.assertEqual(self.host.get_client_input(), {"W"})
+
+        self.host.send_game_state({"tanks": [], "game_time": 1.5})
+        self.assertTrue(_wait_until(lambda: len(self.received_states) == 1))
+        self.assertEqual(self.received_states[0]["game_time"], 1.5)
+        self.assertEqual(self.client.last_state_time, 1.5)
+        print("    ✅ 回环游戏会话正确")
+
+
+class TestLoopbackDiscovery(unittest.TestCase):
+    """测试回环网络上的房间发现"""
+
+    def test_room_discovered(self):
+        """广播的房间可以被发现"""
+        print("  测试回环房间发现...")
+        network = LoopbackNetwork()
+        advertiser = RoomDiscovery(network=network)
+        browser = RoomDiscovery(network=network)
+        try:
+            self.assertTrue(browser.start_discovery())
+            self.assertTrue(advertiser.start_advertising("回环房间", "主机"))
+            self.assertTrue(_wait_until(lambda: len(browser.get_discovered_rooms()) == 1))
+            self.assertEqual(browser.get_discovered_rooms()[0].room_name, "回环房间")
+        finally:
+            advertiser.stop_advertising()
+            browser.stop_discovery()
+        print("    ✅ 回环房间发现正确")
+
+
+class TestUdpTransport(unittest.TestCase):
+    """测试UDP传输"""
+
+    def test_receive_batch_drains_socket(self):
+        """批量接收取出所有已到达的数据报"""
+        print("  测试UDP批量接收...")
+        network = UdpNetwork()
+        server = network.create_transport(0)
+        client = network.create_transport()
+        try:
+            port = server.local_address[1]
+            for i in range(4):
+                client.send(bytes([i]), ('127.0.0.1', port))
+            time.sleep(0.05)
+
+            batch = server.receive_batch(timeout=1.0)
+            self.assertEqual([data for data, _ in batch], [b'\x00', b'\x01', b'\x02', b'\x03'])
+            self.assertEqual(server.receive_batch(timeout=0.01), [])
+        finally:
+            server.close()
+            client.close()
+        print("    ✅ UDP批量接收正确")
+
+    def test_receive_batch_returns_without_waiting(self):
+        """已有数据报时取完立即返回，不再等待整个超时时间"""
+        print("  测试UDP批量接收不等待...")
+        network = UdpNetwork()
+        server = network.create_transport(0)
+        client = network.create_transport()
+        try:
+            port = server.local_address[1]
+            for i in range(3):
+                client.send(bytes([i]), ('127.0.0.1', port))
+            time.sleep(0.05)
+
+            start = time.perf_counter()
+            batch = server.receive_batch(timeout=0.5)
+            elapsed = time.perf_counter() - start
+            self.assertEqual(len(batch), 3)
+            self.assertLess(elapsed, 0.1)
+
+            # 没有数据时仍然等待第一个数据报到达
+            threading.Timer(0.05, client.send, (b'late', ('127.0.0.1', port))).start()
+            batch = server.receive_batch(timeout=1.0)
+            self.assertEqual([data for data, _ in batch], [b'late'])
+        finally:
+            server.close()
+            client.close()
+        print(f"    ✅ {elapsed * 1000:.1f}ms 内返回")
+
+    def test_receive_into_reuses_buffers(self):
+        """receive_into 把数据报接收到复用的缓冲区"""
+        print("  测试UDP零拷贝接收...")
+        network = UdpNetwork()
+        server = network.create_transport(0)
+        client = network.create_transport()
+        try:
+            port = server.local_address[1]
+            for i in range(3):
+                client.send(bytes([i]) * (i + 1), ('127.0.0.1', port))
+            time.sleep(0.05)
+
+            batch = server.receive_into(timeout=1.0)
+            self.assertEqual([bytes(data) for data, _ in batch], [b'\x00', b'\x01\x01', b'\x02\x02\x02'])
+            self.assertTrue(all(isinstance(data, memoryview) for data, _ in batch))
+            first = batch[0][0].obj
+
+            client.send(b'next', ('127.0.0.1', port))
+            batch = server.receive_into(timeout=1.0)
+            self.assertEqual(bytes(batch[0][0]), b'next')
+            self.assertIs(batch[0][0].obj, first)
+
+            # 已有数据报时取完立即返回，不等待整个超时时间
+            for i in range(3):
+                client.send(bytes([i]), ('127.0.0.1', port))
+            time.sleep(0.05)
+            start = time.perf_counter()
+            batch = server.receive_into(timeout=0.5)
+            self.assertEqual(len(batch), 3)
+            self.assertLess(time.perf_counter() - start, 0.1)
+        finally:
+            server.close()
+            client.close()
+        print("    ✅ 接收缓冲区被复用")
+
+
+class TestDrainToLatest(unittest.TestCase):
+    """测试积压状态快照的丢弃"""
+
+    def test_latest_state_only(self):
+        """只保留最新的状态快照，其他消息按顺序保留"""
+        print("  测试只保留最新状态...")
+        states = [MessageFactory.create_game_state([], game_time=t).to_bytes() for t in (1.0, 2.0, 3.0)]
+        game_end = MessageFactory.create_game_end("host").to_bytes()
+        batch = [(memoryview(pack_messages([states[0], game_end])[0]), ("h", 1)),
+                 (memoryview(states[1]), ("h", 1)),
+                 (memoryview(states[2]), ("h", 1))]
+
+        payloads = latest_only(split_batch(batch))
+        messages = [NetworkMessage.from_bytes(payload) for payload, _ in payloads]
+        self.assertEqual([m.type for m in messages], [MessageType.GAME_END, MessageType.GAME_STATE])
+        self.assertEqual(messages[1].data["game_time"], 3.0)
+
+        # 无效的合并数据报被丢弃，不影响同批其他数据报
+        payloads = split_batch([(b'\xb7\x00\x09{', ("h", 1)), (states[0], ("h", 1))])
+        self.assertEqual([bytes(p) for p, _ in payloads], [states[0]])
+        print("    ✅ 积压状态只解码最新的一个")
+
+    def test_dropped_states_keep_bullet_events(self):
+        """积压超过事件重复次数时，被丢弃快照中的子弹事件交给客户端回调"""
+        print("  测试被丢弃快照的子弹事件...")
+        count = EVENT_REDUNDANCY * 2
+        states = []
+        for i in range(count):
+            # 子弹 i 在第 i 个快照生成，第 i+1 个快照消失；每个事件只重复 EVENT_REDUNDANCY 次
+            spawns = [{"id": j, "x": j} for j in range(max(i - EVENT_REDUNDANCY + 1, 0), i + 1)]
+            despawns = list(range(max(i - EVENT_REDUNDANCY, 0), i))
+            events = {"spawn": spawns, "despawn": despawns, "check": [{"id": i}]}
+            states.append(MessageFactory.create_game_state([], bullet_events=events, game_time=float(i)))
+        batch = [(state.to_bytes(), ("h", 1)) for state in states]
+
+        # 保留的快照原样返回（不重新编码），被丢弃的按顺序交给调用方
+        dropped = []
+        payloads = latest_only(batch, dropped=dropped)
+        self.assertEqual(len(payloads), 1)
+        self.assertIs(payloads[0][0], batch[-1][0])
+        self.assertEqual(dropped, [data for data, _ in batch[:-1]])
+
+        received = []
+        client = GameClient(network=LoopbackNetwork())
+        client.set_callbacks(dropped_state=received.append)
+        client._handle_dropped_states(dropped)
+        received.append(NetworkMessage.from_bytes(payloads[0][0]).data)
+        self.assertEqual([state["game_time"] for state in received], [float(i) for i in range(count)])
+        spawned = {event["id"] for state in received for event in state["bullet_events"]["spawn"]}
+        despawned = {bid for state in received for bid in state["bullet_events"]["despawn"]}
+        self.assertEqual(spawned, set(range(count)))
+        self.assertEqual(despawned, set(range(count - 1)))
+        print(f"    ✅ {count} 个积压快照的生成和消失事件全部交给客户端")
+
+if __name__ == "__main__":
+    unittest.main()